@@ -0,0 +1,389 @@
+"""
+Отдача файлов заказов из админ-панели
+
+Поддерживает докачку (HTTP Range), условные запросы (ETag, If-None-Match,
+If-Modified-Since, If-Range) и передачу файла без копирования в Python:
+через nginx (X-Accel-Redirect) или ASGI-расширения zerocopysend/pathsend,
+если их поддерживает сервер. Иначе файл читается блоками. Файлы из S3
+отдаются редиректом на presigned-ссылку.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import RedirectResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.config import settings
+from app.database.models.file import OrderFile
+from app.services.metrics import file_io_bytes
+from app.storage.backends import backend_for, is_remote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEDIA_TYPE = "application/octet-stream"
+
+# Файлы доступны только после авторизации: не кэшируем в общих кэшах
+# и проверяем актуальность через ETag при каждом обращении
+CACHE_CONTROL = "private, no-cache"
+
+_served_bytes = file_io_bytes.labels("serve")
+
+
+class RangeNotSatisfiable(Exception):
+    """Запрошенный диапазон вне файла"""
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разобрать заголовок Range
+
+    Поддерживается один диапазон: bytes=0-99, bytes=100-, bytes=-500.
+    Для нескольких диапазонов и некорректного заголовка возвращается None
+    (отдаем файл целиком, это допускает RFC 9110).
+
+    Returns:
+        Optional[Tuple[int, int]]: Первый и последний байт включительно
+
+    Raises:
+        RangeNotSatisfiable: Диапазон начинается за концом файла
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    start_str, sep, end_str = ranges.strip().partition("-")
+    if not sep:
+        return None
+
+    try:
+        if start_str == "":
+            # Последние N байт
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start > end:
+        return None
+
+    return start, min(end, size - 1)
+
+
+def make_etag(content_hash: Optional[str], stat_result: os.stat_result) -> str:
+    """
+    ETag файла
+
+    Для файлов в хранилище - строгий, по SHA-256 содержимого (содержимое
+    по этому пути не меняется). Для старых файлов - слабый, по mtime и размеру.
+    """
+    if content_hash:
+        return f'"{content_hash}"'
+
+    base = f"{stat_result.st_mtime_ns}-{stat_result.st_size}".encode()
+    return f'W/"{hashlib.md5(base).hexdigest()}"'
+
+
+def _etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    """Сравнить ETag со списком из заголовка (If-None-Match / If-Range)"""
+    if header.strip() == "*":
+        return True
+
+    def normalize(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if weak and tag.startswith("W/") else tag
+
+    if not weak and etag.startswith("W/"):
+        return False
+
+    target = normalize(etag)
+    return any(normalize(tag) == target for tag in header.split(","))
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Можно ли ответить 304 Not Modified"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since игнорируется, если есть If-None-Match
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        return _not_modified_since(if_modified_since, mtime)
+
+    return False
+
+
+def range_allowed(request: Request, etag: str, last_modified: str) -> bool:
+    """Проверка If-Range: отдаем диапазон, только если файл не изменился"""
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if if_range.strip().startswith(('"', 'W/')):
+        return _etag_matches(if_range, etag, weak=False)
+    return if_range.strip() == last_modified
+
+
+def content_disposition(filename: str, disposition: str = "attachment") -> str:
+    """
+    Content-Disposition с именем файла в UTF-8 (RFC 6266)
+
+    filename - ASCII-вариант для старых клиентов, filename* - полное имя.
+    """
+    ascii_name = filename.encode("ascii", "ignore").decode().replace('"', "").replace("\\", "")
+    stem, extension = os.path.splitext(ascii_name)
+    if not stem.strip(" ._-"):
+        ascii_name = "download" + extension
+    return f"{disposition}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def accel_redirect_path(path: str) -> Optional[str]:
+    """Путь для X-Accel-Redirect, если файл лежит внутри upload_path"""
+    if not settings.file_accel_redirect:
+        return None
+
+    root = os.path.realpath(settings.upload_path)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([root, real_path]) != root:
+        return None
+
+    relative = os.path.relpath(real_path, root).replace(os.sep, "/")
+    return settings.file_accel_redirect.rstrip("/") + "/" + quote(relative)
+
+
+class StoredFileResponse(Response):
+    """
+    Ответ с файлом или его диапазоном
+
+    Тело отправляется через zerocopysend (sendfile в ядре) или pathsend,
+    если сервер объявил эти расширения ASGI, иначе читается блоками.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, size: int, headers: dict,
+                 byte_range: Optional[Tuple[int, int]] = None, method: str = "GET"):
+        self.path = path
+        self.size = size
+        self.send_header_only = method.upper() == "HEAD"
+
+        if byte_range is None:
+            self.start, self.length = 0, size
+            self.status_code = 200
+        else:
+            self.start, end = byte_range
+            self.length = end - self.start + 1
+            self.status_code = 206
+            headers["content-range"] = f"bytes {self.start}-{end}/{size}"
+
+        headers["content-length"] = str(self.length)
+        self.background = None
+        self.body = b""
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if self.send_header_only or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+
+        if "http.response.zerocopysend" in extensions:
+            _served_bytes.inc(self.length)
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+
+        if "http.response.pathsend" in extensions and self.status_code == 200:
+            _served_bytes.inc(self.length)
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            if self.start:
+                await file.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                _served_bytes.inc(len(chunk))
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                })
+            if remaining > 0:
+                # Файл укоротился во время отдачи - закрываем ответ
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def serve_order_file(request: Request, file_record: OrderFile,
+                           disposition: str = "attachment") -> Response:
+    """
+    Отдать файл заказа с учетом Range и условных заголовков
+
+    Args:
+        request: Запрос (GET или HEAD)
+        file_record: Файл заказа
+        disposition: attachment (скачать) или inline (открыть в браузере)
+
+    Raises:
+        HTTPException: 404, если файла нет на диске
+    """
+    return await serve_file(
+        request,
+        file_record.file_path,
+        file_record.filename or os.path.basename(file_record.file_path or ""),
+        content_hash=file_record.content_hash,
+        disposition=disposition
+    )
+
+
+async def serve_file(request: Request, path: str, filename: str,
+                     content_hash: Optional[str] = None, media_type: Optional[str] = None,
+                     disposition: str = "attachment",
+                     cache_control: str = CACHE_CONTROL) -> Response:
+    """
+    Отдать файл с диска с учетом Range и условных заголовков
+
+    Args:
+        request: Запрос (GET или HEAD)
+        path: Путь к файлу
+        filename: Имя для Content-Disposition и определения MIME-типа
+        content_hash: Хэш содержимого для строгого ETag
+        media_type: MIME-тип (по умолчанию - по имени файла)
+        disposition: attachment или inline
+        cache_control: Значение Cache-Control
+
+    Raises:
+        HTTPException: 404, если файла нет на диске
+    """
+    if is_remote(path):
+        return await serve_remote_file(request, path, filename, media_type, disposition, cache_control)
+
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path) if path else None
+    except FileNotFoundError:
+        stat_result = None
+
+    if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+        logger.warning(f"Файл не найден на диске: {path}")
+        raise HTTPException(status_code=404, detail="Файл не найден на диске")
+
+    size = stat_result.st_size
+    etag = make_etag(content_hash, stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+
+    headers = {
+        "etag": etag,
+        "last-modified": last_modified,
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    headers["content-type"] = media_type or mimetypes.guess_type(filename)[0] or DEFAULT_MEDIA_TYPE
+    headers["content-disposition"] = content_disposition(filename, disposition)
+
+    # Отдачу берет на себя nginx (sendfile, Range) - передаем только заголовки
+    accel_path = accel_redirect_path(path)
+    if accel_path:
+        headers["x-accel-redirect"] = accel_path
+        return Response(status_code=200, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and range_allowed(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={"content-range": f"bytes */{size}", "accept-ranges": "bytes"}
+            )
+
+    return StoredFileResponse(path, size, headers, byte_range, method=request.method)
+
+
+async def serve_remote_file(request: Request, uri: str, filename: str,
+                            media_type: Optional[str] = None, disposition: str = "attachment",
+                            cache_control: str = CACHE_CONTROL) -> Response:
+    """
+    Отдать файл из удаленного хранилища (S3)
+
+    По умолчанию - редирект на presigned-ссылку: файл идет к браузеру
+    напрямую из хранилища, минуя приложение (Range и кэширование
+    обеспечивает само хранилище). Если ссылки выключены
+    (S3_PRESIGNED_DOWNLOADS=false), содержимое проксируется потоком.
+    """
+    backend = backend_for(uri)
+    media_type = media_type or mimetypes.guess_type(filename)[0] or DEFAULT_MEDIA_TYPE
+
+    if settings.s3_presigned_downloads:
+        url = await anyio.to_thread.run_sync(
+            backend.presigned_url, uri, filename, media_type, disposition == "inline"
+        )
+        if url:
+            return RedirectResponse(url, status_code=307)
+
+    try:
+        body = await anyio.to_thread.run_sync(backend.open_read, uri)
+    except Exception as e:
+        logger.warning(f"Файл не найден в хранилище: {uri} ({e})")
+        raise HTTPException(status_code=404, detail="Файл не найден в хранилище")
+
+    def iterate():
+        try:
+            while chunk := body.read(StoredFileResponse.chunk_size):
+                _served_bytes.inc(len(chunk))
+                yield chunk
+        finally:
+            body.close()
+
+    return StreamingResponse(
+        iterate(),
+        media_type=media_type,
+        headers={
+            "content-disposition": content_disposition(filename, disposition),
+            "cache-control": cache_control,
+        }
+    )
@@ -1,21 +1,39 @@
+import logging
 from fastapi import FastAPI, Request, Form, Depends, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime, timedelta
 import os
+import time
 
 from fastapi import UploadFile, File, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from app.services.communication_service import CommunicationService
+from app.admin.file_response import content_disposition, serve_file, serve_order_file
+from app.services.notification_service import close_bot, user_notifier
+from app.services.delivery_tracker import delivery_tracker
+from app.services.storage_service import StorageService
+from app.storage.backends import storage_size
+from app.storage.indexer import StorageIndexer
+from app.storage.thumbnails import THUMBNAIL_MEDIA_TYPE, ensure_thumbnail, shutdown_thumbnail_pool
+from app.storage.zip_stream import archive_entries, stream_zip
+from app.admin.uploads import receive_upload_form
+from app.admin.metrics import MetricsMiddleware
+from app.services import metrics
+from app.services.profiling import ProfilerBusyError, dump_tasks, loop_watchdog, sample_profile
 import aiofiles
 import uuid
 from pathlib import Path
 
 
 from app.config import settings
+from app.config.logging_setup import setup_logging
 from app.database.connection import get_db
 from app.services.user_service import UserService
 from app.services.order_service import OrderService
@@ -29,12 +47,22 @@ from fastapi.exception_handlers import (
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+logger = logging.getLogger(__name__)
+
+# Логирование через очередь настраивается при импорте: при reload=True uvicorn
+# импортирует "app.admin.main:app" в дочернем процессе, и main_admin там не выполняется
+setup_logging()
+
 # Создание приложения FastAPI
 app = FastAPI(title="Telegram Bot Admin Panel")
 
 # Добавление middleware для сессий
 app.add_middleware(SessionMiddleware, secret_key=settings.secret_key)
 
+# Время запросов для /metrics
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 
 def create_app():
     """Создание экземпляра FastAPI приложения для тестирования"""
@@ -45,6 +73,37 @@ def create_app():
 app.mount("/static", StaticFiles(directory="app/admin/static"), name="static")
 templates = Jinja2Templates(directory="app/admin/templates")
 
+# Сколько заказов можно выгрузить одним архивом
+MAX_EXPORT_ORDERS = 50
+
+# Превью файла не меняется (содержимое файла заказа неизменно) - кэшируем в браузере
+THUMBNAIL_CACHE_CONTROL = "private, max-age=604800"
+
+
+def storage_sizes(files) -> Dict[int, Optional[int]]:
+    """
+    Размер содержимого файлов в хранилище по ID файла (None - файла нет)
+
+    Для S3 каждая проверка - запрос к хранилищу, поэтому из обработчиков
+    вызывается через run_in_threadpool.
+    """
+    return {file.id: storage_size(file.file_path) for file in files}
+
+
+@app.on_event("startup")
+async def startup():
+    """Сторож цикла событий"""
+    loop_watchdog.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Дослать уведомления, закрыть HTTP-сессию бота и пул построения превью"""
+    loop_watchdog.stop()
+    await user_notifier.drain()
+    await close_bot()
+    shutdown_thumbnail_pool()
+
 
 # Простая авторизация (в реальном проекте используйте более надежную)
 def verify_admin(request: Request):
@@ -57,6 +116,40 @@ def verify_admin(request: Request):
         )
 
 
+@app.get("/metrics")
+async def prometheus_metrics(request: Request):
+    """Метрики процесса админ-панели в формате Prometheus (токен METRICS_TOKEN или сессия админа)"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404)
+    if not settings.metrics_token:
+        verify_admin(request)
+    elif not metrics.authorized(request.headers.get("authorization")):
+        raise HTTPException(status_code=401, detail="Требуется токен метрик")
+    return Response(await run_in_threadpool(metrics.expose), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = 10.0, all_threads: bool = False):
+    """Выборочный профиль процесса админ-панели: свернутые стеки для flamegraph"""
+    verify_admin(request)
+    try:
+        folded = await sample_profile(seconds, all_threads=all_threads)
+    except ProfilerBusyError:
+        raise HTTPException(status_code=409, detail="Профиль уже снимается")
+    return Response(
+        folded,
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="admin-profile-{int(time.time())}.folded"'}
+    )
+
+
+@app.get("/debug/tasks")
+async def debug_tasks(request: Request):
+    """Стеки задач asyncio процесса админ-панели"""
+    verify_admin(request)
+    return Response(dump_tasks(), media_type="text/plain; charset=utf-8")
+
+
 @app.get("/", response_class=HTMLResponse)
 async def admin_login_page(request: Request):
     """Страница входа в админ-панель"""
@@ -211,35 +304,25 @@ async def admin_order_detail(
         raise HTTPException(status_code=404, detail="Заказ не найден")
     
     # 🔥 ИСПРАВЛЕНО: Явно загружаем файлы заказа
-    print(f"🔍 Загружаем детали заказа #{order_id}")
-    
-    # Способ 1: Через relationship (должен работать автоматически)
-    files_via_relationship = order.files
-    print(f"   Файлов через relationship: {len(files_via_relationship)}")
-    
-    # Способ 2: Через сервис (для надежности)
-    files_via_service = order_service.get_order_files(order_id)
-    print(f"   Файлов через сервис: {len(files_via_service)}")
-    
-    # Способ 3: Прямой запрос (для отладки)
     from app.database.models.file import OrderFile
     files_direct = db.query(OrderFile).filter(OrderFile.order_id == order_id).all()
-    print(f"   Файлов прямым запросом: {len(files_direct)}")
+    
+    # Отладочная сверка (лишние запросы и проверки хранилища - только при DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Заказ #%s: файлов через relationship %s, через сервис %s, прямым запросом %s",
+            order_id, len(order.files), len(order_service.get_order_files(order_id)), len(files_direct)
+        )
+        sizes = await run_in_threadpool(storage_sizes, files_direct)
+        for file in files_direct:
+            logger.debug(
+                "Файл заказа #%s: ID %s, имя %s, путь %s, размер %s, в хранилище %s",
+                order_id, file.id, file.filename, file.file_path, file.file_size, sizes[file.id]
+            )
     
     # Используем файлы из прямого запроса для надежности
     order.files = files_direct
     
-    # Добавляем отладочную информацию
-    if files_direct:
-        print("   📎 Найденные файлы:")
-        for file in files_direct:
-            print(f"      • ID: {file.id}, Имя: {file.filename}")
-            print(f"        Путь: {file.file_path}")
-            print(f"        Размер: {file.file_size}")
-            print(f"        Существует: {os.path.exists(file.file_path) if file.file_path else False}")
-    else:
-        print("   📎 Файлов не найдено")
-    
     return templates.TemplateResponse(
         "order_detail.html",
         {
@@ -261,34 +344,62 @@ async def update_order_status(
     verify_admin(request)
     
     order_service = OrderService(db)
-    communication_service = CommunicationService(db)
     
     try:
         status = OrderStatus(new_status)
-        success = order_service.update_order_status(order_id, status, "Изменено через веб-панель")
-        
-        if success:
-            # Если статус изменен на "ожидает оплаты", отправляем реквизиты
-            if status == OrderStatus.WAITING_PAYMENT:
-                from app.services.payment_service import PaymentService
-                payment_service = PaymentService(db)
-                
-                try:
-                    payment_message = payment_service.create_payment_request(order_id)
-                    await communication_service.send_message_to_user(
-                        order_id, 
-                        payment_message, 
-                        from_admin=True
-                    )
-                except Exception as e:
-                    print(f"❌ Ошибка отправки реквизитов: {e}")
-            
-            return RedirectResponse(f"/orders/{order_id}?success=status_updated", status_code=302)
-        else:
-            raise HTTPException(status_code=400, detail="Ошибка обновления статуса")
-    
     except ValueError:
         raise HTTPException(status_code=400, detail="Неверный статус")
+    
+    try:
+        effects = order_service.update_order_status(order_id, status, "Изменено через веб-панель")
+    except ValueError as e:
+        # TransitionError: переход недопустим или заказ к нему не готов
+        raise HTTPException(status_code=400, detail=f"Нельзя изменить статус: {e}")
+    
+    if effects is None:
+        raise HTTPException(status_code=404, detail="Заказ не найден")
+    
+    # Уведомление клиенту; для "ожидает оплаты" - реквизиты
+    user_notifier.enqueue(effects.notifications)
+    
+    return RedirectResponse(f"/orders/{order_id}?success=status_updated", status_code=302)
+
+
+class BulkStatusRequest(BaseModel):
+    """Массовая смена статуса заказов"""
+    order_ids: List[int]
+    status: OrderStatus
+    note: Optional[str] = None
+
+
+@app.post("/orders/bulk_status")
+async def bulk_update_order_status(
+    request: Request,
+    bulk: BulkStatusRequest,
+    db: Session = Depends(get_db)
+):
+    """Перевести несколько заказов в новый статус одной транзакцией"""
+    verify_admin(request)
+    
+    order_service = OrderService(db)
+    
+    try:
+        result = order_service.bulk_update_status(
+            bulk.order_ids,
+            bulk.status,
+            bulk.note or "Массовое изменение через веб-панель"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    queued = user_notifier.enqueue(result.notifications)
+    
+    return {
+        "success": True,
+        "updated": result.updated,
+        "skipped": {str(order_id): reason for order_id, reason in result.skipped.items()},
+        "notifications_queued": queued
+    }
 
 
 @app.post("/orders/{order_id}/price")
@@ -327,7 +438,7 @@ async def update_order_price(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Неверное значение цены: {str(e)}")
     except Exception as e:
-        print(f"Error updating price: {e}")
+        logger.error(f"Ошибка изменения цены: {e}")
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
 
@@ -403,13 +514,177 @@ async def get_dashboard_stats(
     }
 
 
+@app.get("/admin/storage_stats")
+async def get_storage_stats(
+    request: Request,
+    limit: int = 20,
+    db: Session = Depends(get_db)
+):
+    """Занятое место по заказам и пользователям и состояние хранилища по последнему обходу"""
+    verify_admin(request)
+    
+    storage_service = StorageService(db)
+    
+    return {
+        "usage": storage_service.get_usage_totals(),
+        "top_orders": storage_service.get_usage_by_order(limit),
+        "top_users": storage_service.get_usage_by_user(limit),
+        "index": StorageIndexer(db).summary()
+    }
+
+
+@app.get("/admin/upcoming_deadlines")
+async def get_upcoming_deadlines(
+    request: Request,
+    hours: int = 48,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """Незавершенные заказы со сроком в ближайшие hours часов (и просроченные)"""
+    verify_admin(request)
+    
+    order_service = OrderService(db)
+    now = datetime.utcnow()
+    orders = order_service.get_orders_due(now + timedelta(hours=hours), limit=limit)
+    
+    return {
+        "count": len(orders),
+        "orders": [
+            {
+                "id": order.id,
+                "status": order.status.value,
+                "deadline": order.deadline,
+                "due_at": order.due_at.isoformat(),
+                "overdue": order.due_at <= now,
+                "topic": order.short_topic
+            }
+            for order in orders
+        ]
+    }
+
+
+@app.get("/admin/unreachable_users")
+async def get_unreachable_users(
+    request: Request,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """Пользователи, которым не доставляются сообщения (заблокировали бота, удалили чат)"""
+    verify_admin(request)
+    
+    user_service = UserService(db)
+    users = user_service.get_unreachable_users(limit=limit)
+    
+    return {
+        "count": len(users),
+        "suppressed_sends": delivery_tracker.stats["suppressed"],
+        "users": [
+            {
+                "telegram_id": user.telegram_id,
+                "name": user.full_name,
+                "unreachable_at": user.unreachable_at.isoformat(),
+                "reason": user.unreachable_reason
+            }
+            for user in users
+        ]
+    }
+
+
+@app.post("/admin/unreachable_users/clear")
+async def clear_unreachable_users(
+    request: Request,
+    telegram_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Снова отправлять сообщения пользователю (или всем, если telegram_id не указан)"""
+    verify_admin(request)
+    
+    cleared = UserService(db).clear_unreachable(telegram_id)
+    # Бот подхватит изменения при следующем перечитывании списка
+    delivery_tracker.forget(telegram_id)
+    
+    return {"success": True, "cleared": cleared}
+
+
+def parse_id_list(value: Optional[str]) -> List[int]:
+    """Список ID из строки вида "1,2,3" """
+    if not value:
+        return []
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный список ID")
+
+
+def zip_response(entries, filename: str) -> StreamingResponse:
+    """Отдать ZIP-архив потоком, не собирая его в памяти"""
+    if not entries:
+        raise HTTPException(status_code=404, detail="Нет файлов для выгрузки")
+    
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={"content-disposition": content_disposition(filename)}
+    )
+
+
+@app.get("/orders/{order_id}/files.zip")
+async def download_order_files_zip(
+    request: Request,
+    order_id: int,
+    file_ids: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Скачать все файлы заказа (или выбранные в file_ids=1,2,3) одним ZIP"""
+    verify_admin(request)
+    
+    from app.database.models.file import OrderFile
+    
+    query = db.query(OrderFile).filter(OrderFile.order_id == order_id)
+    selected = parse_id_list(file_ids)
+    if selected:
+        query = query.filter(OrderFile.id.in_(selected))
+    
+    entries = archive_entries(query.order_by(OrderFile.uploaded_at, OrderFile.id).all())
+    logger.debug(f"ZIP-архив заказа #{order_id}: файлов {len(entries)}")
+    
+    return zip_response(entries, f"Заказ_{order_id}.zip")
+
+
+@app.get("/files/export.zip")
+async def export_orders_files_zip(
+    request: Request,
+    order_ids: str,
+    db: Session = Depends(get_db)
+):
+    """Выгрузить файлы нескольких заказов (order_ids=1,2,3) одним ZIP, по папке на заказ"""
+    verify_admin(request)
+    
+    from app.database.models.file import OrderFile
+    
+    ids = parse_id_list(order_ids)
+    if not ids:
+        raise HTTPException(status_code=400, detail="Не указаны заказы")
+    if len(ids) > MAX_EXPORT_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Не больше {MAX_EXPORT_ORDERS} заказов за раз")
+    
+    files = db.query(OrderFile)\
+        .filter(OrderFile.order_id.in_(ids))\
+        .order_by(OrderFile.order_id, OrderFile.uploaded_at, OrderFile.id)\
+        .all()
+    entries = archive_entries(files, folder_per_order=True)
+    logger.debug(f"ZIP-выгрузка заказов {ids}: файлов {len(entries)}")
+    
+    return zip_response(entries, f"Заказы_{len(ids)}.zip")
+
+
 @app.api_route("/files/download/{file_id}", methods=["GET", "HEAD"])
 async def download_file(
     request: Request,
     file_id: int,
     db: Session = Depends(get_db)
 ):
-    """Скачивание файла заказа с поддержкой HEAD запросов для проверки"""
+    """Скачивание файла заказа (HEAD для проверки, Range для докачки)"""
     verify_admin(request)
     
     # Получаем информацию о файле из базы данных
@@ -418,25 +693,42 @@ async def download_file(
     file_record = db.query(OrderFile).filter(OrderFile.id == file_id).first()
     
     if not file_record:
-        print(f"❌ Файл с ID {file_id} не найден в БД")
+        logger.warning(f"Файл с ID {file_id} не найден в БД")
         raise HTTPException(status_code=404, detail="Файл не найден")
     
-    print(f"📁 Запрос на {'проверку' if request.method == 'HEAD' else 'скачивание'} файла: {file_record.filename}")
-    print(f"   Путь: {file_record.file_path}")
-    
-    # Проверяем существование файла на диске
-    file_path = file_record.file_path
-    if not file_path or not os.path.exists(file_path):
-        print(f"❌ Файл не найден на диске: {file_path}")
-        raise HTTPException(status_code=404, detail="Файл не найден на диске")
+    # Range, ETag/304 и передача без копирования - в serve_order_file
+    return await serve_order_file(request, file_record)
+
+
+@app.api_route("/files/thumb/{file_id}", methods=["GET", "HEAD"])
+async def file_thumbnail(
+    request: Request,
+    file_id: int,
+    db: Session = Depends(get_db)
+):
+    """Превью изображения (WebP, несколько КБ вместо исходного скриншота)"""
+    verify_admin(request)
     
-    print(f"✅ {'Проверяем' if request.method == 'HEAD' else 'Отправляем'} файл: {file_record.filename}")
+    from app.database.models.file import OrderFile
     
-    # Возвращаем файл с оригинальным именем из БД
-    return FileResponse(
-        path=file_path,
-        filename=file_record.filename,  # Оригинальное имя из БД
-        media_type='application/octet-stream'
+    file_record = db.query(OrderFile).filter(OrderFile.id == file_id).first()
+    if not file_record or not file_record.is_image:
+        raise HTTPException(status_code=404, detail="Превью недоступно")
+    
+    thumb = await ensure_thumbnail(file_record.file_path)
+    if not thumb:
+        # Pillow не установлен или изображение не читается - показываем оригинал
+        return await serve_order_file(request, file_record, disposition="inline")
+    
+    content_hash = file_record.content_hash
+    return await serve_file(
+        request,
+        thumb,
+        f"{file_record.filename}.webp",
+        content_hash=f"{content_hash}-thumb{settings.thumbnail_size}" if content_hash else None,
+        media_type=THUMBNAIL_MEDIA_TYPE,
+        disposition="inline",
+        cache_control=THUMBNAIL_CACHE_CONTROL
     )
 
 
@@ -459,7 +751,8 @@ async def get_order_files(
     # Получаем файлы
     files = order_service.get_order_files(order_id)
     
-    print(f"📁 API запрос файлов для заказа #{order_id}: найдено {len(files)} файлов")
+    logger.debug(f"API запрос файлов для заказа #{order_id}: найдено {len(files)} файлов")
+    sizes = await run_in_threadpool(storage_sizes, files)
     
     return {
         "order_id": order_id,
@@ -472,7 +765,7 @@ async def get_order_files(
                 "file_type": file.file_type,
                 "uploaded_at": file.uploaded_at.isoformat(),
                 "download_url": f"/files/download/{file.id}",
-                "exists_on_disk": os.path.exists(file.file_path) if file.file_path else False,
+                "exists_on_disk": sizes[file.id] is not None,
                 "file_path_on_disk": os.path.basename(file.file_path) if file.file_path else None  # Только имя файла на диске
             }
             for file in files
@@ -559,9 +852,8 @@ async def validation_exception_handler(request, exc):
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Общий обработчик ошибок"""
-    import traceback
-    print(f"Unexpected error: {exc}")
-    print(traceback.format_exc())
+    logger.error(f"Необработанная ошибка {request.method} {request.url.path}: {exc}",
+                 exc_info=(type(exc), exc, exc.__traceback__))
     
     return templates.TemplateResponse(
         "error.html",
@@ -592,9 +884,11 @@ async def debug_order_files(
         "files_count": len(files),
         "files": []
     }
+    sizes = await run_in_threadpool(storage_sizes, files)
     
     for file in files:
-        file_exists = os.path.exists(file.file_path) if file.file_path else False
+        disk_size = sizes[file.id]
+        file_exists = disk_size is not None
         disk_filename = os.path.basename(file.file_path) if file.file_path else None
         
         debug_info["files"].append({
@@ -605,8 +899,8 @@ async def debug_order_files(
             "file_size": file.file_size,
             "uploaded_at": str(file.uploaded_at),
             "exists_on_disk": file_exists,
-            "disk_size": os.path.getsize(file.file_path) if file_exists else None,
-            "size_match": os.path.getsize(file.file_path) == file.file_size if file_exists and file.file_size else None
+            "disk_size": disk_size,
+            "size_match": disk_size == file.file_size if file_exists and file.file_size else None
         })
     
     return debug_info
@@ -642,11 +936,11 @@ async def send_message_to_user(
                 from_admin=True
             )
             if success:
-                print(f"✅ Сообщение успешно отправлено пользователю по заказу #{order_id}")
+                logger.info(f"Сообщение успешно отправлено пользователю по заказу #{order_id}")
             else:
-                print(f"❌ Не удалось отправить сообщение по заказу #{order_id}")
+                logger.warning(f"Не удалось отправить сообщение по заказу #{order_id}")
         except Exception as e:
-            print(f"❌ Ошибка отправки сообщения: {e}")
+            logger.error(f"Ошибка отправки сообщения: {e}")
     
     background_tasks.add_task(send_message_background)
     
@@ -657,10 +951,9 @@ async def send_message_to_user(
 async def upload_admin_file(
     request: Request,
     order_id: int,
-    file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    """Загрузить файл от админа для заказа"""
+    """Загрузить файлы от админа для заказа (потоково, можно несколько)"""
     verify_admin(request)
     
     # Проверяем существование заказа
@@ -669,46 +962,29 @@ async def upload_admin_file(
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     
-    # Проверяем файл
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="Файл должен иметь имя")
+    # Файлы пишутся в хранилище по мере приема, лимит размера проверяется на лету
+    form = await receive_upload_form(request)
     
-    if file.size > settings.max_file_size:
-        raise HTTPException(
-            status_code=413, 
-            detail=f"Файл слишком большой. Максимум: {settings.max_file_size / 1024 / 1024:.1f} МБ"
-        )
+    if not form.files:
+        raise HTTPException(status_code=400, detail="Файл не выбран")
     
     try:
-        # Создаем директорию для файлов админа
-        admin_files_dir = Path(settings.upload_path) / str(order_id) / "admin"
-        admin_files_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Генерируем уникальное имя файла (чтобы избежать конфликтов)
-        file_extension = Path(file.filename).suffix
-        unique_filename = f"{uuid.uuid4().hex[:8]}_{file.filename}"
-        file_path = admin_files_dir / unique_filename
-        
-        # Сохраняем файл
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
         # Сохраняем в БД
         communication_service = CommunicationService(db)
-        order_file = communication_service.save_admin_file(
-            order_id=order_id,
-            file_path=str(file_path),
-            original_filename=file.filename,
-            file_size=file.size
-        )
-        
-        print(f"✅ Файл от админа загружен: {file.filename} для заказа #{order_id}")
+        for uploaded in form.files:
+            communication_service.save_admin_file(
+                order_id=order_id,
+                file_path=uploaded.content.path,
+                original_filename=uploaded.filename,
+                file_size=uploaded.content.size,
+                content=uploaded.content
+            )
+            logger.info(f"Файл от админа загружен: {uploaded.filename} для заказа #{order_id}")
         
         return RedirectResponse(f"/orders/{order_id}?success=file_uploaded", status_code=302)
         
     except Exception as e:
-        print(f"❌ Ошибка загрузки файла: {e}")
+        logger.error(f"Ошибка загрузки файла: {e}")
         raise HTTPException(status_code=500, detail="Ошибка загрузки файла")
 
 
@@ -745,11 +1021,11 @@ async def send_file_to_user(
         try:
             success = await communication_service.send_file_to_user(order_id, file_id)
             if success:
-                print(f"✅ Файл {file_record.filename} успешно отправлен пользователю")
+                logger.info(f"Файл {file_record.filename} успешно отправлен пользователю")
             else:
-                print(f"❌ Не удалось отправить файл {file_record.filename}")
+                logger.warning(f"Не удалось отправить файл {file_record.filename}")
         except Exception as e:
-            print(f"❌ Ошибка отправки файла: {e}")
+            logger.error(f"Ошибка отправки файла: {e}")
     
     background_tasks.add_task(send_file_background)
     
@@ -801,6 +1077,7 @@ async def get_admin_files(
         OrderFile.order_id == order_id,
         OrderFile.uploaded_by_admin == True
     ).all()
+    sizes = await run_in_threadpool(storage_sizes, admin_files)
     
     return {
         "order_id": order_id,
@@ -813,7 +1090,7 @@ async def get_admin_files(
                 "uploaded_at": file.uploaded_at.isoformat(),
                 "sent_to_user": file.sent_to_user,
                 "sent_at": file.sent_at.isoformat() if file.sent_at else None,
-                "exists_on_disk": os.path.exists(file.file_path) if file.file_path else False
+                "exists_on_disk": sizes[file.id] is not None
             }
             for file in admin_files        ]
     }
@@ -847,6 +1124,9 @@ async def get_order_payments(
                 "is_verified": payment.is_verified,
                 "is_rejected": payment.is_rejected,
                 "screenshot_file_id": payment.screenshot_file_id,
+                "screenshot_thumb_url": (
+                    f"/files/thumb/{payment.screenshot_file_id}" if payment.screenshot_file_id else None
+                ),
                 "screenshot_message": payment.screenshot_message,
                 "created_at": payment.created_at.isoformat(),
                 "verified_at": payment.verified_at.isoformat() if payment.verified_at else None,
@@ -898,6 +1178,78 @@ async def reject_payment(
         raise HTTPException(status_code=400, detail="Ошибка отклонения платежа")
 
 
+class PaymentReviewRequest(BaseModel):
+    """Пакетная проверка платежей"""
+    verify: List[int] = Field(default_factory=list)
+    reject: List[int] = Field(default_factory=list)
+    reason: Optional[str] = None
+
+
+@app.post("/payments/review")
+async def review_payments(
+    request: Request,
+    review: PaymentReviewRequest,
+    db: Session = Depends(get_db)
+):
+    """Подтвердить и отклонить несколько платежей за один запрос"""
+    verify_admin(request)
+    
+    from app.services.payment_service import PaymentService
+    payment_service = PaymentService(db)
+    
+    try:
+        result = payment_service.review_payments(
+            review.verify,
+            review.reject,
+            review.reason,
+            request.session.get("admin_user_id", 1)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Уведомления уходят в фоне, ответ не ждет Telegram
+    queued = user_notifier.enqueue(result.notifications)
+    
+    return {
+        "success": True,
+        "verified": result.verified,
+        "rejected": result.rejected,
+        "skipped": {str(payment_id): reason for payment_id, reason in result.skipped.items()},
+        "notifications_queued": queued
+    }
+
+
+@app.post("/payments/reconcile")
+async def reconcile_payments(
+    request: Request,
+    statement: UploadFile = File(...),
+    dry_run: bool = Form(False),
+    db: Session = Depends(get_db)
+):
+    """Сверить банковскую выписку (CSV/OFX) с ожидающими платежами"""
+    verify_admin(request)
+    
+    from app.services.bank_statement import StatementError, iter_statement
+    from app.services.reconciliation_service import ReconciliationService
+    
+    def run():
+        return ReconciliationService(db).reconcile(
+            iter_statement(statement.file),
+            request.session.get("admin_user_id", 1),
+            auto_verify=False if dry_run else None
+        )
+    
+    try:
+        # Разбор выписки на десятки тысяч строк - не в цикле событий
+        report = await run_in_threadpool(run)
+    except StatementError as e:
+        raise HTTPException(status_code=400, detail=f"Не удалось разобрать выписку: {e}")
+    
+    queued = user_notifier.enqueue(report.notifications)
+    
+    return {"success": True, "notifications_queued": queued, **report.to_dict()}
+
+
 @app.get("/admin/pending_payments")
 async def get_pending_payments(
     request: Request,
@@ -923,6 +1275,9 @@ async def get_pending_payments(
                 "amount_text": payment.amount_rub,
                 "user_name": payment.order.user.full_name,
                 "screenshot_file_id": payment.screenshot_file_id,
+                "screenshot_thumb_url": (
+                    f"/files/thumb/{payment.screenshot_file_id}" if payment.screenshot_file_id else None
+                ),
                 "screenshot_message": payment.screenshot_message,
                 "created_at": payment.created_at.isoformat()
             }
@@ -961,6 +1316,9 @@ async def debug_payments(
                 "is_verified": payment.is_verified,
                 "is_rejected": payment.is_rejected,
                 "screenshot_file_id": payment.screenshot_file_id,
+                "screenshot_thumb_url": (
+                    f"/files/thumb/{payment.screenshot_file_id}" if payment.screenshot_file_id else None
+                ),
                 "screenshot_message": payment.screenshot_message,
                 "created_at": payment.created_at.isoformat(),
                 "verified_at": payment.verified_at.isoformat() if payment.verified_at else None,
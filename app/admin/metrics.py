@@ -0,0 +1,44 @@
+"""
+Метрики запросов к админ-панели
+
+ASGI-middleware без BaseHTTPMiddleware: тело ответа не буферизуется
+и расширения zerocopysend/pathsend (отдача файлов) продолжают работать.
+Маршрут в метке - шаблон пути ("/orders/{order_id}"), а не сам путь,
+чтобы число рядов не росло с числом заказов.
+"""
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.metrics import http_request_seconds
+
+
+class MetricsMiddleware:
+    """Время запроса до отправки ответа целиком по методу, маршруту и статусу"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_seconds.labels(
+                scope["method"],
+                getattr(route, "path", None) or "unmatched",
+                status_code,
+            ).observe(time.perf_counter() - started)
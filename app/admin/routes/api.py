@@ -1,15 +1,18 @@
 """
 API роуты для админ-панели
 """
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
-import shutil
 from datetime import datetime
 
+from app.admin.file_response import serve_order_file
+from app.admin.uploads import receive_upload_form
 from app.database.connection import get_db
+from app.database.models.file import OrderFile
 from app.services.order_service import OrderService
+from app.services.storage_service import StorageService
 from app.services.user_service import UserService
 from app.database.models.enums import OrderStatus
 from app.config import settings
@@ -99,55 +102,37 @@ async def set_order_price(
 
 
 @router.post("/orders/{order_id}/files")
-async def upload_files(
-    order_id: int,
-    files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
-):
-    """Загрузить файлы к заказу"""
+async def upload_files(request: Request, order_id: int, db: Session = Depends(get_db)):
+    """Загрузить файлы к заказу (multipart, поле files, можно несколько)"""
     order_service = OrderService(db)
-    order = await order_service.get_order(order_id)
+    order = order_service.get_order_by_id(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     
+    # Файлы пишутся в хранилище по мере приема, лимит размера проверяется на лету
+    form = await receive_upload_form(request)
+    
     uploaded_files = []
     
-    for file in files:
-        # Проверка размера файла
-        if file.size > settings.max_file_size:
-            raise HTTPException(
-                status_code=413, 
-                detail=f"Файл {file.filename} слишком большой"
-            )
-        
-        # Создание директории для заказа
-        order_dir = os.path.join(settings.upload_path, str(order_id))
-        os.makedirs(order_dir, exist_ok=True)
-        
-        # Генерация уникального имени файла
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{file.filename}"
-        file_path = os.path.join(order_dir, filename)
-        
-        # Сохранение файла
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    for uploaded in form.files:
+        file_type = uploaded.filename.split('.')[-1].lower() if '.' in uploaded.filename else None
         
         # Добавление записи в БД
-        await order_service.add_file(
+        order_file = order_service.add_file_to_order(
             order_id=order_id,
-            filename=filename,
-            original_filename=file.filename,
-            file_path=file_path,
-            file_size=file.size,
-            mime_type=file.content_type,
-            uploaded_by_admin=True
+            filename=uploaded.filename,
+            file_path=uploaded.content.path,
+            file_size=uploaded.content.size,
+            file_type=file_type,
+            uploaded_by_admin=True,
+            content=uploaded.content
         )
         
         uploaded_files.append({
-            "filename": filename,
-            "original_filename": file.filename,
-            "size": file.size
+            "id": order_file.id,
+            "filename": uploaded.filename,
+            "size": uploaded.content.size,
+            "sha256": uploaded.content.sha256
         })
     
     return {
@@ -156,41 +141,27 @@ async def upload_files(
     }
 
 
-@router.get("/files/{file_id}/download")
-async def download_file(file_id: int, db: Session = Depends(get_db)):
-    """Скачать файл"""
-    order_service = OrderService(db)
-    file_record = await order_service.get_file(file_id)
+@router.api_route("/files/{file_id}/download", methods=["GET", "HEAD"])
+async def download_file(request: Request, file_id: int, db: Session = Depends(get_db)):
+    """Скачать файл (поддерживает Range и условные запросы)"""
+    file_record = db.query(OrderFile).filter(OrderFile.id == file_id).first()
     
     if not file_record:
         raise HTTPException(status_code=404, detail="Файл не найден")
     
-    if not os.path.exists(file_record.file_path):
-        raise HTTPException(status_code=404, detail="Файл не найден на диске")
-    
-    from fastapi.responses import FileResponse
-    return FileResponse(
-        path=file_record.file_path,
-        filename=file_record.original_filename,
-        media_type=file_record.mime_type or 'application/octet-stream'
-    )
+    return await serve_order_file(request, file_record)
 
 
 @router.delete("/files/{file_id}")
 async def delete_file(file_id: int, db: Session = Depends(get_db)):
     """Удалить файл"""
-    order_service = OrderService(db)
-    file_record = await order_service.get_file(file_id)
+    file_record = db.query(OrderFile).filter(OrderFile.id == file_id).first()
     
     if not file_record:
         raise HTTPException(status_code=404, detail="Файл не найден")
     
-    # Удаление файла с диска
-    if os.path.exists(file_record.file_path):
-        os.remove(file_record.file_path)
-    
-    # Удаление записи из БД
-    await order_service.delete_file(file_id)
+    # Удаление записи; содержимое удаляется из хранилища, когда на него нет ссылок
+    StorageService(db).delete_order_file(file_record)
     
     return {"message": "Файл успешно удален"}
 
@@ -199,17 +170,19 @@ async def delete_file(file_id: int, db: Session = Depends(get_db)):
 async def delete_order(order_id: int, db: Session = Depends(get_db)):
     """Удалить заказ"""
     order_service = OrderService(db)
-    order = await order_service.get_order(order_id)
+    order = order_service.get_order_by_id(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     
-    # Удаление файлов заказа
-    order_dir = os.path.join(settings.upload_path, str(order_id))
-    if os.path.exists(order_dir):
-        shutil.rmtree(order_dir)
+    # Удаление файлов заказа из хранилища (с учетом общих копий)
+    storage_service = StorageService(db)
+    for order_file in list(order.files):
+        storage_service.release_file(order_file)
+        db.delete(order_file)
     
-    # Удаление заказа из БД
-    await order_service.delete_order(order_id)
+    # Удаление заказа из БД, затем освобожденного содержимого из хранилища
+    db.delete(order)
+    storage_service.commit()
     
     return {"message": "Заказ успешно удален"}
 
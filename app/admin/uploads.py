@@ -0,0 +1,273 @@
+"""
+Потоковый прием файлов из multipart-форм
+
+Тело запроса разбирается по мере поступления: содержимое каждого файла
+сразу пишется блоками фиксированного размера в хранилище (с подсчетом
+SHA-256), без промежуточного временного файла и без чтения файла в память.
+Превышение лимита размера обнаруживается во время приема, и загрузка
+прерывается, не дочитывая тело запроса.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import multipart
+from multipart.multipart import parse_options_header
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.config import settings
+from app.storage.blob_store import BlobWriter, StoredContent
+
+logger = logging.getLogger(__name__)
+
+# Запас на заголовки частей и границы multipart при проверке Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Некорректная форма загрузки"""
+    status_code = 400
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class UploadTooLarge(UploadError):
+    """Файл или запрос больше допустимого"""
+    status_code = 413
+
+
+@dataclass
+class UploadedFile:
+    """Принятый файл"""
+    filename: str
+    content_type: Optional[str]
+    content: StoredContent
+
+
+@dataclass
+class UploadForm:
+    """Разобранная форма: файлы и обычные поля"""
+    files: List[UploadedFile] = field(default_factory=list)
+    fields: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class _Part:
+    name: str = ""
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    size: int = 0
+    data: bytearray = field(default_factory=bytearray)
+    writer: Optional[BlobWriter] = None
+    pending: Optional[asyncio.Future] = None
+
+
+def _format_mb(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} МБ"
+
+
+class StreamingUploadParser:
+    """
+    Разбор multipart/form-data с записью файлов прямо в хранилище
+
+    Запись блока на диск идет в фоне, пока принимается следующий блок
+    (не больше одной записи на файл одновременно), поэтому прием
+    и запись перекрываются, а в памяти держится не больше двух блоков.
+    """
+
+    def __init__(self, request: Request, max_file_size: Optional[int] = None,
+                 max_files: Optional[int] = None, chunk_size: Optional[int] = None):
+        self.request = request
+        self.max_file_size = max_file_size or settings.max_file_size
+        self.max_files = max_files or settings.max_upload_files
+        self.chunk_size = chunk_size or settings.file_chunk_size
+
+        self.form = UploadForm()
+        self._events: list = []
+        self._part = _Part()
+        self._header_name = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._open_parts: List[_Part] = []
+
+    # Колбэки парсера синхронные: только копим события, запись - в parse()
+
+    def _on_part_begin(self) -> None:
+        self._part = _Part()
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise UploadError("В части формы нет имени поля")
+
+        part = self._part
+        part.name = options[b"name"].decode("utf-8", "replace")
+        if b"filename" in options:
+            part.filename = options[b"filename"].decode("utf-8", "replace")
+            content_type = self._headers.get(b"content-type")
+            part.content_type = content_type.decode("latin-1") if content_type else None
+        self._events.append(("start", part, None))
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self._events.append(("data", self._part, data[start:end]))
+
+    def _on_part_end(self) -> None:
+        self._events.append(("end", self._part, None))
+
+    async def parse(self) -> UploadForm:
+        """
+        Принять форму целиком
+
+        Raises:
+            UploadError: Некорректная форма
+            UploadTooLarge: Превышен размер файла или количество файлов
+        """
+        content_type = self.request.headers.get("content-type", "")
+        media_type, params = parse_options_header(content_type)
+        if media_type != b"multipart/form-data" or b"boundary" not in params:
+            raise UploadError("Ожидается multipart/form-data")
+
+        # Заведомо слишком большой запрос отклоняем, не читая тело
+        content_length = self.request.headers.get("content-length")
+        limit = self.max_file_size * self.max_files + MULTIPART_OVERHEAD
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            raise UploadTooLarge(f"Запрос слишком большой. Максимум файла: {_format_mb(self.max_file_size)}")
+
+        parser = multipart.MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+        try:
+            async for chunk in self.request.stream():
+                parser.write(chunk)
+                await self._process_events()
+            parser.finalize()
+            await self._process_events()
+        except BaseException:
+            await self._abort()
+            raise
+
+        return self.form
+
+    async def _process_events(self) -> None:
+        events, self._events = self._events, []
+        # За один write() парсер может пройти несколько частей,
+        # поэтому каждое событие несет свою часть
+        for kind, part, data in events:
+            if kind == "start":
+                await self._start_part(part)
+            elif kind == "data":
+                await self._feed(part, data)
+            else:
+                await self._finish_part(part)
+
+    async def _start_part(self, part: _Part) -> None:
+        # Пустое имя файла - браузер отправил поле без выбранного файла
+        if not part.filename:
+            return
+
+        if len(self.form.files) + len(self._open_parts) >= self.max_files:
+            raise UploadTooLarge(f"Слишком много файлов. Максимум: {self.max_files}")
+
+        part.writer = BlobWriter()
+        await part.writer.__aenter__()
+        self._open_parts.append(part)
+
+    async def _feed(self, part: _Part, data: bytes) -> None:
+        part.size += len(data)
+
+        if part.filename is None:
+            if part.size > MAX_FIELD_SIZE:
+                raise UploadTooLarge(f"Поле {part.name} слишком большое")
+            part.data += data
+            return
+
+        if part.writer is None:
+            return
+
+        if part.size > self.max_file_size:
+            raise UploadTooLarge(
+                f"Файл {part.filename} слишком большой. Максимум: {_format_mb(self.max_file_size)}"
+            )
+
+        part.data += data
+        if len(part.data) >= self.chunk_size:
+            await self._write(part, bytes(part.data))
+            part.data.clear()
+
+    async def _write(self, part: _Part, chunk: bytes) -> None:
+        """Записать блок, дождавшись предыдущей записи этого файла"""
+        if part.pending is not None:
+            await part.pending
+        part.pending = asyncio.ensure_future(part.writer.write(chunk))
+
+    async def _finish_part(self, part: _Part) -> None:
+        if part.filename is None:
+            self.form.fields[part.name] = part.data.decode("utf-8", "replace")
+            return
+
+        if part.writer is None:
+            return
+
+        if part.data:
+            await self._write(part, bytes(part.data))
+            part.data.clear()
+        if part.pending is not None:
+            await part.pending
+
+        content = await part.writer.commit()
+        self._open_parts.remove(part)
+        self.form.files.append(UploadedFile(
+            filename=part.filename,
+            content_type=part.content_type,
+            content=content
+        ))
+
+    async def _abort(self) -> None:
+        """Удалить недописанные временные файлы"""
+        for part in self._open_parts:
+            if part.pending is not None:
+                try:
+                    await part.pending
+                except Exception:
+                    pass
+            await part.writer.__aexit__(None, None, None)
+        self._open_parts.clear()
+
+
+async def receive_upload_form(request: Request, **kwargs) -> UploadForm:
+    """
+    Принять файлы из формы, ошибки - в виде HTTPException (400/413)
+
+    Args:
+        request: Запрос с multipart/form-data
+        **kwargs: max_file_size, max_files, chunk_size
+    """
+    try:
+        return await StreamingUploadParser(request, **kwargs).parse()
+    except UploadError as e:
+        logger.warning(f"Загрузка отклонена: {e.message}")
+        raise HTTPException(status_code=e.status_code, detail=e.message)
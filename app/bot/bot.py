@@ -7,11 +7,6 @@ from app.config import settings
 from app.bot.handlers import basic, orders, user_orders, admin, price_callbacks, user_messages
 from app.database.connection import create_tables
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 # Глобальный экземпляр бота для использования в уведомлениях
@@ -7,6 +7,11 @@ from aiogram import Dispatcher
 
 from app.bot.handlers import basic, orders, user_orders, admin, price_callbacks, error_handler, user_messages
 from app.bot.states.states import OrderStates, AdminStates
+from app.bot.middlewares.throttling import ThrottlingMiddleware
+from app.bot.middlewares.reachability import ReachabilityMiddleware
+from app.bot.middlewares.metrics import setup_bot_metrics
+from app.bot.utils.dispatch_profiler import dispatch_profiler
+from app.config import settings
 
 
 def register_handlers(dp: Dispatcher) -> None:
@@ -16,6 +21,21 @@ def register_handlers(dp: Dispatcher) -> None:
     Args:
         dp: Диспетчер aiogram
     """
+    # Антифлуд: один экземпляр на сообщения и callback, чтобы общий лимит был единым
+    if settings.throttle_enabled:
+        throttling = ThrottlingMiddleware.from_settings()
+        dp.message.middleware(throttling)
+        dp.callback_query.middleware(throttling)
+    
+    # Написавший боту пользователь снова получает уведомления и рассылки
+    reachability = ReachabilityMiddleware()
+    dp.message.outer_middleware(reachability)
+    dp.callback_query.outer_middleware(reachability)
+    
+    # Метрики обновлений и времени обработчиков
+    if settings.metrics_enabled:
+        setup_bot_metrics(dp)
+    
     # Регистрация обработчика ошибок (должен быть первым)
     dp.include_router(error_handler.router)
     
@@ -38,4 +58,8 @@ def register_handlers(dp: Dispatcher) -> None:
     dp.include_router(admin.router)
     
     # Настройка обработки ошибок
-    error_handler.setup_error_handling()
\ No newline at end of file
+    error_handler.setup_error_handling()
+    
+    # Профилирование фильтров - после регистрации всех обработчиков
+    if settings.dispatch_profiling:
+        dispatch_profiler.install(dp)
@@ -1,27 +1,54 @@
+import html
+import logging
+import time
+
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, Document
+from aiogram.types import (
+    Message, CallbackQuery, Document, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
+)
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
 from app.bot.states.states import AdminStates
 from app.bot.keyboards.inline import (
     get_admin_main_keyboard, get_status_change_keyboard,
-    get_orders_pagination_keyboard, get_order_details_keyboard
+    get_orders_pagination_keyboard, get_order_details_keyboard,
+    get_bulk_status_keyboard, get_bulk_confirm_keyboard,
+    get_broadcast_segment_keyboard, get_broadcast_work_types_keyboard,
+    get_broadcast_cancel_keyboard
 )
 from app.bot.keyboards.client import get_cancel_keyboard, get_main_menu
+from app.bot.keyboards.callbacks import (
+    AdminBroadcast, AdminOrders, AdminStats, BroadcastCancel, BroadcastSegment, BroadcastWorkTypes,
+    BulkApply, BulkPick, BulkTo, ChangeStatus, SendFile, SetPrice, SetStatus
+)
+from app.bot.utils.callback_data import use_prefix_dispatch
 from app.bot.utils.text_formatter import format_order_list, format_admin_order_info
+from app.bot.utils.message_dispatch import use_fast_path
+from app.bot.utils.dispatch_profiler import dispatch_profiler
 from app.services.user_service import UserService
 from app.services.order_service import OrderService
+from app.services.notification_service import user_notifier
+from app.services.delivery_tracker import delivery_tracker
+from app.services.broadcast_service import (
+    BroadcastService, Segment, cancel_broadcast, format_progress, start_broadcast
+)
+from app.services.order_lifecycle import TransitionError
+from app.services.profiling import ProfilerBusyError, dump_tasks, sample_profile
 from app.database.models import OrderStatus, get_status_text, get_status_emoji
+from app.database.models.enums import ORDER_TRANSITIONS
+from app.services.order_service import MAX_BULK_ORDERS
 from app.database.connection import get_db_async
 from app.config import settings
 
-router = Router()
+logger = logging.getLogger(__name__)
+
+router = use_fast_path(use_prefix_dispatch(Router(name="admin")))
 
 
 def is_admin(user_id: int) -> bool:
     """Проверка, является ли пользователь администратором"""
-    return user_id == settings.admin_id
+    return user_id == settings.admin_user_id
 
 
 @router.message(Command("admin"))
@@ -59,10 +86,64 @@ async def admin_panel(message: Message, state: FSMContext):
     )
 
 
-@router.callback_query(F.data.startswith("admin_orders:"))
-async def admin_orders(callback: CallbackQuery):
+@router.message(Command("dispatch_stats"))
+async def admin_dispatch_stats(message: Message):
+    """Отчет профилировщика диспетчеризации (/dispatch_stats reset - сбросить счетчики)"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    if not dispatch_profiler.installed:
+        await message.answer("ℹ️ Профилирование выключено (DISPATCH_PROFILING=true)")
+        return
+    
+    if message.text.split()[1:] == ["reset"]:
+        dispatch_profiler.reset()
+        await message.answer("✅ Счетчики сброшены")
+        return
+    
+    report = html.escape(dispatch_profiler.report())[:4000]
+    await message.answer(f"<pre>{report}</pre>", parse_mode="HTML")
+
+
+@router.message(Command("profile"))
+async def admin_profile(message: Message):
+    """
+    Профиль процесса бота файлом
+
+    /profile [секунды] [all] - выборочный профиль (свернутые стеки для flamegraph),
+    /profile tasks - стеки задач asyncio
+    """
+    if not is_admin(message.from_user.id):
+        return
+    
+    args = message.text.split()[1:]
+    if args[:1] == ["tasks"]:
+        await message.answer_document(BufferedInputFile(dump_tasks().encode(), filename="tasks.txt"))
+        return
+    
+    try:
+        seconds = float(args[0]) if args and args[0] != "all" else 10.0
+    except ValueError:
+        await message.answer("❌ Формат: /profile [секунды] [all] или /profile tasks")
+        return
+    
+    await message.answer(f"⏱ Снимаю профиль {min(seconds, settings.profile_max_seconds):g} с...")
+    try:
+        folded = await sample_profile(seconds, all_threads="all" in args)
+    except ProfilerBusyError:
+        await message.answer("⚠️ Профиль уже снимается")
+        return
+    
+    await message.answer_document(
+        BufferedInputFile(folded.encode(), filename=f"bot-profile-{int(time.time())}.folded"),
+        caption="Свернутые стеки: flamegraph.pl, speedscope.app"
+    )
+
+
+@router.callback_query(AdminOrders.filter())
+async def admin_orders(callback: CallbackQuery, callback_data: AdminOrders):
     """Показать заказы админу"""
-    status_filter = callback.data.split(":")[1]
+    status = callback_data.status
     
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Доступ запрещен")
@@ -71,11 +152,6 @@ async def admin_orders(callback: CallbackQuery):
     db = await get_db_async()
     order_service = OrderService(db)
     
-    # Определяем статус для фильтра
-    status = None
-    if status_filter != "all":
-        status = OrderStatus(status_filter)
-    
     result = order_service.get_orders_by_status(status, page=1, per_page=5)
     
     db.close()
@@ -86,13 +162,13 @@ async def admin_orders(callback: CallbackQuery):
     
     # Заголовок в зависимости от фильтра
     titles = {
-        "all": "Все заказы",
-        "new": "Новые заказы",
-        "in_progress": "Заказы в работе",
-        "ready": "Готовые заказы"
+        None: "Все заказы",
+        OrderStatus.NEW: "Новые заказы",
+        OrderStatus.IN_PROGRESS: "Заказы в работе",
+        OrderStatus.READY: "Готовые заказы"
     }
     
-    text = f"📋 <b>{titles.get(status_filter, 'Заказы')}</b> (стр. 1/{result['total_pages']}):\n\n"
+    text = f"📋 <b>{titles.get(status, 'Заказы')}</b> (стр. 1/{result['total_pages']}):\n\n"
     
     for order in result['orders']:
         from app.database.models import get_status_emoji, get_status_text
@@ -118,6 +194,14 @@ async def admin_orders(callback: CallbackQuery):
             None
         )
     
+    # Массовая смена статуса для заказов из отфильтрованного списка
+    if status is not None and ORDER_TRANSITIONS.get(status):
+        rows = keyboard.inline_keyboard if keyboard else []
+        keyboard = InlineKeyboardMarkup(inline_keyboard=rows + [[InlineKeyboardButton(
+            text="🔄 Сменить статус всем",
+            callback_data=BulkPick(status).pack()
+        )]])
+    
     await callback.message.edit_text(
         text,
         reply_markup=keyboard,
@@ -126,14 +210,14 @@ async def admin_orders(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("set_price:"))
-async def set_price_start(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(SetPrice.filter())
+async def set_price_start(callback: CallbackQuery, callback_data: SetPrice, state: FSMContext):
     """Начать установку цены заказа"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Доступ запрещен")
         return
     
-    order_id = int(callback.data.split(":")[1])
+    order_id = callback_data.order_id
     
     await state.update_data(order_id=order_id)
     await state.set_state(AdminStates.SET_ORDER_PRICE)
@@ -189,7 +273,10 @@ async def set_price_process(message: Message, state: FSMContext):
             reply_markup=get_main_menu()
         )
         
-        # Уведомляем клиента
+        # Уведомляем клиента, если он не заблокировал бота
+        if await delivery_tracker.is_suppressed(order.user.telegram_id):
+            return
+        
         try:
             from aiogram import Bot
             bot = Bot(token=settings.bot_token)
@@ -204,7 +291,8 @@ async def set_price_process(message: Message, state: FSMContext):
                 parse_mode="HTML"
             )
         except Exception as e:
-            print(f"Ошибка отправки уведомления клиенту: {e}")
+            logger.error(f"Ошибка отправки уведомления клиенту: {e}")
+            await delivery_tracker.record_failure(order.user.telegram_id, e)
     else:
         db.close()
         await state.clear()
@@ -214,14 +302,14 @@ async def set_price_process(message: Message, state: FSMContext):
         )
 
 
-@router.callback_query(F.data.startswith("change_status:"))
-async def change_status_start(callback: CallbackQuery):
+@router.callback_query(ChangeStatus.filter())
+async def change_status_start(callback: CallbackQuery, callback_data: ChangeStatus):
     """Показать меню изменения статуса"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Доступ запрещен")
         return
     
-    order_id = int(callback.data.split(":")[1])
+    order_id = callback_data.order_id
     
     await callback.message.edit_text(
         f"🔄 <b>Изменение статуса заказа #{order_id}</b>\n\nВыберите новый статус:",
@@ -231,16 +319,14 @@ async def change_status_start(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("status:"))
-async def change_status_process(callback: CallbackQuery):
+@router.callback_query(SetStatus.filter())
+async def change_status_process(callback: CallbackQuery, callback_data: SetStatus):
     """Обработка изменения статуса"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Доступ запрещен")
         return
     
-    _, order_id_str, new_status_str = callback.data.split(":")
-    order_id = int(order_id_str)
-    new_status = OrderStatus(new_status_str)
+    order_id, new_status = callback_data.order_id, callback_data.status
     
     db = await get_db_async()
     order_service = OrderService(db)
@@ -255,18 +341,19 @@ async def change_status_process(callback: CallbackQuery):
     old_status = order.status
     
     # Обновляем статус
-    success = order_service.update_order_status(
-        order_id, 
-        new_status, 
-        f"Статус изменен администратором"
-    )
-    
-    if success:
-        order = order_service.get_order_by_id(order_id)  # Обновляем данные
+    try:
+        effects = order_service.update_order_status(
+            order_id, 
+            new_status, 
+            f"Статус изменен администратором"
+        )
+    except TransitionError as e:
+        await callback.answer(f"❌ Нельзя изменить статус: {e}", show_alert=True)
+        return
+    finally:
         db.close()
-        
-        from app.database.models import get_status_text
-        
+    
+    if effects:
         await callback.message.edit_text(
             f"✅ <b>Статус изменен!</b>\n\n"
             f"Заказ #{order_id}\n"
@@ -276,25 +363,9 @@ async def change_status_process(callback: CallbackQuery):
             parse_mode="HTML"
         )
         
-        # Уведомляем клиента
-        try:
-            from aiogram import Bot
-            bot = Bot(token=settings.bot_token)
-            
-            status_emoji = get_status_emoji(new_status)
-            client_text = f"🔔 <b>Статус заказа изменен!</b>\n\n"
-            client_text += f"Заказ #{order_id}\n"
-            client_text += f"Новый статус: {status_emoji} {get_status_text(new_status)}"
-            
-            await bot.send_message(
-                chat_id=order.user.telegram_id,
-                text=client_text,
-                parse_mode="HTML"
-            )
-        except Exception as e:
-            print(f"Ошибка отправки уведомления клиенту: {e}")
+        # Уведомляем клиента (для "ожидает оплаты" - реквизиты)
+        user_notifier.enqueue(effects.notifications)
     else:
-        db.close()
         await callback.message.edit_text(
             f"❌ Ошибка изменения статуса заказа #{order_id}",
             parse_mode="HTML"
@@ -303,14 +374,100 @@ async def change_status_process(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("send_file:"))
-async def send_file_start(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(BulkPick.filter())
+async def bulk_status_pick(callback: CallbackQuery, callback_data: BulkPick):
+    """Выбор нового статуса для всех заказов в статусе"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен")
+        return
+    
+    from_status = callback_data.from_status
+    
+    await callback.message.edit_text(
+        f"🔄 <b>Массовая смена статуса</b>\n\n"
+        f"Заказы в статусе «{get_status_text(from_status)}» перевести в:",
+        reply_markup=get_bulk_status_keyboard(from_status),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(BulkTo.filter())
+async def bulk_status_confirm(callback: CallbackQuery, callback_data: BulkTo):
+    """Подтверждение массовой смены статуса"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен")
+        return
+    
+    from_status, to_status = callback_data.from_status, callback_data.to_status
+    
+    db = await get_db_async()
+    order_ids = OrderService(db).get_order_ids_by_status(from_status)
+    db.close()
+    
+    if not order_ids:
+        await callback.answer("Заказы не найдены")
+        return
+    
+    limit_note = f" (первые {MAX_BULK_ORDERS})" if len(order_ids) >= MAX_BULK_ORDERS else ""
+    
+    await callback.message.edit_text(
+        f"🔄 <b>Массовая смена статуса</b>\n\n"
+        f"{get_status_emoji(from_status)} {get_status_text(from_status)} → "
+        f"{get_status_emoji(to_status)} {get_status_text(to_status)}\n"
+        f"Заказов: {len(order_ids)}{limit_note}\n\n"
+        f"Клиенты получат уведомления. Продолжить?",
+        reply_markup=get_bulk_confirm_keyboard(from_status, to_status),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(BulkApply.filter())
+async def bulk_status_apply(callback: CallbackQuery, callback_data: BulkApply):
+    """Массовая смена статуса"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен")
+        return
+    
+    from_status, to_status = callback_data.from_status, callback_data.to_status
+    
+    db = await get_db_async()
+    try:
+        order_service = OrderService(db)
+        result = order_service.bulk_update_status(
+            order_service.get_order_ids_by_status(from_status),
+            to_status,
+            "Массовое изменение администратором"
+        )
+    finally:
+        db.close()
+    
+    user_notifier.enqueue(result.notifications)
+    
+    text = (f"✅ <b>Статус изменен</b>: {get_status_text(from_status)} → {get_status_text(to_status)}\n\n"
+            f"Обновлено заказов: {len(result.updated)}\n")
+    if result.skipped:
+        text += f"Пропущено: {len(result.skipped)}\n"
+        for order_id, reason in list(result.skipped.items())[:10]:
+            text += f"• #{order_id}: {reason}\n"
+    
+    await callback.message.edit_text(
+        text,
+        reply_markup=get_admin_main_keyboard(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(SendFile.filter())
+async def send_file_start(callback: CallbackQuery, callback_data: SendFile, state: FSMContext):
     """Начать отправку файла клиенту"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Доступ запрещен")
         return
     
-    order_id = int(callback.data.split(":")[1])
+    order_id = callback_data.order_id
     
     await state.update_data(order_id=order_id)
     await state.set_state(AdminStates.SEND_ORDER_FILE)
@@ -345,6 +502,14 @@ async def send_file_process(message: Message, state: FSMContext):
     
     db.close()
     
+    if await delivery_tracker.is_suppressed(order.user.telegram_id):
+        await state.clear()
+        await message.answer(
+            f"❌ Клиент заказа #{order_id} заблокировал бота, файл не отправлен",
+            reply_markup=get_main_menu()
+        )
+        return
+    
     # Отправляем файл клиенту
     try:
         from aiogram import Bot
@@ -368,8 +533,12 @@ async def send_file_process(message: Message, state: FSMContext):
         
     except Exception as e:
         await state.clear()
+        if await delivery_tracker.record_failure(order.user.telegram_id, e):
+            error = "клиент заблокировал бота или удалил чат"
+        else:
+            error = str(e)
         await message.answer(
-            f"❌ Ошибка отправки файла: {e}",
+            f"❌ Ошибка отправки файла: {error}",
             reply_markup=get_main_menu()
         )
 
@@ -391,7 +560,7 @@ async def send_file_invalid(message: Message, state: FSMContext):
     )
 
 
-@router.callback_query(F.data == "admin_stats")
+@router.callback_query(AdminStats.filter())
 async def admin_statistics(callback: CallbackQuery):
     """Показать подробную статистику"""
     if not is_admin(callback.from_user.id):
@@ -426,18 +595,73 @@ async def admin_statistics(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "admin_broadcast")
+@router.callback_query(AdminBroadcast.filter())
 async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext):
-    """Начать создание рассылки"""
+    """Начать создание рассылки: выбор аудитории"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Доступ запрещен")
         return
     
+    await state.clear()
+    
+    await callback.message.edit_text(
+        "📢 <b>Создание рассылки</b>\n\n"
+        "Выберите, кому отправить сообщение:",
+        reply_markup=get_broadcast_segment_keyboard(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(BroadcastWorkTypes.filter())
+async def admin_broadcast_work_types(callback: CallbackQuery):
+    """Выбор типа работы для рассылки"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен")
+        return
+    
+    db = await get_db_async()
+    try:
+        work_types = BroadcastService(db).get_work_types()
+    finally:
+        db.close()
+    
+    await callback.message.edit_text(
+        "📢 <b>Создание рассылки</b>\n\n"
+        "Клиентам, заказывавшим работу типа:",
+        reply_markup=get_broadcast_work_types_keyboard(work_types),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(BroadcastSegment.filter())
+async def admin_broadcast_segment(callback: CallbackQuery, callback_data: BroadcastSegment, state: FSMContext):
+    """Аудитория выбрана - ждем текст рассылки"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен")
+        return
+    
+    segment = Segment(kind=callback_data.kind, value=callback_data.value)
+    
+    db = await get_db_async()
+    try:
+        recipients = BroadcastService(db).count_recipients(segment)
+    finally:
+        db.close()
+    
+    if not recipients:
+        await callback.answer("Нет пользователей в этой аудитории", show_alert=True)
+        return
+    
     await state.set_state(AdminStates.BROADCAST_MESSAGE)
+    await state.update_data(broadcast_segment=segment.to_json())
     
     await callback.message.answer(
-        "📢 <b>Создание рассылки</b>\n\n"
-        "Введите текст сообщения для отправки всем пользователям:",
+        f"📢 <b>Создание рассылки</b>\n\n"
+        f"👥 Аудитория: {segment.title}\n"
+        f"📊 Получателей: {recipients}\n\n"
+        f"Введите текст сообщения:",
         reply_markup=get_cancel_keyboard(),
         parse_mode="HTML"
     )
@@ -446,7 +670,7 @@ async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext):
 
 @router.message(AdminStates.BROADCAST_MESSAGE)
 async def admin_broadcast_process(message: Message, state: FSMContext):
-    """Обработка рассылки"""
+    """Запуск рассылки в фоне"""
     if message.text == "❌ Отменить":
         await state.clear()
         await message.answer(
@@ -455,51 +679,52 @@ async def admin_broadcast_process(message: Message, state: FSMContext):
         )
         return
     
-    db = await get_db_async()
-    user_service = UserService(db)
-    
-    users = user_service.get_all_users(include_blocked=False)
-    db.close()
-    
-    if not users:
-        await state.clear()
+    # Рассылаются только тексты: фото, стикер и т.п. - просим прислать текст
+    if not message.text:
         await message.answer(
-            "❌ Нет пользователей для рассылки",
-            reply_markup=get_main_menu()
+            "⚠️ Рассылка поддерживает только текст. Отправьте текст сообщения или нажмите «❌ Отменить».",
+            reply_markup=get_cancel_keyboard()
         )
         return
     
-    # Отправляем рассылку
-    success_count = 0
-    failed_count = 0
-    
-    from aiogram import Bot
-    bot = Bot(token=settings.bot_token)
+    data = await state.get_data()
+    segment = Segment.from_json(data.get("broadcast_segment") or Segment().to_json())
+    await state.clear()
     
-    broadcast_text = f"📢 <b>Сообщение от администрации</b>\n\n{message.text}"
+    db = await get_db_async()
+    try:
+        broadcast_service = BroadcastService(db)
+        broadcast = broadcast_service.create(message.text, segment, message.chat.id)
+        
+        await message.answer("📢 Рассылка запущена", reply_markup=get_main_menu())
+        progress = await message.answer(
+            format_progress(broadcast.id, segment, broadcast.total, 0, 0),
+            reply_markup=get_broadcast_cancel_keyboard(broadcast.id),
+            parse_mode="HTML"
+        )
+        broadcast_service.set_progress_message(broadcast.id, progress.message_id)
+        db.refresh(broadcast)
+    finally:
+        db.close()
     
-    for user in users:
-        try:
-            await bot.send_message(
-                chat_id=user.telegram_id,
-                text=broadcast_text,
-                parse_mode="HTML"
-            )
-            success_count += 1
-        except Exception as e:
-            failed_count += 1
-            print(f"Ошибка отправки пользователю {user.telegram_id}: {e}")
+    # Сообщение с прогрессом обновляется по ходу рассылки
+    start_broadcast(broadcast)
+
+
+@router.callback_query(BroadcastCancel.filter())
+async def admin_broadcast_cancel(callback: CallbackQuery, callback_data: BroadcastCancel):
+    """Остановить рассылку"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен")
+        return
     
-    await state.clear()
+    broadcast_id = callback_data.broadcast_id
     
-    result_text = f"📢 <b>Рассылка завершена!</b>\n\n"
-    result_text += f"✅ Успешно отправлено: {success_count}\n"
-    result_text += f"❌ Ошибок: {failed_count}\n"
-    result_text += f"📊 Всего пользователей: {len(users)}"
+    db = await get_db_async()
+    try:
+        stopped = cancel_broadcast(db, broadcast_id)
+    finally:
+        db.close()
     
-    await message.answer(
-        result_text,
-        reply_markup=get_main_menu(),
-        parse_mode="HTML"
-    )
+    await callback.answer("⏹ Рассылка останавливается" if stopped else "Рассылка уже завершена")
     
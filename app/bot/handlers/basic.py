@@ -1,15 +1,16 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.orm import Session
 
 from app.bot.keyboards.client import get_main_menu, get_contact_keyboard
+from app.bot.utils.message_dispatch import ButtonText, use_fast_path
 from app.services.user_service import UserService
 from app.database.connection import get_db_async
 from app.config import settings
 
-router = Router()
+router = use_fast_path(Router(name="basic"))
 
 
 @router.message(CommandStart())
@@ -67,7 +68,7 @@ async def help_command(message: Message):
     await message.answer(help_text, parse_mode="HTML")
 
 
-@router.message(F.text == "ℹ️ О нас")
+@router.message(ButtonText("ℹ️ О нас"))
 async def about_command(message: Message):
     """Информация о сервисе"""
     about_text = "🏢 <b>О нашем сервисе</b>\n\n"
@@ -89,7 +90,7 @@ async def about_command(message: Message):
     await message.answer(about_text, parse_mode="HTML")
 
 
-@router.message(F.text == "☎️ Поддержка")
+@router.message(ButtonText("☎️ Поддержка"))
 async def support_command(message: Message):
     """Обработчик кнопки поддержки"""
     support_text = "📞 <b>Служба поддержки</b>\n\n"
@@ -104,7 +105,7 @@ async def support_command(message: Message):
     await message.answer(support_text, parse_mode="HTML")
 
 
-@router.message(F.text == "📱 Отправить контакт")
+@router.message(ButtonText("📱 Отправить контакт"))
 async def contact_received(message: Message):
     """Обработчик получения контакта"""
     if message.contact:
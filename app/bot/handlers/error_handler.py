@@ -6,7 +6,11 @@ from aiogram import Router
 from aiogram.types import Update, ErrorEvent
 from aiogram.exceptions import TelegramBadRequest, TelegramNotFound
 
-router = Router()
+from app.config import settings
+from app.config.logging_setup import setup_logging
+from app.services.delivery_tracker import record_send_failure
+
+router = Router(name="error_handler")
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
@@ -19,6 +23,11 @@ async def error_handler(event: ErrorEvent, update: Update):
     """
     exception = event.exception
     
+    # Пользователь заблокировал бота или удалил чат - больше ему не пишем
+    if await record_send_failure(exception):
+        logger.warning(f"User blocked bot or chat not found: {exception}")
+        return True
+    
     # Логируем ошибку
     logger.error(f"Update {update} caused error {exception}", exc_info=True)
     
@@ -48,16 +57,5 @@ def setup_error_handling():
     """
     Настройка обработки ошибок
     """
-    # Настройка логгирования
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('bot_errors.log'),
-            logging.StreamHandler()
-        ]
-    )
-    
-    # Устанавливаем уровень логгирования для различных модулей
-    logging.getLogger('aiogram').setLevel(logging.WARNING)
-    logging.getLogger('asyncio').setLevel(logging.WARNING)
+    # Запись логов в отдельном потоке; уровни модулей - settings.log_levels
+    setup_logging(log_file=settings.bot_log_file)
@@ -1,3 +1,4 @@
+import html
 from aiogram import Router, F
 from aiogram.types import Message, Document
 from aiogram.fsm.context import FSMContext
@@ -9,16 +10,19 @@ from app.bot.keyboards.client import (
     get_files_keyboard, get_confirm_keyboard, get_main_menu
 )
 from app.bot.utils.text_formatter import format_work_type, format_order_summary
-from app.bot.utils.file_handler import save_file, is_allowed_file_type, format_file_size
+from app.bot.utils.file_handler import is_allowed_file_type, format_file_size
+from app.bot.utils.file_ingest import schedule_order_ingestion
+from app.bot.utils.message_dispatch import ButtonText, use_fast_path
 from app.services.user_service import UserService
 from app.services.order_service import OrderService
+from app.services.notification_service import admin_digest
 from app.database.connection import get_db_async
 from app.config import settings
 
-router = Router()
+router = use_fast_path(Router(name="orders"))
 
 
-@router.message(F.text == "📝 Новый заказ")
+@router.message(ButtonText("📝 Новый заказ"), flags={"throttling_key": "new_order"})
 async def new_order_start(message: Message, state: FSMContext):
     """Начать создание нового заказа"""
     await state.clear()
@@ -202,7 +206,7 @@ async def process_requirements(message: Message, state: FSMContext):
     )
 
 
-@router.message(StateFilter(OrderStates.FILES), F.document)
+@router.message(StateFilter(OrderStates.FILES), F.document, flags={"throttling_key": "order_file"})
 async def process_file(message: Message, state: FSMContext):
     """Обработка загрузки файла"""
     document = message.document
@@ -245,7 +249,7 @@ async def process_file(message: Message, state: FSMContext):
         f"📎 Всего файлов: {len(files)}",
         parse_mode="HTML"
     )
-@router.message(StateFilter(OrderStates.FILES), F.photo)
+@router.message(StateFilter(OrderStates.FILES), F.photo, flags={"throttling_key": "order_file"})
 async def process_photo(message: Message, state: FSMContext):
     """Обработка загрузки фото чека"""
     photo = message.photo[-1]  # Берем фото максимального размера
@@ -356,54 +360,6 @@ async def process_confirm(message: Message, state: FSMContext):
                 requirements=data.get('requirements')
             )
             
-            # 🔥 ИСПРАВЛЕНО: Правильное сохранение файлов
-            files_saved = 0
-            saved_files_info = []
-            
-            if data.get('files'):
-                from aiogram import Bot
-                
-                bot = Bot(token=settings.bot_token)
-                
-                try:
-                    for i, file_info in enumerate(data['files']):
-                        try:
-                            # 🔥 ИСПРАВЛЕНО: Используем сохраненный Document объект
-                            document = file_info['document']
-                            
-                            # Сохраняем файл с правильным именем
-                            saved_filename, file_path = await save_file(document, order.id, bot)
-                            
-                            # Определяем тип файла
-                            file_type = None
-                            if saved_filename and '.' in saved_filename:
-                                file_type = saved_filename.split('.')[-1].lower()
-                            
-                            # Сохраняем информацию о файле в БД
-                            order_file = order_service.add_file_to_order(
-                                order_id=order.id,
-                                filename=saved_filename,  # 🔥 Используем имя сохраненного файла
-                                file_path=file_path,
-                                file_size=document.file_size,
-                                file_type=file_type
-                            )
-                            
-                            files_saved += 1
-                            saved_files_info.append({
-                                'original': file_info['filename'],
-                                'saved': saved_filename,
-                                'path': file_path
-                            })
-                            
-                            print(f"✅ Файл сохранен: {file_info['filename']} -> {saved_filename}")
-                            
-                        except Exception as e:
-                            print(f"❌ Ошибка сохранения файла {file_info.get('filename', 'неизвестный')}: {e}")
-                            continue
-                    
-                finally:
-                    await bot.session.close()
-            
             # Сохраняем данные для уведомления админа
             order_id = order.id
             user_data = {
@@ -418,27 +374,35 @@ async def process_confirm(message: Message, state: FSMContext):
         
         await state.clear()
         
+        files = data.get('files') or []
+        
         # Формируем сообщение об успехе
         success_text = f"✅ <b>Заказ #{order_id} создан!</b>\n\n"
         success_text += "📋 Ваш заказ принят в обработку.\n"
         
-        if files_saved > 0:
-            success_text += f"📎 Прикреплено файлов: {files_saved}\n"
-            success_text += "\n📁 <b>Сохраненные файлы:</b>\n"
-            for file_info in saved_files_info:
-                success_text += f"• {file_info['saved']}\n"
+        if files:
+            success_text += f"📎 Файлов прикреплено: {len(files)}. Они загружаются и скоро появятся в заказе.\n"
         
         success_text += "\n🔔 Вы получите уведомление при изменении статуса.\n"
         success_text += "📱 Посмотреть статус заказа можно в разделе 'Мои заказы'"
         
+        # Отвечаем сразу, не дожидаясь загрузки файлов
         await message.answer(
             success_text,
             reply_markup=get_main_menu(),
             parse_mode="HTML"
         )
         
-        # Уведомляем администратора о новом заказе
-        await send_admin_notification(order_id, user_data, data, files_saved, saved_files_info)
+        if files:
+            # Файлы качаются параллельно в фоне; админ получит уведомление
+            # о заказе, когда все файлы будут сохранены
+            async def notify_when_ingested(order_id: int, saved_files: list):
+                await send_admin_notification(order_id, user_data, data, len(saved_files), saved_files)
+            
+            schedule_order_ingestion(message.bot, order_id, files, on_complete=notify_when_ingested)
+        else:
+            # Уведомляем администратора о новом заказе
+            await send_admin_notification(order_id, user_data, data)
     
     else:
         await message.answer(
@@ -449,54 +413,46 @@ async def process_confirm(message: Message, state: FSMContext):
 
 async def send_admin_notification(order_id: int, user_data: dict, order_data: dict, files_count: int = 0, files_info: list = None):
     """Отправить уведомление администратору о новом заказе"""
-    try:
-        from aiogram import Bot
-        
-        bot = Bot(token=settings.bot_token)
-        
-        admin_text = f"🆕 <b>НОВЫЙ ЗАКАЗ #{order_id}</b>\n\n"
-        admin_text += f"👤 <b>Клиент:</b> {user_data['first_name']}"
-        if user_data['last_name']:
-            admin_text += f" {user_data['last_name']}"
-        if user_data['username']:
-            admin_text += f" (@{user_data['username']})"
-        admin_text += f"\n📱 <b>Telegram ID:</b> {user_data['telegram_id']}\n\n"
-        
-        admin_text += f"📝 <b>Тип работы:</b> {order_data['work_type']}\n"
-        admin_text += f"📚 <b>Предмет:</b> {order_data['subject']}\n"
-        admin_text += f"📋 <b>Тема:</b> {order_data['topic']}\n"
-        admin_text += f"📏 <b>Объем:</b> {order_data['volume']}\n"
-        admin_text += f"⏰ <b>Срок:</b> {order_data['deadline']}\n"
-        
-        if order_data.get('requirements'):
-            requirements_preview = order_data['requirements'][:200]
-            if len(order_data['requirements']) > 200:
-                requirements_preview += "..."
-            admin_text += f"📌 <b>Требования:</b> {requirements_preview}\n"
-        
-        if files_count > 0:
-            admin_text += f"\n📎 <b>Файлов прикреплено:</b> {files_count}\n"
-            if files_info:
-                admin_text += "<b>Сохраненные файлы:</b>\n"
-                for file_info in files_info[:5]:  # Показываем только первые 5 файлов
-                    admin_text += f"• {file_info['saved']}\n"
-                if len(files_info) > 5:
-                    admin_text += f"• ... и еще {len(files_info) - 5} файлов\n"
-        
-        admin_text += f"\n🔗 <b>Админ-панель:</b> http://127.0.0.1:8000/orders/{order_id}\n"
-        admin_text += f"\n💼 Заказ ожидает установки цены!"
-        
-        # Отправляем уведомление админу
-        await bot.send_message(
-            chat_id=settings.admin_user_id,
-            text=admin_text,
-            parse_mode="HTML"
-        )
-        
-        print(f"✅ Уведомление о новом заказе #{order_id} отправлено админу")
-        
-        # Закрываем сессию бота
-        await bot.session.close()
-        
-    except Exception as e:
-        print(f"❌ Ошибка отправки уведомления админу: {e}")
\ No newline at end of file
+    admin_text = f"🆕 <b>НОВЫЙ ЗАКАЗ #{order_id}</b>\n\n"
+    admin_text += f"👤 <b>Клиент:</b> {html.escape(user_data['first_name'] or '')}"
+    if user_data['last_name']:
+        admin_text += f" {html.escape(user_data['last_name'])}"
+    if user_data['username']:
+        admin_text += f" (@{html.escape(user_data['username'])})"
+    admin_text += f"\n📱 <b>Telegram ID:</b> {user_data['telegram_id']}\n\n"
+    
+    admin_text += f"📝 <b>Тип работы:</b> {html.escape(order_data['work_type'])}\n"
+    admin_text += f"📚 <b>Предмет:</b> {html.escape(order_data['subject'])}\n"
+    admin_text += f"📋 <b>Тема:</b> {html.escape(order_data['topic'])}\n"
+    admin_text += f"📏 <b>Объем:</b> {html.escape(order_data['volume'])}\n"
+    admin_text += f"⏰ <b>Срок:</b> {html.escape(order_data['deadline'])}\n"
+    
+    if order_data.get('requirements'):
+        requirements_preview = order_data['requirements'][:200]
+        if len(order_data['requirements']) > 200:
+            requirements_preview += "..."
+        admin_text += f"📌 <b>Требования:</b> {html.escape(requirements_preview)}\n"
+    
+    if files_count > 0:
+        admin_text += f"\n📎 <b>Файлов прикреплено:</b> {files_count}\n"
+        if files_info:
+            admin_text += "<b>Сохраненные файлы:</b>\n"
+            for file_info in files_info[:5]:  # Показываем только первые 5 файлов
+                admin_text += f"• {html.escape(file_info['saved'])}\n"
+            if len(files_info) > 5:
+                admin_text += f"• ... и еще {len(files_info) - 5} файлов\n"
+    
+    admin_text += f"\n🔗 <b>Админ-панель:</b> http://127.0.0.1:8000/orders/{order_id}\n"
+    admin_text += f"\n💼 Заказ ожидает установки цены!"
+    
+    client_name = user_data['first_name'] or f"User {user_data['telegram_id']}"
+    
+    # Несколько заказов подряд от одного клиента уходят одним дайджестом
+    await admin_digest.notify(
+        admin_text,
+        key=f"user:{user_data['telegram_id']}",
+        summary=(f"🆕 Заказ #{order_id}: {html.escape(order_data['work_type'])}, "
+                 f"{html.escape(order_data['subject'])}"),
+        title=f"Новые заказы от {html.escape(client_name)}",
+        link="http://127.0.0.1:8000/orders?status_filter=new"
+    )
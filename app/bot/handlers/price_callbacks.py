@@ -1,22 +1,30 @@
-from aiogram import Router, F
+import html
+import logging
+from aiogram import Router
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 
+from app.bot.keyboards.callbacks import AcceptPrice, DeclinePrice, ViewOrder
 from app.bot.keyboards.client import get_main_menu, get_order_status_keyboard
+from app.bot.utils.callback_data import use_prefix_dispatch
 from app.services.order_service import OrderService
 from app.services.user_service import UserService
+from app.services.notification_service import admin_digest, user_notifier
+from app.services.order_lifecycle import ACTOR_USER, TransitionError
 from app.database.connection import get_db_async
 from app.database.models import OrderStatus, STATUS_EMOJI
 from app.config import settings
 
-router = Router()
+logger = logging.getLogger(__name__)
 
+router = use_prefix_dispatch(Router(name="price_callbacks"))
 
-@router.callback_query(F.data.startswith("accept_price:"))
-async def accept_price_callback(callback: CallbackQuery, state: FSMContext):
+
+@router.callback_query(AcceptPrice.filter())
+async def accept_price_callback(callback: CallbackQuery, callback_data: AcceptPrice, state: FSMContext):
     """Обработка принятия цены пользователем"""
     try:
-        order_id = int(callback.data.split(":")[1])
+        order_id = callback_data.order_id
         
         db = await get_db_async()
         try:
@@ -35,10 +43,20 @@ async def accept_price_callback(callback: CallbackQuery, state: FSMContext):
                 await callback.answer("❌ Цена не установлена", show_alert=True)
                 return
             
-            # Обновляем статус заказа на "ждет оплаты"
-            success = order_service.update_order_status(order_id, OrderStatus.WAITING_PAYMENT)
+            if order.status == OrderStatus.WAITING_PAYMENT:
+                await callback.answer("Цена уже принята, реквизиты отправлены", show_alert=True)
+                return
+            
+            # Обновляем статус заказа на "ждет оплаты" (реквизиты придут отдельным сообщением)
+            try:
+                effects = order_service.update_order_status(
+                    order_id, OrderStatus.WAITING_PAYMENT, "Цена принята клиентом", actor=ACTOR_USER
+                )
+            except TransitionError as e:
+                await callback.answer(f"❌ Нельзя принять цену: {e}", show_alert=True)
+                return
             
-            if success:
+            if effects:
                 # Сохраняем данные для уведомлений до закрытия сессии
                 order_data = {
                     'id': order.id,
@@ -56,10 +74,11 @@ async def accept_price_callback(callback: CallbackQuery, state: FSMContext):
                     f"📋 <b>Заказ #{order_data['id']}</b>\n"
                     f"📝 {order_data['work_type']}: {order_data['topic'][:50]}...\n\n"
                     f"💰 Статус изменен на: <b>Ожидает оплаты</b>\n\n"
-                    f"📞 Для оплаты свяжитесь с нами через поддержку.",
+                    f"💳 Реквизиты для оплаты отправлены следующим сообщением.",
                     parse_mode="HTML",
                     reply_markup=get_order_status_keyboard(order_id)
                 )
+                user_notifier.enqueue(effects.notifications)
 
                 # Уведомляем админа о принятии цены
                 await send_admin_notification_accept(order_data)
@@ -71,15 +90,15 @@ async def accept_price_callback(callback: CallbackQuery, state: FSMContext):
             db.close()
                 
     except Exception as e:
-        print(f"Ошибка при принятии цены: {e}")
+        logger.error(f"Ошибка при принятии цены: {e}")
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("decline_price:"))
-async def decline_price_callback(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(DeclinePrice.filter())
+async def decline_price_callback(callback: CallbackQuery, callback_data: DeclinePrice, state: FSMContext):
     """Обработка отклонения цены пользователем"""
     try:
-        order_id = int(callback.data.split(":")[1])
+        order_id = callback_data.order_id
         
         db = await get_db_async()
         try:
@@ -95,9 +114,15 @@ async def decline_price_callback(callback: CallbackQuery, state: FSMContext):
                 return
             
             # Возвращаем статус на "новый" для пересмотра цены
-            success = order_service.update_order_status(order_id, OrderStatus.NEW)
+            try:
+                effects = order_service.update_order_status(
+                    order_id, OrderStatus.NEW, "Цена отклонена клиентом", actor=ACTOR_USER
+                )
+            except TransitionError as e:
+                await callback.answer(f"❌ Нельзя отклонить цену: {e}", show_alert=True)
+                return
             
-            if success:
+            if effects:
                 # Сохраняем данные для уведомлений до закрытия сессии
                 order_data = {
                     'id': order.id,
@@ -129,15 +154,15 @@ async def decline_price_callback(callback: CallbackQuery, state: FSMContext):
             db.close()
                 
     except Exception as e:
-        print(f"Ошибка при отклонении цены: {e}")
+        logger.error(f"Ошибка при отклонении цены: {e}")
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("view_order:"))
-async def view_order_callback(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(ViewOrder.filter())
+async def view_order_callback(callback: CallbackQuery, callback_data: ViewOrder, state: FSMContext):
     """Просмотр информации о заказе"""
     try:
-        order_id = int(callback.data.split(":")[1])
+        order_id = callback_data.order_id
         
         db = await get_db_async()
         try:
@@ -188,76 +213,54 @@ async def view_order_callback(callback: CallbackQuery, state: FSMContext):
             db.close()
             
     except Exception as e:
-        print(f"Ошибка при просмотре заказа: {e}")
+        logger.error(f"Ошибка при просмотре заказа: {e}")
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
 async def send_admin_notification_accept(order_data: dict):
     """Отправить уведомление админу о принятии цены"""
-    try:
-        from aiogram import Bot
-        
-        bot = Bot(token=settings.bot_token)
-        
-        admin_text = f"✅ <b>ЦЕНА ПРИНЯТА</b>\n\n"
-        admin_text += f"📋 <b>Заказ #{order_data['id']}</b>\n"
-        admin_text += f"👤 <b>Клиент:</b> {order_data['user_first_name']}"
-        if order_data['user_last_name']:
-            admin_text += f" {order_data['user_last_name']}"
-        if order_data['user_username']:
-            admin_text += f" (@{order_data['user_username']})"
-        admin_text += f"\n💰 <b>Цена:</b> {order_data['price']} ₽\n"
-        admin_text += f"📝 <b>Работа:</b> {order_data['work_type']}\n"
-        admin_text += f"📋 <b>Тема:</b> {order_data['topic'][:100]}...\n\n"
-        admin_text += f"🔗 <b>Админ-панель:</b> http://127.0.0.1:8000/orders/{order_data['id']}\n\n"
-        admin_text += f"⏰ Статус изменен на: <b>Ожидает оплаты</b>"
-        
-        await bot.send_message(
-            chat_id=settings.admin_user_id,
-            text=admin_text,
-            parse_mode="HTML"
-        )
-        
-        print(f"✅ Уведомление о принятии цены отправлено админу")
-        
-        # Закрываем сессию бота
-        await bot.session.close()
-        
-    except Exception as e:
-        print(f"❌ Ошибка отправки уведомления админу о принятии: {e}")
+    admin_text = f"✅ <b>ЦЕНА ПРИНЯТА</b>\n\n"
+    admin_text += f"📋 <b>Заказ #{order_data['id']}</b>\n"
+    admin_text += f"👤 <b>Клиент:</b> {html.escape(order_data['user_first_name'] or '')}"
+    if order_data['user_last_name']:
+        admin_text += f" {html.escape(order_data['user_last_name'])}"
+    if order_data['user_username']:
+        admin_text += f" (@{html.escape(order_data['user_username'])})"
+    admin_text += f"\n💰 <b>Цена:</b> {order_data['price']} ₽\n"
+    admin_text += f"📝 <b>Работа:</b> {html.escape(order_data['work_type'])}\n"
+    admin_text += f"📋 <b>Тема:</b> {html.escape(order_data['topic'][:100])}...\n\n"
+    admin_text += f"🔗 <b>Админ-панель:</b> http://127.0.0.1:8000/orders/{order_data['id']}\n\n"
+    admin_text += f"⏰ Статус изменен на: <b>Ожидает оплаты</b>"
+    
+    await admin_digest.notify(
+        admin_text,
+        key=f"order:{order_data['id']}",
+        summary=f"✅ Цена принята: {order_data['price']} ₽",
+        title=f"Заказ #{order_data['id']}",
+        link=f"http://127.0.0.1:8000/orders/{order_data['id']}"
+    )
 
 
 async def send_admin_notification_decline(order_data: dict):
     """Отправить уведомление админу об отклонении цены"""
-    try:
-        from aiogram import Bot
-        
-        bot = Bot(token=settings.bot_token)
-        
-        admin_text = f"❌ <b>ЦЕНА ОТКЛОНЕНА</b>\n\n"
-        admin_text += f"📋 <b>Заказ #{order_data['id']}</b>\n"
-        admin_text += f"👤 <b>Клиент:</b> {order_data['user_first_name']}"
-        if order_data['user_last_name']:
-            admin_text += f" {order_data['user_last_name']}"
-        if order_data['user_username']:
-            admin_text += f" (@{order_data['user_username']})"
-        admin_text += f"\n💰 <b>Отклоненная цена:</b> {order_data['price']} ₽\n"
-        admin_text += f"📝 <b>Работа:</b> {order_data['work_type']}\n"
-        admin_text += f"📋 <b>Тема:</b> {order_data['topic'][:100]}...\n\n"
-        admin_text += f"🔗 <b>Админ-панель:</b> http://127.0.0.1:8000/orders/{order_data['id']}\n\n"
-        admin_text += f"🔄 Статус изменен на: <b>Новый</b>\n"
-        admin_text += f"💭 Требуется пересмотр цены!"
-        
-        await bot.send_message(
-            chat_id=settings.admin_user_id,
-            text=admin_text,
-            parse_mode="HTML"
-        )
-        
-        print(f"✅ Уведомление об отклонении цены отправлено админу")
-        
-        # Закрываем сессию бота
-        await bot.session.close()
-        
-    except Exception as e:
-        print(f"❌ Ошибка отправки уведомления админу об отклонении: {e}")
\ No newline at end of file
+    admin_text = f"❌ <b>ЦЕНА ОТКЛОНЕНА</b>\n\n"
+    admin_text += f"📋 <b>Заказ #{order_data['id']}</b>\n"
+    admin_text += f"👤 <b>Клиент:</b> {html.escape(order_data['user_first_name'] or '')}"
+    if order_data['user_last_name']:
+        admin_text += f" {html.escape(order_data['user_last_name'])}"
+    if order_data['user_username']:
+        admin_text += f" (@{html.escape(order_data['user_username'])})"
+    admin_text += f"\n💰 <b>Отклоненная цена:</b> {order_data['price']} ₽\n"
+    admin_text += f"📝 <b>Работа:</b> {html.escape(order_data['work_type'])}\n"
+    admin_text += f"📋 <b>Тема:</b> {html.escape(order_data['topic'][:100])}...\n\n"
+    admin_text += f"🔗 <b>Админ-панель:</b> http://127.0.0.1:8000/orders/{order_data['id']}\n\n"
+    admin_text += f"🔄 Статус изменен на: <b>Новый</b>\n"
+    admin_text += f"💭 Требуется пересмотр цены!"
+    
+    await admin_digest.notify(
+        admin_text,
+        key=f"order:{order_data['id']}",
+        summary=f"❌ Цена отклонена: {order_data['price']} ₽",
+        title=f"Заказ #{order_data['id']}",
+        link=f"http://127.0.0.1:8000/orders/{order_data['id']}"
+    )
@@ -1,5 +1,7 @@
 # Создайте новый файл: app/bot/handlers/user_messages.py
 
+import html
+import logging
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
@@ -11,16 +13,20 @@ from app.services.payment_service import PaymentService
 from app.database.connection import get_db_async
 from app.database.models.enums import OrderStatus
 from app.bot.keyboards.client import get_main_menu
+from app.bot.utils.message_dispatch import ButtonText, use_fast_path
+from app.services.notification_service import admin_digest
 from app.config import settings
 
-router = Router()
+logger = logging.getLogger(__name__)
+
+router = use_fast_path(Router(name="user_messages"))
 
 
 @router.message(F.text & ~F.text.startswith('/') & ~F.text.in_([
     "📝 Новый заказ", "📋 Мои заказы", "ℹ️ О нас", "☎️ Поддержка",
     "❌ Отменить", "⏭️ Пропустить", "✅ Завершить загрузку", 
     "✅ Подтвердить заказ", "✏️ Редактировать", "🔙 Назад"
-]))
+]), flags={"throttling_key": "user_message"})
 async def handle_user_message(message: Message, state: FSMContext):
     """
     Обработчик обычных текстовых сообщений пользователя
@@ -82,7 +88,7 @@ async def handle_user_message(message: Message, state: FSMContext):
         )
         
         if user_message_saved:
-            print(f"💬 Сообщение от пользователя {user.telegram_id} сохранено для заказа #{active_order.id}")
+            logger.debug("Сообщение от пользователя %s сохранено для заказа #%s", user.telegram_id, active_order.id)
             
             # Отправляем подтверждение пользователю
             await message.answer(
@@ -109,45 +115,36 @@ async def handle_user_message(message: Message, state: FSMContext):
 
 async def notify_admin_about_user_message(order, user, message_text: str):
     """Уведомить администратора о новом сообщении от пользователя"""
-    try:
-        from aiogram import Bot
-        
-        bot = Bot(token=settings.bot_token)
-        
-        # Формируем уведомление для админа
-        admin_text = f"💬 <b>НОВОЕ СООБЩЕНИЕ ОТ КЛИЕНТА</b>\n\n"
-        admin_text += f"📋 <b>Заказ #{order.id}</b>\n"
-        admin_text += f"👤 <b>Клиент:</b> {user.full_name}"
-        if user.username:
-            admin_text += f" (@{user.username})"
-        admin_text += f"\n📱 <b>Telegram ID:</b> {user.telegram_id}\n\n"
-        
-        admin_text += f"📝 <b>Тип работы:</b> {order.work_type}\n"
-        admin_text += f"📋 <b>Тема:</b> {order.short_topic}\n\n"
-        
-        # Сообщение от пользователя
-        preview = message_text[:200] + "..." if len(message_text) > 200 else message_text
-        admin_text += f"💭 <b>Сообщение:</b>\n<i>'{preview}'</i>\n"        
-        admin_text += f"🔗 <b>Ответить:</b> http://127.0.0.1:8000/orders/{order.id}\n"
-        admin_text += f"💡 <b>Откройте заказ и нажмите 'Общение' для ответа</b>"
-        
-        # Отправляем уведомление админу
-        await bot.send_message(
-            chat_id=settings.admin_user_id,
-            text=admin_text,
-            parse_mode="HTML"
-        )
-        
-        print(f"✅ Админ уведомлен о сообщении от {user.telegram_id} по заказу #{order.id}")
-        
-        # Закрываем сессию бота
-        await bot.session.close()
-        
-    except Exception as e:
-        print(f"❌ Ошибка уведомления админа о сообщении пользователя: {e}")
+    # Формируем уведомление для админа
+    admin_text = f"💬 <b>НОВОЕ СООБЩЕНИЕ ОТ КЛИЕНТА</b>\n\n"
+    admin_text += f"📋 <b>Заказ #{order.id}</b>\n"
+    admin_text += f"👤 <b>Клиент:</b> {html.escape(user.full_name)}"
+    if user.username:
+        admin_text += f" (@{html.escape(user.username)})"
+    admin_text += f"\n📱 <b>Telegram ID:</b> {user.telegram_id}\n\n"
+    
+    admin_text += f"📝 <b>Тип работы:</b> {html.escape(order.work_type)}\n"
+    admin_text += f"📋 <b>Тема:</b> {html.escape(order.short_topic)}\n\n"
+    
+    # Сообщение от пользователя
+    preview = message_text[:200] + "..." if len(message_text) > 200 else message_text
+    admin_text += f"💭 <b>Сообщение:</b>\n<i>'{html.escape(preview)}'</i>\n"        
+    admin_text += f"🔗 <b>Ответить:</b> http://127.0.0.1:8000/orders/{order.id}\n"
+    admin_text += f"💡 <b>Откройте заказ и нажмите 'Общение' для ответа</b>"
+    
+    short_preview = message_text[:60] + "..." if len(message_text) > 60 else message_text
+    
+    # Сообщения по одному заказу объединяются в дайджест
+    await admin_digest.notify(
+        admin_text,
+        key=f"order:{order.id}",
+        summary=f"💬 {html.escape(user.full_name)}: <i>{html.escape(short_preview)}</i>",
+        title=f"Заказ #{order.id}",
+        link=f"http://127.0.0.1:8000/orders/{order.id}"
+    )
 
 
-@router.message(F.text == "💬 Написать администратору")
+@router.message(ButtonText("💬 Написать администратору"))
 async def write_to_admin_button(message: Message):
     """Обработчик кнопки 'Написать администратору'"""
     
@@ -198,7 +195,7 @@ async def write_to_admin_button(message: Message):
 
 # === ОБРАБОТЧИКИ ФАЙЛОВ ===
 
-@router.message(F.photo)
+@router.message(F.photo, flags={"throttling_key": "user_file"})
 async def handle_user_photo(message: Message, state: FSMContext):
     """
     Обработчик фотографий от пользователя
@@ -231,52 +228,58 @@ async def handle_user_photo(message: Message, state: FSMContext):
         if payment_orders:
             # Есть заказ, ожидающий оплаты - это скорее всего скриншот оплаты
             order = payment_orders[0]  # Берем первый
-              # Сохраняем фото
+            # Сохраняем фото
             from app.bot.utils.file_handler import save_photo
-            from aiogram import Bot
-            
-            bot = Bot(token=settings.bot_token)
-            
-            try:
-                # Получаем файл наибольшего размера
-                photo = message.photo[-1]
-                
-                file_path, original_filename = await save_photo(photo, order.id, bot)
-                  # Сохраняем в базу как файл заказа
-                file_record = order_service.add_file_to_order(
-                    order.id,
-                    original_filename or f"screenshot_{photo.file_id}.jpg",
-                    file_path,
-                    photo.file_size
-                )
-                
-                # Обрабатываем как скриншот оплаты
-                from app.services.payment_service import PaymentService
-                payment_service = PaymentService(db)
-                
-                caption = message.caption if message.caption else "Скриншот оплаты"
-                payment_service.process_payment_screenshot(
-                    order.id, 
-                    file_record.id, 
-                    caption
-                )
-                
-                # Отправляем подтверждение пользователю
+
+            # Получаем файл наибольшего размера
+            photo = message.photo[-1]
+            content, filename = await save_photo(photo, order.id, message.bot)
+
+            # Тот же скриншот уже приложен к платежу на проверке или подтвержденному
+            from app.services.payment_service import PaymentService
+            payment_service = PaymentService(db)
+
+            duplicate = payment_service.find_payment_by_screenshot(order.id, content.sha256)
+            if duplicate:
                 await message.answer(
-                    f"✅ <b>Скриншот оплаты получен!</b>\n\n"
-                    f"📋 <b>Заказ #{order.id}</b>\n"
-                    f"📝 <b>Тема:</b> {order.short_topic}\n\n"
-                    f"⏳ Ваш платеж будет проверен в течение 1-2 часов.\n"
-                    f"После подтверждения оплаты мы отправим готовую работу.",
-                    parse_mode="HTML",
+                    f"ℹ️ Этот скриншот уже получен по заказу #{order.id}: "
+                    f"{'оплата подтверждена' if duplicate.is_verified else 'платеж на проверке'}.",
                     reply_markup=get_main_menu()
                 )
-                
-                # Уведомляем админа о скриншоте оплаты
-                await notify_admin_about_payment_screenshot(order, user, caption)
-                
-            finally:
-                await bot.session.close()
+                return
+
+            # Сохраняем в базу как файл заказа
+            file_record = order_service.add_file_to_order(
+                order.id,
+                filename,
+                content.path,
+                content.size,
+                content=content
+            )
+
+            # Обрабатываем как скриншот оплаты
+
+            caption = message.caption if message.caption else "Скриншот оплаты"
+            payment_service.process_payment_screenshot(
+                order.id,
+                file_record.id,
+                caption
+            )
+
+            # Отправляем подтверждение пользователю
+            await message.answer(
+                f"✅ <b>Скриншот оплаты получен!</b>\n\n"
+                f"📋 <b>Заказ #{order.id}</b>\n"
+                f"📝 <b>Тема:</b> {order.short_topic}\n\n"
+                f"⏳ Ваш платеж будет проверен в течение 1-2 часов.\n"
+                f"После подтверждения оплаты мы отправим готовую работу.",
+                parse_mode="HTML",
+                reply_markup=get_main_menu()
+            )
+
+            # Уведомляем админа о скриншоте оплаты
+            await notify_admin_about_payment_screenshot(order, user, caption)
+
         else:            # Нет заказов в ожидании оплаты - обрабатываем как обычный файл
             active_orders = order_service.get_user_orders_by_status(
                 user.id,  # Используем ID пользователя из БД, а не telegram_id
@@ -284,46 +287,50 @@ async def handle_user_photo(message: Message, state: FSMContext):
             )
             
             if active_orders:
-                order = active_orders[0]                # Сохраняем фото как обычный файл
+                order = active_orders[0]
+
+                # Сохраняем фото как обычный файл
                 from app.bot.utils.file_handler import save_photo
-                from aiogram import Bot
-                
-                bot = Bot(token=settings.bot_token)
-                
-                try:
-                    photo = message.photo[-1]
-                    file_path, original_filename = await save_photo(photo, order.id, bot)
-                    
-                    file_record = order_service.add_file_to_order(
-                        order.id,
-                        original_filename or f"photo_{photo.file_id}.jpg",
-                        file_path,
-                        photo.file_size
-                    )
-                    
-                    # Сохраняем сообщение
-                    caption = message.caption if message.caption else "Фотография"
-                    await communication_service.save_user_message(
-                        order.id, 
-                        f"📸 Отправил фотографию: {caption}",
-                        message.message_id
-                    )
-                    
+                from app.services.storage_service import StorageService
+
+                photo = message.photo[-1]
+                content, filename = await save_photo(photo, order.id, message.bot)
+
+                if StorageService(db).find_order_file_by_hash(order.id, content.sha256):
                     await message.answer(
-                        f"✅ <b>Фотография получена!</b>\n\n"
-                        f"📋 <b>Заказ #{order.id}</b>\n"
-                        f"📝 <b>Тема:</b> {order.short_topic}\n\n"
-                        f"📄 <b>Файл:</b> {file_record.filename}",
-                        parse_mode="HTML",
+                        f"ℹ️ Эта фотография уже прикреплена к заказу #{order.id}.",
                         reply_markup=get_main_menu()
                     )
-                    
-                    # Уведомляем админа
-                    await notify_admin_about_user_file(order, user, file_record)
-                    
-                finally:
-                    await bot.session.close()
-            
+                    return
+
+                file_record = order_service.add_file_to_order(
+                    order.id,
+                    filename,
+                    content.path,
+                    content.size,
+                    content=content
+                )
+
+                # Сохраняем сообщение
+                caption = message.caption if message.caption else "Фотография"
+                await communication_service.save_user_message(
+                    order.id,
+                    f"📸 Отправил фотографию: {caption}",
+                    message.message_id
+                )
+
+                await message.answer(
+                    f"✅ <b>Фотография получена!</b>\n\n"
+                    f"📋 <b>Заказ #{order.id}</b>\n"
+                    f"📝 <b>Тема:</b> {order.short_topic}\n\n"
+                    f"📄 <b>Файл:</b> {file_record.filename}",
+                    parse_mode="HTML",
+                    reply_markup=get_main_menu()
+                )
+
+                # Уведомляем админа
+                await notify_admin_about_user_file(order, user, file_record)
+
             else:
                 await message.answer(
                     "❌ У вас нет активных заказов.\n\n"
@@ -332,7 +339,7 @@ async def handle_user_photo(message: Message, state: FSMContext):
                 )
                 
     except Exception as e:
-        print(f"❌ Ошибка обработки фотографии: {e}")
+        logger.error(f"Ошибка обработки фотографии: {e}")
         await message.answer(
             "❌ Произошла ошибка при обработке фотографии. Попробуйте еще раз.",
             reply_markup=get_main_menu()
@@ -341,7 +348,7 @@ async def handle_user_photo(message: Message, state: FSMContext):
         db.close()
 
 
-@router.message(F.document)
+@router.message(F.document, flags={"throttling_key": "user_file"})
 async def handle_user_document(message: Message, state: FSMContext):
     """
     Обработчик документов от пользователя
@@ -377,44 +384,49 @@ async def handle_user_document(message: Message, state: FSMContext):
             
             # Сохраняем документ
             from app.bot.utils.file_handler import save_file
-            from aiogram import Bot
-            
-            bot = Bot(token=settings.bot_token)
-            
-            try:
-                document = message.document
-                file_path, original_filename = await save_file(document, order.id, bot)
-                
-                file_record = order_service.add_file_to_order(
-                    order.id,
-                    original_filename or document.file_name,
-                    file_path,
-                    document.file_size
-                )
-                
-                # Сохраняем сообщение
-                caption = message.caption if message.caption else f"Документ: {document.file_name}"
-                await communication_service.save_user_message(
-                    order.id, 
-                    f"📎 Отправил документ: {caption}",
-                    message.message_id
-                )
-                
+            from app.services.storage_service import StorageService
+
+            document = message.document
+            content, filename = await save_file(document, order.id, message.bot)
+
+            # Такой же файл уже прикреплен к заказу
+            duplicate = StorageService(db).find_order_file_by_hash(order.id, content.sha256)
+            if duplicate:
                 await message.answer(
-                    f"✅ <b>Документ получен!</b>\n\n"
-                    f"📋 <b>Заказ #{order.id}</b>\n"
-                    f"📝 <b>Тема:</b> {order.short_topic}\n\n"
-                    f"📄 <b>Файл:</b> {file_record.filename}",
-                    parse_mode="HTML",
+                    f"ℹ️ Этот файл уже прикреплен к заказу #{order.id} "
+                    f"как «{duplicate.filename}».",
                     reply_markup=get_main_menu()
                 )
-                
-                # Уведомляем админа
-                await notify_admin_about_user_file(order, user, file_record)
-                
-            finally:
-                await bot.session.close()
-        
+                return
+
+            file_record = order_service.add_file_to_order(
+                order.id,
+                filename,
+                content.path,
+                content.size,
+                content=content
+            )
+
+            # Сохраняем сообщение
+            caption = message.caption if message.caption else f"Документ: {filename}"
+            await communication_service.save_user_message(
+                order.id,
+                f"📎 Отправил документ: {caption}",
+                message.message_id
+            )
+
+            await message.answer(
+                f"✅ <b>Документ получен!</b>\n\n"
+                f"📋 <b>Заказ #{order.id}</b>\n"
+                f"📝 <b>Тема:</b> {order.short_topic}\n\n"
+                f"📄 <b>Файл:</b> {file_record.filename}",
+                parse_mode="HTML",
+                reply_markup=get_main_menu()
+            )
+
+            # Уведомляем админа
+            await notify_admin_about_user_file(order, user, file_record)
+
         else:
             await message.answer(
                 "❌ У вас нет активных заказов.\n\n"
@@ -423,7 +435,7 @@ async def handle_user_document(message: Message, state: FSMContext):
             )
                 
     except Exception as e:
-        print(f"❌ Ошибка обработки документа: {e}")
+        logger.error(f"Ошибка обработки документа: {e}")
         await message.answer(
             "❌ Произошла ошибка при обработке файла. Попробуйте еще раз.",
             reply_markup=get_main_menu()
@@ -436,59 +448,36 @@ async def notify_admin_about_payment_screenshot(order, user, message_text: str):
     """
     Отправить уведомление админу о получении скриншота оплаты
     """
-    try:
-        from aiogram import Bot
-        
-        bot = Bot(token=settings.bot_token)
-        
-        admin_text = f"💰 <b>ПОЛУЧЕН СКРИНШОТ ОПЛАТЫ!</b>\n\n"
-        admin_text += f"👤 <b>Пользователь:</b> {user.full_name}\n"
-        admin_text += f"📱 <b>Telegram:</b> @{user.username or 'без username'}\n\n"
-        admin_text += f"📋 <b>Заказ #{order.id}</b>\n"
-        admin_text += f"📝 <b>{order.work_type}:</b> {order.short_topic}\n"
-        admin_text += f"💵 <b>Сумма:</b> {order.price:,.2f} ₽\n\n"
-        if message_text and message_text != "Скриншот оплаты":
-            admin_text += f"💭 <b>Сообщение:</b> {message_text}\n\n"
-        admin_text += f"🔗 <b>Проверить платеж:</b> http://127.0.0.1:8000/orders/{order.id}"
-        
-        await bot.send_message(
-            chat_id=settings.admin_user_id,
-            text=admin_text,
-            parse_mode="HTML"
-        )
-        
-        await bot.session.close()
-        print(f"✅ Админ уведомлен о скриншоте оплаты для заказа #{order.id}")
-        
-    except Exception as e:
-        print(f"❌ Ошибка уведомления админа о скриншоте: {e}")
+    admin_text = f"💰 <b>ПОЛУЧЕН СКРИНШОТ ОПЛАТЫ!</b>\n\n"
+    admin_text += f"👤 <b>Пользователь:</b> {html.escape(user.full_name)}\n"
+    admin_text += f"📱 <b>Telegram:</b> @{html.escape(user.username or 'без username')}\n\n"
+    admin_text += f"📋 <b>Заказ #{order.id}</b>\n"
+    admin_text += f"📝 <b>{html.escape(order.work_type)}:</b> {html.escape(order.short_topic)}\n"
+    admin_text += f"💵 <b>Сумма:</b> {order.price:,.2f} ₽\n\n"
+    if message_text and message_text != "Скриншот оплаты":
+        admin_text += f"💭 <b>Сообщение:</b> {html.escape(message_text)}\n\n"
+    admin_text += f"🔗 <b>Проверить платеж:</b> http://127.0.0.1:8000/orders/{order.id}"
+    
+    # Оплата - срочное событие, отправляем сразу
+    await admin_digest.notify(admin_text, urgent=True)
 
 
 async def notify_admin_about_user_file(order, user, file_record):
     """Уведомить администратора о получении файла от пользователя"""
-    try:
-        from aiogram import Bot
-        
-        bot = Bot(token=settings.bot_token)
-        
-        admin_text = f"📎 <b>НОВЫЙ ФАЙЛ ОТ ПОЛЬЗОВАТЕЛЯ</b>\n\n"
-        admin_text += f"👤 <b>Пользователь:</b> {user.full_name}\n"
-        admin_text += f"📱 <b>Telegram:</b> @{user.username or 'без username'}\n\n"
-        admin_text += f"📋 <b>Заказ #{order.id}</b>\n"
-        admin_text += f"📝 <b>{order.work_type}:</b> {order.short_topic}\n\n"
-        admin_text += f"📄 <b>Файл:</b> {file_record.filename}\n"
-        if file_record.file_size:
-            admin_text += f"📊 <b>Размер:</b> {file_record.size_mb} МБ\n"
-        admin_text += f"🔗 <b>Посмотреть:</b> http://127.0.0.1:8000/orders/{order.id}"
-        
-        await bot.send_message(
-            chat_id=settings.admin_user_id,
-            text=admin_text,
-            parse_mode="HTML"
-        )
-        
-        await bot.session.close()
-        print(f"✅ Админ уведомлен о новом файле для заказа #{order.id}")
-        
-    except Exception as e:
-        print(f"❌ Ошибка уведомления админа о файле: {e}")
\ No newline at end of file
+    admin_text = f"📎 <b>НОВЫЙ ФАЙЛ ОТ ПОЛЬЗОВАТЕЛЯ</b>\n\n"
+    admin_text += f"👤 <b>Пользователь:</b> {html.escape(user.full_name)}\n"
+    admin_text += f"📱 <b>Telegram:</b> @{html.escape(user.username or 'без username')}\n\n"
+    admin_text += f"📋 <b>Заказ #{order.id}</b>\n"
+    admin_text += f"📝 <b>{html.escape(order.work_type)}:</b> {html.escape(order.short_topic)}\n\n"
+    admin_text += f"📄 <b>Файл:</b> {html.escape(file_record.filename)}\n"
+    if file_record.file_size:
+        admin_text += f"📊 <b>Размер:</b> {file_record.size_mb} МБ\n"
+    admin_text += f"🔗 <b>Посмотреть:</b> http://127.0.0.1:8000/orders/{order.id}"
+    
+    await admin_digest.notify(
+        admin_text,
+        key=f"order:{order.id}",
+        summary=f"📎 Файл: {html.escape(file_record.filename)}",
+        title=f"Заказ #{order.id}",
+        link=f"http://127.0.0.1:8000/orders/{order.id}"
+    )
@@ -1,21 +1,24 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
+from app.bot.keyboards.callbacks import BackToOrders, CurrentPage, OrderDetails, OrdersPage
 from app.bot.keyboards.client import get_main_menu
 from app.bot.keyboards.inline import (
     get_orders_pagination_keyboard, get_order_details_keyboard, 
     get_order_action_keyboard
 )
+from app.bot.utils.callback_data import use_prefix_dispatch
 from app.bot.utils.text_formatter import format_order_list, format_order_info
+from app.bot.utils.message_dispatch import ButtonText, use_fast_path
 from app.services.user_service import UserService
 from app.services.order_service import OrderService
 from app.database.connection import get_db_async
 
-router = Router()
+router = use_fast_path(use_prefix_dispatch(Router(name="user_orders")))
 
 
-@router.message(F.text == "📋 Мои заказы")
+@router.message(ButtonText("📋 Мои заказы"))
 async def my_orders(message: Message, state: FSMContext):
     """Показать заказы пользователя"""
     await state.clear()
@@ -67,21 +70,19 @@ async def my_orders(message: Message, state: FSMContext):
     )
 
 
-@router.callback_query(F.data.startswith("orders_page:"))
-async def orders_pagination(callback: CallbackQuery):
+@router.callback_query(OrdersPage.filter())
+async def orders_pagination(callback: CallbackQuery, callback_data: OrdersPage):
     """Обработка пагинации заказов"""
-    _, page_str, user_id_str = callback.data.split(":")
-    page = int(page_str)
+    page, user_id = callback_data.page, callback_data.user_id
     
     db = await get_db_async()
     order_service = OrderService(db)
     
-    if user_id_str == "all":
+    if user_id is None:
         # Админ смотрит все заказы
         result = order_service.get_orders_by_status(page=page, per_page=5)
     else:
         # Пользователь смотрит свои заказы
-        user_id = int(user_id_str)
         result = order_service.get_user_orders(user_id, page=page, per_page=5)
     
     db.close()
@@ -97,7 +98,7 @@ async def orders_pagination(callback: CallbackQuery):
         keyboard = get_orders_pagination_keyboard(
             result['page'], 
             result['total_pages'],
-            int(user_id_str) if user_id_str != "all" else None
+            user_id
         )
     
     await callback.message.edit_text(
@@ -108,10 +109,10 @@ async def orders_pagination(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("order_details:"))
-async def order_details(callback: CallbackQuery):
+@router.callback_query(OrderDetails.filter())
+async def order_details(callback: CallbackQuery, callback_data: OrderDetails):
     """Показать детальную информацию о заказе"""
-    order_id = int(callback.data.split(":")[1])
+    order_id = callback_data.order_id
     
     db = await get_db_async()
     order_service = OrderService(db)
@@ -161,7 +162,7 @@ async def order_details(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "back_to_orders")
+@router.callback_query(BackToOrders.filter())
 async def back_to_orders(callback: CallbackQuery):
     """Вернуться к списку заказов"""
     # Определяем, это админ или пользователь
@@ -197,7 +198,7 @@ async def back_to_orders(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "current_page")
+@router.callback_query(CurrentPage.filter())
 async def current_page_callback(callback: CallbackQuery):
     """Заглушка для кнопки текущей страницы"""
     await callback.answer("Вы находитесь на этой странице")
@@ -0,0 +1,127 @@
+"""
+Схемы callback_data кнопок бота (см. bot/utils/callback_data.py)
+
+Префиксы - короткие и неизменные: по ним находятся обработчики, в том числе
+для кнопок в давно отправленных сообщениях. При изменении полей схемы
+повышается version; legacy - префикс старого текстового формата.
+Перечисления кодируются номером значения: новые статусы добавляются
+в конец OrderStatus, иначе нужна новая version схем со статусом.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from app.bot.utils.callback_data import CallbackData
+from app.database.models import OrderStatus
+
+
+# --- Клиент ---
+
+@dataclass(frozen=True)
+class AcceptPrice(CallbackData, prefix="ap", legacy="accept_price"):
+    order_id: int
+
+
+@dataclass(frozen=True)
+class DeclinePrice(CallbackData, prefix="dp", legacy="decline_price"):
+    order_id: int
+
+
+@dataclass(frozen=True)
+class ViewOrder(CallbackData, prefix="vo", legacy="view_order"):
+    order_id: int
+
+
+# --- Списки заказов ---
+
+@dataclass(frozen=True)
+class OrdersPage(CallbackData, prefix="op", legacy="orders_page"):
+    page: int
+    user_id: Optional[int] = None   # None - заказы всех пользователей (админ)
+
+
+@dataclass(frozen=True)
+class OrderDetails(CallbackData, prefix="od", legacy="order_details"):
+    order_id: int
+
+
+@dataclass(frozen=True)
+class BackToOrders(CallbackData, prefix="bo", legacy="back_to_orders"):
+    pass
+
+
+@dataclass(frozen=True)
+class CurrentPage(CallbackData, prefix="cp", legacy="current_page"):
+    pass
+
+
+# --- Админ: заказы ---
+
+@dataclass(frozen=True)
+class AdminOrders(CallbackData, prefix="ao", legacy="admin_orders"):
+    status: Optional[OrderStatus] = None   # None - все заказы
+
+
+@dataclass(frozen=True)
+class SetPrice(CallbackData, prefix="sp", legacy="set_price"):
+    order_id: int
+
+
+@dataclass(frozen=True)
+class ChangeStatus(CallbackData, prefix="cs", legacy="change_status"):
+    order_id: int
+
+
+@dataclass(frozen=True)
+class SetStatus(CallbackData, prefix="st", legacy="status"):
+    order_id: int
+    status: OrderStatus
+
+
+@dataclass(frozen=True)
+class BulkPick(CallbackData, prefix="bp", legacy="bulk_pick"):
+    from_status: OrderStatus
+
+
+@dataclass(frozen=True)
+class BulkTo(CallbackData, prefix="bt", legacy="bulk_to"):
+    from_status: OrderStatus
+    to_status: OrderStatus
+
+
+@dataclass(frozen=True)
+class BulkApply(CallbackData, prefix="ba", legacy="bulk_apply"):
+    from_status: OrderStatus
+    to_status: OrderStatus
+
+
+@dataclass(frozen=True)
+class SendFile(CallbackData, prefix="sf", legacy="send_file"):
+    order_id: int
+
+
+# --- Админ: статистика и рассылки ---
+
+@dataclass(frozen=True)
+class AdminStats(CallbackData, prefix="as", legacy="admin_stats"):
+    pass
+
+
+@dataclass(frozen=True)
+class AdminBroadcast(CallbackData, prefix="ab", legacy="admin_broadcast"):
+    pass
+
+
+@dataclass(frozen=True)
+class BroadcastWorkTypes(CallbackData, prefix="bw", legacy="bc_seg_types"):
+    pass
+
+
+@dataclass(frozen=True)
+class BroadcastSegment(CallbackData, prefix="bs", legacy="bc_seg"):
+    kind: str
+    value: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class BroadcastCancel(CallbackData, prefix="bc", legacy="broadcast_cancel"):
+    broadcast_id: int
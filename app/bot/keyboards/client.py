@@ -4,7 +4,11 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMar
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 from typing import List
 
+from app.bot.keyboards.callbacks import AcceptPrice, DeclinePrice, ViewOrder
+from app.bot.keyboards.registry import cached_keyboard, static_keyboard
 
+
+@static_keyboard
 def get_main_menu() -> ReplyKeyboardMarkup:
     """Главное меню клиента с кнопкой общения"""
     builder = ReplyKeyboardBuilder()
@@ -19,6 +23,7 @@ def get_main_menu() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@static_keyboard
 def get_work_types() -> ReplyKeyboardMarkup:
     """Клавиатура выбора типа работы"""
     builder = ReplyKeyboardBuilder()
@@ -41,6 +46,7 @@ def get_work_types() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@static_keyboard
 def get_cancel_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура отмены"""
     builder = ReplyKeyboardBuilder()
@@ -48,6 +54,7 @@ def get_cancel_keyboard() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@static_keyboard
 def get_skip_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура пропуска (для необязательных полей)"""
     builder = ReplyKeyboardBuilder()
@@ -59,6 +66,7 @@ def get_skip_keyboard() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@static_keyboard
 def get_files_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура для загрузки файлов"""
     builder = ReplyKeyboardBuilder()
@@ -70,6 +78,7 @@ def get_files_keyboard() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@static_keyboard
 def get_confirm_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура подтверждения заказа"""
     builder = ReplyKeyboardBuilder()
@@ -82,6 +91,7 @@ def get_confirm_keyboard() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@static_keyboard
 def get_contact_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура для отправки контакта"""
     builder = ReplyKeyboardBuilder()
@@ -91,30 +101,32 @@ def get_contact_keyboard() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@cached_keyboard
 def get_price_response_keyboard(order_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для ответа на предложенную цену"""
     builder = InlineKeyboardBuilder()
     builder.add(
         InlineKeyboardButton(
             text="✅ Принять цену",
-            callback_data=f"accept_price:{order_id}"
+            callback_data=AcceptPrice(order_id).pack()
         ),
         InlineKeyboardButton(
             text="❌ Отклонить",
-            callback_data=f"decline_price:{order_id}"
+            callback_data=DeclinePrice(order_id).pack()
         )
     )
     builder.adjust(1)
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_order_status_keyboard(order_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для просмотра статуса заказа"""
     builder = InlineKeyboardBuilder()
     builder.add(
         InlineKeyboardButton(
             text="📋 Посмотреть заказ",
-            callback_data=f"view_order:{order_id}"
+            callback_data=ViewOrder(order_id).pack()
         ),
         InlineKeyboardButton(
             text="💬 Написать администратору",
@@ -125,6 +137,7 @@ def get_order_status_keyboard(order_id: int) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_communication_keyboard(order_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для общения по конкретному заказу"""
     builder = InlineKeyboardBuilder()
@@ -135,7 +148,7 @@ def get_communication_keyboard(order_id: int) -> InlineKeyboardMarkup:
         ),
         InlineKeyboardButton(
             text="📋 Показать заказ",
-            callback_data=f"view_order:{order_id}"
+            callback_data=ViewOrder(order_id).pack()
         )
     )
     builder.adjust(1)
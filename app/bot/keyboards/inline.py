@@ -1,9 +1,18 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from app.database.models import OrderStatus, get_status_emoji, get_status_text
+from app.database.models.enums import ORDER_TRANSITIONS
+from app.bot.keyboards.callbacks import (
+    AdminBroadcast, AdminOrders, AdminStats, BackToOrders, BroadcastCancel, BroadcastSegment,
+    BroadcastWorkTypes, BulkApply, BulkPick, BulkTo, ChangeStatus, CurrentPage, OrderDetails,
+    OrdersPage, SendFile, SetPrice, SetStatus
+)
+from app.bot.keyboards.registry import cached_keyboard, static_keyboard
+from app.bot.utils.callback_data import CallbackDataError
 from typing import List
 
 
+@cached_keyboard
 def get_order_details_keyboard(order_id: int, is_admin: bool = False) -> InlineKeyboardMarkup:
     """Клавиатура для детального просмотра заказа"""
     builder = InlineKeyboardBuilder()
@@ -11,26 +20,27 @@ def get_order_details_keyboard(order_id: int, is_admin: bool = False) -> InlineK
     if is_admin:
         builder.add(InlineKeyboardButton(
             text="💰 Установить цену", 
-            callback_data=f"set_price:{order_id}"
+            callback_data=SetPrice(order_id).pack()
         ))
         builder.add(InlineKeyboardButton(
             text="🔄 Изменить статус", 
-            callback_data=f"change_status:{order_id}"
+            callback_data=ChangeStatus(order_id).pack()
         ))
         builder.add(InlineKeyboardButton(
             text="📎 Отправить файл", 
-            callback_data=f"send_file:{order_id}"
+            callback_data=SendFile(order_id).pack()
         ))
         builder.adjust(1)
     
     builder.add(InlineKeyboardButton(
         text="🔙 Назад к списку", 
-        callback_data="back_to_orders"
+        callback_data=BackToOrders().pack()
     ))
     
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_orders_pagination_keyboard(page: int, total_pages: int, user_id: int = None) -> InlineKeyboardMarkup:
     """Клавиатура пагинации заказов"""
     builder = InlineKeyboardBuilder()
@@ -40,18 +50,18 @@ def get_orders_pagination_keyboard(page: int, total_pages: int, user_id: int = N
     if page > 1:
         nav_buttons.append(InlineKeyboardButton(
             text="◀️ Назад", 
-            callback_data=f"orders_page:{page-1}:{user_id or 'all'}"
+            callback_data=OrdersPage(page - 1, user_id).pack()
         ))
     
     nav_buttons.append(InlineKeyboardButton(
         text=f"{page}/{total_pages}",
-        callback_data="current_page"
+        callback_data=CurrentPage().pack()
     ))
     
     if page < total_pages:
         nav_buttons.append(InlineKeyboardButton(
             text="Вперед ▶️", 
-            callback_data=f"orders_page:{page+1}:{user_id or 'all'}"
+            callback_data=OrdersPage(page + 1, user_id).pack()
         ))
     
     if nav_buttons:
@@ -60,6 +70,7 @@ def get_orders_pagination_keyboard(page: int, total_pages: int, user_id: int = N
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_status_change_keyboard(order_id: int) -> InlineKeyboardMarkup:
     """Клавиатура изменения статуса заказа"""
     builder = InlineKeyboardBuilder()
@@ -76,40 +87,121 @@ def get_status_change_keyboard(order_id: int) -> InlineKeyboardMarkup:
     for status, text in statuses:
         builder.add(InlineKeyboardButton(
             text=text,
-            callback_data=f"status:{order_id}:{status.value}"
+            callback_data=SetStatus(order_id, status).pack()
         ))
     
     builder.add(InlineKeyboardButton(
         text="🔙 Назад",
-        callback_data=f"order_details:{order_id}"
+        callback_data=OrderDetails(order_id).pack()
     ))
     
     builder.adjust(2)
     return builder.as_markup()
 
 
+@cached_keyboard
+def get_bulk_status_keyboard(from_status: OrderStatus) -> InlineKeyboardMarkup:
+    """Клавиатура выбора статуса для массовой смены (только допустимые переходы)"""
+    builder = InlineKeyboardBuilder()
+    
+    for status in OrderStatus:
+        if status in ORDER_TRANSITIONS.get(from_status, ()):
+            builder.add(InlineKeyboardButton(
+                text=f"{get_status_emoji(status)} {get_status_text(status)}",
+                callback_data=BulkTo(from_status, status).pack()
+            ))
+    
+    builder.add(InlineKeyboardButton(
+        text="🔙 Назад",
+        callback_data=AdminOrders(from_status).pack()
+    ))
+    
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+@cached_keyboard
+def get_bulk_confirm_keyboard(from_status: OrderStatus, to_status: OrderStatus) -> InlineKeyboardMarkup:
+    """Подтверждение массовой смены статуса"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.add(InlineKeyboardButton(
+        text="✅ Подтвердить",
+        callback_data=BulkApply(from_status, to_status).pack()
+    ))
+    builder.add(InlineKeyboardButton(
+        text="❌ Отмена",
+        callback_data=BulkPick(from_status).pack()
+    ))
+    
+    return builder.as_markup()
+
+
+@static_keyboard
 def get_admin_main_keyboard() -> InlineKeyboardMarkup:
     """Главная клавиатура админа"""
     builder = InlineKeyboardBuilder()
     
-    builder.add(InlineKeyboardButton(text="📋 Все заказы", callback_data="admin_orders:all"))
-    builder.add(InlineKeyboardButton(text="🆕 Новые заказы", callback_data="admin_orders:new"))
-    builder.add(InlineKeyboardButton(text="⏳ В работе", callback_data="admin_orders:in_progress"))
-    builder.add(InlineKeyboardButton(text="✅ Готовые", callback_data="admin_orders:ready"))
-    builder.add(InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats"))
-    builder.add(InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast"))
+    builder.add(InlineKeyboardButton(text="📋 Все заказы", callback_data=AdminOrders().pack()))
+    builder.add(InlineKeyboardButton(text="🆕 Новые заказы", callback_data=AdminOrders(OrderStatus.NEW).pack()))
+    builder.add(InlineKeyboardButton(text="⏳ В работе", callback_data=AdminOrders(OrderStatus.IN_PROGRESS).pack()))
+    builder.add(InlineKeyboardButton(text="✅ Готовые", callback_data=AdminOrders(OrderStatus.READY).pack()))
+    builder.add(InlineKeyboardButton(text="📊 Статистика", callback_data=AdminStats().pack()))
+    builder.add(InlineKeyboardButton(text="📢 Рассылка", callback_data=AdminBroadcast().pack()))
     
     builder.adjust(2)
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_order_action_keyboard(order_id: int) -> InlineKeyboardMarkup:
     """Клавиатура действий с заказом для клиента"""
     builder = InlineKeyboardBuilder()
     
     builder.add(InlineKeyboardButton(
         text="👁️ Подробнее",
-        callback_data=f"order_details:{order_id}"
+        callback_data=OrderDetails(order_id).pack()
     ))
     
     return builder.as_markup()
+
+
+@static_keyboard
+def get_broadcast_segment_keyboard() -> InlineKeyboardMarkup:
+    """Выбор аудитории рассылки"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.add(InlineKeyboardButton(text="👥 Все пользователи", callback_data=BroadcastSegment("all").pack()))
+    builder.add(InlineKeyboardButton(text="⏳ С заказами в работе", callback_data=BroadcastSegment("active_orders").pack()))
+    builder.add(InlineKeyboardButton(text="📝 По типу работы", callback_data=BroadcastWorkTypes().pack()))
+    builder.add(InlineKeyboardButton(text="🟢 Активные за 30 дней", callback_data=BroadcastSegment("active", "30").pack()))
+    builder.add(InlineKeyboardButton(text="💤 Неактивные 90+ дней", callback_data=BroadcastSegment("inactive", "90").pack()))
+    
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def get_broadcast_work_types_keyboard(work_types: List[str]) -> InlineKeyboardMarkup:
+    """Выбор типа работы для сегмента рассылки"""
+    builder = InlineKeyboardBuilder()
+    
+    for work_type in work_types:
+        try:
+            callback_data = BroadcastSegment("work_type", work_type).pack()
+        except CallbackDataError:
+            # Не влезает в лимит callback_data в Telegram (64 байта)
+            continue
+        builder.add(InlineKeyboardButton(text=work_type, callback_data=callback_data))
+    
+    builder.add(InlineKeyboardButton(text="🔙 Назад", callback_data=AdminBroadcast().pack()))
+    
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+@cached_keyboard
+def get_broadcast_cancel_keyboard(broadcast_id: int) -> InlineKeyboardMarkup:
+    """Остановка идущей рассылки"""
+    builder = InlineKeyboardBuilder()
+    builder.add(InlineKeyboardButton(text="⏹ Остановить", callback_data=BroadcastCancel(broadcast_id).pack()))
+    return builder.as_markup()
@@ -0,0 +1,107 @@
+"""
+Реестр готовых клавиатур
+
+Клавиатуры aiogram - неизменяемые pydantic-модели, поэтому один экземпляр
+можно отдавать во все ответы:
+    - @static_keyboard - клавиатура без параметров строится один раз;
+      при первой отправке ее JSON запоминается, и KeyboardSession
+      подставляет готовую строку в запрос вместо повторной сериализации;
+    - @cached_keyboard - клавиатуры с параметрами (ID заказа, страница)
+      кэшируются в LRU ограниченного размера (settings.keyboard_cache_size).
+
+Замер: python -m benchmarks.bench_keyboards
+"""
+import functools
+from typing import Any, Callable, Dict, TypeVar
+
+from aiohttp import FormData
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+from app.config import settings
+from app.services.metrics import register_collector
+
+Markup = TypeVar("Markup", InlineKeyboardMarkup, ReplyKeyboardMarkup)
+
+# id(клавиатуры) -> JSON; статические клавиатуры живут до конца процесса,
+# так что id не переиспользуется
+_serialized: Dict[int, str] = {}
+_static_ids: set = set()
+_cached: Dict[str, Callable] = {}
+
+
+def static_keyboard(factory: Callable[[], Markup]) -> Callable[[], Markup]:
+    """Клавиатура без параметров: строится при первом вызове, дальше тот же объект"""
+    @functools.wraps(factory)
+    def wrapper() -> Markup:
+        markup = wrapper.markup
+        if markup is None:
+            markup = wrapper.markup = factory()
+            _static_ids.add(id(markup))
+        return markup
+
+    wrapper.markup = None
+    return wrapper
+
+
+def cached_keyboard(factory: Callable[..., Markup]) -> Callable[..., Markup]:
+    """Клавиатура с параметрами: последние settings.keyboard_cache_size вариантов в LRU"""
+    cached = functools.lru_cache(maxsize=settings.keyboard_cache_size)(factory)
+    _cached[factory.__qualname__] = cached
+    return cached
+
+
+def keyboard_cache_info() -> Dict[str, Any]:
+    """Статистика LRU по каждой параметризованной клавиатуре"""
+    return {name: cached.cache_info() for name, cached in _cached.items()}
+
+
+@register_collector
+def _collect_cache_metrics():
+    info = keyboard_cache_info()
+    yield ("cache_hits_total", "counter", "Попадания в кэши",
+           [({"cache": f"keyboard.{name}"}, stats.hits) for name, stats in info.items()])
+    yield ("cache_misses_total", "counter", "Промахи кэшей",
+           [({"cache": f"keyboard.{name}"}, stats.misses) for name, stats in info.items()])
+
+
+def clear_keyboard_caches() -> None:
+    """Сбросить LRU (например, после смены текстов кнопок)"""
+    for cached in _cached.values():
+        cached.cache_clear()
+
+
+class KeyboardSession(AiohttpSession):
+    """HTTP-сессия бота, отправляющая статические клавиатуры готовым JSON"""
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if settings.metrics_enabled:
+            from app.bot.middlewares.metrics import TelegramRequestMetrics
+            self.middleware(TelegramRequestMetrics())
+
+    def build_form_data(self, bot: Any, method: Any) -> FormData:
+        markup = getattr(method, "reply_markup", None)
+        if id(markup) not in _static_ids:
+            return super().build_form_data(bot, method)
+
+        # То же, что AiohttpSession.build_form_data, но reply_markup не сериализуется заново
+        form = FormData(quote_fields=False)
+        files: Dict[str, Any] = {}
+        for key, value in method.model_dump(warnings=False, exclude={"reply_markup"}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+        form.add_field("reply_markup", self._markup_json(markup, bot))
+        for key, value in files.items():
+            form.add_field(key, value.read(bot), filename=value.filename or key)
+        return form
+
+    def _markup_json(self, markup: Any, bot: Any) -> str:
+        prepared = _serialized.get(id(markup))
+        if prepared is None:
+            prepared = _serialized[id(markup)] = self.prepare_value(
+                markup.model_dump(warnings=False), bot=bot, files={}
+            )
+        return prepared
@@ -0,0 +1,81 @@
+"""
+Метрики бота: поток обновлений, время обработчиков, запросы к Bot API
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.services.metrics import (
+    bot_handler_errors, bot_handler_seconds, bot_updates, telegram_request_errors, telegram_request_seconds
+)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Счетчик обновлений по типу (outer-middleware на dp.update)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            bot_updates.labels(event.event_type).inc()
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Время обработчика по роутеру и имени функции
+
+    Inner-middleware: вызывается, когда обработчик уже выбран, поэтому
+    в data есть handler и event_router; время проверки фильтров сюда
+    не входит (его показывает DispatchProfiler).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        router = data.get("event_router")
+        labels = (
+            router.name if router is not None else "",
+            getattr(handler_object.callback, "__name__", "?") if handler_object is not None else "?",
+        )
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            bot_handler_errors.labels(*labels, type(e).__name__).inc()
+            raise
+        finally:
+            bot_handler_seconds.labels(*labels).observe(time.perf_counter() - started)
+
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """Время и ошибки запросов к Bot API по методу (middleware HTTP-сессии)"""
+
+    async def __call__(self, make_request: Any, bot: Any, method: Any) -> Any:
+        name = getattr(method, "__api_method__", type(method).__name__)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            telegram_request_errors.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            telegram_request_seconds.labels(name).observe(time.perf_counter() - started)
+
+
+def setup_bot_metrics(dp: Dispatcher) -> None:
+    """Подключить метрики обновлений и обработчиков к диспетчеру"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_metrics = HandlerMetricsMiddleware()
+    for observer in (dp.message, dp.callback_query, dp.edited_message, dp.my_chat_member):
+        observer.middleware(handler_metrics)
@@ -0,0 +1,28 @@
+"""
+Снятие отметки о недоступности, когда пользователь снова пишет боту
+"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.services.delivery_tracker import delivery_tracker
+
+
+class ReachabilityMiddleware(BaseMiddleware):
+    """
+    Пользователь, от которого пришло сообщение или нажатие кнопки, снова
+    доступен: убираем его из списка подавления отправок. Проверка - поиск
+    в множестве в памяти, к БД обращаемся только для отмеченных.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None and user.id in delivery_tracker:
+            await delivery_tracker.clear(user.id)
+        return await handler(event, data)
@@ -0,0 +1,147 @@
+"""
+Антифлуд: ограничение частоты запросов пользователя
+"""
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from app.config import settings
+
+# Лимиты по ключу обработчика (ключ задается флагом throttling_key): (запросов, окно в секундах)
+THROTTLE_LIMITS: Dict[str, Tuple[int, float]] = {
+    "new_order": (3, 60.0),       # 📝 Новый заказ
+    "order_file": (20, 60.0),     # Файлы при оформлении заказа
+    "user_message": (10, 60.0),   # Свободный текст администратору
+    "user_file": (10, 60.0),      # Фото и документы вне оформления заказа
+}
+
+# Ключ общего лимита на пользователя
+GLOBAL_KEY = "__global__"
+
+THROTTLED_TEXT = "⏳ Слишком много запросов. Подождите немного и попробуйте снова."
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты запросов по скользящему окну
+
+    Учитывает общий лимит на пользователя и отдельные лимиты обработчиков.
+    Лишние запросы отбрасываются до обработчика, так что не доходят до БД
+    и уведомлений админу. Пользователь получает одно предупреждение за окно,
+    остальные отброшенные запросы молча схлопываются в него.
+    """
+
+    # Как часто чистить опустевшие окна (в вызовах)
+    CLEANUP_EVERY = 1000
+
+    def __init__(
+        self,
+        rate: int,
+        period: float,
+        limits: Optional[Dict[str, Tuple[int, float]]] = None,
+        exempt_user_ids: Tuple[int, ...] = (),
+    ):
+        self.rate = rate
+        self.period = period
+        self.limits = dict(THROTTLE_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.exempt_user_ids = set(exempt_user_ids)
+
+        self._windows: Dict[Tuple[int, str], Deque[float]] = {}
+        self._warned_at: Dict[Tuple[int, str], float] = {}
+        self._calls = 0
+
+    @classmethod
+    def from_settings(cls) -> "ThrottlingMiddleware":
+        """Создать middleware по настройкам приложения"""
+        limits = {
+            key: (int(value[0]), float(value[1]))
+            for key, value in settings.throttle_limits.items()
+        }
+        return cls(
+            rate=settings.throttle_rate,
+            period=settings.throttle_period,
+            limits=limits,
+            exempt_user_ids=(settings.admin_user_id,),
+        )
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or user.id in self.exempt_user_ids:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        self._maybe_cleanup(now)
+
+        # Сначала проверяем лимит обработчика, затем общий: отброшенный
+        # запрос не должен расходовать общий бюджет пользователя
+        key = get_flag(data, "throttling_key")
+        checks = [(GLOBAL_KEY, self.rate, self.period)]
+        if key in self.limits:
+            rate, period = self.limits[key]
+            checks.insert(0, (key, rate, period))
+
+        for check_key, rate, period in checks:
+            if not self._has_room(user.id, check_key, rate, period, now):
+                await self._reject(event, user.id, check_key, period, now)
+                return None
+
+        for check_key, _, _ in checks:
+            self._windows[(user.id, check_key)].append(now)
+
+        return await handler(event, data)
+
+    def _has_room(self, user_id: int, key: str, rate: int, period: float, now: float) -> bool:
+        """Есть ли место в окне (заодно выбрасываем устаревшие отметки)"""
+        window = self._windows.get((user_id, key))
+        if window is None:
+            window = self._windows[(user_id, key)] = deque()
+
+        while window and now - window[0] >= period:
+            window.popleft()
+
+        return len(window) < rate
+
+    async def _reject(self, event: TelegramObject, user_id: int, key: str,
+                      period: float, now: float) -> None:
+        """Отбросить запрос; предупредить пользователя не чаще раза за окно"""
+        warned_at = self._warned_at.get((user_id, key))
+        if warned_at is not None and now - warned_at < period:
+            if isinstance(event, CallbackQuery):
+                # Без ответа у пользователя будет вечно крутиться индикатор
+                await event.answer()
+            return
+
+        self._warned_at[(user_id, key)] = now
+
+        if isinstance(event, CallbackQuery):
+            await event.answer(THROTTLED_TEXT, show_alert=False)
+        elif isinstance(event, Message):
+            await event.answer(THROTTLED_TEXT)
+
+    def _maybe_cleanup(self, now: float) -> None:
+        """Удалить пустые и устаревшие окна, чтобы словари не росли бесконечно"""
+        self._calls += 1
+        if self._calls % self.CLEANUP_EVERY:
+            return
+
+        max_period = max([self.period] + [period for _, period in self.limits.values()])
+
+        for window_key in list(self._windows):
+            window = self._windows[window_key]
+            if not window or now - window[-1] >= max_period:
+                del self._windows[window_key]
+
+        for warn_key in list(self._warned_at):
+            if now - self._warned_at[warn_key] >= max_period:
+                del self._warned_at[warn_key]
@@ -0,0 +1,415 @@
+"""
+Типизированные callback_data кнопок
+
+Каждый вид кнопки описывается схемой - frozen-dataclass, унаследованным от
+CallbackData с коротким префиксом:
+
+    @dataclass(frozen=True)
+    class SetStatus(CallbackData, prefix="st", legacy="status"):
+        order_id: int
+        status: OrderStatus
+
+    SetStatus(12, OrderStatus.READY).pack()   # "st:ARgC"
+
+Формат: "<префикс>:<base64url>", где в base64 - версия схемы и поля
+в двоичном виде (числа - varint, перечисления - номер значения, строки -
+длина + UTF-8). Несколько ID и курсоры укладываются в лимит Telegram
+в 64 байта; pack() проверяет лимит сразу, а не при отправке сообщения.
+
+Кнопки старого текстового формата ("status:12:ready") в уже отправленных
+сообщениях продолжают работать: схема с legacy-префиксом разбирает и их.
+
+Обработчики выбираются по префиксу словарем (use_prefix_dispatch), а не
+проверкой фильтров всех обработчиков роутера по очереди; callback_data
+разбирается один раз и передается в обработчик аргументом callback_data.
+"""
+import base64
+import dataclasses
+import enum
+import logging
+import typing
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple, Type, TypeVar
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram на callback_data, байт
+MAX_CALLBACK_DATA = 64
+
+# Значения Optional-полей в старом текстовом формате, означающие "нет значения"
+LEGACY_NONE = frozenset({"", "all", "None"})
+
+STALE_BUTTON_TEXT = "⚠️ Кнопка устарела, откройте меню заново"
+
+Schema = TypeVar("Schema", bound="CallbackData")
+
+
+class CallbackDataError(ValueError):
+    """callback_data не разбирается или не проходит проверку"""
+
+
+# --- Двоичное представление полей ---
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise CallbackDataError("обрезанные данные")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise CallbackDataError("слишком длинное число")
+
+
+@dataclasses.dataclass(frozen=True)
+class FieldCodec:
+    name: str
+    encode: Callable[[bytearray, Any], None]
+    decode: Callable[[bytes, int], Tuple[Any, int]]
+    parse_legacy: Callable[[str], Any]
+
+
+def _int_codec() -> Tuple[Callable, Callable, Callable]:
+    def encode(out: bytearray, value: int) -> None:
+        if type(value) is not int:
+            raise CallbackDataError(f"ожидалось целое, получено {value!r}")
+        _write_varint(out, value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+    def decode(buf: bytes, pos: int) -> Tuple[int, int]:
+        raw, pos = _read_varint(buf, pos)
+        return (raw >> 1) if not raw & 1 else -((raw + 1) >> 1), pos
+
+    return encode, decode, int
+
+
+def _bool_codec() -> Tuple[Callable, Callable, Callable]:
+    def encode(out: bytearray, value: bool) -> None:
+        out.append(1 if value else 0)
+
+    def decode(buf: bytes, pos: int) -> Tuple[bool, int]:
+        if pos >= len(buf):
+            raise CallbackDataError("обрезанные данные")
+        return buf[pos] == 1, pos + 1
+
+    return encode, decode, lambda text: text in ("1", "true", "True")
+
+
+def _str_codec() -> Tuple[Callable, Callable, Callable]:
+    def encode(out: bytearray, value: str) -> None:
+        raw = value.encode()
+        _write_varint(out, len(raw))
+        out += raw
+
+    def decode(buf: bytes, pos: int) -> Tuple[str, int]:
+        length, pos = _read_varint(buf, pos)
+        if pos + length > len(buf):
+            raise CallbackDataError("обрезанные данные")
+        try:
+            return buf[pos:pos + length].decode(), pos + length
+        except UnicodeDecodeError:
+            raise CallbackDataError("некорректная строка")
+
+    return encode, decode, str
+
+
+def _enum_codec(enum_type: Type[enum.Enum]) -> Tuple[Callable, Callable, Callable]:
+    members = list(enum_type)
+    index = {member: position for position, member in enumerate(members)}
+
+    def encode(out: bytearray, value: enum.Enum) -> None:
+        if value not in index:
+            raise CallbackDataError(f"ожидалось значение {enum_type.__name__}, получено {value!r}")
+        _write_varint(out, index[value])
+
+    def decode(buf: bytes, pos: int) -> Tuple[enum.Enum, int]:
+        position, pos = _read_varint(buf, pos)
+        if position >= len(members):
+            raise CallbackDataError(f"неизвестное значение {enum_type.__name__}")
+        return members[position], pos
+
+    def parse_legacy(text: str) -> enum.Enum:
+        try:
+            return enum_type(text)
+        except ValueError:
+            raise CallbackDataError(f"неизвестное значение {enum_type.__name__}: {text}")
+
+    return encode, decode, parse_legacy
+
+
+def _optional_codec(inner: Tuple[Callable, Callable, Callable]) -> Tuple[Callable, Callable, Callable]:
+    inner_encode, inner_decode, inner_legacy = inner
+
+    def encode(out: bytearray, value: Any) -> None:
+        if value is None:
+            out.append(0)
+        else:
+            out.append(1)
+            inner_encode(out, value)
+
+    def decode(buf: bytes, pos: int) -> Tuple[Any, int]:
+        if pos >= len(buf):
+            raise CallbackDataError("обрезанные данные")
+        if buf[pos] == 0:
+            return None, pos + 1
+        return inner_decode(buf, pos + 1)
+
+    return encode, decode, lambda text: None if text in LEGACY_NONE else inner_legacy(text)
+
+
+def _sequence_codec(inner: Tuple[Callable, Callable, Callable]) -> Tuple[Callable, Callable, Callable]:
+    inner_encode, inner_decode, inner_legacy = inner
+
+    def encode(out: bytearray, values: Tuple[Any, ...]) -> None:
+        _write_varint(out, len(values))
+        for value in values:
+            inner_encode(out, value)
+
+    def decode(buf: bytes, pos: int) -> Tuple[Tuple[Any, ...], int]:
+        count, pos = _read_varint(buf, pos)
+        values = []
+        for _ in range(count):
+            value, pos = inner_decode(buf, pos)
+            values.append(value)
+        return tuple(values), pos
+
+    return encode, decode, lambda text: tuple(inner_legacy(item) for item in text.split(",") if item)
+
+
+def _codec_for(annotation: Any) -> Tuple[Callable, Callable, Callable]:
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin is typing.Union and len(args) == 2 and type(None) in args:
+        return _optional_codec(_codec_for(args[0] if args[1] is type(None) else args[1]))
+    if origin is tuple and len(args) == 2 and args[1] is Ellipsis:
+        return _sequence_codec(_codec_for(args[0]))
+    if annotation is bool:
+        return _bool_codec()
+    if annotation is int:
+        return _int_codec()
+    if annotation is str:
+        return _str_codec()
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return _enum_codec(annotation)
+    raise TypeError(f"Тип поля callback_data не поддерживается: {annotation!r}")
+
+
+# --- Схемы ---
+
+# Префикс (новый или старого формата) -> схема
+_schemas: Dict[str, Type["CallbackData"]] = {}
+
+
+class CallbackData:
+    """Базовый класс схем callback_data (наследники - frozen-dataclass)"""
+
+    prefix: ClassVar[str]
+    version: ClassVar[int]
+    legacy_prefix: ClassVar[Optional[str]]
+    _codecs: ClassVar[Optional[List[FieldCodec]]]
+
+    def __init_subclass__(cls, prefix: str, version: int = 1, legacy: Optional[str] = None, **kwargs: Any):
+        super().__init_subclass__(**kwargs)
+        if not prefix.isalnum():
+            raise ValueError(f"Префикс callback_data должен состоять из букв и цифр: {prefix!r}")
+        for key in filter(None, (prefix, legacy)):
+            if key in _schemas:
+                raise ValueError(f"Префикс callback_data {key!r} уже занят схемой {_schemas[key].__name__}")
+            _schemas[key] = cls
+        cls.prefix = prefix
+        cls.version = version
+        cls.legacy_prefix = legacy
+        cls._codecs = None
+
+    @classmethod
+    def keys(cls) -> Tuple[str, ...]:
+        """Префиксы, по которым находятся обработчики этой схемы"""
+        return (cls.prefix, cls.legacy_prefix) if cls.legacy_prefix else (cls.prefix,)
+
+    @classmethod
+    def codecs(cls) -> List[FieldCodec]:
+        if cls._codecs is None:
+            hints = typing.get_type_hints(cls)
+            cls._codecs = [
+                FieldCodec(item.name, *_codec_for(hints[item.name]))
+                for item in dataclasses.fields(cls)
+            ]
+        return cls._codecs
+
+    def pack(self) -> str:
+        """callback_data для кнопки"""
+        out = bytearray()
+        _write_varint(out, self.version)
+        for codec in self.codecs():
+            codec.encode(out, getattr(self, codec.name))
+        data = f"{self.prefix}:{base64.urlsafe_b64encode(bytes(out)).rstrip(b'=').decode()}"
+        if len(data) > MAX_CALLBACK_DATA:
+            raise CallbackDataError(f"callback_data длиннее {MAX_CALLBACK_DATA} байт: {data}")
+        return data
+
+    @classmethod
+    def unpack(cls: Type[Schema], data: str) -> Schema:
+        """Разобрать callback_data этой схемы (новый или старый формат)"""
+        prefix, _, payload = data.partition(":")
+        if prefix == cls.prefix:
+            return cls._decode(payload)
+        if prefix == cls.legacy_prefix:
+            return cls._parse_legacy(payload)
+        raise CallbackDataError(f"callback_data {data!r} не относится к {cls.__name__}")
+
+    @classmethod
+    def _decode(cls: Type[Schema], payload: str) -> Schema:
+        try:
+            buf = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        except (ValueError, TypeError):
+            raise CallbackDataError("некорректный base64")
+
+        version, pos = _read_varint(buf, 0)
+        if version != cls.version:
+            raise CallbackDataError(f"{cls.__name__}: версия {version}, ожидалась {cls.version}")
+
+        values = {}
+        for codec in cls.codecs():
+            values[codec.name], pos = codec.decode(buf, pos)
+        if pos != len(buf):
+            raise CallbackDataError("лишние данные")
+        return cls(**values)
+
+    @classmethod
+    def _parse_legacy(cls: Type[Schema], payload: str) -> Schema:
+        codecs = cls.codecs()
+        # Последнее поле забирает остаток: в старых строках оно могло содержать ":";
+        # недостающие последние поля берутся по умолчанию
+        parts = payload.split(":", len(codecs) - 1) if codecs and payload else []
+        if len(parts) > len(codecs):
+            raise CallbackDataError(f"{cls.__name__}: ожидалось полей {len(codecs)}, получено {len(parts)}")
+        try:
+            return cls(**{codec.name: codec.parse_legacy(part) for codec, part in zip(codecs, parts)})
+        except (TypeError, ValueError) as e:
+            raise CallbackDataError(f"{cls.__name__}: {e}")
+
+    @classmethod
+    def filter(cls, rule: Optional[Callable[[Any], bool]] = None) -> "CallbackFilter":
+        """Фильтр aiogram: кнопка этой схемы (и, если задано, rule(callback_data))"""
+        return CallbackFilter(cls, rule)
+
+
+def parse_callback(data: Optional[str]) -> Optional[CallbackData]:
+    """
+    Разобрать callback_data любой зарегистрированной схемы
+
+    Returns:
+        Экземпляр схемы или None, если префикс не зарегистрирован
+
+    Raises:
+        CallbackDataError: Префикс известен, но данные не разбираются
+    """
+    if not data:
+        return None
+    schema = _schemas.get(data.partition(":")[0])
+    if schema is None:
+        return None
+    return schema.unpack(data)
+
+
+class CallbackFilter(Filter):
+    """Кнопка заданной схемы; разобранные данные - в аргумент callback_data"""
+
+    def __init__(self, schema: Type[CallbackData], rule: Optional[Callable[[Any], bool]] = None):
+        self.schema = schema
+        self.rule = rule
+
+    async def __call__(self, query: CallbackQuery, **kwargs: Any) -> Any:
+        parsed = kwargs.get("callback_data")
+        if not isinstance(parsed, self.schema):
+            # Роутер без диспетчеризации по префиксу - разбираем сами
+            try:
+                parsed = self.schema.unpack(query.data or "")
+            except CallbackDataError:
+                return False
+        if self.rule is not None and not self.rule(parsed):
+            return False
+        return {"callback_data": parsed}
+
+
+class PrefixDispatchObserver(TelegramEventObserver):
+    """
+    Наблюдатель callback_query, выбирающий обработчики по префиксу
+
+    Для каждого префикса заранее собран список обработчиков: со схемой
+    этого префикса и без схемы (обычные фильтры), в порядке регистрации -
+    как при обычном переборе, но без проверки фильтров чужих кнопок.
+    """
+
+    def __init__(self, router: Router, event_name: str = "callback_query"):
+        super().__init__(router=router, event_name=event_name)
+        self._generic: List[HandlerObject] = []
+        self._by_prefix: Dict[str, List[HandlerObject]] = {}
+
+    def register(self, callback: Any, *filters: Any, flags: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+        super().register(callback, *filters, flags=flags, **kwargs)
+        handler = self.handlers[-1]
+
+        keys = [key for item in filters if isinstance(item, CallbackFilter) for key in item.schema.keys()]
+        if keys:
+            for key in keys:
+                self._by_prefix.setdefault(key, list(self._generic)).append(handler)
+        else:
+            self._generic.append(handler)
+            for handlers in self._by_prefix.values():
+                handlers.append(handler)
+        return callback
+
+    async def trigger(self, event: CallbackQuery, **kwargs: Any) -> Any:
+        data = event.data or ""
+        handlers = self._by_prefix.get(data.partition(":")[0])
+        if handlers is None:
+            handlers = self._generic
+        elif not isinstance(kwargs.get("callback_data"), CallbackData):
+            try:
+                kwargs["callback_data"] = parse_callback(data)
+            except CallbackDataError as e:
+                logger.warning(f"Некорректная callback_data {data!r}: {e}")
+                await event.answer(STALE_BUTTON_TEXT)
+                return None
+
+        # Дальше - как в TelegramEventObserver.trigger, только по отобранным обработчикам
+        for handler in handlers:
+            kwargs["handler"] = handler
+            result, data_update = await handler.check(event, **kwargs)
+            if result:
+                kwargs.update(data_update)
+                try:
+                    wrapped_inner = self.outer_middleware.wrap_middlewares(
+                        self._resolve_middlewares(),
+                        handler.call,
+                    )
+                    return await wrapped_inner(event, kwargs)
+                except SkipHandler:
+                    continue
+
+        return UNHANDLED
+
+
+def use_prefix_dispatch(router: Router) -> Router:
+    """Включить выбор обработчиков callback по префиксу (до регистрации обработчиков)"""
+    if router.callback_query.handlers:
+        raise RuntimeError("use_prefix_dispatch нужно вызывать до регистрации обработчиков")
+    observer = PrefixDispatchObserver(router=router)
+    router.callback_query = router.observers["callback_query"] = observer
+    return router
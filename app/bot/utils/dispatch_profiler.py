@@ -0,0 +1,167 @@
+"""
+Профилировщик выбора обработчиков
+
+Включается настройкой DISPATCH_PROFILING=true. После регистрации
+обработчиков install(dp) оборачивает:
+    - каждый фильтр каждого обработчика - число проверок, сколько прошло,
+      суммарное время проверки;
+    - trigger каждого наблюдателя роутера - сколько событий дошло до роутера,
+      сколько он обработал, время вместе с выполнением обработчика.
+
+Отчет: команда админа /dispatch_stats (или dispatch_profiler.report()).
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.event.handler import FilterObject, HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.filters import Filter
+from aiogram.fsm.state import State
+
+logger = logging.getLogger(__name__)
+
+# Наблюдатели, которые не выбирают обработчики событий пользователей
+_SKIPPED_OBSERVERS = {"update", "error"}
+
+
+@dataclass
+class Stat:
+    calls: int = 0
+    passed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.passed / self.calls if self.calls else 0.0
+
+
+def _describe_magic(magic: Any) -> str:
+    parts = ["F"]
+    for operation in getattr(magic, "_operations", ()):
+        name = type(operation).__name__
+        if name == "GetAttributeOperation":
+            parts.append(f".{operation.name}")
+        elif name == "ComparatorOperation":
+            parts.append(f" {getattr(operation.comparator, '__name__', '?')} {operation.right!r}")
+        elif name == "FunctionOperation":
+            parts.append(f".{getattr(operation.function, '__name__', 'func')}()")
+        else:
+            parts.append(f" <{name.replace('Operation', '').lower()}>")
+    return "".join(parts)
+
+
+def describe_filter(filter_object: FilterObject) -> str:
+    if filter_object.magic is not None:
+        return _describe_magic(filter_object.magic)
+    callback = filter_object.callback
+    if isinstance(callback, (Filter, State)):
+        return str(callback)
+    return getattr(callback, "__name__", type(callback).__name__)
+
+
+def describe_handler(handler: HandlerObject) -> str:
+    callback = handler.callback
+    return getattr(callback, "__qualname__", None) or getattr(callback, "__name__", repr(callback))
+
+
+class DispatchProfiler:
+    """Счетчики проверок фильтров и обработки событий по роутерам"""
+
+    def __init__(self):
+        self.installed = False
+        # (роутер, событие, обработчик, фильтр) -> Stat
+        self.filters: Dict[Tuple[str, str, str, str], Stat] = {}
+        # (роутер, событие) -> Stat (passed - событие обработано роутером)
+        self.routers: Dict[Tuple[str, str], Stat] = {}
+
+    def install(self, router: Router) -> None:
+        """Обернуть фильтры и наблюдателей роутера и всех вложенных (после регистрации обработчиков)"""
+        for item in self._walk(router):
+            for event_name, observer in item.observers.items():
+                if event_name in _SKIPPED_OBSERVERS or not observer.handlers:
+                    continue
+                self._wrap_observer(item.name, event_name, observer)
+        self.installed = True
+        logger.info(f"Профилирование диспетчеризации включено: фильтров {len(self.filters)}")
+
+    def reset(self) -> None:
+        for stat in (*self.filters.values(), *self.routers.values()):
+            stat.calls = stat.passed = 0
+            stat.seconds = 0.0
+
+    def report(self, limit: int = 15) -> str:
+        """Текстовый отчет: роутеры по порядку, самые дорогие фильтры"""
+        lines = ["Роутеры (событий / обработано / время с обработчиками, мс / фильтры, мс):"]
+        filter_seconds: Dict[Tuple[str, str], float] = {}
+        for (router, event_name, _, _), stat in self.filters.items():
+            filter_seconds[(router, event_name)] = filter_seconds.get((router, event_name), 0.0) + stat.seconds
+        for (router, event_name), stat in self.routers.items():
+            if stat.calls:
+                lines.append(
+                    f"  {router}.{event_name}: {stat.calls} / {stat.rate:.0%} / "
+                    f"{stat.seconds * 1000:.1f} / {filter_seconds.get((router, event_name), 0.0) * 1000:.1f}"
+                )
+
+        lines.append("Фильтры (проверок / прошло / всего мс / мкс на проверку):")
+        ranked = sorted(
+            ((key, stat) for key, stat in self.filters.items() if stat.calls),
+            key=lambda item: item[1].seconds, reverse=True,
+        )
+        for (router, event_name, handler, filter_name), stat in ranked[:limit]:
+            lines.append(
+                f"  {router}.{event_name} {handler} [{filter_name}]: {stat.calls} / {stat.rate:.0%} / "
+                f"{stat.seconds * 1000:.1f} / {stat.seconds / stat.calls * 1e6:.1f}"
+            )
+        return "\n".join(lines)
+
+    @staticmethod
+    def _walk(router: Router) -> List[Router]:
+        routers = [router]
+        for sub_router in router.sub_routers:
+            routers.extend(DispatchProfiler._walk(sub_router))
+        return routers
+
+    def _wrap_observer(self, router_name: str, event_name: str, observer: TelegramEventObserver) -> None:
+        for handler in observer.handlers:
+            handler_name = describe_handler(handler)
+            for filter_object in handler.filters or ():
+                key = (router_name, event_name, handler_name, describe_filter(filter_object))
+                stat = self.filters.setdefault(key, Stat())
+                filter_object.call = self._timed_filter(filter_object.call, stat)
+
+        stat = self.routers.setdefault((router_name, event_name), Stat())
+        observer.trigger = self._timed_trigger(observer.trigger, stat)
+
+    @staticmethod
+    def _timed_filter(call: Any, stat: Stat) -> Any:
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            result = await call(*args, **kwargs)
+            stat.seconds += time.perf_counter() - started
+            stat.calls += 1
+            if result:
+                stat.passed += 1
+            return result
+        return timed
+
+    @staticmethod
+    def _timed_trigger(trigger: Any, stat: Stat) -> Any:
+        async def timed(event: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                result = await trigger(event, **kwargs)
+            finally:
+                stat.seconds += time.perf_counter() - started
+                stat.calls += 1
+            if result is not UNHANDLED:
+                stat.passed += 1
+            return result
+        return timed
+
+
+# Общий профилировщик процесса
+dispatch_profiler = DispatchProfiler()
@@ -1,12 +1,122 @@
-import os
+import asyncio
+import logging
 import uuid
 from pathlib import Path
+from typing import Optional
+
 from aiogram.types import File as TelegramFile, Document, PhotoSize
 from aiogram import Bot
 from app.config import settings
+from app.database.connection import get_db_session
+from app.services.storage_service import StorageService
+from app.storage.backends import storage_exists
+from app.storage.blob_store import StoredContent, store_stream, store_local_file
+from app.storage.thumbnails import schedule_thumbnail
+
+logger = logging.getLogger(__name__)
+
+
+# Расширения по mime_type для файлов без имени
+MIME_EXTENSIONS = {
+    'application/pdf': '.pdf',
+    'application/msword': '.doc',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
+    'text/plain': '.txt',
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'application/zip': '.zip',
+    'application/x-rar-compressed': '.rar'
+}
+
+
+def resolve_document_filename(document: Document) -> str:
+    """Имя файла документа; если его нет - генерируем по mime_type"""
+    original_filename = document.file_name
+    
+    if not original_filename or original_filename.strip() == "":
+        file_extension = MIME_EXTENSIONS.get(document.mime_type, '.bin') if document.mime_type else ".bin"
+        original_filename = f"file_{uuid.uuid4().hex[:8]}{file_extension}"
+    
+    return original_filename
+
+
+async def download_to_storage(bot: Bot, file_id: str) -> StoredContent:
+    """
+    Скачать файл Telegram в хранилище потоково, блоками
+    
+    Содержимое хэшируется на лету и попадает на место по SHA-256 только
+    после полной загрузки; одинаковые файлы хранятся один раз.
+    
+    Returns:
+        StoredContent: Хэш, размер и путь содержимого
+    """
+    telegram_file: TelegramFile = await bot.get_file(file_id)
+    
+    if bot.session.api.is_local:
+        # Локальный Bot API сервер: файл уже лежит на диске сервера
+        local_path = bot.session.api.wrap_local_file.to_local(telegram_file.file_path)
+        return await store_local_file(str(local_path))
+    
+    url = bot.session.api.file_url(bot.token, telegram_file.file_path)
+    return await store_stream(bot.session.stream_content(
+        url=url,
+        timeout=settings.file_download_timeout,
+        chunk_size=settings.file_chunk_size,
+        raise_for_status=True,
+    ))
+
+
+def find_known_content(file_unique_id: str) -> Optional[StoredContent]:
+    """
+    Найти уже сохраненное содержимое по file_unique_id Telegram
+    
+    file_unique_id одинаков у одного и того же файла для всех пользователей,
+    поэтому повторно присланный файл не нужно скачивать.
+    """
+    db = get_db_session()
+    try:
+        blob = StorageService(db).get_blob_by_telegram_unique_id(file_unique_id)
+        if not blob or not storage_exists(blob.storage_path):
+            return None
+        return StoredContent(sha256=blob.sha256, size=blob.size, path=blob.storage_path)
+    finally:
+        db.close()
 
 
-async def save_photo(photo: PhotoSize, order_id: int, bot: Bot) -> tuple[str, str]:
+async def save_telegram_file(bot: Bot, file_id: str, filename: str,
+                             file_unique_id: Optional[str] = None,
+                             file_type: str = "document") -> StoredContent:
+    """
+    Сохранить файл Telegram в хранилище
+    
+    Args:
+        bot: Экземпляр бота для скачивания
+        file_id: file_id файла в Telegram
+        filename: Имя файла (для журнала)
+        file_unique_id: file_unique_id файла (для пропуска повторной загрузки)
+        file_type: Тип файла в Telegram: document или photo
+        
+    Returns:
+        StoredContent: Хэш, размер и путь содержимого с данными Telegram
+    """
+    content = await asyncio.to_thread(find_known_content, file_unique_id) if file_unique_id else None
+    
+    if content:
+        logger.debug("Файл уже есть в хранилище: %s", filename)
+    else:
+        content = await download_to_storage(bot, file_id)
+        logger.debug("Файл сохранен: %s (%s, %s байт)", filename, content.path, content.size)
+    
+    # Превью для админ-панели строится в фоне
+    schedule_thumbnail(content.path, filename)
+    
+    content.telegram_file_id = file_id
+    content.telegram_file_unique_id = file_unique_id
+    content.telegram_file_type = file_type
+    return content
+
+
+async def save_photo(photo: PhotoSize, order_id: int, bot: Bot) -> tuple[StoredContent, str]:
     """
     Сохранить фотографию от пользователя
     
@@ -16,46 +126,22 @@ async def save_photo(photo: PhotoSize, order_id: int, bot: Bot) -> tuple[str, st
         bot: Экземпляр бота для скачивания
         
     Returns:
-        tuple: (путь к сохраненному файлу, оригинальное имя файла)
+        tuple: (содержимое в хранилище, имя файла)
     """
+    original_filename = f"photo_{photo.file_id[:8]}.jpg"
+    
     try:
-        # Создаем папку для заказа если её нет
-        order_dir = Path(settings.upload_path) / str(order_id)
-        order_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Генерируем имя файла для фото
-        original_filename = f"photo_{photo.file_id[:8]}.jpg"
-        
-        # Путь к файлу
-        file_path = order_dir / original_filename
-        
-        # Если файл с таким именем уже существует, добавляем номер
-        counter = 1
-        base_name = Path(original_filename).stem
-        extension = Path(original_filename).suffix
-        
-        while file_path.exists():
-            new_filename = f"{base_name}_{counter}{extension}"
-            file_path = order_dir / new_filename
-            original_filename = new_filename
-            counter += 1
-        
-        # Получаем файл от Telegram и скачиваем его
-        telegram_file = await bot.get_file(photo.file_id)
-        await bot.download_file(telegram_file.file_path, file_path)
-        
-        print(f"✅ Фото сохранено: {original_filename}")
-        print(f"   Путь: {file_path}")
-        print(f"   Размер: {photo.file_size} байт")
-        
-        return str(file_path), original_filename
-        
+        content = await save_telegram_file(
+            bot, photo.file_id, original_filename,
+            file_unique_id=photo.file_unique_id, file_type="photo"
+        )
+        return content, original_filename
     except Exception as e:
-        print(f"❌ Ошибка сохранения фото: {e}")
+        logger.error(f"Ошибка сохранения фото для заказа #{order_id}: {e}")
         raise
 
 
-async def save_file(document: Document, order_id: int, bot: Bot) -> tuple[str, str]:
+async def save_file(document: Document, order_id: int, bot: Bot) -> tuple[StoredContent, str]:
     """
     Сохранить файл от пользователя
     
@@ -65,64 +151,18 @@ async def save_file(document: Document, order_id: int, bot: Bot) -> tuple[str, s
         bot: Экземпляр бота для скачивания
         
     Returns:
-        tuple: (оригинальное имя файла, путь к сохраненному файлу)
+        tuple: (содержимое в хранилище, оригинальное имя файла)
     """
+    original_filename = resolve_document_filename(document)
+    
     try:
-        # Создаем папку для заказа если её нет
-        order_dir = Path(settings.upload_path) / str(order_id)
-        order_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 🔥 ИСПРАВЛЕНО: Получаем оригинальное имя файла из Document
-        original_filename = document.file_name
-        
-        # Если имя файла пустое или None, генерируем его
-        if not original_filename or original_filename.strip() == "":
-            # Пытаемся определить расширение по mime_type
-            file_extension = ".bin"
-            if document.mime_type:
-                mime_extensions = {
-                    'application/pdf': '.pdf',
-                    'application/msword': '.doc',
-                    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
-                    'text/plain': '.txt',
-                    'image/jpeg': '.jpg',
-                    'image/png': '.png',
-                    'application/zip': '.zip',
-                    'application/x-rar-compressed': '.rar'
-                }
-                file_extension = mime_extensions.get(document.mime_type, '.bin')
-            
-            original_filename = f"file_{uuid.uuid4().hex[:8]}{file_extension}"
-        
-        # 🔥 ИСПРАВЛЕНО: Сохраняем файл с ОРИГИНАЛЬНЫМ именем (без префиксов)
-        # Но чтобы избежать конфликтов, сохраняем в папке заказа
-        file_path = order_dir / original_filename
-        
-        # Если файл с таким именем уже существует, добавляем номер
-        counter = 1
-        base_name = Path(original_filename).stem
-        extension = Path(original_filename).suffix
-        
-        while file_path.exists():
-            new_filename = f"{base_name}_{counter}{extension}"
-            file_path = order_dir / new_filename
-            counter += 1
-        
-        # Получаем файл от Telegram и скачиваем его
-        telegram_file = await bot.get_file(document.file_id)
-        await bot.download_file(telegram_file.file_path, file_path)
-        
-        # Возвращаем имя сохраненного файла и путь
-        final_filename = file_path.name
-        
-        print(f"✅ Файл сохранен: {original_filename} -> {final_filename}")
-        print(f"   Путь: {file_path}")
-        print(f"   Размер: {document.file_size} байт")
-        
-        return str(file_path), final_filename
-        
+        content = await save_telegram_file(
+            bot, document.file_id, original_filename,
+            file_unique_id=document.file_unique_id
+        )
+        return content, original_filename
     except Exception as e:
-        print(f"❌ Ошибка сохранения файла {original_filename}: {e}")
+        logger.error(f"Ошибка сохранения файла {original_filename} для заказа #{order_id}: {e}")
         raise
 
 
@@ -0,0 +1,116 @@
+"""
+Фоновая загрузка файлов заказа из Telegram
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Set
+
+from aiogram import Bot
+
+from app.bot.utils.file_handler import save_telegram_file, resolve_document_filename
+from app.config import settings
+from app.database.connection import get_db_session
+from app.services.order_service import OrderService
+
+logger = logging.getLogger(__name__)
+
+# Ссылки на запущенные задачи, чтобы их не собрал сборщик мусора
+_background_tasks: Set[asyncio.Task] = set()
+
+IngestCallback = Callable[[int, List[dict]], Awaitable[None]]
+
+
+async def _ingest_one(bot: Bot, order_id: int, file_info: dict,
+                      semaphore: asyncio.Semaphore) -> Optional[dict]:
+    """Скачать один файл и сразу записать его в БД"""
+    document = file_info['document']
+
+    if file_info.get('is_photo'):
+        filename = file_info['filename']
+    else:
+        filename = resolve_document_filename(document)
+
+    async with semaphore:
+        content = await save_telegram_file(
+            bot, document.file_id, filename,
+            file_unique_id=document.file_unique_id,
+            file_type="photo" if file_info.get('is_photo') else "document"
+        )
+
+    file_type = filename.split('.')[-1].lower() if '.' in filename else None
+
+    # Короткая сессия на каждый файл: строка появляется, как только файл скачан
+    db = get_db_session()
+    try:
+        OrderService(db).add_file_to_order(
+            order_id=order_id,
+            filename=filename,
+            file_path=content.path,
+            file_size=content.size,
+            file_type=file_type,
+            content=content
+        )
+    finally:
+        db.close()
+
+    return {
+        'original': file_info['filename'],
+        'saved': filename,
+        'path': content.path
+    }
+
+
+async def ingest_order_files(bot: Bot, order_id: int, files: List[dict]) -> List[dict]:
+    """
+    Параллельно скачать файлы заказа
+
+    Одновременно качается не больше settings.file_download_concurrency файлов.
+    Ошибка одного файла не прерывает загрузку остальных.
+
+    Args:
+        bot: Экземпляр бота
+        order_id: ID заказа
+        files: Файлы из данных FSM (ключи document, filename, is_photo)
+
+    Returns:
+        List[dict]: Информация о сохраненных файлах в исходном порядке
+    """
+    semaphore = asyncio.Semaphore(max(1, settings.file_download_concurrency))
+
+    results = await asyncio.gather(
+        *(_ingest_one(bot, order_id, file_info, semaphore) for file_info in files),
+        return_exceptions=True
+    )
+
+    saved = []
+    for file_info, result in zip(files, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Ошибка сохранения файла {file_info.get('filename', 'неизвестный')} "
+                         f"для заказа #{order_id}: {result}")
+            continue
+        saved.append(result)
+
+    return saved
+
+
+def schedule_order_ingestion(bot: Bot, order_id: int, files: List[dict],
+                             on_complete: Optional[IngestCallback] = None) -> asyncio.Task:
+    """
+    Запустить загрузку файлов заказа в фоне
+
+    Args:
+        bot: Экземпляр бота
+        order_id: ID заказа
+        files: Файлы из данных FSM
+        on_complete: Корутина (order_id, saved_files), вызываемая по окончании
+    """
+    async def run():
+        saved = await ingest_order_files(bot, order_id, files)
+        logger.info(f"Заказ #{order_id}: сохранено файлов {len(saved)} из {len(files)}")
+        if on_complete:
+            await on_complete(order_id, saved)
+
+    task = asyncio.create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
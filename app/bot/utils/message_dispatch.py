@@ -0,0 +1,158 @@
+"""
+Быстрый выбор обработчиков сообщений по тексту кнопки и состоянию FSM
+
+Обычный роутер aiogram проверяет фильтры всех обработчиков по очереди,
+поэтому свободный текст, который в итоге обработает user_messages,
+сначала проходит фильтры basic, orders, user_orders и admin.
+
+Роутер с use_fast_path заранее раскладывает обработчики по ключам:
+    - ButtonText("📋 Мои заказы") - точный текст кнопки;
+    - StateFilter(...) / State - состояние FSM.
+Для пары (состояние, текст) список обработчиков, которые вообще могут
+сработать, собирается один раз и дальше берется из словаря; фильтры
+отобранных обработчиков проверяются как обычно, в порядке регистрации.
+Обработчики без этих фильтров (команды, F.photo, общий F.text) попадают
+в список для любой пары.
+"""
+from inspect import isclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import FilterObject, HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.filters import Filter, StateFilter
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message
+
+# Ключ для состояний и текстов, на которые нет отдельных обработчиков
+_OTHER = object()
+
+# Ограничение по ключу: множество допустимых значений, None - любое
+Constraint = Optional[FrozenSet[Any]]
+
+
+class ButtonText(Filter):
+    """Текст сообщения совпадает с текстом одной из кнопок"""
+
+    __slots__ = ("texts",)
+
+    def __init__(self, *texts: str):
+        if not texts:
+            raise ValueError("Нужен хотя бы один текст кнопки")
+        self.texts = frozenset(texts)
+
+    def __str__(self) -> str:
+        return self._signature_to_string(*sorted(self.texts))
+
+    async def __call__(self, message: Message) -> bool:
+        return message.text in self.texts
+
+
+def _group_states(group: Any) -> FrozenSet[str]:
+    if not isclass(group):
+        group = type(group)
+    return frozenset(group.__all_states_names__)
+
+
+def _state_constraint(item: Any) -> Constraint:
+    """Состояния, в которых фильтр может пройти (None - в любом)"""
+    if isinstance(item, State):
+        return None if item.state == "*" else frozenset({item.state})
+    if not isinstance(item, StateFilter):
+        return None
+
+    states = set()
+    for allowed in item.states:
+        if allowed == "*":
+            return None
+        if allowed is None or isinstance(allowed, str):
+            states.add(allowed)
+        elif isinstance(allowed, State):
+            if allowed.state == "*":
+                return None
+            states.add(allowed.state)
+        elif isinstance(allowed, StatesGroup) or (isclass(allowed) and issubclass(allowed, StatesGroup)):
+            states |= _group_states(allowed)
+        else:
+            return None
+    return frozenset(states)
+
+
+def _handler_constraints(filters: List[FilterObject]) -> Tuple[Constraint, Constraint]:
+    states: Constraint = None
+    texts: Constraint = None
+    for filter_object in filters:
+        item = filter_object.callback
+        if isinstance(item, ButtonText):
+            texts = item.texts if texts is None else texts & item.texts
+        else:
+            constraint = _state_constraint(item)
+            if constraint is not None:
+                states = constraint if states is None else states & constraint
+    return states, texts
+
+
+class FastPathObserver(TelegramEventObserver):
+    """Наблюдатель сообщений с выбором обработчиков по (состоянию, тексту кнопки)"""
+
+    def __init__(self, router: Router, event_name: str = "message"):
+        super().__init__(router=router, event_name=event_name)
+        self._constraints: List[Tuple[HandlerObject, Constraint, Constraint]] = []
+        self._states: set = set()
+        self._texts: set = set()
+        self._candidates: Dict[Tuple[Any, Any], List[HandlerObject]] = {}
+
+    def register(self, callback: Any, *filters: Any, flags: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+        super().register(callback, *filters, flags=flags, **kwargs)
+        handler = self.handlers[-1]
+        states, texts = _handler_constraints(handler.filters or [])
+        self._constraints.append((handler, states, texts))
+        self._states |= states or set()
+        self._texts |= texts or set()
+        self._candidates.clear()
+        return callback
+
+    def candidates(self, raw_state: Optional[str], text: Optional[str]) -> List[HandlerObject]:
+        """Обработчики, которые могут сработать в этом состоянии на этот текст"""
+        key = (
+            raw_state if raw_state in self._states else _OTHER,
+            text if text in self._texts else _OTHER,
+        )
+        handlers = self._candidates.get(key)
+        if handlers is None:
+            state_key, text_key = key
+            handlers = self._candidates[key] = [
+                handler for handler, states, texts in self._constraints
+                if (states is None or state_key in states) and (texts is None or text_key in texts)
+            ]
+        return handlers
+
+    async def trigger(self, event: Message, **kwargs: Any) -> Any:
+        handlers = self.candidates(kwargs.get("raw_state"), getattr(event, "text", None))
+
+        # Дальше - как в TelegramEventObserver.trigger, только по отобранным обработчикам
+        for handler in handlers:
+            kwargs["handler"] = handler
+            result, data = await handler.check(event, **kwargs)
+            if result:
+                kwargs.update(data)
+                try:
+                    wrapped_inner = self.outer_middleware.wrap_middlewares(
+                        self._resolve_middlewares(),
+                        handler.call,
+                    )
+                    return await wrapped_inner(event, kwargs)
+                except SkipHandler:
+                    continue
+
+        return UNHANDLED
+
+
+def use_fast_path(router: Router) -> Router:
+    """Включить выбор обработчиков сообщений по ключам (до регистрации обработчиков)"""
+    if router.message.handlers:
+        raise RuntimeError("use_fast_path нужно вызывать до регистрации обработчиков")
+    observer = FastPathObserver(router=router)
+    router.message = router.observers["message"] = observer
+    return router
@@ -0,0 +1,149 @@
+"""
+Настройка логирования процессов бота и админ-панели
+
+Обработчики логгеров не пишут в поток сами: QueueHandler кладет запись
+в очередь (без блокировок и ввода-вывода), а запись в stderr и файл
+выполняет отдельный поток QueueListener. Цикл событий не ждет диска
+и терминала даже под нагрузкой.
+
+    - формат: JSON по строке на запись (LOG_FORMAT=json) или текст;
+    - уровни: LOG_LEVEL для всех и LOG_LEVELS для отдельных логгеров,
+      например {"aiogram": "WARNING", "app.services": "DEBUG"};
+    - из DEBUG-записей с одного места кода (логгер и строка) в очередь
+      попадает одна из LOG_DEBUG_SAMPLE_EVERY; поле sampled у нее -
+      сколько записей она представляет.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+from app.config.settings import settings
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Атрибуты LogRecord; остальные (extra=...) попадают в JSON как поля
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись в одну строку JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Оставлять одну из N DEBUG-записей с одного места кода"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen: Dict[Tuple[str, int], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.lineno)
+        seen = self._seen.get(key, 0)
+        self._seen[key] = seen + 1
+        if seen % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler, оставляющий структуру записи
+
+    Стандартный prepare форматирует запись целиком в msg; здесь в потоке
+    вызывающего только подставляются аргументы сообщения и
+    форматируется исключение (объекты из args могут измениться до записи
+    в файл), а формат строки выбирает обработчик в потоке записи.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _formatter() -> logging.Formatter:
+    if settings.log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def setup_logging(log_file: Optional[str] = None) -> None:
+    """
+    Направить все логи процесса в очередь с потоком записи
+
+    Повторный вызов ничего не меняет (процесс настраивается один раз).
+
+    Args:
+        log_file: Дополнительно писать в этот файл
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    formatter = _formatter()
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(settings.log_debug_sample_every))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    _queue_handler = queue_handler
+    root.setLevel(settings.log_level.upper())
+    for name, level in settings.log_levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Дописать очередь и остановить поток записи"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = _queue_handler = None
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, List
 
 
 class Settings(BaseSettings):
@@ -16,12 +16,77 @@ class Settings(BaseSettings):
     # Files
     upload_path: str = "./uploads/"
     max_file_size: int = 20971520  # 20 MB
+    max_upload_files: int = 10     # Файлов в одной загрузке из админ-панели
+    file_download_concurrency: int = 4   # Одновременных загрузок файлов из Telegram
+    file_chunk_size: int = 262144        # Размер блока при потоковой записи, байт
+    file_download_timeout: int = 300     # Таймаут загрузки одного файла, сек
+    thumbnail_size: int = 320            # Максимальная сторона превью изображений, px
+    thumbnail_quality: int = 70          # Качество WebP превью
+    thumbnail_workers: int = 2           # Процессов для построения превью
+    file_accel_redirect: Optional[str] = None  # internal location nginx для X-Accel-Redirect, например "/protected-uploads/"
+    
+    # Storage backend: local (диск, upload_path) или s3 (S3/MinIO)
+    storage_backend: str = "local"
+    s3_bucket: Optional[str] = None
+    s3_prefix: str = ""
+    s3_endpoint_url: Optional[str] = None   # Например http://localhost:9000 для MinIO
+    s3_region: Optional[str] = None
+    s3_access_key_id: Optional[str] = None
+    s3_secret_access_key: Optional[str] = None
+    s3_presigned_downloads: bool = True     # Отдавать файлы редиректом на presigned-ссылку
+    s3_presign_expires: int = 3600          # Срок жизни presigned-ссылки, сек
+    
+    # Сборка мусора хранилища (сироты, брошенные загрузки)
+    storage_gc_enabled: bool = True
+    storage_gc_interval: int = 21600        # Период обхода хранилища, сек
+    storage_gc_grace: int = 86400           # Сколько файл должен пробыть сиротой до удаления, сек
     
     # Admin Panel
     secret_key: str
     admin_host: str = "127.0.0.1"
     admin_port: int = 8000
     debug: bool = False
+
+    # Throttling (антифлуд)
+    throttle_enabled: bool = True
+    throttle_rate: int = 30          # Запросов от пользователя за окно (все обработчики)
+    throttle_period: float = 60.0    # Размер скользящего окна, сек
+    throttle_limits: Dict[str, List[float]] = {}  # Переопределение лимитов по ключу обработчика: {"new_order": [2, 60]}
+    dispatch_profiling: bool = False   # Счетчики времени фильтров и роутеров (отчет - /dispatch_stats)
+
+    # Логирование (см. config/logging_setup.py)
+    log_level: str = "INFO"
+    log_format: str = "json"                 # json или text
+    log_levels: Dict[str, str] = {"aiogram": "WARNING", "asyncio": "WARNING"}  # Уровни отдельных логгеров
+    log_debug_sample_every: int = 10         # Писать 1 из N DEBUG-записей с одного места кода (1 - все)
+    bot_log_file: Optional[str] = "bot_errors.log"  # Файл логов бота (пусто - только stderr)
+
+    # Метрики Prometheus (/metrics админ-панели и отдельный порт бота)
+    metrics_enabled: bool = True
+    metrics_token: Optional[str] = None      # "Authorization: Bearer <token>"; без токена /metrics админки - только после входа
+    bot_metrics_host: str = "127.0.0.1"
+    bot_metrics_port: int = 9101             # 0 - не поднимать сервер метрик в процессе бота
+
+    # Профилирование (см. services/profiling.py: /profile в боте, /debug/profile в админке)
+    profile_max_seconds: float = 60.0        # Максимальная длительность профиля
+    profile_sample_interval_ms: float = 5.0  # Интервал выборок стека
+    loop_block_threshold_ms: float = 200.0   # Писать в лог стек, если цикл событий занят дольше (0 - выключено)
+
+    # Уведомления админу
+    admin_digest_window: float = 20.0  # Окно объединения событий, сек (0 - отправлять сразу)
+    
+    # Уведомления пользователям
+    user_notify_rate: float = 25.0     # Сообщений в секунду (лимит Telegram ~30)
+    user_notify_workers: int = 4       # Одновременных отправок
+    
+    # Рассылки (частота ограничена общим лимитом user_notify_rate)
+    broadcast_workers: int = 8              # Одновременных отправок одной рассылки
+    broadcast_page_size: int = 500          # Получателей за один запрос к БД
+    broadcast_progress_interval: float = 5.0  # Период сохранения прогресса и обновления сообщения админу, сек
+    bot_locale: str = "ru"                  # Язык текстов бота по умолчанию (см. services/templates.py)
+    template_cache_size: int = 4096         # Фрагментов текстов по заказам в LRU
+    keyboard_cache_size: int = 1024         # Вариантов каждой клавиатуры с параметрами в LRU
+    delivery_suppression_refresh: float = 60.0  # Период перечитывания списка недоступных чатов из БД, сек
       # Payment
     tbank_api_key: Optional[str] = None
     
@@ -42,6 +107,18 @@ class Settings(BaseSettings):
 3️⃣ Мы проверим оплату и отправим готовую работу
 
 ❗️ Важно: в комментарии к переводу укажите номер заказа #{order_id}"""
+
+    # Сверка с банковской выпиской
+    bank_statement_utc_offset: float = 3.0   # Часовой пояс времени в выписке (МСК)
+    reconcile_window_days: int = 7           # Сколько дней после запроса оплаты ждем платеж
+    reconcile_auto_verify: bool = True       # Подтверждать платежи с совпадением номера заказа и суммы
+
+    # Сроки заказов и напоминания админу (SLA)
+    deadline_utc_offset: float = 3.0         # Часовой пояс клиентов для разбора срока (МСК)
+    sla_enabled: bool = True
+    sla_reminder_hours: List[float] = [24, 3, 0]  # За сколько часов до срока напоминать (0 - срок истек)
+    sla_horizon_hours: int = 48              # На сколько вперед загружаются сроки в очередь
+    sla_refill_interval: int = 60            # Период подгрузки новых заказов в очередь, сек
     
     class Config:
         env_file = ".env"
@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
 from app.config import settings
+from app.services.metrics import instrument_engine
 
 # Создание движка базы данных для SQLite (синхронный)
 # 🔥 ИСПРАВЛЕНО: Отключены SQL логи для чистоты консоли
@@ -13,6 +14,10 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in database_url else {}
 )
 
+# Время запросов для метрик
+if settings.metrics_enabled:
+    instrument_engine(engine)
+
 # Создание сессии
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -40,4 +45,33 @@ def get_db_session():
 def create_tables():
     """Создать все таблицы в базе данных"""
     from app.database.models import Base
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(Base.metadata)
+
+
+def add_missing_columns(metadata):
+    """
+    Добавить в существующие таблицы колонки и индексы, появившиеся в моделях
+    
+    create_all создает только отсутствующие таблицы, поэтому новые поля
+    моделей добавляем в уже созданную БД через ALTER TABLE.
+    Новые колонки должны допускать NULL или иметь server_default.
+    """
+    inspector = inspect(engine)
+    
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+            
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
\ No newline at end of file
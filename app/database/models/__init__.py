@@ -15,6 +15,9 @@ from .file import OrderFile
 from .status_history import StatusHistory
 from .message import OrderMessage
 from .payment import OrderPayment
+from .blob import StoredBlob
+from .storage_object import StorageObject
+from .broadcast import Broadcast
 
 def get_status_emoji(status: OrderStatus) -> str:
     """Получить эмодзи для статуса"""
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from . import Base
+
+
+class StoredBlob(Base):
+    """Содержимое файла в хранилище (адресация по SHA-256, один экземпляр на диске)"""
+    __tablename__ = "stored_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False, index=True)
+    size = Column(BigInteger, nullable=False)
+    storage_path = Column(String(500), nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)  # Сколько OrderFile ссылается на содержимое
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Кэш Telegram: содержимое уже лежит на серверах Telegram, повторно не загружаем
+    telegram_file_id = Column(String(255), nullable=True)
+    telegram_file_unique_id = Column(String(64), nullable=True, index=True)
+    telegram_file_type = Column(String(20), nullable=True)  # document, photo
+    
+    # Relationships
+    files = relationship("OrderFile", back_populates="blob")
+    
+    def __repr__(self):
+        return f"<StoredBlob(id={self.id}, sha256='{self.sha256[:12]}', refs={self.ref_count})>"
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, BigInteger
+from datetime import datetime
+from . import Base
+
+
+class Broadcast(Base):
+    """Рассылка администратора с сохраненным прогрессом (для продолжения после перезапуска)"""
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    text = Column(Text, nullable=False)
+    segment = Column(Text, nullable=False)                  # Аудитория, JSON (см. broadcast_service.Segment)
+    status = Column(String(20), nullable=False, default="running", index=True)  # running, done, cancelled
+    admin_chat_id = Column(BigInteger, nullable=False)      # Куда писать прогресс
+    progress_message_id = Column(Integer, nullable=True)    # Сообщение с прогрессом (редактируется)
+    total = Column(Integer, default=0)                      # Получателей на момент запуска
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    last_user_id = Column(Integer, default=0)               # Все получатели с User.id <= last_user_id обработаны
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    @property
+    def processed(self) -> int:
+        return (self.sent or 0) + (self.failed or 0)
+
+    def __repr__(self):
+        return f"<Broadcast(id={self.id}, status='{self.status}', sent={self.sent}/{self.total})>"
@@ -56,3 +56,25 @@ WORK_TYPE_NAMES = {
     WorkType.PRESENTATION: "Презентация",
     WorkType.OTHER: "Другое"
 }
+
+# Допустимые переходы между статусами заказа (переход в тот же статус разрешен всегда)
+ORDER_TRANSITIONS = {
+    OrderStatus.NEW: {OrderStatus.IN_PROGRESS, OrderStatus.WAITING_PAYMENT, OrderStatus.CANCELLED},
+    # В NEW - клиент отклонил цену, назначенную заказу на любом этапе до отправки
+    OrderStatus.IN_PROGRESS: {OrderStatus.READY, OrderStatus.WAITING_PAYMENT, OrderStatus.NEW,
+                              OrderStatus.CANCELLED},
+    OrderStatus.READY: {OrderStatus.WAITING_PAYMENT, OrderStatus.SENT, OrderStatus.IN_PROGRESS,
+                        OrderStatus.NEW, OrderStatus.REVISION, OrderStatus.CANCELLED},
+    OrderStatus.WAITING_PAYMENT: {OrderStatus.SENT, OrderStatus.NEW, OrderStatus.IN_PROGRESS,
+                                  OrderStatus.READY, OrderStatus.CANCELLED},
+    OrderStatus.SENT: {OrderStatus.REVISION},
+    OrderStatus.REVISION: {OrderStatus.IN_PROGRESS, OrderStatus.READY, OrderStatus.SENT, OrderStatus.CANCELLED},
+    OrderStatus.CANCELLED: {OrderStatus.NEW},
+}
+
+# Заказы в работе: для них отслеживается срок
+OPEN_STATUSES = (
+    OrderStatus.NEW, OrderStatus.IN_PROGRESS, OrderStatus.READY,
+    OrderStatus.WAITING_PAYMENT, OrderStatus.REVISION,
+)
+
@@ -1,6 +1,7 @@
 from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from app.storage.thumbnails import is_image
 from . import Base
 
 
@@ -21,8 +22,12 @@ class OrderFile(Base):
     sent_to_user = Column(Boolean, default=False, nullable=False)       # Отправлен пользователю
     sent_at = Column(DateTime, nullable=True)                           # Когда отправлен
     
+    # Содержимое в хранилище (общее для одинаковых файлов)
+    blob_id = Column(Integer, ForeignKey("stored_blobs.id"), nullable=True, index=True)
+    
     # Relationships
     order = relationship("Order", back_populates="files")
+    blob = relationship("StoredBlob", back_populates="files")
     
     def __repr__(self):
         return f"<OrderFile(id={self.id}, filename='{self.filename}', order_id={self.order_id}, by_admin={self.uploaded_by_admin})>"
@@ -39,6 +44,16 @@ class OrderFile(Base):
         """Расширение файла"""
         return self.filename.split('.')[-1].lower() if '.' in self.filename else ''
     
+    @property
+    def is_image(self):
+        """Изображение (для него строится превью)"""
+        return is_image(self.filename)
+    
+    @property
+    def content_hash(self):
+        """SHA-256 содержимого (если файл лежит в хранилище)"""
+        return self.blob.sha256 if self.blob else None
+    
     @property
     def source_label(self):
         """Источник файла для отображения"""
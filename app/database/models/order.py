@@ -16,6 +16,7 @@ class Order(Base):
     topic = Column(Text, nullable=False)
     volume = Column(String(100), nullable=False)
     deadline = Column(String(200), nullable=False)  # Храним как строку, т.к. может быть "до среды"
+    due_at = Column(DateTime, nullable=True, index=True)  # Срок, распознанный из deadline (UTC)
     requirements = Column(Text, nullable=True)
     status = Column(Enum(OrderStatus), default=OrderStatus.NEW)
     price = Column(Numeric(10, 2), nullable=True)
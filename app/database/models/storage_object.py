@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, Float
+from datetime import datetime
+from . import Base
+
+
+class StorageObject(Base):
+    """Файл, найденный в хранилище при последнем обходе (индекс для сборщика мусора)"""
+    __tablename__ = "storage_objects"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    backend = Column(String(10), nullable=False)           # local, s3
+    uri = Column(String(500), unique=True, nullable=False, index=True)
+    kind = Column(String(20), nullable=False)              # blob, thumbnail, tmp, legacy
+    size = Column(BigInteger, nullable=False)
+    mtime = Column(Float, nullable=False)                  # Время изменения файла, unix time
+    sha256 = Column(String(64), nullable=True, index=True) # Хэш содержимого (пересчитывается при изменении size/mtime)
+    hashed_at = Column(DateTime, nullable=True)
+    first_seen_at = Column(DateTime, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+    orphan_since = Column(DateTime, nullable=True)         # С какого обхода на файл не ссылается БД
+    
+    @property
+    def is_corrupted(self) -> bool:
+        """Содержимое не совпадает с хэшем в имени файла"""
+        if self.kind != "blob" or not self.sha256:
+            return False
+        return not self.uri.endswith(self.sha256)
+    
+    def __repr__(self):
+        return f"<StorageObject(id={self.id}, kind='{self.kind}', uri='{self.uri}')>"
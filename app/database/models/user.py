@@ -16,6 +16,8 @@ class User(Base):
     last_name = Column(String(100), nullable=True)
     phone = Column(String(20), nullable=True)
     is_blocked = Column(Boolean, default=False)
+    unreachable_at = Column(DateTime, nullable=True, index=True)    # Бот заблокирован или чат удален (см. delivery_tracker)
+    unreachable_reason = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
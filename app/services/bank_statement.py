@@ -0,0 +1,236 @@
+"""
+Чтение банковских выписок (CSV и OFX)
+
+Выписка читается построчно и отдается генератором, поэтому файл
+на десятки тысяч операций не загружается в память целиком.
+Кодировка определяется по началу файла: выгрузки российских банков
+бывают и в UTF-8, и в cp1251.
+
+StatementError - выписку нельзя разобрать целиком (нет нужных колонок).
+Строка с неверной суммой или датой не прерывает импорт: вместо операции
+генератор отдает InvalidRow, и она попадает в отчет.
+"""
+import csv
+import io
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Dict, Iterator, Optional, TextIO, Tuple, Union
+
+from app.config import settings
+
+# Сколько байт читаем для определения кодировки и формата
+SNIFF_SIZE = 64 * 1024
+
+# Названия колонок в выгрузках разных банков (в нижнем регистре)
+CSV_COLUMNS = {
+    "date": ("дата операции", "дата и время операции", "дата", "date", "posted", "дата платежа"),
+    "amount": ("сумма операции", "сумма платежа", "сумма", "amount", "сумма в валюте счета"),
+    "description": ("описание", "назначение платежа", "комментарий", "description", "memo", "детали операции"),
+    "transaction_id": ("id операции", "номер операции", "номер документа", "id", "transaction id", "fitid"),
+}
+
+DATE_FORMATS = (
+    "%d.%m.%Y %H:%M:%S",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+)
+
+OFX_TAG_RE = re.compile(r"<(/?)([A-Z0-9.]+)>([^<\r\n]*)")
+
+
+class StatementError(ValueError):
+    """Выписку не удалось разобрать"""
+
+
+@dataclass
+class BankTransaction:
+    """Операция из выписки"""
+    posted_at: datetime          # Время операции в UTC
+    amount: Decimal              # Положительная - поступление
+    description: str
+    transaction_id: Optional[str] = None
+    has_time: bool = True        # False, если в выписке только дата
+    line: int = 0                # Строка в файле (для отчета)
+
+
+@dataclass
+class InvalidRow:
+    """Строка выписки, которую не удалось разобрать (пропускается)"""
+    line: int
+    error: str
+
+
+StatementRow = Union[BankTransaction, InvalidRow]
+
+
+def parse_amount(value: str) -> Decimal:
+    """'1 234,56' / '-1234.56' / '1 234,56 ₽' -> Decimal"""
+    cleaned = re.sub(r"[^\d,.\-+]", "", value.replace("−", "-"))
+    if "," in cleaned and "." in cleaned:
+        # Разделитель тысяч - тот, что встречается раньше
+        thousands = "," if cleaned.index(",") < cleaned.index(".") else "."
+        cleaned = cleaned.replace(thousands, "")
+    cleaned = cleaned.replace(",", ".")
+    try:
+        return Decimal(cleaned)
+    except InvalidOperation:
+        raise StatementError(f"Неверная сумма: {value!r}")
+
+
+def parse_datetime(value: str) -> Tuple[datetime, bool]:
+    """Дата выписки -> (datetime в UTC, есть ли время)"""
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        has_time = "%H" in date_format
+        if has_time:
+            # В выписках местное время банка
+            parsed -= timedelta(hours=settings.bank_statement_utc_offset)
+        return parsed, has_time
+    raise StatementError(f"Неверная дата: {value!r}")
+
+
+def parse_ofx_datetime(value: str) -> Tuple[datetime, bool]:
+    """20240131153000.000[+3:MSK] -> (datetime в UTC, есть ли время)"""
+    match = re.match(r"(\d{8})(\d{6})?(?:\.\d+)?(?:\[([+-]?\d+(?:\.\d+)?)(?::\w+)?\])?", value.strip())
+    if not match:
+        raise StatementError(f"Неверная дата OFX: {value!r}")
+
+    date_part, time_part, offset = match.groups()
+    parsed = datetime.strptime(date_part + (time_part or "000000"), "%Y%m%d%H%M%S")
+    if time_part:
+        hours = float(offset) if offset is not None else settings.bank_statement_utc_offset
+        parsed -= timedelta(hours=hours)
+    return parsed, bool(time_part)
+
+
+def open_statement(raw: BinaryIO) -> Tuple[TextIO, str]:
+    """
+    Открыть выписку как текст и определить формат
+
+    Returns:
+        (поток текста, формат "csv" или "ofx")
+    """
+    buffered = raw if isinstance(raw, io.BufferedReader) else io.BufferedReader(raw, SNIFF_SIZE)
+    head = buffered.peek(SNIFF_SIZE)[:SNIFF_SIZE]
+
+    try:
+        head.decode("utf-8")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # Обрезанный на границе многобайтовый символ - не повод менять кодировку
+        encoding = "utf-8-sig" if e.start >= len(head) - 3 else "cp1251"
+
+    head_text = head.decode(encoding, errors="ignore").lstrip()
+    statement_format = "ofx" if head_text.startswith("OFXHEADER") or "<OFX>" in head_text[:4096] else "csv"
+
+    return io.TextIOWrapper(buffered, encoding=encoding, errors="replace", newline=""), statement_format
+
+
+def _match_columns(header) -> Dict[str, int]:
+    normalized = [column.strip().strip('"').lower() for column in header]
+    columns = {}
+    for field_name, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                columns[field_name] = normalized.index(alias)
+                break
+    missing = {"date", "amount"} - columns.keys()
+    if missing:
+        raise StatementError(f"В выписке нет колонок: {', '.join(sorted(missing))}")
+    return columns
+
+
+def iter_csv_transactions(stream: TextIO) -> Iterator[StatementRow]:
+    """Операции из CSV-выписки (разделитель определяется автоматически)"""
+    first_line = stream.readline()
+    if not first_line:
+        return
+    try:
+        dialect = csv.Sniffer().sniff(first_line, delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+
+    header = next(csv.reader([first_line], dialect))
+    columns = _match_columns(header)
+    width = max(columns.values()) + 1
+
+    reader = csv.reader(stream, dialect)
+    for row in reader:
+        line = reader.line_num + 1  # +1 - строка заголовка
+        if len(row) < width or not row[columns["amount"]].strip():
+            continue
+
+        try:
+            posted_at, has_time = parse_datetime(row[columns["date"]])
+            amount = parse_amount(row[columns["amount"]])
+        except StatementError as e:
+            yield InvalidRow(line=line, error=str(e))
+            continue
+
+        description_index = columns.get("description")
+        id_index = columns.get("transaction_id")
+
+        yield BankTransaction(
+            posted_at=posted_at,
+            amount=amount,
+            description=row[description_index].strip() if description_index is not None else "",
+            transaction_id=(row[id_index].strip() or None) if id_index is not None else None,
+            has_time=has_time,
+            line=line
+        )
+
+
+def iter_ofx_transactions(stream: TextIO) -> Iterator[StatementRow]:
+    """Операции из OFX (SGML и XML; теги внутри STMTTRN)"""
+    current: Optional[Dict[str, str]] = None
+    start_line = 0
+
+    for line, text in enumerate(stream, start=1):
+        for closing, tag, value in OFX_TAG_RE.findall(text):
+            if tag == "STMTTRN":
+                if not closing:
+                    current, start_line = {}, line
+                elif current is not None:
+                    try:
+                        yield _ofx_transaction(current, start_line)
+                    except StatementError as e:
+                        yield InvalidRow(line=start_line, error=str(e))
+                    current = None
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+
+def _ofx_transaction(fields: Dict[str, str], line: int) -> BankTransaction:
+    if "TRNAMT" not in fields or "DTPOSTED" not in fields:
+        raise StatementError("Операция без суммы или даты")
+
+    posted_at, has_time = parse_ofx_datetime(fields["DTPOSTED"])
+    description = " ".join(filter(None, (fields.get("NAME"), fields.get("MEMO"))))
+
+    return BankTransaction(
+        posted_at=posted_at,
+        amount=parse_amount(fields["TRNAMT"]),
+        description=description,
+        transaction_id=fields.get("FITID") or None,
+        has_time=has_time,
+        line=line
+    )
+
+
+def iter_statement(raw: BinaryIO) -> Iterator[StatementRow]:
+    """Операции из выписки в любом поддерживаемом формате (и неразобранные строки)"""
+    stream, statement_format = open_statement(raw)
+    if statement_format == "ofx":
+        yield from iter_ofx_transactions(stream)
+    else:
+        yield from iter_csv_transactions(stream)
@@ -0,0 +1,383 @@
+"""
+Рассылки администратора
+
+Рассылка хранится в таблице broadcasts вместе с прогрессом. Получатели
+выбираются по сегменту (Segment) и читаются из БД страницами по User.id
+(keyset: id > курсора), каждая страница - короткий запрос в отдельной
+сессии, поэтому рассылка не держит открытую транзакцию и не мешает
+записи в БД. Сообщения отправляются параллельно (settings.broadcast_workers)
+через общий с уведомлениями ограничитель частоты user_notifier.
+
+Курсор last_user_id сдвигается только до получателя, перед которым все
+уже обработаны, и сохраняется вместе со счетчиками. После перезапуска
+бота рассылка продолжается с курсора (resume_broadcasts). При штатной
+остановке отправки в полете завершаются до сохранения курсора; при аварийной
+повторно могут уйти не больше broadcast_workers сообщений.
+"""
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, not_, or_, select
+from sqlalchemy.orm import Session
+
+from app.bot.keyboards.inline import get_broadcast_cancel_keyboard
+from app.config import settings
+from app.database.connection import get_db_session
+from app.database.models.broadcast import Broadcast
+from app.database.models.enums import OPEN_STATUSES
+from app.database.models.message import OrderMessage
+from app.database.models.order import Order
+from app.database.models.user import User
+from app.services.notification_service import UserNotification, get_bot, user_notifier
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_ALL = "all"
+SEGMENT_ACTIVE_ORDERS = "active_orders"   # Есть заказ в работе
+SEGMENT_WORK_TYPE = "work_type"           # Заказывали работу этого типа
+SEGMENT_ACTIVE = "active"                 # Были активны за value дней
+SEGMENT_INACTIVE = "inactive"             # Не были активны value дней и больше
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_CANCELLED = "cancelled"
+
+# Сколько ждать отправок в полете при остановке бота, сек
+SHUTDOWN_GRACE = 5.0
+
+
+@dataclass(frozen=True)
+class Segment:
+    """Аудитория рассылки"""
+    kind: str = SEGMENT_ALL
+    value: Optional[str] = None   # Тип работы или число дней
+
+    def to_json(self) -> str:
+        return json.dumps({"kind": self.kind, "value": self.value}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "Segment":
+        data = json.loads(raw)
+        return cls(kind=data["kind"], value=data.get("value"))
+
+    @property
+    def title(self) -> str:
+        if self.kind == SEGMENT_ACTIVE_ORDERS:
+            return "С заказами в работе"
+        if self.kind == SEGMENT_WORK_TYPE:
+            return f"Заказывали: {self.value}"
+        if self.kind == SEGMENT_ACTIVE:
+            return f"Активные за {self.value} дн."
+        if self.kind == SEGMENT_INACTIVE:
+            return f"Неактивные {self.value}+ дн."
+        return "Все пользователи"
+
+    def criteria(self, now: Optional[datetime] = None) -> list:
+        """Условия на User для этого сегмента"""
+        criteria = [User.is_blocked == False, User.unreachable_at.is_(None)]
+
+        if self.kind == SEGMENT_ACTIVE_ORDERS:
+            criteria.append(
+                select(Order.id).where(Order.user_id == User.id, Order.status.in_(OPEN_STATUSES)).exists()
+            )
+        elif self.kind == SEGMENT_WORK_TYPE:
+            criteria.append(
+                select(Order.id).where(Order.user_id == User.id, Order.work_type == self.value).exists()
+            )
+        elif self.kind in (SEGMENT_ACTIVE, SEGMENT_INACTIVE):
+            cutoff = (now or datetime.utcnow()) - timedelta(days=int(self.value))
+            active = _active_since(cutoff)
+            if self.kind == SEGMENT_ACTIVE:
+                criteria.append(or_(User.created_at >= cutoff, active))
+            else:
+                criteria.append(and_(User.created_at < cutoff, not_(active)))
+        elif self.kind != SEGMENT_ALL:
+            raise ValueError(f"Неизвестный сегмент: {self.kind}")
+
+        return criteria
+
+
+def _active_since(cutoff: datetime):
+    """Пользователь создавал заказ или писал по заказу после cutoff"""
+    return or_(
+        select(Order.id).where(Order.user_id == User.id, Order.created_at >= cutoff).exists(),
+        select(OrderMessage.id)
+        .join(Order, Order.id == OrderMessage.order_id)
+        .where(Order.user_id == User.id, OrderMessage.from_admin == False, OrderMessage.sent_at >= cutoff)
+        .exists()
+    )
+
+
+class BroadcastService:
+    """Сервис рассылок"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def count_recipients(self, segment: Segment) -> int:
+        return self.db.query(User.id).filter(*segment.criteria()).count()
+
+    def get_work_types(self) -> List[str]:
+        """Типы работ из заказов (для выбора сегмента)"""
+        rows = self.db.query(Order.work_type).distinct().order_by(Order.work_type).all()
+        return [work_type for (work_type,) in rows]
+
+    def create(self, text: str, segment: Segment, admin_chat_id: int) -> Broadcast:
+        broadcast = Broadcast(
+            text=text,
+            segment=segment.to_json(),
+            status=STATUS_RUNNING,
+            admin_chat_id=admin_chat_id,
+            total=self.count_recipients(segment)
+        )
+        self.db.add(broadcast)
+        self.db.commit()
+        self.db.refresh(broadcast)
+        return broadcast
+
+    def get(self, broadcast_id: int) -> Optional[Broadcast]:
+        return self.db.get(Broadcast, broadcast_id)
+
+    def get_running(self) -> List[Broadcast]:
+        return self.db.query(Broadcast).filter(Broadcast.status == STATUS_RUNNING).all()
+
+    def recipients_page(self, segment: Segment, after_user_id: int,
+                        limit: int) -> List[Tuple[int, int]]:
+        """Следующая страница получателей: [(User.id, telegram_id)] по возрастанию id"""
+        return self.db.query(User.id, User.telegram_id)\
+            .filter(User.id > after_user_id, *segment.criteria())\
+            .order_by(User.id)\
+            .limit(limit)\
+            .all()
+
+    def save_progress(self, broadcast_id: int, last_user_id: int, sent: int, failed: int,
+                      status: Optional[str] = None) -> None:
+        values = {
+            Broadcast.last_user_id: last_user_id,
+            Broadcast.sent: sent,
+            Broadcast.failed: failed,
+        }
+        if status is not None:
+            values[Broadcast.status] = status
+            values[Broadcast.finished_at] = datetime.utcnow()
+        self.db.query(Broadcast)\
+            .filter(Broadcast.id == broadcast_id, Broadcast.status == STATUS_RUNNING)\
+            .update(values, synchronize_session=False)
+        self.db.commit()
+
+    def set_progress_message(self, broadcast_id: int, message_id: int) -> None:
+        self.db.query(Broadcast)\
+            .filter(Broadcast.id == broadcast_id)\
+            .update({Broadcast.progress_message_id: message_id}, synchronize_session=False)
+        self.db.commit()
+
+    def cancel(self, broadcast_id: int) -> bool:
+        updated = self.db.query(Broadcast)\
+            .filter(Broadcast.id == broadcast_id, Broadcast.status == STATUS_RUNNING)\
+            .update({Broadcast.status: STATUS_CANCELLED, Broadcast.finished_at: datetime.utcnow()},
+                    synchronize_session=False)
+        self.db.commit()
+        return updated > 0
+
+
+def _with_session(method: str, *args):
+    """Вызвать метод BroadcastService в отдельной короткой сессии (для asyncio.to_thread)"""
+    db = get_db_session()
+    try:
+        return getattr(BroadcastService(db), method)(*args)
+    finally:
+        db.close()
+
+
+def format_broadcast_text(text: str) -> str:
+    return f"📢 <b>Сообщение от администрации</b>\n\n{text}"
+
+
+def format_progress(broadcast_id: int, segment: Segment, total: int, sent: int,
+                    failed: int, status: str = STATUS_RUNNING) -> str:
+    processed = sent + failed
+    percent = min(100, processed * 100 // total) if total else 100
+    filled = percent // 10
+
+    if status == STATUS_DONE:
+        header = f"📢 <b>Рассылка #{broadcast_id} завершена!</b>"
+    elif status == STATUS_CANCELLED:
+        header = f"⏹ <b>Рассылка #{broadcast_id} остановлена</b>"
+    else:
+        header = f"📢 <b>Рассылка #{broadcast_id}</b>"
+
+    text = f"{header}\n"
+    text += f"👥 Аудитория: {segment.title}\n\n"
+    text += f"{'▓' * filled}{'░' * (10 - filled)} {percent}%\n\n"
+    text += f"✅ Успешно отправлено: {sent}\n"
+    text += f"❌ Ошибок: {failed}\n"
+    text += f"📊 Всего пользователей: {total}"
+    return text
+
+
+class BroadcastRunner:
+    """Выполнение одной рассылки с сохранением прогресса"""
+
+    def __init__(self, broadcast: Broadcast):
+        self.broadcast_id = broadcast.id
+        self.segment = Segment.from_json(broadcast.segment)
+        self.text = format_broadcast_text(broadcast.text)
+        self.total = broadcast.total or 0
+        self.admin_chat_id = broadcast.admin_chat_id
+        self.progress_message_id = broadcast.progress_message_id
+
+        # Сохраненный прогресс: все получатели до cursor обработаны
+        self.cursor = broadcast.last_user_id or 0
+        self.sent = broadcast.sent or 0
+        self.failed = broadcast.failed or 0
+
+        self.cancelled = False
+        self._window: "OrderedDict[int, Optional[bool]]" = OrderedDict()  # User.id -> результат (None - в полете)
+        self._slots = asyncio.Semaphore(max(1, settings.broadcast_workers))
+        self._inflight: set = set()
+
+    async def run(self) -> None:
+        reporter = asyncio.create_task(self._report_loop())
+        status = STATUS_DONE
+        try:
+            fetch_after = self.cursor
+            while not self.cancelled:
+                page = await asyncio.to_thread(
+                    _with_session, "recipients_page", self.segment, fetch_after, settings.broadcast_page_size
+                )
+                if not page:
+                    break
+                for user_id, chat_id in page:
+                    if self.cancelled:
+                        break
+                    await self._slots.acquire()
+                    self._window[user_id] = None
+                    task = asyncio.create_task(self._send(user_id, chat_id))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+                fetch_after = page[-1][0]
+
+            if self._inflight:
+                await asyncio.gather(*self._inflight)
+            if self.cancelled:
+                status = STATUS_CANCELLED
+        except asyncio.CancelledError:
+            # Остановка бота: дожидаемся сообщений в полете, чтобы не отправить их повторно,
+            # и сохраняем прогресс - рассылка продолжится после запуска
+            reporter.cancel()
+            if self._inflight:
+                await asyncio.wait(self._inflight, timeout=SHUTDOWN_GRACE)
+            _with_session("save_progress", self.broadcast_id, self.cursor, self.sent, self.failed)
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка рассылки #{self.broadcast_id}: {e}")
+            status = STATUS_CANCELLED
+        reporter.cancel()
+
+        await asyncio.to_thread(
+            _with_session, "save_progress", self.broadcast_id, self.cursor, self.sent, self.failed, status
+        )
+        await self._edit_progress(status)
+        logger.info(f"Рассылка #{self.broadcast_id}: отправлено {self.sent}, ошибок {self.failed}")
+
+    async def _send(self, user_id: int, chat_id: int) -> None:
+        try:
+            delivered = await user_notifier.deliver(UserNotification(chat_id=chat_id, text=self.text))
+        except Exception as e:
+            logger.error(f"Ошибка рассылки пользователю {chat_id}: {e}")
+            delivered = False
+        finally:
+            self._slots.release()
+
+        self._window[user_id] = delivered
+        # Сдвигаем курсор по непрерывному префиксу обработанных получателей
+        while self._window:
+            first_id, result = next(iter(self._window.items()))
+            if result is None:
+                break
+            self._window.popitem(last=False)
+            self.cursor = first_id
+            if result:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    async def _report_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.broadcast_progress_interval)
+            try:
+                await asyncio.to_thread(
+                    _with_session, "save_progress", self.broadcast_id, self.cursor, self.sent, self.failed
+                )
+                await self._edit_progress(STATUS_RUNNING)
+            except Exception as e:
+                logger.error(f"Ошибка сохранения прогресса рассылки #{self.broadcast_id}: {e}")
+
+    async def _edit_progress(self, status: str) -> None:
+        if not self.progress_message_id:
+            return
+        try:
+            await get_bot().edit_message_text(
+                text=format_progress(self.broadcast_id, self.segment, self.total,
+                                     self.sent, self.failed, status),
+                chat_id=self.admin_chat_id,
+                message_id=self.progress_message_id,
+                parse_mode="HTML",
+                reply_markup=get_broadcast_cancel_keyboard(self.broadcast_id) if status == STATUS_RUNNING else None
+            )
+        except Exception as e:
+            # В том числе "message is not modified", если прогресс не изменился
+            logger.debug(f"Прогресс рассылки #{self.broadcast_id} не обновлен: {e}")
+
+
+_runners: Dict[int, BroadcastRunner] = {}
+_tasks: Dict[int, asyncio.Task] = {}
+
+
+def start_broadcast(broadcast: Broadcast) -> None:
+    """Запустить рассылку в фоне (в процессе бота)"""
+    if broadcast.id in _tasks:
+        return
+    runner = _runners[broadcast.id] = BroadcastRunner(broadcast)
+    task = _tasks[broadcast.id] = asyncio.create_task(runner.run())
+
+    def _forget(_task: asyncio.Task, broadcast_id: int = broadcast.id) -> None:
+        _runners.pop(broadcast_id, None)
+        _tasks.pop(broadcast_id, None)
+    task.add_done_callback(_forget)
+
+
+def cancel_broadcast(db: Session, broadcast_id: int) -> bool:
+    """Остановить рассылку; False - она уже не выполняется"""
+    runner = _runners.get(broadcast_id)
+    if runner is not None:
+        runner.cancelled = True
+        return True
+    return BroadcastService(db).cancel(broadcast_id)
+
+
+def resume_broadcasts() -> int:
+    """Продолжить рассылки, прерванные остановкой бота"""
+    db = get_db_session()
+    try:
+        broadcasts = BroadcastService(db).get_running()
+    finally:
+        db.close()
+
+    for broadcast in broadcasts:
+        logger.info(f"Продолжаем рассылку #{broadcast.id} с пользователя {broadcast.last_user_id}")
+        start_broadcast(broadcast)
+    return len(broadcasts)
+
+
+async def stop_broadcasts() -> None:
+    """Прервать рассылки при остановке бота (прогресс сохраняется)"""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
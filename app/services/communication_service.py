@@ -1,9 +1,11 @@
+import logging
 import os
 import asyncio
 from typing import Optional, List
 from sqlalchemy.orm import Session
 from aiogram import Bot
-from aiogram.types import FSInputFile
+from aiogram.types import FSInputFile, InputFile, URLInputFile
+from aiogram.exceptions import TelegramBadRequest
 from datetime import datetime
 from pathlib import Path
 
@@ -11,6 +13,22 @@ from app.config import settings
 from app.database.models.order import Order
 from app.database.models.file import OrderFile
 from app.database.models.message import OrderMessage
+from app.services.delivery_tracker import delivery_tracker, record_send_failure
+from app.services.notification_service import get_bot
+from app.services.storage_service import StorageService
+from app.storage.backends import backend_for, is_remote, storage_exists
+from app.storage.blob_store import StoredContent
+
+logger = logging.getLogger(__name__)
+
+
+async def stored_input_file(path: str, filename: str) -> InputFile:
+    """Файл из хранилища для отправки в Telegram (с диска или по ссылке из S3)"""
+    if not is_remote(path):
+        return FSInputFile(path=path, filename=filename)
+    
+    url = await asyncio.to_thread(backend_for(path).presigned_url, path)
+    return URLInputFile(url, filename=filename)
 
 
 class CommunicationService:
@@ -35,7 +53,12 @@ class CommunicationService:
             # Получаем заказ
             order = self.db.query(Order).filter(Order.id == order_id).first()
             if not order:
-                print(f"❌ Заказ #{order_id} не найден")
+                logger.warning(f"Заказ #{order_id} не найден")
+                return False
+            
+            if await delivery_tracker.is_suppressed(order.user.telegram_id):
+                logger.warning(f"Пользователь {order.user.telegram_id} недоступен (бот заблокирован), сообщение не отправлено")
+                self._save_undelivered(order_id, message_text, from_admin)
                 return False
             
             # Создаем бота
@@ -70,35 +93,44 @@ class CommunicationService:
                 self.db.add(order_message)
                 self.db.commit()
                 
-                print(f"✅ Сообщение отправлено пользователю {order.user.telegram_id} по заказу #{order_id}")
+                logger.info(f"Сообщение отправлено пользователю {order.user.telegram_id} по заказу #{order_id}")
                 return True
                 
             finally:
                 await bot.session.close()
                 
         except Exception as e:
-            print(f"❌ Ошибка отправки сообщения: {e}")
+            logger.error(f"Ошибка отправки сообщения: {e}")
+            await record_send_failure(e)
             
             # Сохраняем неотправленное сообщение
-            try:
-                order_message = OrderMessage(
-                    order_id=order_id,
-                    message_text=message_text,
-                    from_admin=from_admin,
-                    delivered=False
-                )
-                
-                self.db.add(order_message)
-                self.db.commit()
-            except:
-                pass
-            
+            self._save_undelivered(order_id, message_text, from_admin)
             return False
     
+    def _save_undelivered(self, order_id: int, message_text: str, from_admin: bool) -> None:
+        """Сохранить сообщение, которое не удалось отправить"""
+        try:
+            order_message = OrderMessage(
+                order_id=order_id,
+                message_text=message_text,
+                from_admin=from_admin,
+                delivered=False
+            )
+            
+            self.db.add(order_message)
+            self.db.commit()
+        except:
+            pass
+    
     async def send_file_to_user(self, order_id: int, file_id: int) -> bool:
         """
         Отправить файл пользователю через Telegram
         
+        Файл, который уже есть на серверах Telegram (прислан пользователем
+        или отправлялся раньше), отправляется по file_id без повторной
+        загрузки. Telegram при этом показывает имя из первой загрузки,
+        актуальное имя указано в подписи.
+        
         Args:
             order_id: ID заказа
             file_id: ID файла
@@ -110,65 +142,94 @@ class CommunicationService:
             # Получаем заказ и файл
             order = self.db.query(Order).filter(Order.id == order_id).first()
             if not order:
-                print(f"❌ Заказ #{order_id} не найден")
+                logger.warning(f"Заказ #{order_id} не найден")
                 return False
             
             file_record = self.db.query(OrderFile).filter(OrderFile.id == file_id).first()
             if not file_record:
-                print(f"❌ Файл #{file_id} не найден")
+                logger.warning(f"Файл #{file_id} не найден")
                 return False
             
-            # Проверяем файл на диске
-            if not os.path.exists(file_record.file_path):
-                print(f"❌ Файл не найден на диске: {file_record.file_path}")
+            if await delivery_tracker.is_suppressed(order.user.telegram_id):
+                logger.warning(f"Пользователь {order.user.telegram_id} недоступен (бот заблокирован), файл не отправлен")
                 return False
             
-            # Создаем бота
-            bot = Bot(token=settings.bot_token)
+            # Если содержимое уже есть на серверах Telegram, отправляем по file_id
+            blob = file_record.blob
+            cached_file_id = None
+            if blob is not None and blob.telegram_file_type == "document":
+                cached_file_id = blob.telegram_file_id
             
-            try:
-                # Формируем сообщение
-                caption = f"📎 <b>Файл от администратора</b>\n\n"
-                caption += f"📋 <b>Заказ #{order_id}</b>\n"
-                caption += f"📝 {order.work_type}: {order.short_topic}\n\n"
-                caption += f"📄 Файл: <b>{file_record.filename}</b>\n"
-                if file_record.file_size:
-                    caption += f"📊 Размер: {file_record.size_mb} MB"
-                
-                # Создаем файл для отправки
-                input_file = FSInputFile(
-                    path=file_record.file_path,
-                    filename=file_record.filename
-                )
+            # Проверяем файл в хранилище
+            if not cached_file_id and not await asyncio.to_thread(storage_exists, file_record.file_path):
+                logger.warning(f"Файл не найден в хранилище: {file_record.file_path}")
+                return False
+            
+            bot = get_bot()
+            
+            # Формируем сообщение
+            caption = f"📎 <b>Файл от администратора</b>\n\n"
+            caption += f"📋 <b>Заказ #{order_id}</b>\n"
+            caption += f"📝 {order.work_type}: {order.short_topic}\n\n"
+            caption += f"📄 Файл: <b>{file_record.filename}</b>\n"
+            if file_record.file_size:
+                caption += f"📊 Размер: {file_record.size_mb} MB"
+            
+            sent = None
+            if cached_file_id:
+                try:
+                    sent = await bot.send_document(
+                        chat_id=order.user.telegram_id,
+                        document=cached_file_id,
+                        caption=caption,
+                        parse_mode="HTML"
+                    )
+                except TelegramBadRequest as e:
+                    # file_id недействителен - загружаем файл заново
+                    logger.warning(f"Не удалось отправить по file_id, загружаем файл: {e}")
+                    StorageService(self.db).forget_telegram_file(blob)
+                    if not await asyncio.to_thread(storage_exists, file_record.file_path):
+                        logger.warning(f"Файл не найден в хранилище: {file_record.file_path}")
+                        return False
+            
+            if sent is None:
+                # Загружаем файл из хранилища
+                input_file = await stored_input_file(file_record.file_path, file_record.filename)
                 
-                # Отправляем файл
-                await bot.send_document(
+                sent = await bot.send_document(
                     chat_id=order.user.telegram_id,
                     document=input_file,
                     caption=caption,
                     parse_mode="HTML"
                 )
                 
-                # Помечаем файл как отправленный
-                file_record.sent_to_user = True
-                file_record.sent_at = datetime.utcnow()
-                self.db.commit()
-                
-                print(f"✅ Файл {file_record.filename} отправлен пользователю {order.user.telegram_id}")
-                
-                # Также отправляем уведомление в сообщениях
-                await self.send_message_to_user(
-                    order_id, 
-                    f"📎 Отправлен файл: {file_record.filename}"
-                )
-                
-                return True
-                
-            finally:
-                await bot.session.close()
+                # Запоминаем file_id для следующих отправок
+                if blob is not None and sent.document:
+                    StorageService(self.db).remember_telegram_file(
+                        blob,
+                        sent.document.file_id,
+                        sent.document.file_unique_id,
+                        "document"
+                    )
+            
+            # Помечаем файл как отправленный
+            file_record.sent_to_user = True
+            file_record.sent_at = datetime.utcnow()
+            self.db.commit()
+            
+            logger.info(f"Файл {file_record.filename} отправлен пользователю {order.user.telegram_id}")
+            
+            # Также отправляем уведомление в сообщениях
+            await self.send_message_to_user(
+                order_id, 
+                f"📎 Отправлен файл: {file_record.filename}"
+            )
+            
+            return True
                 
         except Exception as e:
-            print(f"❌ Ошибка отправки файла: {e}")
+            logger.error(f"Ошибка отправки файла: {e}")
+            await record_send_failure(e)
             return False
     
     def get_order_messages(self, order_id: int) -> List[OrderMessage]:
@@ -179,7 +240,7 @@ class CommunicationService:
             .all()
     
     def save_admin_file(self, order_id: int, file_path: str, original_filename: str, 
-                       file_size: int = None) -> OrderFile:
+                       file_size: int = None, content: StoredContent = None) -> OrderFile:
         """
         Сохранить файл загруженный админом
         
@@ -188,6 +249,7 @@ class CommunicationService:
             file_path: Путь к сохраненному файлу
             original_filename: Оригинальное имя файла
             file_size: Размер файла
+            content: Содержимое в хранилище (если файл сохранен через него)
             
         Returns:
             OrderFile: Созданная запись файла
@@ -207,12 +269,14 @@ class CommunicationService:
             uploaded_by_admin=True,  # Помечаем как загруженный админом
             sent_to_user=False
         )
+        if content is not None:
+            order_file.blob = StorageService(self.db).acquire_blob(content)
         
         self.db.add(order_file)
         self.db.commit()
         self.db.refresh(order_file)
         
-        print(f"✅ Файл от админа сохранен: {original_filename} для заказа #{order_id}")
+        logger.info(f"Файл от админа сохранен: {original_filename} для заказа #{order_id}")
         return order_file
     # Обновите app/services/communication_service.py - добавьте эти методы:
 
@@ -233,7 +297,7 @@ class CommunicationService:
             # Проверяем существование заказа
             order = self.db.query(Order).filter(Order.id == order_id).first()
             if not order:
-                print(f"❌ Заказ #{order_id} не найден")
+                logger.warning(f"Заказ #{order_id} не найден")
                 return False
             
             # Сохраняем сообщение в БД
@@ -248,11 +312,11 @@ class CommunicationService:
             self.db.add(order_message)
             self.db.commit()
             
-            print(f"✅ Сообщение от пользователя сохранено для заказа #{order_id}")
+            logger.info(f"Сообщение от пользователя сохранено для заказа #{order_id}")
             return True
             
         except Exception as e:
-            print(f"❌ Ошибка сохранения сообщения пользователя: {e}")
+            logger.error(f"Ошибка сохранения сообщения пользователя: {e}")
             self.db.rollback()
             return False
     
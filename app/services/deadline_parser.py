@@ -0,0 +1,214 @@
+"""
+Разбор срока заказа из свободного текста
+
+Клиент пишет срок как хочет: "до 15 мая", "через неделю", "к понедельнику",
+"завтра в 18:00", "15.05.2025". parse_deadline превращает распространенные
+формы в момент времени (UTC, как все даты в БД), который хранится
+в Order.due_at. Исходный текст остается в Order.deadline.
+
+Если время не указано, срок - конец дня по местному времени клиентов
+(settings.deadline_utc_offset). Непонятный текст дает None.
+"""
+import calendar
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+
+from app.config import settings
+
+# Срок без указания времени - конец дня
+END_OF_DAY = time(23, 59)
+
+MONTHS = {
+    "янв": 1, "фев": 2, "мар": 3, "апр": 4, "мая": 5, "май": 5, "июн": 6,
+    "июл": 7, "авг": 8, "сен": 9, "окт": 10, "ноя": 11, "дек": 12,
+}
+
+WEEKDAYS = (
+    ("понедельник", 0), ("вторник", 1), ("сред", 2), ("четверг", 3),
+    ("пятниц", 4), ("суббот", 5), ("воскресень", 6),
+)
+
+NUMBER_WORDS = {
+    "один": 1, "одну": 1, "одна": 1, "два": 2, "две": 2, "пару": 2, "пара": 2,
+    "три": 3, "четыре": 4, "пять": 5, "шесть": 6, "семь": 7, "восемь": 8,
+    "девять": 9, "десять": 10,
+}
+
+# Количество перед единицей срока: "3", "1.5", "две"
+_NUMBER = r"(\d{1,3}(?:[.,]\d{1,2})?|" + "|".join(NUMBER_WORDS) + r")"
+
+TIME_RE = re.compile(r"\b(\d{1,2}):(\d{2})\b")
+# "в 3 дня", но не "через 3 дня"
+HOUR_RE = re.compile(r"\b(?:в|до|к)\s+(\d{1,2})\s*(?:час\w*\s*)?(утра|дня|вечера)\b")
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+# "1.5 недели" - не 1 мая (но "15.05 днем" - дата)
+NUMERIC_DATE_RE = re.compile(
+    r"\b(\d{1,2})[./](\d{1,2})(?:[./](\d{2}|\d{4}))?\b"
+    r"(?!\s*(?:час|дн(?:я|и|ей)\b|день|сут|недел|месяц))"
+)
+MONTH_DATE_RE = re.compile(
+    r"\b(\d{1,2})(?:-?го)?\s+(" + "|".join(MONTHS) + r")[а-я]*(?:\s+(\d{4}))?"
+)
+RELATIVE_RE = re.compile(
+    r"(?:через\s+)?(?:" + _NUMBER + r"\s+)?\b(час|дн|день|сут|недел|месяц)[а-я]*"
+)
+WEEKDAY_RE = re.compile(
+    r"\b(следующ\w*\s+)?(понедельник[аув]?|вторник[аув]?|сред[аыеу]|четверг[аув]?"
+    r"|пятниц[аыеу]|суббот[аыеу]|воскресень[еяю])\b"
+)
+
+
+def _local_offset() -> timedelta:
+    return timedelta(hours=settings.deadline_utc_offset)
+
+
+def to_local(moment: datetime) -> datetime:
+    """UTC -> местное время клиентов (для отображения срока)"""
+    return moment + _local_offset()
+
+
+def _number(value: Optional[str]) -> float:
+    if not value:
+        return 1
+    if value in NUMBER_WORDS:
+        return NUMBER_WORDS[value]
+    return float(value.replace(",", "."))
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _safe_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _extract_time(text: str) -> Tuple[str, Optional[time]]:
+    """Время из текста ("в 18:00", "до 10 утра") и текст без него"""
+    match = TIME_RE.search(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        if hour < 24 and minute < 60:
+            return text[:match.start()] + text[match.end():], time(hour, minute)
+
+    match = HOUR_RE.search(text)
+    if match:
+        hour = int(match.group(1))
+        if match.group(2) in ("дня", "вечера") and hour < 12:
+            hour += 12
+        if hour < 24:
+            return text[:match.start()] + text[match.end():], time(hour)
+
+    return text, None
+
+
+def _explicit_date(text: str, today: date) -> Optional[date]:
+    """15.05, 15.05.2025, 2025-05-15, 15 мая (2025)"""
+    match = ISO_DATE_RE.search(text)
+    if match:
+        return _safe_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+    match = MONTH_DATE_RE.search(text)
+    if match:
+        day, month, year = int(match.group(1)), MONTHS[match.group(2)], match.group(3)
+    else:
+        match = NUMERIC_DATE_RE.search(text)
+        if not match:
+            return None
+        day, month, year = int(match.group(1)), int(match.group(2)), match.group(3)
+
+    if year:
+        year = int(year)
+        return _safe_date(year + 2000 if year < 100 else year, month, day)
+
+    # Год не указан - ближайшая такая дата, не раньше сегодняшней
+    result = _safe_date(today.year, month, day)
+    if result and result < today:
+        result = _safe_date(today.year + 1, month, day)
+    return result
+
+
+def _weekday_date(text: str, today: date) -> Optional[date]:
+    """к понедельнику, до среды, в следующую пятницу"""
+    match = WEEKDAY_RE.search(text)
+    if not match:
+        return None
+
+    word = match.group(2)
+    weekday = next(index for stem, index in WEEKDAYS if word.startswith(stem))
+    days_ahead = (weekday - today.weekday()) % 7 or 7
+    result = today + timedelta(days=days_ahead)
+
+    # "В следующую пятницу" - на следующей неделе, даже если пятница этой еще впереди
+    if match.group(1) and result.isocalendar()[1] == today.isocalendar()[1]:
+        result += timedelta(days=7)
+    return result
+
+
+def parse_deadline(text: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Срок из текста клиента
+
+    Args:
+        text: Срок как его написал клиент
+        now: Момент, от которого считаются "завтра", "через неделю" (UTC;
+            для старых заказов - время создания)
+
+    Returns:
+        datetime в UTC или None, если срок не распознан
+    """
+    if not text:
+        return None
+
+    now = now or datetime.utcnow()
+    today = to_local(now).date()
+
+    text = text.lower().replace("ё", "е")
+    text, due_time = _extract_time(text)
+
+    due_date = _explicit_date(text, today)
+
+    if due_date is None and re.search(r"\bпослезавтра\b", text):
+        due_date = today + timedelta(days=2)
+    elif due_date is None and re.search(r"\bзавтра\b", text):
+        due_date = today + timedelta(days=1)
+    elif due_date is None:
+        # "не срочно", "не сегодня" - срока нет
+        match = re.search(r"\b(не\s+)?(сегодня|срочно)\b", text)
+        if match and not match.group(1):
+            due_date = today
+
+    if due_date is None and ("конц" in text or "конец" in text):
+        if "месяц" in text:
+            due_date = date(today.year, today.month, calendar.monthrange(today.year, today.month)[1])
+        elif "недел" in text:
+            due_date = today + timedelta(days=6 - today.weekday())
+
+    if due_date is None:
+        due_date = _weekday_date(text, today)
+
+    if due_date is None:
+        match = RELATIVE_RE.search(text)
+        if match and (match.group(1) or "через" in text or "недел" in match.group(2)):
+            amount, unit = _number(match.group(1)), match.group(2)
+            if unit == "час":
+                return now + timedelta(hours=amount)
+            if unit == "недел":
+                due_date = today + timedelta(weeks=amount)
+            elif unit == "месяц":
+                # Дробная часть месяца - по 30 дней
+                due_date = _add_months(today, int(amount)) + timedelta(days=round(amount % 1 * 30))
+            else:
+                due_date = today + timedelta(days=amount)
+
+    if due_date is None:
+        return None
+
+    local_due = datetime.combine(due_date, due_time or END_OF_DAY)
+    return local_due - _local_offset()
@@ -0,0 +1,186 @@
+"""
+Учет недоставленных сообщений и список подавления отправок
+
+Если пользователь заблокировал бота или удалил аккаунт, Telegram отвечает
+Forbidden / chat not found на каждую отправку, и рассылки с уведомлениями
+впустую тратят лимит частоты. После такой ошибки пользователь отмечается
+в БД (User.unreachable_at), а его чат попадает в множество в памяти,
+которое проверяется перед каждой отправкой - без запроса к БД.
+
+Множество перечитывается из БД раз в settings.delivery_suppression_refresh
+секунд, так что отметки, снятые в админке (другой процесс), доходят до бота.
+Отметка снимается и сама, как только пользователь снова пишет боту
+(см. middlewares.reachability).
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Optional, Set
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramNotFound
+
+from app.config import settings
+from app.database.connection import get_db_session
+from app.services.metrics import register_collector
+from app.services.user_service import UserService
+
+logger = logging.getLogger(__name__)
+
+# Ответы Telegram, после которых писать в чат бесполезно
+PERMANENT_ERRORS = (
+    "bot was blocked by the user",
+    "user is deactivated",
+    "chat not found",
+    "bot can't initiate conversation",
+    "bot was kicked",
+)
+
+
+def unreachable_reason(exc: BaseException) -> Optional[str]:
+    """Причина недоступности чата по ошибке отправки или None, если ошибка временная"""
+    if isinstance(exc, TelegramForbiddenError):
+        return exc.message
+    if isinstance(exc, (TelegramBadRequest, TelegramNotFound)):
+        text = exc.message.lower()
+        if any(marker in text for marker in PERMANENT_ERRORS):
+            return exc.message
+    return None
+
+
+def failed_chat_id(exc: BaseException) -> Optional[int]:
+    """Чат, в который не удалось отправить (из метода, вызвавшего ошибку)"""
+    if isinstance(exc, TelegramAPIError):
+        chat_id = getattr(exc.method, "chat_id", None)
+        if isinstance(chat_id, int):
+            return chat_id
+    return None
+
+
+class DeliveryTracker:
+    """Множество недоступных чатов с фоновой синхронизацией с БД"""
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.stats: Counter = Counter()   # suppressed - пропущено отправок, unreachable - новых отметок
+        self._suppressed: Set[int] = set()
+        self._added: Set[int] = set()     # Отмечены после начала последней загрузки
+        self._loaded_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._suppressed)
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._suppressed
+
+    def load(self) -> int:
+        """Перечитать множество из БД (блокирующий вызов)"""
+        self._added = set()
+        db = get_db_session()
+        try:
+            suppressed = set(UserService(db).get_unreachable_ids())
+        finally:
+            db.close()
+        # Отметки, сохраненные во время загрузки, запрос мог не увидеть
+        self._suppressed = suppressed | self._added
+        self._loaded_at = time.monotonic()
+        return len(suppressed)
+
+    async def is_suppressed(self, chat_id: int) -> bool:
+        """Пропустить отправку в этот чат? Устаревшее множество обновляется в фоне"""
+        self._maybe_refresh()
+        if chat_id in self._suppressed:
+            self.stats["suppressed"] += 1
+            return True
+        return False
+
+    async def record_failure(self, chat_id: int, exc: BaseException) -> bool:
+        """
+        Учесть ошибку отправки
+
+        Returns:
+            bool: True, если чат признан недоступным и больше не получает сообщений
+        """
+        reason = unreachable_reason(exc)
+        if reason is None:
+            return False
+
+        if chat_id not in self._suppressed:
+            self._suppressed.add(chat_id)
+            self._added.add(chat_id)
+            self.stats["unreachable"] += 1
+            logger.warning(f"Чат {chat_id} недоступен, отправки приостановлены: {reason}")
+            try:
+                await asyncio.to_thread(self._persist, chat_id, reason)
+            except Exception as e:
+                logger.error(f"Не удалось сохранить недоступность чата {chat_id}: {e}")
+        return True
+
+    async def clear(self, chat_id: Optional[int] = None) -> int:
+        """Снять отметку с чата (или со всех), вернуть число пользователей в БД"""
+        self.forget(chat_id)
+        return await asyncio.to_thread(self._unpersist, chat_id)
+
+    def forget(self, chat_id: Optional[int] = None) -> None:
+        """Убрать чат из множества в памяти (без БД)"""
+        if chat_id is None:
+            self._suppressed.clear()
+            self._added.clear()
+        else:
+            self._suppressed.discard(chat_id)
+            self._added.discard(chat_id)
+
+    def _maybe_refresh(self) -> None:
+        if self._refreshing is not None:
+            return
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        self._refreshing = asyncio.create_task(self._refresh())
+
+    async def _refresh(self) -> None:
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception as e:
+            # Повторим не раньше, чем через интервал
+            self._loaded_at = time.monotonic()
+            logger.error(f"Ошибка загрузки списка недоступных чатов: {e}")
+        finally:
+            self._refreshing = None
+
+    @staticmethod
+    def _persist(chat_id: int, reason: str) -> None:
+        db = get_db_session()
+        try:
+            UserService(db).mark_unreachable(chat_id, reason)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _unpersist(chat_id: Optional[int]) -> int:
+        db = get_db_session()
+        try:
+            return UserService(db).clear_unreachable(chat_id)
+        finally:
+            db.close()
+
+
+# Общий список процесса
+delivery_tracker = DeliveryTracker(refresh_interval=settings.delivery_suppression_refresh)
+
+
+@register_collector
+def _collect_metrics():
+    yield ("delivery_sends_suppressed_total", "counter", "Пропущенные отправки недоступным чатам",
+           [({}, delivery_tracker.stats["suppressed"])])
+    yield ("delivery_unreachable_marked_total", "counter", "Новые отметки о недоступности чата",
+           [({}, delivery_tracker.stats["unreachable"])])
+    yield ("delivery_unreachable_chats", "gauge", "Чатов в списке недоступных", [({}, len(delivery_tracker))])
+
+
+async def record_send_failure(exc: BaseException) -> bool:
+    """Учесть ошибку отправки, когда чат известен только из самой ошибки"""
+    chat_id = failed_chat_id(exc)
+    if chat_id is None:
+        return False
+    return await delivery_tracker.record_failure(chat_id, exc)
@@ -0,0 +1,321 @@
+"""
+Метрики процесса в формате Prometheus
+
+Счетчики и гистограммы с фиксированными границами: наблюдение - бинарный
+поиск корзины и два сложения под блокировкой, без выделения памяти.
+Значения с метками хранятся в словаре по кортежу меток; .labels() лучше
+вызывать один раз и держать дочерний объект, если метки известны заранее.
+
+Значения, которые уже считаются в других модулях (попадания в кэши,
+переходы статусов), не дублируются: модуль регистрирует сборщик
+(register_collector), который читает их при запросе /metrics.
+
+Отдаются на /metrics админ-панели и на отдельном порту процесса бота
+(settings.bot_metrics_port).
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы по умолчанию, сек: от миллисекунды до 10 секунд
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Семейство от сборщика: имя, тип, описание, [(метки, значение)]
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        """Дочерний объект для значений меток (в порядке labelnames)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получено {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _label_dict(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def expose(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонный счетчик (имя должно оканчиваться на _total)"""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def expose(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self._label_dict(key))} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами корзин"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def expose(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            labels = self._label_dict(key)
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip((*self.bounds, float("inf")), counts):
+                cumulative += count
+                bucket_labels = {**labels, "le": _format_value(bound)}
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Метрики и сборщики процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        self._collectors.append(collector)
+
+    def expose(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.expose())
+
+        families: Dict[str, Family] = {}
+        for collector in self._collectors:
+            try:
+                for name, kind, documentation, samples in collector():
+                    family = families.setdefault(name, (name, kind, documentation, []))
+                    family[3].extend(samples)
+            except Exception as e:
+                logger.warning(f"Сборщик метрик {collector.__name__} завершился с ошибкой: {e}")
+        for name, kind, documentation, samples in families.values():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def register_collector(collector: Callable[[], Iterable[Family]]) -> Callable[[], Iterable[Family]]:
+    """Зарегистрировать сборщик (можно как декоратор)"""
+    registry.register_collector(collector)
+    return collector
+
+
+def expose() -> str:
+    return registry.expose()
+
+
+def authorized(header: Optional[str]) -> bool:
+    """Проверка заголовка Authorization, если задан settings.metrics_token"""
+    return not settings.metrics_token or header == f"Bearer {settings.metrics_token}"
+
+
+# --- Общие метрики ---
+
+bot_updates = counter("bot_updates_total", "Обновления Telegram по типу", ["type"])
+bot_handler_seconds = histogram(
+    "bot_handler_duration_seconds", "Время обработчика бота", ["router", "handler"]
+)
+bot_handler_errors = counter(
+    "bot_handler_errors_total", "Исключения в обработчиках бота", ["router", "handler", "error"]
+)
+telegram_request_seconds = histogram(
+    "telegram_api_request_duration_seconds", "Время запроса к Bot API", ["method"],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+telegram_request_errors = counter(
+    "telegram_api_errors_total", "Ошибки запросов к Bot API", ["method", "error"]
+)
+db_query_seconds = histogram(
+    "db_query_duration_seconds", "Время SQL-запроса", ["statement"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+http_request_seconds = histogram(
+    "http_request_duration_seconds", "Время запроса к админ-панели", ["method", "route", "status"]
+)
+file_io_bytes = counter("file_io_bytes_total", "Байты файлов заказов", ["op"])
+
+
+# --- SQL ---
+
+_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def instrument_engine(engine: Any) -> None:
+    """Время каждого SQL-запроса движка по виду запроса (SELECT, INSERT, ...)"""
+    from sqlalchemy import event
+
+    children = {verb: db_query_seconds.labels(verb) for verb in (*_STATEMENTS, "OTHER")}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        verb = statement.lstrip()[:6].upper()
+        children[verb if verb in _STATEMENTS else "OTHER"].observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+# --- Порт метрик процесса бота ---
+
+_runner = None
+
+
+async def start_metrics_server(host: str, port: int) -> None:
+    """HTTP-сервер с /metrics в процессе бота"""
+    global _runner
+    from aiohttp import web
+
+    async def handle(request: "web.Request") -> "web.Response":
+        if not authorized(request.headers.get("Authorization")):
+            return web.Response(status=401)
+        return web.Response(body=expose().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, host, port).start()
+    logger.info(f"Метрики бота: http://{host}:{port}/metrics")
+
+
+async def stop_metrics_server() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
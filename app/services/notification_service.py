@@ -0,0 +1,287 @@
+"""
+Сервис исходящих уведомлений: общий экземпляр бота, дайджест для админа
+и очередь уведомлений пользователям
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from app.bot.keyboards.registry import KeyboardSession
+from app.config import settings
+from app.services.delivery_tracker import delivery_tracker
+
+logger = logging.getLogger(__name__)
+
+_bot: Optional[Bot] = None
+
+
+def get_bot() -> Bot:
+    """
+    Общий экземпляр бота для уведомлений вне обработчиков
+
+    Вместо создания Bot (и новой HTTP-сессии) на каждое уведомление
+    переиспользуем один экземпляр в рамках процесса.
+    """
+    global _bot
+    if _bot is None:
+        _bot = Bot(
+            token=settings.bot_token,
+            session=KeyboardSession(),
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        )
+    return _bot
+
+
+async def close_bot() -> None:
+    """Закрыть HTTP-сессию общего бота (при остановке процесса)"""
+    global _bot
+    if _bot is not None:
+        await _bot.session.close()
+        _bot = None
+
+
+@dataclass
+class AdminEvent:
+    """Событие для администратора"""
+    text: str      # Полный текст уведомления
+    summary: str   # Одна строка для дайджеста
+
+
+@dataclass
+class _Bucket:
+    """Накопленные события по одному заказу или пользователю"""
+    title: str
+    link: Optional[str]
+    events: List[AdminEvent] = field(default_factory=list)
+    task: Optional[asyncio.Task] = None
+
+
+class AdminDigest:
+    """
+    Агрегатор уведомлений администратору
+
+    События с одинаковым ключом (заказ или пользователь) копятся в течение
+    короткого окна и уходят одним сообщением. Одиночное событие отправляется
+    как есть, без изменения текста. Срочные события идут в обход буфера.
+    """
+
+    # Сколько строк показываем в одном дайджесте
+    MAX_LINES = 15
+
+    def __init__(self, window: float, max_events: int = 30):
+        self.window = window
+        self.max_events = max_events
+        self._buckets: Dict[str, _Bucket] = {}
+
+    async def notify(self, text: str, key: Optional[str] = None, summary: Optional[str] = None,
+                     title: Optional[str] = None, link: Optional[str] = None,
+                     urgent: bool = False) -> None:
+        """
+        Поставить уведомление администратору
+
+        Args:
+            text: Полный текст (используется, если событие одно)
+            key: Ключ объединения, например "order:12" или "user:12345"
+            summary: Краткая строка для дайджеста
+            title: Заголовок дайджеста для этого ключа
+            link: Ссылка в конце дайджеста
+            urgent: Отправить немедленно, минуя буфер
+        """
+        if urgent or not key or self.window <= 0:
+            await self._send(text)
+            return
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(title=title or key, link=link)
+            bucket.task = asyncio.create_task(self._flush_later(key))
+
+        bucket.events.append(AdminEvent(text=text, summary=summary or text.split("\n", 1)[0]))
+
+        if len(bucket.events) >= self.max_events:
+            bucket.task.cancel()
+            await self._flush(key)
+
+    async def flush_all(self) -> None:
+        """Отправить все накопленные события (например, при остановке)"""
+        for key in list(self._buckets):
+            bucket = self._buckets.get(key)
+            if bucket and bucket.task:
+                bucket.task.cancel()
+            await self._flush(key)
+
+    async def _flush_later(self, key: str) -> None:
+        await asyncio.sleep(self.window)
+        await self._flush(key)
+
+    async def _flush(self, key: str) -> None:
+        bucket = self._buckets.pop(key, None)
+        if not bucket or not bucket.events:
+            return
+
+        if len(bucket.events) == 1:
+            await self._send(bucket.events[0].text)
+            return
+
+        await self._send(self._format_digest(bucket))
+
+    def _format_digest(self, bucket: _Bucket) -> str:
+        """
+        Сформировать одно сообщение из нескольких событий
+
+        title и summary - HTML: текст пользователя в них экранирует вызывающий код.
+        """
+        events = bucket.events
+        text = f"📬 <b>{bucket.title}</b>: {len(events)} событий\n\n"
+
+        for event in events[:self.MAX_LINES]:
+            text += f"• {event.summary}\n"
+        if len(events) > self.MAX_LINES:
+            text += f"• ... и еще {len(events) - self.MAX_LINES}\n"
+
+        if bucket.link:
+            text += f"\n🔗 {bucket.link}"
+
+        return text
+
+    async def _send(self, text: str) -> None:
+        try:
+            await get_bot().send_message(
+                chat_id=settings.admin_user_id,
+                text=text,
+                parse_mode="HTML"
+            )
+        except TelegramBadRequest as e:
+            # Неэкранированный текст пользователя в разметке: отправляем без
+            # разметки, чтобы не потерять события дайджеста
+            logger.warning(f"Уведомление админу отправлено без разметки: {e}")
+            try:
+                await get_bot().send_message(chat_id=settings.admin_user_id, text=text, parse_mode=None)
+            except Exception as e:
+                logger.error(f"Ошибка отправки уведомления админу: {e}")
+        except Exception as e:
+            logger.error(f"Ошибка отправки уведомления админу: {e}")
+
+
+# Общий дайджест процесса
+admin_digest = AdminDigest(window=settings.admin_digest_window)
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты (token bucket)
+
+    Telegram допускает около 30 сообщений в секунду от бота; лимит
+    выбираем с запасом, всплеск до burst сообщений проходит сразу.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Дождаться разрешения на одну отправку"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class UserNotification:
+    """Уведомление пользователю"""
+    chat_id: int
+    text: str
+
+
+class UserNotifier:
+    """
+    Очередь уведомлений пользователям
+
+    enqueue() не ждет отправки: сообщения уходят в фоне несколькими
+    воркерами с общим ограничением частоты. При TelegramRetryAfter
+    сообщение отправляется повторно после указанной паузы.
+    """
+
+    def __init__(self, rate: float, workers: int = 4):
+        self.limiter = RateLimiter(rate)
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def enqueue(self, notifications: Iterable[UserNotification]) -> int:
+        """Поставить уведомления в очередь, вернуть их количество"""
+        queue = self._ensure_workers()
+        count = 0
+        for notification in notifications:
+            queue.put_nowait(notification)
+            count += 1
+        return count
+
+    def _ensure_workers(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self._queue
+
+    async def _worker(self) -> None:
+        while True:
+            notification = await self._queue.get()
+            try:
+                await self.deliver(notification)
+            finally:
+                self._queue.task_done()
+
+    async def deliver(self, notification: UserNotification, attempts: int = 3) -> bool:
+        """Отправить сразу, с учетом лимита частоты; False - не доставлено"""
+        # Недоступные чаты не тратят лимит частоты
+        if await delivery_tracker.is_suppressed(notification.chat_id):
+            return False
+
+        for _ in range(attempts):
+            await self.limiter.acquire()
+            try:
+                await get_bot().send_message(
+                    chat_id=notification.chat_id,
+                    text=notification.text,
+                    parse_mode="HTML"
+                )
+                return True
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                if not await delivery_tracker.record_failure(notification.chat_id, e):
+                    logger.error(f"Ошибка отправки уведомления пользователю {notification.chat_id}: {e}")
+                return False
+        return False
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Дослать очередь и остановить воркеры (при остановке процесса)"""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Не отправлено уведомлений пользователям: {self._queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+
+# Общая очередь уведомлений пользователям
+user_notifier = UserNotifier(rate=settings.user_notify_rate, workers=settings.user_notify_workers)
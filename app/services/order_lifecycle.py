@@ -0,0 +1,281 @@
+"""
+Жизненный цикл заказа
+
+Все изменения Order.status проходят через OrderLifecycle.transition:
+    - допустимость перехода проверяется по таблице TRANSITION_TABLE,
+      которая строится один раз при импорте из ORDER_TRANSITIONS,
+      GUARDS и ON_ENTER - проверка перехода это один поиск в словаре;
+    - охранные условия (guards) запрещают переход, если заказ к нему
+      не готов (например, ожидание оплаты без цены);
+    - обработчики входа в статус (on-enter hooks) пишут историю,
+      создают запрос оплаты, формируют уведомления пользователю.
+
+Побочные эффекты копятся в LifecycleEffects и применяются в одном месте
+при OrderLifecycle.commit(): после коммита обновляются счетчики переходов
+и вызываются слушатели (register_status_listener) - например, для сброса
+кэшей. Уведомления пользователям только формируются, отправляет их
+вызывающий код (user_notifier.enqueue), как и в остальных сервисах.
+"""
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.database.models.enums import ORDER_TRANSITIONS, STATUS_EMOJI, STATUS_NAMES, OrderStatus
+from app.database.models.order import Order
+from app.database.models.payment import OrderPayment
+from app.database.models.status_history import StatusHistory
+from app.services.metrics import register_collector
+from app.services.notification_service import UserNotification
+
+logger = logging.getLogger(__name__)
+
+# Кто меняет статус
+ACTOR_ADMIN = "admin"
+ACTOR_USER = "user"
+ACTOR_PAYMENT = "payment"
+
+
+class TransitionError(ValueError):
+    """Переход недопустим"""
+
+
+@dataclass
+class LifecycleEffects:
+    """Побочные эффекты переходов, накопленные до коммита"""
+    notifications: List[UserNotification] = field(default_factory=list)
+    changes: List[Tuple[int, OrderStatus, OrderStatus]] = field(default_factory=list)  # (ID заказа, было, стало)
+
+    def notify(self, chat_id: int, text: str) -> None:
+        self.notifications.append(UserNotification(chat_id=chat_id, text=text))
+
+
+@dataclass
+class TransitionContext:
+    """Данные одного перехода для охранных условий и обработчиков"""
+    db: Session
+    order: Order
+    old_status: OrderStatus
+    new_status: OrderStatus
+    note: Optional[str]
+    actor: str
+    notify: bool
+    now: datetime
+    effects: LifecycleEffects
+    notified: bool = False  # Обработчик уже сформировал уведомление пользователю
+
+
+Guard = Callable[[TransitionContext], Optional[str]]   # Причина отказа или None
+Hook = Callable[[TransitionContext], None]
+
+
+# --- Охранные условия ---
+
+def require_price(ctx: TransitionContext) -> Optional[str]:
+    return None if ctx.order.price else "цена не установлена"
+
+
+# --- Обработчики входа в статус ---
+
+def record_history(ctx: TransitionContext) -> None:
+    ctx.db.add(StatusHistory(
+        order_id=ctx.order.id,
+        old_status=ctx.old_status,
+        new_status=ctx.new_status,
+        changed_at=ctx.now,
+        note=ctx.note
+    ))
+
+
+def request_payment(ctx: TransitionContext) -> None:
+    """Запрос оплаты; вместо уведомления о статусе - реквизиты"""
+    from app.services.payment_service import PaymentService
+
+    text = PaymentService(ctx.db).build_payment_request(ctx.order)
+    if ctx.notify:
+        ctx.effects.notify(ctx.order.user.telegram_id, text)
+        ctx.notified = True
+
+
+def close_pending_payments(ctx: TransitionContext) -> None:
+    """Запрос оплаты отозван (заказ отменен или цена отклонена) - платежи больше не ждут сверки"""
+    ctx.db.query(OrderPayment)\
+        .filter(
+            OrderPayment.order_id == ctx.order.id,
+            OrderPayment.is_verified == False,
+            OrderPayment.is_rejected == False
+        )\
+        .update({
+            OrderPayment.is_rejected: True,
+            OrderPayment.rejection_reason: "Запрос оплаты отменен",
+            OrderPayment.rejected_at: ctx.now,
+        }, synchronize_session=False)
+
+
+def notify_status_change(ctx: TransitionContext) -> None:
+    # Пользователь сам меняет статус (принял/отклонил цену) - уведомлять незачем
+    if not ctx.notify or ctx.notified or ctx.actor == ACTOR_USER:
+        return
+    ctx.effects.notify(
+        ctx.order.user.telegram_id,
+        f"🔔 <b>Статус заказа изменен!</b>\n\n"
+        f"Заказ #{ctx.order.id}\n"
+        f"Новый статус: {STATUS_EMOJI[ctx.new_status]} {STATUS_NAMES[ctx.new_status]}"
+    )
+
+
+GUARDS: Dict[OrderStatus, Tuple[Guard, ...]] = {
+    OrderStatus.WAITING_PAYMENT: (require_price,),
+}
+
+ON_ENTER: Dict[OrderStatus, Tuple[Hook, ...]] = {
+    OrderStatus.WAITING_PAYMENT: (request_payment,),
+    OrderStatus.NEW: (close_pending_payments,),
+    OrderStatus.CANCELLED: (close_pending_payments,),
+}
+
+# Выполняются при любом переходе: история - первой, уведомление - последним
+COMMON_BEFORE: Tuple[Hook, ...] = (record_history,)
+COMMON_AFTER: Tuple[Hook, ...] = (notify_status_change,)
+
+
+@dataclass(frozen=True)
+class Transition:
+    """Переход с уже собранными охранными условиями и обработчиками"""
+    source: OrderStatus
+    target: OrderStatus
+    guards: Tuple[Guard, ...]
+    hooks: Tuple[Hook, ...]
+
+
+def build_transition_table() -> Dict[Tuple[OrderStatus, OrderStatus], Transition]:
+    """(было, стало) -> Transition для всех допустимых переходов"""
+    table = {}
+    for source, targets in ORDER_TRANSITIONS.items():
+        for target in targets:
+            table[(source, target)] = Transition(
+                source=source,
+                target=target,
+                guards=GUARDS.get(target, ()),
+                hooks=COMMON_BEFORE + ON_ENTER.get(target, ()) + COMMON_AFTER
+            )
+    return table
+
+
+TRANSITION_TABLE = build_transition_table()
+
+# Число выполненных переходов (было, стало) с запуска процесса
+transition_counts: Counter = Counter()
+
+StatusListener = Callable[[int, OrderStatus, OrderStatus], None]
+_listeners: List[StatusListener] = []
+
+
+def register_status_listener(listener: StatusListener) -> None:
+    """Вызывать listener(order_id, old_status, new_status) после коммита каждого перехода"""
+    _listeners.append(listener)
+
+
+@register_collector
+def _collect_metrics():
+    yield ("order_transitions_total", "counter", "Переходы заказов между статусами",
+           [({"from": old.value, "to": new.value}, count) for (old, new), count in transition_counts.items()])
+
+
+def transition_error(old_status: OrderStatus, new_status: OrderStatus) -> str:
+    return f"переход {STATUS_NAMES[old_status]} → {STATUS_NAMES[new_status]} недопустим"
+
+
+class OrderLifecycle:
+    """Переходы заказов между статусами в рамках одной сессии"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.effects = LifecycleEffects()
+
+    def check(self, order: Order, new_status: OrderStatus) -> Optional[str]:
+        """Причина, по которой переход невозможен, или None"""
+        transition = TRANSITION_TABLE.get((order.status, new_status))
+        if transition is None:
+            return transition_error(order.status, new_status)
+        ctx = self._context(order, new_status, None, ACTOR_ADMIN, False)
+        for guard in transition.guards:
+            reason = guard(ctx)
+            if reason:
+                return reason
+        return None
+
+    def transition(self, order: Order, new_status: OrderStatus, note: Optional[str] = None,
+                   actor: str = ACTOR_ADMIN, notify: bool = True) -> bool:
+        """
+        Перевести заказ в новый статус (без коммита)
+
+        Args:
+            order: Заказ
+            new_status: Новый статус
+            note: Комментарий для истории
+            actor: Кто меняет статус (ACTOR_*)
+            notify: Формировать уведомления пользователю
+
+        Returns:
+            bool: False, если заказ уже в этом статусе
+
+        Raises:
+            TransitionError: Переход недопустим
+        """
+        if order.status == new_status:
+            return False
+
+        transition = TRANSITION_TABLE.get((order.status, new_status))
+        if transition is None:
+            raise TransitionError(transition_error(order.status, new_status))
+
+        ctx = self._context(order, new_status, note, actor, notify)
+        for guard in transition.guards:
+            reason = guard(ctx)
+            if reason:
+                raise TransitionError(reason)
+
+        order.status = new_status
+        order.updated_at = ctx.now
+        for hook in transition.hooks:
+            hook(ctx)
+
+        self.effects.changes.append((order.id, ctx.old_status, new_status))
+        return True
+
+    def commit(self) -> LifecycleEffects:
+        """Зафиксировать переходы и применить побочные эффекты"""
+        try:
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            self.effects = LifecycleEffects()
+            raise
+
+        effects, self.effects = self.effects, LifecycleEffects()
+        for order_id, old_status, new_status in effects.changes:
+            transition_counts[(old_status, new_status)] += 1
+            for listener in _listeners:
+                try:
+                    listener(order_id, old_status, new_status)
+                except Exception as e:
+                    logger.error(f"Ошибка обработчика смены статуса заказа #{order_id}: {e}")
+        return effects
+
+    def _context(self, order: Order, new_status: OrderStatus, note: Optional[str],
+                 actor: str, notify: bool) -> TransitionContext:
+        return TransitionContext(
+            db=self.db,
+            order=order,
+            old_status=order.status,
+            new_status=new_status,
+            note=note,
+            actor=actor,
+            notify=notify,
+            now=datetime.utcnow(),
+            effects=self.effects
+        )
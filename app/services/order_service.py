@@ -1,15 +1,36 @@
-from sqlalchemy.orm import Session
+import logging
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import and_, or_, desc
 from app.database.models.order import Order
 from app.database.models.file import OrderFile
 from app.database.models.status_history import StatusHistory
 from app.database.models import OrderStatus
+from app.database.models.enums import OPEN_STATUSES
 from app.database.models.user import User
+from app.services.deadline_parser import parse_deadline
+from app.services.notification_service import UserNotification
+from app.services.order_lifecycle import ACTOR_ADMIN, LifecycleEffects, OrderLifecycle
+from app.services.storage_service import StorageService
+from app.storage.blob_store import StoredContent
 from typing import Optional, List, Dict, Any, Union
+from dataclasses import dataclass, field
 from datetime import datetime
 import math
 import asyncio
 
+logger = logging.getLogger(__name__)
+
+# Максимум заказов в одной массовой смене статуса
+MAX_BULK_ORDERS = 200
+
+
+@dataclass
+class BulkStatusResult:
+    """Итог массовой смены статуса"""
+    updated: List[int] = field(default_factory=list)
+    skipped: Dict[int, str] = field(default_factory=dict)  # ID заказа -> причина
+    notifications: List[UserNotification] = field(default_factory=list)
+
 
 class OrderService:
     """Сервис для работы с заказами"""
@@ -28,15 +49,17 @@ class OrderService:
             topic=topic,
             volume=volume,
             deadline=deadline,
+            due_at=parse_deadline(deadline),
             requirements=requirements,
             status=OrderStatus.NEW
         )
         self.db.add(order)
-        self.db.commit()
-        self.db.refresh(order)
+        self.db.flush()
         
-        # Добавляем запись в историю статусов
+        # Заказ и запись в истории статусов - одним коммитом
         self.add_status_history(order.id, None, OrderStatus.NEW, "Заказ создан")
+        self.db.commit()
+        self.db.refresh(order)
         
         return order
     
@@ -91,22 +114,98 @@ class OrderService:
             'total_pages': math.ceil(total / per_page) if total > 0 else 1
         }
 
-    def update_order_status(self, order_id: int, new_status: OrderStatus, note: str = None) -> bool:
-        """Обновить статус заказа"""
+    def get_order_ids_by_status(self, status: OrderStatus, limit: int = MAX_BULK_ORDERS) -> List[int]:
+        """ID заказов в статусе (старые первыми)"""
+        rows = self.db.query(Order.id)\
+            .filter(Order.status == status)\
+            .order_by(Order.created_at)\
+            .limit(limit)\
+            .all()
+        return [order_id for (order_id,) in rows]
+
+    def get_orders_due(self, until: datetime, since: Optional[datetime] = None,
+                       limit: int = 100) -> List[Order]:
+        """Незавершенные заказы со сроком до until (по индексу due_at, ближайшие первыми)"""
+        query = self.db.query(Order)\
+            .filter(Order.due_at.isnot(None), Order.due_at <= until, Order.status.in_(OPEN_STATUSES))
+        if since is not None:
+            query = query.filter(Order.due_at > since)
+        return query.order_by(Order.due_at).limit(limit).all()
+
+    def update_order_status(self, order_id: int, new_status: OrderStatus, note: str = None,
+                            actor: str = ACTOR_ADMIN, notify: bool = True) -> Optional[LifecycleEffects]:
+        """
+        Обновить статус заказа через OrderLifecycle
+
+        Returns:
+            LifecycleEffects с уведомлениями для user_notifier.enqueue
+            или None, если заказ не найден
+
+        Raises:
+            TransitionError: Переход недопустим
+        """
         order = self.get_order_by_id(order_id)
         if not order:
-            return False
+            return None
 
-        old_status = order.status
-        order.status = new_status
-        order.updated_at = datetime.utcnow()
-        
-        self.db.commit()
-        
-        # Добавляем запись в историю
-        self.add_status_history(order_id, old_status, new_status, note)
-        
-        return True
+        lifecycle = OrderLifecycle(self.db)
+        lifecycle.transition(order, new_status, note, actor=actor, notify=notify)
+        return lifecycle.commit()
+
+    def bulk_update_status(self, order_ids: List[int], new_status: OrderStatus,
+                           note: str = None) -> BulkStatusResult:
+        """
+        Перевести несколько заказов в новый статус одной транзакцией
+
+        Переходы проверяются OrderLifecycle; заказы с недопустимым
+        переходом пропускаются. Заказы загружаются одним запросом, записи
+        истории (и запросы оплаты для WAITING_PAYMENT) добавляются пачкой
+        и фиксируются одним коммитом. Уведомления пользователям только
+        формируются - отправляет их вызывающий код (user_notifier.enqueue).
+
+        Args:
+            order_ids: ID заказов
+            new_status: Новый статус
+            note: Комментарий для истории
+
+        Returns:
+            BulkStatusResult: Обновленные и пропущенные заказы
+        """
+        ids = list(dict.fromkeys(order_ids))
+        if len(ids) > MAX_BULK_ORDERS:
+            raise ValueError(f"Не больше {MAX_BULK_ORDERS} заказов за раз")
+
+        result = BulkStatusResult()
+        lifecycle = OrderLifecycle(self.db)
+
+        orders = self.db.query(Order)\
+            .options(selectinload(Order.user))\
+            .filter(Order.id.in_(ids))\
+            .with_for_update()\
+            .all()
+        by_id = {order.id: order for order in orders}
+
+        for order_id in ids:
+            order = by_id.get(order_id)
+            if order is None:
+                result.skipped[order_id] = "не найден"
+                continue
+            if order.status == new_status:
+                result.skipped[order_id] = "уже в этом статусе"
+                continue
+            reason = lifecycle.check(order, new_status)
+            if reason:
+                result.skipped[order_id] = reason
+                continue
+
+            lifecycle.transition(order, new_status, note)
+            result.updated.append(order.id)
+
+        result.notifications = lifecycle.commit().notifications
+
+        logger.info(f"Статус {new_status.value}: обновлено заказов {len(result.updated)}, "
+                    f"пропущено {len(result.skipped)}")
+        return result
 
     def update_order_price(self, order_id: int, price: float) -> bool:
         """Установить цену заказа и отправить уведомление пользователю"""
@@ -158,10 +257,10 @@ class OrderService:
             thread.daemon = True
             thread.start()
             
-            print(f"✅ Задача уведомления о цене создана для пользователя {user_telegram_id}")
+            logger.info(f"Задача уведомления о цене создана для пользователя {user_telegram_id}")
             
         except Exception as e:
-            print(f"❌ Ошибка при создании уведомления о цене: {e}")
+            logger.error(f"Ошибка при создании уведомления о цене: {e}")
     
     def _run_async_notification(self, user_telegram_id: int, notification_text: str, order_id: int):
         """Запустить асинхронное уведомление в отдельном потоке"""
@@ -176,7 +275,7 @@ class OrderService:
             )
             
         except Exception as e:
-            print(f"❌ Ошибка при отправке уведомления в потоке: {e}")
+            logger.error(f"Ошибка при отправке уведомления в потоке: {e}")
         finally:
             try:
                 loop.close()
@@ -189,6 +288,11 @@ class OrderService:
             from aiogram import Bot
             from app.config import settings
             from app.bot.keyboards.client import get_price_response_keyboard
+            from app.services.delivery_tracker import delivery_tracker
+            
+            if await delivery_tracker.is_suppressed(user_telegram_id):
+                logger.warning(f"Пользователь {user_telegram_id} недоступен (бот заблокирован), уведомление о цене не отправлено")
+                return
             
             bot = Bot(token=settings.bot_token)
             
@@ -199,17 +303,19 @@ class OrderService:
                 reply_markup=get_price_response_keyboard(order_id)
             )
             
-            print(f"✅ Уведомление о цене отправлено пользователю {user_telegram_id}")
+            logger.info(f"Уведомление о цене отправлено пользователю {user_telegram_id}")
             
             # Закрываем сессию бота
             await bot.session.close()
             
         except Exception as e:
-            print(f"❌ Ошибка отправки уведомления пользователю {user_telegram_id}: {e}")
+            logger.error(f"Ошибка отправки уведомления пользователю {user_telegram_id}: {e}")
+            from app.services.delivery_tracker import delivery_tracker
+            await delivery_tracker.record_failure(user_telegram_id, e)
     
     def add_status_history(self, order_id: int, old_status: OrderStatus, 
                           new_status: OrderStatus, note: str = None):
-        """Добавить запись в историю статусов"""
+        """Добавить запись в историю статусов (вместе с остальными изменениями сессии)"""
         history = StatusHistory(
             order_id=order_id,
             old_status=old_status,
@@ -217,18 +323,22 @@ class OrderService:
             note=note
         )
         self.db.add(history)
-        self.db.commit()
     
     def add_file_to_order(self, order_id: int, filename: str, file_path: str, 
-                         file_size: int = None, file_type: str = None) -> OrderFile:
-        """Добавить файл к заказу"""
+                         file_size: int = None, file_type: str = None,
+                         content: StoredContent = None,
+                         uploaded_by_admin: bool = False) -> OrderFile:
+        """Добавить файл к заказу (content - содержимое в хранилище, если есть)"""
         order_file = OrderFile(
             order_id=order_id,
             filename=filename,
             file_path=file_path,
             file_size=file_size,
-            file_type=file_type
+            file_type=file_type,
+            uploaded_by_admin=uploaded_by_admin
         )
+        if content is not None:
+            order_file.blob = StorageService(self.db).acquire_blob(content)
         self.db.add(order_file)
         self.db.commit()
         self.db.refresh(order_file)
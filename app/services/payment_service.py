@@ -1,15 +1,36 @@
 """
 Сервис для работы с платежами
 """
-from typing import Optional
-from sqlalchemy.orm import Session
+import logging
+import html
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session, selectinload
 from datetime import datetime
 
+from app.services.templates import order_fields, template
 from app.config import settings
 from app.database.models.order import Order
 from app.database.models.payment import OrderPayment
+from app.database.models.blob import StoredBlob
 from app.database.models.file import OrderFile
 from app.database.models.enums import OrderStatus
+from app.services.notification_service import UserNotification
+from app.services.order_lifecycle import ACTOR_PAYMENT, OrderLifecycle
+
+logger = logging.getLogger(__name__)
+
+# Максимум платежей в одной пакетной проверке
+MAX_REVIEW_BATCH = 200
+
+
+@dataclass
+class PaymentReviewResult:
+    """Итог пакетной проверки платежей"""
+    verified: List[int] = field(default_factory=list)
+    rejected: List[int] = field(default_factory=list)
+    skipped: Dict[int, str] = field(default_factory=dict)  # ID платежа -> причина
+    notifications: List[UserNotification] = field(default_factory=list)
 
 
 class PaymentService:
@@ -32,34 +53,61 @@ class PaymentService:
         if not order:
             raise ValueError(f"Заказ #{order_id} не найден")
         
+        payment_message = self.build_payment_request(order)
+        self.db.commit()
+        
+        return payment_message
+    
+    def build_payment_request(self, order: Order) -> str:
+        """
+        Добавить запись о платеже в сессию (без коммита) и вернуть сообщение с реквизитами
+        
+        Args:
+            order: Заказ с установленной ценой
+            
+        Returns:
+            str: Текст сообщения с реквизитами
+        """
+        order_id = order.id
         if not order.price:
             raise ValueError(f"Цена для заказа #{order_id} не установлена")
         
+        # Заказ мог вернуться в ожидание оплаты: ждущий сверки платеж на ту же
+        # сумму переиспользуем, на другую - закрываем
+        pending = self.db.query(OrderPayment)\
+            .filter(
+                OrderPayment.order_id == order_id,
+                OrderPayment.is_verified == False,
+                OrderPayment.is_rejected == False
+            )\
+            .order_by(OrderPayment.created_at.desc())\
+            .all()
+        payment = next((p for p in pending if p.amount == order.price), None)
+        for stale in pending:
+            if stale is not payment:
+                stale.is_rejected = True
+                stale.rejection_reason = "Сумма к оплате изменена"
+                stale.rejected_at = datetime.utcnow()
+        
         # Создаем запись о платеже
-        payment = OrderPayment(
-            order_id=order_id,
-            amount=order.price
-        )
-        self.db.add(payment)
-        self.db.commit()
+        if payment is None:
+            payment = OrderPayment(
+                order_id=order_id,
+                amount=order.price
+            )
+            self.db.add(payment)
         
         # Формируем сообщение с реквизитами
-        payment_message = f"""💰 <b>Заказ #{order_id} готов к оплате!</b>
-
-📝 <b>Работа:</b> {order.work_type.replace('_', ' ').title()}
-📋 <b>Тема:</b> {order.short_topic}
-💵 <b>Сумма к оплате:</b> {order.price:,.2f} ₽
-
-{settings.payment_instructions.format(
-    card_number=settings.payment_card_number,
-    phone=settings.payment_sbp_phone, 
-    bank=settings.payment_bank_name,
-    receiver=settings.payment_receiver_name,
-    order_id=order_id
-)}
-
-🔍 <b>После оплаты пришлите скриншот чека!</b>
-"""
+        payment_message = template("payment_request").render(
+            order_fields(order),
+            instructions=settings.payment_instructions.format(
+                card_number=settings.payment_card_number,
+                phone=settings.payment_sbp_phone,
+                bank=settings.payment_bank_name,
+                receiver=settings.payment_receiver_name,
+                order_id=order_id
+            )
+        )
         
         return payment_message
     
@@ -82,14 +130,18 @@ class PaymentService:
             if not order:
                 return False
             
-            # Получаем последний платеж по заказу
+            # Получаем последний платеж по заказу, ожидающий сверки
             payment = self.db.query(OrderPayment)\
-                .filter(OrderPayment.order_id == order_id)\
+                .filter(
+                    OrderPayment.order_id == order_id,
+                    OrderPayment.is_verified == False,
+                    OrderPayment.is_rejected == False
+                )\
                 .order_by(OrderPayment.created_at.desc())\
                 .first()
             
             if not payment:
-                # Создаем новый платеж если его нет
+                # Создаем новый платеж если его нет (или прошлый отклонен)
                 payment = OrderPayment(
                     order_id=order_id,
                     amount=order.price or 0
@@ -101,14 +153,30 @@ class PaymentService:
             payment.screenshot_message = user_message
             
             self.db.commit()
-            print(f"✅ Скриншот оплаты сохранен для заказа #{order_id}")
+            logger.info(f"Скриншот оплаты сохранен для заказа #{order_id}")
             return True
             
         except Exception as e:
-            print(f"❌ Ошибка обработки скриншота оплаты: {e}")
+            logger.error(f"Ошибка обработки скриншота оплаты: {e}")
             self.db.rollback()
             return False
     
+    def find_payment_by_screenshot(self, order_id: int, sha256: str) -> Optional[OrderPayment]:
+        """
+        Неотклоненный платеж заказа со скриншотом того же содержимого
+
+        Скриншот из отклоненного платежа можно прислать повторно.
+        """
+        return self.db.query(OrderPayment)\
+            .join(OrderFile, OrderPayment.screenshot_file_id == OrderFile.id)\
+            .join(StoredBlob, OrderFile.blob_id == StoredBlob.id)\
+            .filter(
+                OrderPayment.order_id == order_id,
+                OrderPayment.is_rejected == False,
+                StoredBlob.sha256 == sha256
+            )\
+            .first()
+    
     def verify_payment(self, payment_id: int, admin_user_id: int) -> bool:
         """
         Подтвердить платеж
@@ -130,16 +198,14 @@ class PaymentService:
             payment.verified_at = datetime.utcnow()
             
             # Меняем статус заказа на "отправлен"
-            order = payment.order
-            order.status = OrderStatus.SENT
-            order.updated_at = datetime.utcnow()
-            
-            self.db.commit()
-            print(f"✅ Платеж #{payment_id} подтвержден")
+            lifecycle = OrderLifecycle(self.db)
+            self._mark_order_paid(lifecycle, payment)
+            lifecycle.commit()
+            logger.info(f"Платеж #{payment_id} подтвержден")
             return True
             
         except Exception as e:
-            print(f"❌ Ошибка подтверждения платежа: {e}")
+            logger.error(f"Ошибка подтверждения платежа: {e}")
             self.db.rollback()
             return False
     
@@ -166,14 +232,115 @@ class PaymentService:
             payment.rejected_at = datetime.utcnow()
             
             self.db.commit()
-            print(f"✅ Платеж #{payment_id} отклонен")
+            logger.info(f"Платеж #{payment_id} отклонен")
             return True
             
         except Exception as e:
-            print(f"❌ Ошибка отклонения платежа: {e}")
+            logger.error(f"Ошибка отклонения платежа: {e}")
             self.db.rollback()
             return False
     
+    def review_payments(self, verify_ids: List[int], reject_ids: List[int],
+                        reason: Optional[str], admin_user_id: int) -> PaymentReviewResult:
+        """
+        Подтвердить и отклонить несколько платежей одной транзакцией
+
+        Платежи и их заказы загружаются одним запросом, заказы переводятся
+        в SENT через OrderLifecycle, все изменения фиксируются одним коммитом. Уже проверенные
+        и не найденные платежи пропускаются, поэтому повтор запроса безопасен.
+        Уведомления пользователям только формируются - отправляет их
+        вызывающий код (user_notifier.enqueue).
+
+        Args:
+            verify_ids: ID платежей для подтверждения
+            reject_ids: ID платежей для отклонения
+            reason: Причина отклонения
+            admin_user_id: ID администратора
+
+        Returns:
+            PaymentReviewResult: Обработанные и пропущенные платежи
+        """
+        verify_set, reject_set = set(verify_ids), set(reject_ids)
+        if verify_set & reject_set:
+            raise ValueError("Платеж не может быть одновременно подтвержден и отклонен")
+        if len(verify_set) + len(reject_set) > MAX_REVIEW_BATCH:
+            raise ValueError(f"Не больше {MAX_REVIEW_BATCH} платежей за раз")
+        if reject_set and not reason:
+            raise ValueError("Укажите причину отклонения")
+
+        result = PaymentReviewResult()
+        now = datetime.utcnow()
+        lifecycle = OrderLifecycle(self.db)
+
+        payments = self.db.query(OrderPayment)\
+            .options(selectinload(OrderPayment.order).selectinload(Order.user))\
+            .filter(OrderPayment.id.in_(verify_set | reject_set))\
+            .with_for_update()\
+            .all()
+        by_id = {payment.id: payment for payment in payments}
+
+        for payment_id in sorted(verify_set | reject_set):
+            payment = by_id.get(payment_id)
+            if payment is None:
+                result.skipped[payment_id] = "не найден"
+            elif payment.is_verified or payment.is_rejected:
+                result.skipped[payment_id] = "уже проверен"
+            elif payment_id in verify_set:
+                self._apply_verification(lifecycle, payment, now, result)
+            else:
+                self._apply_rejection(payment, reason, now, result)
+
+        lifecycle.commit()
+
+        logger.info(f"Проверка платежей: подтверждено {len(result.verified)}, "
+                    f"отклонено {len(result.rejected)}, пропущено {len(result.skipped)}")
+        return result
+
+    def _mark_order_paid(self, lifecycle: OrderLifecycle, payment: OrderPayment) -> None:
+        """Перевести заказ в SENT, если переход допустим (платеж подтверждается в любом случае)"""
+        order = payment.order
+        if order.status == OrderStatus.SENT:
+            return
+        reason = lifecycle.check(order, OrderStatus.SENT)
+        if reason:
+            logger.warning(f"Платеж #{payment.id} подтвержден, статус заказа #{order.id} не изменен: {reason}")
+            return
+        # Пользователь получает отдельное сообщение о подтверждении оплаты
+        lifecycle.transition(order, OrderStatus.SENT, f"Оплата подтверждена (платеж #{payment.id})",
+                             actor=ACTOR_PAYMENT, notify=False)
+
+    def _apply_verification(self, lifecycle: OrderLifecycle, payment: OrderPayment, now: datetime,
+                            result: PaymentReviewResult) -> None:
+        payment.is_verified = True
+        payment.verified_at = now
+
+        order = payment.order
+        self._mark_order_paid(lifecycle, payment)
+
+        result.verified.append(payment.id)
+        result.notifications.append(UserNotification(
+            chat_id=order.user.telegram_id,
+            text=(f"✅ <b>Оплата заказа #{order.id} подтверждена!</b>\n\n"
+                  f"💵 Сумма: {payment.amount_rub}\n"
+                  f"📋 {html.escape(order.short_topic)}\n\n"
+                  f"Спасибо! Готовая работа будет отправлена в этот чат.")
+        ))
+
+    def _apply_rejection(self, payment: OrderPayment, reason: str, now: datetime,
+                         result: PaymentReviewResult) -> None:
+        payment.is_rejected = True
+        payment.rejection_reason = reason
+        payment.rejected_at = now
+
+        order = payment.order
+        result.rejected.append(payment.id)
+        result.notifications.append(UserNotification(
+            chat_id=order.user.telegram_id,
+            text=(f"❌ <b>Оплата заказа #{order.id} не подтверждена</b>\n\n"
+                  f"Причина: {html.escape(reason)}\n\n"
+                  f"Пожалуйста, проверьте перевод и пришлите скриншот чека еще раз.")
+        ))
+    
     def get_pending_payments(self, limit: int = 20):
         """Получить платежи на проверке"""
         return self.db.query(OrderPayment)\
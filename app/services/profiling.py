@@ -0,0 +1,193 @@
+"""
+Профилирование живого процесса (бот и админ-панель)
+
+    - sample_profile: выборочный профиль потока цикла событий на заданное
+      время. Отдельный поток раз в PROFILE_SAMPLE_INTERVAL_MS читает стек
+      через sys._current_frames(); результат - свернутые стеки
+      ("a;b;c 42" по строке), их понимают flamegraph.pl, speedscope
+      и inferno. Процесс не останавливается и не перезапускается;
+    - dump_tasks: стеки всех задач asyncio - где ждет каждая корутина;
+    - LoopWatchdog: поток-сторож цикла событий. Если цикл не отвечает
+      дольше LOOP_BLOCK_THRESHOLD_MS (синхронный запрос к БД, чтение файла
+      в обработчике), в лог пишется стек, на котором он стоит, - пока
+      блокировка еще идет. Встроенный slow_callback_duration asyncio
+      работает только в режиме отладки и не показывает стек.
+
+Доступ: команда админа /profile в боте и /debug/profile, /debug/tasks
+в админ-панели.
+"""
+import asyncio
+import io
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import List, Optional
+
+from app.config import settings
+from app.services.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+loop_stalls = counter("event_loop_stalls_total", "Блокировки цикла событий дольше порога")
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    """Профиль уже снимается"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    for prefix in sys.path:
+        if prefix and filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _fold(frame) -> str:
+    """Стек от корня к листу через ';'"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _sample(thread_ids: Optional[List[int]], seconds: float, interval: float) -> Counter:
+    stacks: Counter = Counter()
+    own_id = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or (thread_ids is not None and thread_id not in thread_ids):
+                continue
+            prefix = names.get(thread_id, str(thread_id)) if thread_ids is None else ""
+            stack = _fold(frame)
+            stacks[f"{prefix};{stack}" if prefix else stack] += 1
+        time.sleep(interval)
+    return stacks
+
+
+async def sample_profile(seconds: float, all_threads: bool = False) -> str:
+    """
+    Снять выборочный профиль процесса
+
+    Args:
+        seconds: Длительность (не больше settings.profile_max_seconds)
+        all_threads: Все потоки процесса (первый элемент стека - имя потока),
+            иначе только поток цикла событий
+
+    Returns:
+        Свернутые стеки для flamegraph, по строке "стек число_выборок"
+
+    Raises:
+        ProfilerBusyError: Другой профиль еще снимается
+    """
+    seconds = min(max(seconds, 0.1), settings.profile_max_seconds)
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("Профиль уже снимается")
+    try:
+        thread_ids = None if all_threads else [threading.get_ident()]
+        interval = settings.profile_sample_interval_ms / 1000
+        logger.info(f"Снятие профиля: {seconds:.1f} с, интервал {interval * 1000:.0f} мс")
+        stacks = await asyncio.to_thread(_sample, thread_ids, seconds, interval)
+    finally:
+        _profile_lock.release()
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def dump_tasks() -> str:
+    """Стеки всех задач asyncio текущего цикла"""
+    tasks = sorted(asyncio.all_tasks(), key=lambda task: task.get_name())
+    output = io.StringIO()
+    output.write(f"Задач: {len(tasks)}\n")
+    for task in tasks:
+        output.write("\n")
+        task.print_stack(file=output)
+    return output.getvalue()
+
+
+class LoopWatchdog:
+    """
+    Сторож цикла событий
+
+    Задача в цикле отмечается каждые threshold/2; поток проверяет отметку.
+    Если ее нет дольше порога, цикл занят синхронным кодом: поток пишет
+    в лог стек потока цикла (один раз на блокировку), а когда цикл
+    освободится - сколько длилась блокировка.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stall_started: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Запустить из работающего цикла событий"""
+        if self._task is not None or self.threshold <= 0:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="loop_watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop_watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Сторож цикла событий: порог {self.threshold * 1000:.0f} мс")
+
+    def stop(self) -> None:
+        """Остановить; после stop сторож можно снова запустить через start"""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            # Поток просыпается каждые threshold/4 - дольше порога не ждем
+            self._thread.join(timeout=self.threshold)
+            self._thread = None
+        self._stall_started = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            now = time.monotonic()
+            if self._stall_started is not None:
+                logger.warning(
+                    f"Цикл событий был заблокирован {(now - self._stall_started) * 1000:.0f} мс"
+                )
+                self._stall_started = None
+            self._beat = now
+            await asyncio.sleep(self.threshold / 2)
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.threshold / 4):
+            beat = self._beat
+            lag = time.monotonic() - beat
+            # Полпорога - период отметок, блокировка - сверх него
+            if lag < self.threshold * 1.5 or self._stall_started is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._stall_started = beat + self.threshold / 2
+            loop_stalls.inc()
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(
+                f"Цикл событий не отвечает {lag * 1000:.0f} мс, выполняется:\n{stack}",
+                extra={"loop_lag_ms": round(lag * 1000)},
+            )
+
+
+# Сторож процесса (порог из настроек; 0 - выключен)
+loop_watchdog = LoopWatchdog(settings.loop_block_threshold_ms / 1000)
@@ -0,0 +1,265 @@
+"""
+Сервис сверки банковской выписки с ожидающими платежами
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.models.payment import OrderPayment
+from app.services.bank_statement import BankTransaction, InvalidRow, StatementRow
+from app.services.notification_service import UserNotification
+from app.services.payment_service import MAX_REVIEW_BATCH, PaymentService
+
+# Номер заказа в комментарии к переводу: "#123" (из payment_instructions), "заказ 123", "заказ №123"
+ORDER_NUMBER_RE = re.compile(r"#\s*(\d{1,9})\b|заказ\w*\s*(?:№|n|#)?\s*(\d{1,9})\b", re.IGNORECASE)
+
+# Запас на расхождение часов банка и сервера
+CLOCK_SKEW = timedelta(hours=1)
+
+# Сколько примеров несопоставленных операций показывать в отчете
+UNMATCHED_SAMPLES = 20
+
+# Сколько неразобранных строк перечислять в отчете
+INVALID_ROWS_LIMIT = 200
+
+
+def amount_key(amount: Decimal) -> int:
+    """Сумма в копейках - ключ индекса"""
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def extract_order_numbers(description: str) -> Set[int]:
+    """Номера заказов из комментария к переводу"""
+    return {int(a or b) for a, b in ORDER_NUMBER_RE.findall(description or "")}
+
+
+@dataclass
+class PaymentCandidate:
+    """Ожидающий платеж в индексе"""
+    payment_id: int
+    order_id: int
+    amount: int      # В копейках
+    created_at: datetime
+
+
+@dataclass
+class MatchResult:
+    """Операция выписки и подходящие платежи"""
+    transaction: BankTransaction
+    candidates: List[PaymentCandidate]
+    reason: str
+
+    def to_dict(self) -> dict:
+        return {
+            "line": self.transaction.line,
+            "posted_at": self.transaction.posted_at.isoformat(),
+            "amount": str(self.transaction.amount),
+            "description": self.transaction.description,
+            "transaction_id": self.transaction.transaction_id,
+            "reason": self.reason,
+            "candidates": [
+                {"payment_id": c.payment_id, "order_id": c.order_id}
+                for c in self.candidates
+            ],
+        }
+
+
+@dataclass
+class ReconciliationReport:
+    """Итоги сверки"""
+    transactions: int = 0
+    incoming: int = 0
+    already_imported: int = 0
+    confident: List[MatchResult] = field(default_factory=list)    # Номер заказа + сумма + время
+    probable: List[MatchResult] = field(default_factory=list)     # Единственный платеж с такой суммой
+    ambiguous: List[MatchResult] = field(default_factory=list)    # Несколько кандидатов или расхождения
+    unmatched: int = 0
+    unmatched_samples: List[BankTransaction] = field(default_factory=list)
+    invalid: int = 0                                               # Строки с неверной суммой или датой
+    invalid_rows: List[InvalidRow] = field(default_factory=list)
+    verified: List[int] = field(default_factory=list)
+    notifications: List[UserNotification] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "transactions": self.transactions,
+            "incoming": self.incoming,
+            "already_imported": self.already_imported,
+            "confident": [m.to_dict() for m in self.confident],
+            "probable": [m.to_dict() for m in self.probable],
+            "ambiguous": [m.to_dict() for m in self.ambiguous],
+            "unmatched": self.unmatched,
+            "unmatched_samples": [
+                {"line": t.line, "amount": str(t.amount), "description": t.description}
+                for t in self.unmatched_samples
+            ],
+            "invalid": self.invalid,
+            "invalid_rows": [{"line": row.line, "error": row.error} for row in self.invalid_rows],
+            "verified": self.verified,
+        }
+
+
+class PaymentMatcher:
+    """
+    Индекс ожидающих платежей в памяти
+
+    Платежи разложены по сумме (в копейках) и по номеру заказа, поэтому
+    каждая операция выписки сопоставляется за O(кандидатов с той же
+    суммой), а не перебором всех платежей.
+    """
+
+    def __init__(self, candidates: Iterable[PaymentCandidate], window: timedelta):
+        self.window = window
+        self.by_amount: Dict[int, List[PaymentCandidate]] = {}
+        self.by_order: Dict[int, List[PaymentCandidate]] = {}
+        for candidate in candidates:
+            self.by_amount.setdefault(candidate.amount, []).append(candidate)
+            self.by_order.setdefault(candidate.order_id, []).append(candidate)
+
+    def _in_window(self, candidate: PaymentCandidate, transaction: BankTransaction) -> bool:
+        if transaction.has_time:
+            return candidate.created_at - CLOCK_SKEW <= transaction.posted_at <= candidate.created_at + self.window
+        # В выписке только дата - сравниваем по дням
+        return candidate.created_at.date() <= transaction.posted_at.date() <= (candidate.created_at + self.window).date()
+
+    def claim(self, candidate: PaymentCandidate) -> None:
+        """Убрать сопоставленный платеж из индекса"""
+        self.by_amount[candidate.amount].remove(candidate)
+        self.by_order[candidate.order_id].remove(candidate)
+
+    def match(self, transaction: BankTransaction) -> Optional[MatchResult]:
+        """
+        Сопоставить операцию с платежами
+
+        Returns:
+            MatchResult с reason "order_and_amount" (уверенное совпадение),
+            "amount_only", "amount_mismatch", "several_candidates" или None
+        """
+        amount = amount_key(transaction.amount)
+        by_amount = [c for c in self.by_amount.get(amount, ()) if self._in_window(c, transaction)]
+
+        order_numbers = extract_order_numbers(transaction.description)
+        if order_numbers:
+            exact = [c for c in by_amount if c.order_id in order_numbers]
+            if exact:
+                # Повторный запрос оплаты по тому же заказу - берем последний
+                best = max(exact, key=lambda c: c.created_at)
+                return MatchResult(transaction, [best], "order_and_amount")
+
+            same_order = [c for number in order_numbers for c in self.by_order.get(number, ())]
+            if same_order:
+                return MatchResult(transaction, same_order, "amount_mismatch")
+
+        if len(by_amount) == 1:
+            return MatchResult(transaction, by_amount, "amount_only")
+        if by_amount:
+            return MatchResult(transaction, by_amount, "several_candidates")
+        return None
+
+
+class ReconciliationService:
+    """Сервис сверки банковских выписок с платежами"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _pending_candidates(self) -> List[PaymentCandidate]:
+        rows = self.db.query(OrderPayment.id, OrderPayment.order_id,
+                             OrderPayment.amount, OrderPayment.created_at)\
+            .filter(OrderPayment.is_verified == False, OrderPayment.is_rejected == False)\
+            .all()
+        return [
+            PaymentCandidate(payment_id, order_id, amount_key(amount), created_at)
+            for payment_id, order_id, amount, created_at in rows
+        ]
+
+    def _imported_transaction_ids(self) -> Set[str]:
+        rows = self.db.query(OrderPayment.transaction_id)\
+            .filter(OrderPayment.transaction_id.isnot(None))
+        return {transaction_id for (transaction_id,) in rows}
+
+    def reconcile(self, transactions: Iterable[StatementRow], admin_user_id: int,
+                  auto_verify: Optional[bool] = None) -> ReconciliationReport:
+        """
+        Сверить операции выписки с ожидающими платежами
+
+        Уверенные совпадения (номер заказа в комментарии, та же сумма,
+        операция в окне после запроса оплаты) подтверждаются пачками
+        через PaymentService.review_payments, ID операции
+        сохраняется в OrderPayment.transaction_id - повторный импорт той же
+        выписки ничего не меняет. Остальные совпадения и неразобранные
+        строки попадают в отчет.
+
+        Args:
+            transactions: Операции выписки (генератор iter_statement)
+            admin_user_id: ID администратора
+            auto_verify: Подтверждать уверенные совпадения (по умолчанию из настроек)
+
+        Returns:
+            ReconciliationReport: Отчет; уведомления пользователям в report.notifications
+        """
+        if auto_verify is None:
+            auto_verify = settings.reconcile_auto_verify
+
+        report = ReconciliationReport()
+        matcher = PaymentMatcher(self._pending_candidates(), timedelta(days=settings.reconcile_window_days))
+        imported = self._imported_transaction_ids()
+
+        for transaction in transactions:
+            if isinstance(transaction, InvalidRow):
+                report.invalid += 1
+                if len(report.invalid_rows) < INVALID_ROWS_LIMIT:
+                    report.invalid_rows.append(transaction)
+                continue
+
+            report.transactions += 1
+            if transaction.amount <= 0:
+                continue
+            report.incoming += 1
+
+            if transaction.transaction_id and transaction.transaction_id in imported:
+                report.already_imported += 1
+                continue
+
+            result = matcher.match(transaction)
+            if result is None:
+                report.unmatched += 1
+                if len(report.unmatched_samples) < UNMATCHED_SAMPLES:
+                    report.unmatched_samples.append(transaction)
+            elif result.reason == "order_and_amount":
+                matcher.claim(result.candidates[0])
+                report.confident.append(result)
+            elif result.reason == "amount_only":
+                report.probable.append(result)
+            else:
+                report.ambiguous.append(result)
+
+        if auto_verify and report.confident:
+            self._verify(report, admin_user_id)
+
+        return report
+
+    def _verify(self, report: ReconciliationReport, admin_user_id: int) -> None:
+        payment_ids = [match.candidates[0].payment_id for match in report.confident]
+        payments = self.db.query(OrderPayment).filter(OrderPayment.id.in_(payment_ids)).all()
+        by_id = {payment.id: payment for payment in payments}
+
+        # Изменения фиксируются вместе с подтверждением в review_payments
+        for match in report.confident:
+            payment = by_id[match.candidates[0].payment_id]
+            payment.payment_method = "bank_statement"
+            if match.transaction.transaction_id:
+                payment.transaction_id = match.transaction.transaction_id
+
+        payment_service = PaymentService(self.db)
+        for start in range(0, len(payment_ids), MAX_REVIEW_BATCH):
+            result = payment_service.review_payments(
+                payment_ids[start:start + MAX_REVIEW_BATCH], [], None, admin_user_id
+            )
+            report.verified.extend(result.verified)
+            report.notifications.extend(result.notifications)
@@ -0,0 +1,280 @@
+"""
+Напоминания админу о сроках заказов (SLA)
+
+Сроки лежат в индексированной колонке Order.due_at (см. deadline_parser).
+Планировщик держит в памяти кучу напоминаний только для заказов со сроком
+в ближайшие settings.sla_horizon_hours. Каждые settings.sla_refill_interval
+секунд он подгружает по индексу due_at лишь новое: сроки, вошедшие в окно,
+и заказы, созданные после прошлой подгрузки. Все заказы не перебираются
+никогда; ближайшее напоминание - вершина кучи, ожидание до него - один sleep.
+
+Старые заказы без due_at заполняются при старте (backfill_due_dates) или вручную:
+    python -m app.services.sla_service --backfill
+"""
+import argparse
+import asyncio
+import heapq
+import html
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.connection import get_db_session
+from app.database.models import get_status_text
+from app.database.models.enums import OPEN_STATUSES
+from app.database.models.order import Order
+from app.services.deadline_parser import parse_deadline, to_local
+from app.services.notification_service import admin_digest
+
+logger = logging.getLogger(__name__)
+
+_sla_task: Optional[asyncio.Task] = None
+
+# Запас при подгрузке новых заказов: created_at ставится до коммита,
+# заказ может стать видимым позже начала прошлой подгрузки
+REFILL_OVERLAP = timedelta(minutes=5)
+
+
+@dataclass(order=True)
+class Reminder:
+    """Напоминание в куче (упорядочено по времени срабатывания)"""
+    fire_at: datetime
+    order_id: int = field(compare=False)
+    due_at: datetime = field(compare=False)
+
+
+def backfill_due_dates(db: Session, batch_size: int = 500) -> int:
+    """
+    Заполнить due_at для заказов, где он пуст
+
+    Относительные сроки ("через неделю") считаются от времени создания
+    заказа. Заказы обходятся пачками по ID, каждая пачка - один коммит.
+
+    Returns:
+        int: Сколько сроков распознано
+    """
+    parsed = 0
+    last_id = 0
+    while True:
+        orders = db.query(Order)\
+            .filter(Order.id > last_id, Order.due_at.is_(None))\
+            .order_by(Order.id)\
+            .limit(batch_size)\
+            .all()
+        if not orders:
+            break
+
+        for order in orders:
+            last_id = order.id
+            due_at = parse_deadline(order.deadline, now=order.created_at)
+            if due_at is not None:
+                order.due_at = due_at
+                parsed += 1
+        db.commit()
+
+    logger.info(f"Сроки заказов: распознано {parsed}")
+    return parsed
+
+
+class SLAScheduler:
+    """Куча напоминаний о сроках с подгрузкой по окну"""
+
+    def __init__(self, reminder_hours: Optional[Sequence[float]] = None,
+                 horizon_hours: Optional[int] = None):
+        hours = settings.sla_reminder_hours if reminder_hours is None else reminder_hours
+        self.leads = sorted((timedelta(hours=h) for h in hours), reverse=True)
+        self.horizon = timedelta(hours=settings.sla_horizon_hours if horizon_hours is None else horizon_hours)
+        self._heap: List[Reminder] = []
+        self._scheduled: Dict[int, datetime] = {}   # ID заказа -> due_at в куче
+        self._loaded_until: Optional[datetime] = None
+        self._last_refill: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def refill(self, db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Подгрузить в кучу сроки из окна [now, now + horizon]
+
+        Returns:
+            int: Сколько заказов добавлено
+        """
+        now = now or datetime.utcnow()
+        window_end = now + self.horizon
+
+        query = db.query(Order.id, Order.due_at)\
+            .filter(Order.due_at > now, Order.due_at <= window_end, Order.status.in_(OPEN_STATUSES))
+        if self._loaded_until is not None:
+            # Уже загруженная часть окна - только заказы, созданные после прошлой подгрузки
+            query = query.filter(or_(Order.due_at > self._loaded_until,
+                                     Order.created_at >= self._last_refill - REFILL_OVERLAP))
+
+        added = 0
+        for order_id, due_at in query:
+            added += self.schedule(order_id, due_at, now)
+
+        self._loaded_until, self._last_refill = window_end, now
+        for order_id, due_at in list(self._scheduled.items()):
+            if due_at < now - self.horizon:
+                del self._scheduled[order_id]
+        return added
+
+    def schedule(self, order_id: int, due_at: datetime, now: datetime) -> bool:
+        """Запланировать напоминания по заказу; уже прошедшие сводятся к одному немедленному"""
+        if self._scheduled.get(order_id) == due_at:
+            return False
+        self._scheduled[order_id] = due_at
+
+        missed = False
+        for lead in self.leads:
+            fire_at = due_at - lead
+            if fire_at > now:
+                heapq.heappush(self._heap, Reminder(fire_at, order_id, due_at))
+            else:
+                missed = True
+        if missed:
+            heapq.heappush(self._heap, Reminder(now, order_id, due_at))
+        return True
+
+    def next_fire_at(self) -> Optional[datetime]:
+        return self._heap[0].fire_at if self._heap else None
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[Reminder]:
+        """Напоминания, время которых наступило"""
+        now = now or datetime.utcnow()
+        due = []
+        while self._heap and self._heap[0].fire_at <= now:
+            reminder = heapq.heappop(self._heap)
+            # Срок заказа мог смениться - старые напоминания пропускаем
+            if self._scheduled.get(reminder.order_id) == reminder.due_at:
+                due.append(reminder)
+        return due
+
+
+def format_reminder(order: Order, now: datetime) -> str:
+    left = order.due_at - now
+    if left <= timedelta(0):
+        header = f"🔥 <b>Срок заказа #{order.id} истек</b>"
+    elif left < timedelta(hours=1):
+        header = f"⏰ <b>Срок заказа #{order.id} меньше чем через час</b>"
+    else:
+        hours = int(left.total_seconds() // 3600)
+        header = (f"⏰ <b>Срок заказа #{order.id} через {hours // 24} дн. {hours % 24} ч</b>"
+                  if hours >= 24 else f"⏰ <b>Срок заказа #{order.id} через {hours} ч</b>")
+
+    text = f"{header}\n\n"
+    text += f"📝 {html.escape(order.work_type)}: {html.escape(order.short_topic)}\n"
+    text += f"📊 Статус: {get_status_text(order.status)}\n"
+    text += f"⏰ Срок: {html.escape(order.deadline)} ({to_local(order.due_at).strftime('%d.%m.%Y %H:%M')})\n\n"
+    text += f"🔗 http://127.0.0.1:8000/orders/{order.id}"
+    return text
+
+
+class SLAService:
+    """Цикл планировщика в процессе бота"""
+
+    def __init__(self, scheduler: Optional[SLAScheduler] = None):
+        self.scheduler = scheduler or SLAScheduler()
+
+    def _refill(self) -> int:
+        db = get_db_session()
+        try:
+            return self.scheduler.refill(db)
+        finally:
+            db.close()
+
+    def _load_orders(self, reminders: List[Reminder]) -> List[Order]:
+        """Заказы для сработавших напоминаний, если они все еще в работе и срок не сменился"""
+        db = get_db_session()
+        try:
+            ids = {reminder.order_id for reminder in reminders}
+            due_by_id = {reminder.order_id: reminder.due_at for reminder in reminders}
+            orders = db.query(Order)\
+                .filter(Order.id.in_(ids), Order.status.in_(OPEN_STATUSES))\
+                .all()
+            return [order for order in orders if order.due_at == due_by_id[order.id]]
+        finally:
+            db.close()
+
+    async def _fire(self, reminders: List[Reminder]) -> None:
+        now = datetime.utcnow()
+        for order in await asyncio.to_thread(self._load_orders, reminders):
+            text = format_reminder(order, now)
+            await admin_digest.notify(
+                text,
+                key="sla",
+                summary=text.split("\n", 1)[0],
+                title="Сроки заказов"
+            )
+
+    async def run(self) -> None:
+        try:
+            await asyncio.to_thread(collect_due_dates)
+        except Exception as e:
+            logger.error(f"Ошибка заполнения сроков заказов: {e}")
+
+        next_refill = datetime.utcnow()
+        while True:
+            now = datetime.utcnow()
+            try:
+                if now >= next_refill:
+                    await asyncio.to_thread(self._refill)
+                    next_refill = now + timedelta(seconds=settings.sla_refill_interval)
+
+                reminders = self.scheduler.pop_due(now)
+                if reminders:
+                    await self._fire(reminders)
+            except Exception as e:
+                logger.error(f"Ошибка планировщика сроков: {e}")
+                next_refill = now + timedelta(seconds=settings.sla_refill_interval)
+
+            wake_at = next_refill
+            next_fire = self.scheduler.next_fire_at()
+            if next_fire is not None and next_fire < wake_at:
+                wake_at = next_fire
+            await asyncio.sleep(max((wake_at - datetime.utcnow()).total_seconds(), 0.1))
+
+
+def collect_due_dates() -> int:
+    """Заполнить пустые due_at в отдельной сессии (блокирующий вызов)"""
+    db = get_db_session()
+    try:
+        return backfill_due_dates(db)
+    finally:
+        db.close()
+
+
+def start_sla_scheduler() -> None:
+    """Запустить напоминания о сроках (в процессе бота)"""
+    global _sla_task
+    if settings.sla_enabled and _sla_task is None:
+        _sla_task = asyncio.create_task(SLAService().run())
+
+
+def stop_sla_scheduler() -> None:
+    """Остановить напоминания о сроках"""
+    global _sla_task
+    if _sla_task is not None:
+        _sla_task.cancel()
+        _sla_task = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сроки заказов")
+    parser.add_argument("--backfill", action="store_true", help="Заполнить due_at для старых заказов")
+    args = parser.parse_args()
+
+    if args.backfill:
+        print(f"✅ Распознано сроков: {collect_due_dates()}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,199 @@
+"""
+Сервис учета содержимого файлов в хранилище
+"""
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database.models.blob import StoredBlob
+from app.database.models.file import OrderFile
+from app.database.models.order import Order
+from app.database.models.user import User
+from app.storage.blob_store import StoredContent, delete_blob
+
+
+class StorageService:
+    """Сервис для работы с хранилищем файлов (счетчики ссылок на содержимое)"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        # Содержимое без ссылок: удаляется из хранилища после коммита
+        self._to_delete: List[str] = []
+
+    def get_blob_by_hash(self, sha256: str) -> Optional[StoredBlob]:
+        """Получить содержимое по SHA-256"""
+        return self.db.query(StoredBlob).filter(StoredBlob.sha256 == sha256).first()
+
+    def get_blob_by_telegram_unique_id(self, file_unique_id: str) -> Optional[StoredBlob]:
+        """Получить содержимое по file_unique_id Telegram"""
+        return self.db.query(StoredBlob)\
+            .filter(StoredBlob.telegram_file_unique_id == file_unique_id)\
+            .first()
+
+    def acquire_blob(self, content: StoredContent) -> StoredBlob:
+        """
+        Получить или создать запись о содержимом и увеличить счетчик ссылок
+
+        Изменения не фиксируются: коммит делает вызывающий код вместе
+        с созданием OrderFile.
+        """
+        blob = self.get_blob_by_hash(content.sha256)
+
+        if blob is None:
+            blob = StoredBlob(
+                sha256=content.sha256,
+                size=content.size,
+                storage_path=content.path,
+                ref_count=0
+            )
+            try:
+                # Точка сохранения: при конфликте откатывается только вставка,
+                # а не изменения вызывающего кода в этой сессии
+                with self.db.begin_nested():
+                    self.db.add(blob)
+            except IntegrityError:
+                # Ту же запись параллельно создал другой процесс
+                blob = self.get_blob_by_hash(content.sha256)
+
+        if content.telegram_file_id:
+            self.remember_telegram_file(
+                blob,
+                content.telegram_file_id,
+                content.telegram_file_unique_id,
+                content.telegram_file_type
+            )
+
+        # Сразу в БД: второе увеличение в той же сессии до коммита
+        # иначе заменило бы первое
+        blob.ref_count = StoredBlob.ref_count + 1
+        self.db.flush()
+        return blob
+
+    def remember_telegram_file(self, blob: StoredBlob, file_id: str,
+                               file_unique_id: Optional[str], file_type: str) -> None:
+        """
+        Запомнить file_id Telegram для содержимого
+
+        send_document принимает только file_id документа, поэтому file_id
+        фотографии не заменяет уже известный file_id документа.
+        Изменения не фиксируются.
+        """
+        if blob.telegram_file_type == "document" and file_type != "document":
+            return
+
+        blob.telegram_file_id = file_id
+        blob.telegram_file_unique_id = file_unique_id
+        blob.telegram_file_type = file_type
+
+    def forget_telegram_file(self, blob: StoredBlob) -> None:
+        """Сбросить file_id, который Telegram больше не принимает"""
+        blob.telegram_file_id = None
+        blob.telegram_file_unique_id = None
+        blob.telegram_file_type = None
+        self.db.commit()
+
+    def find_order_file_by_hash(self, order_id: int, sha256: str) -> Optional[OrderFile]:
+        """Найти файл заказа с таким же содержимым (проверка дубликатов)"""
+        return self.db.query(OrderFile)\
+            .join(StoredBlob, OrderFile.blob_id == StoredBlob.id)\
+            .filter(OrderFile.order_id == order_id, StoredBlob.sha256 == sha256)\
+            .first()
+
+    def release_file(self, order_file: OrderFile) -> None:
+        """
+        Освободить содержимое файла заказа перед удалением записи
+
+        Содержимое, на которое не остается ссылок (и файлы, сохраненные до
+        появления хранилища), удаляется из хранилища в commit(), после
+        фиксации транзакции: при откате записи продолжают на него ссылаться.
+        """
+        blob = order_file.blob
+
+        if blob is None:
+            if order_file.file_path:
+                self._to_delete.append(order_file.file_path)
+            return
+
+        blob.ref_count = StoredBlob.ref_count - 1
+        self.db.flush()
+        self.db.refresh(blob)
+
+        if blob.ref_count <= 0:
+            self._to_delete.append(blob.storage_path)
+            self.db.delete(blob)
+
+    def commit(self) -> None:
+        """Зафиксировать сессию и удалить освобожденное содержимое"""
+        self.db.commit()
+
+        to_delete, self._to_delete = self._to_delete, []
+        for storage_path in to_delete:
+            delete_blob(storage_path)
+
+    def delete_order_file(self, order_file: OrderFile) -> None:
+        """Удалить файл заказа вместе со ссылкой на содержимое"""
+        self.release_file(order_file)
+        self.db.delete(order_file)
+        self.commit()
+
+    def _file_bytes(self):
+        """Размер файла: по содержимому в хранилище, для старых файлов - из OrderFile"""
+        return func.coalesce(func.sum(func.coalesce(StoredBlob.size, OrderFile.file_size, 0)), 0)
+
+    def get_usage_totals(self) -> dict:
+        """
+        Общий объем файлов
+
+        files_bytes - сумма размеров всех файлов заказов, stored_bytes -
+        сколько они занимают в хранилище с учетом дедупликации.
+        """
+        files_count, files_bytes = self.db.query(func.count(OrderFile.id), self._file_bytes())\
+            .outerjoin(StoredBlob, OrderFile.blob_id == StoredBlob.id)\
+            .one()
+
+        blobs_bytes = self.db.query(func.coalesce(func.sum(StoredBlob.size), 0)).scalar()
+        legacy_bytes = self.db.query(func.coalesce(func.sum(OrderFile.file_size), 0))\
+            .filter(OrderFile.blob_id.is_(None))\
+            .scalar()
+
+        return {
+            "files": files_count,
+            "files_bytes": files_bytes,
+            "stored_bytes": blobs_bytes + legacy_bytes,
+        }
+
+    def get_usage_by_order(self, limit: int = 20) -> List[dict]:
+        """Заказы, занимающие больше всего места"""
+        total = self._file_bytes().label("bytes")
+        rows = self.db.query(OrderFile.order_id, func.count(OrderFile.id), total)\
+            .outerjoin(StoredBlob, OrderFile.blob_id == StoredBlob.id)\
+            .group_by(OrderFile.order_id)\
+            .order_by(total.desc())\
+            .limit(limit)\
+            .all()
+
+        return [
+            {"order_id": order_id, "files": files, "bytes": size}
+            for order_id, files, size in rows
+        ]
+
+    def get_usage_by_user(self, limit: int = 20) -> List[dict]:
+        """Пользователи, файлы заказов которых занимают больше всего места"""
+        total = self._file_bytes().label("bytes")
+        rows = self.db.query(User.id, User.telegram_id, User.username,
+                             func.count(OrderFile.id), total)\
+            .join(Order, Order.user_id == User.id)\
+            .join(OrderFile, OrderFile.order_id == Order.id)\
+            .outerjoin(StoredBlob, OrderFile.blob_id == StoredBlob.id)\
+            .group_by(User.id, User.telegram_id, User.username)\
+            .order_by(total.desc())\
+            .limit(limit)\
+            .all()
+
+        return [
+            {"user_id": user_id, "telegram_id": telegram_id, "username": username,
+             "files": files, "bytes": size}
+            for user_id, telegram_id, username, files, size in rows
+        ]
@@ -0,0 +1,312 @@
+"""
+Шаблоны текстов бота
+
+Модуль не зависит от aiogram: тексты рендерят и обработчики бота, и сервисы.
+
+Тексты хранятся в каталоге по языкам (CATALOG) и разбираются один раз
+при импорте: поля каждого шаблона проверяются, рендер - один вызов
+format_map без склейки строк по кусочкам.
+
+Поля заказа (HTML-экранированные, с обрезанной темой, отформатированными
+ценой и датами) готовятся один раз и вместе с готовыми фрагментами
+(строка списка, карточка заказа) лежат в LRU с ключом
+(ID заказа, вид фрагмента, язык). Запись действительна, пока не изменился
+Order.updated_at; при смене статуса через OrderLifecycle записи заказа
+удаляются сразу.
+"""
+import html
+from collections import ChainMap, OrderedDict
+from string import Formatter
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Mapping, Optional, Tuple
+
+from app.config import settings
+from app.database.models import get_status_emoji, get_status_text
+from app.database.models.order import Order
+from app.services.metrics import register_collector
+from app.services.order_lifecycle import register_status_listener
+
+DEFAULT_LOCALE = "ru"
+
+# Форматы значений по языкам
+FORMATS: Dict[str, Dict[str, str]] = {
+    "ru": {
+        "date": "%d.%m.%Y",
+        "datetime": "%d.%m.%Y %H:%M",
+    },
+}
+
+CATALOG: Dict[str, Dict[str, str]] = {
+    "ru": {
+        "order_info": (
+            "🆔 <b>Заказ #{id}</b>\n"
+            "📝 <b>Тип:</b> {work_type}\n"
+            "📚 <b>Предмет:</b> {subject}\n"
+            "📋 <b>Тема:</b> {topic_50}\n"
+            "📊 <b>Статус:</b> {status_emoji} {status_text}\n"
+            "📅 <b>Создан:</b> {created_datetime}\n"
+        ),
+        "order_info_detailed": (
+            "🆔 <b>Заказ #{id}</b>\n"
+            "📝 <b>Тип:</b> {work_type}\n"
+            "📚 <b>Предмет:</b> {subject}\n"
+            "📋 <b>Тема:</b> {topic}\n"
+            "📏 <b>Объем:</b> {volume}\n"
+            "⏰ <b>Срок:</b> {deadline}\n"
+            "{requirements_line}{files_line}{price_line}"
+            "📊 <b>Статус:</b> {status_emoji} {status_text}\n"
+            "📅 <b>Создан:</b> {created_datetime}\n"
+        ),
+        "requirements_line": "📄 <b>Требования:</b> {requirements_200}\n",
+        "files_line": "📎 <b>Файлов:</b> {files_count}\n",
+        "price_line": "💰 <b>Цена:</b> {price} руб.\n",
+        "client_info": (
+            "\n👤 <b>Клиент:</b>\n"
+            "🆔 ID: {telegram_id}\n"
+            "👨‍💼 Имя: {full_name}\n"
+            "{username_line}{phone_line}"
+        ),
+        "username_line": "📱 Username: @{username}\n",
+        "phone_line": "☎️ Телефон: {phone}\n",
+        "order_list_empty": "📭 <b>Заказов не найдено</b>",
+        "order_list_header": "📋 <b>Ваши заказы</b> (стр. {page}/{total_pages}):\n\n",
+        "order_list_item": (
+            "🆔 <b>#{id}</b> - {work_type}\n"
+            "📋 {topic_30}\n"
+            "📊 {status_emoji} {status_text}\n"
+            "{list_price_line}"
+            "📅 {created_date}\n"
+            "➖➖➖➖➖➖➖➖➖➖\n"
+        ),
+        "list_price_line": "💰 {price} руб.\n",
+        "order_summary": (
+            "📋 <b>Сводка заказа:</b>\n\n"
+            "📝 <b>Тип работы:</b> {work_type}\n"
+            "📚 <b>Предмет:</b> {subject}\n"
+            "📋 <b>Тема:</b> {topic}\n"
+            "📏 <b>Объем:</b> {volume}\n"
+            "⏰ <b>Срок выполнения:</b> {deadline}\n"
+            "{requirements_line}{attached_line}"
+            "\n✅ Проверьте данные и подтвердите заказ"
+        ),
+        "summary_requirements_line": "📄 <b>Требования:</b> {requirements}\n",
+        "attached_line": "📎 <b>Файлов прикреплено:</b> {count}\n",
+        "payment_request": (
+            "💰 <b>Заказ #{id} готов к оплате!</b>\n\n"
+            "📝 <b>Работа:</b> {work_type_title}\n"
+            "📋 <b>Тема:</b> {topic_50}\n"
+            "💵 <b>Сумма к оплате:</b> {price_amount} ₽\n\n"
+            "{instructions}\n\n"
+            "🔍 <b>После оплаты пришлите скриншот чека!</b>\n"
+        ),
+    },
+}
+
+
+class Template:
+    """Шаблон, разобранный при загрузке"""
+
+    __slots__ = ("name", "fields", "render_map")
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.fields: FrozenSet[str] = frozenset(
+            field_name.split(".")[0].split("[")[0]
+            for _, field_name, _, _ in Formatter().parse(source)
+            if field_name
+        )
+        self.render_map = source.format_map
+
+    def render(self, values: Optional[Mapping[str, Any]] = None, **fields: Any) -> str:
+        if values is None:
+            return self.render_map(fields)
+        return self.render_map(ChainMap(fields, values) if fields else values)
+
+
+def compile_catalog(catalog: Dict[str, Dict[str, str]]) -> Dict[Tuple[str, str], Template]:
+    """
+    Разобрать все шаблоны
+
+    Переводы могут опускать шаблоны (берется язык по умолчанию), но не могут
+    требовать полей, которых нет в шаблоне языка по умолчанию.
+    """
+    compiled = {}
+    for locale, templates in catalog.items():
+        for name, source in templates.items():
+            compiled[(locale, name)] = Template(name, source)
+
+    for (locale, name), template in compiled.items():
+        default = compiled.get((DEFAULT_LOCALE, name))
+        if default is None:
+            raise ValueError(f"Шаблон {name} ({locale}) отсутствует в языке {DEFAULT_LOCALE}")
+        extra = template.fields - default.fields
+        if extra:
+            raise ValueError(f"Шаблон {name} ({locale}) использует неизвестные поля: {', '.join(sorted(extra))}")
+    return compiled
+
+
+_templates = compile_catalog(CATALOG)
+
+
+def resolve_locale(locale: Optional[str]) -> str:
+    """Язык из каталога по коду пользователя ("en-US" -> "en"), иначе язык бота"""
+    if locale:
+        locale = locale.split("-")[0].lower()
+        if locale in CATALOG:
+            return locale
+    return settings.bot_locale if settings.bot_locale in CATALOG else DEFAULT_LOCALE
+
+
+def template(name: str, locale: Optional[str] = None) -> Template:
+    locale = resolve_locale(locale)
+    return _templates.get((locale, name)) or _templates[(DEFAULT_LOCALE, name)]
+
+
+def escape(value: Any) -> str:
+    """HTML-экранирование значения от пользователя (None -> пустая строка)"""
+    return "" if value is None else html.escape(str(value), quote=False)
+
+
+def truncate(value: Optional[str], limit: int) -> str:
+    """Обрезать до limit символов (до экранирования, чтобы не резать сущности)"""
+    value = value or ""
+    return value[:limit] + "..." if len(value) > limit else value
+
+
+class FragmentCache:
+    """LRU фрагментов по заказам; запись действительна при том же updated_at"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[int, str, str], Tuple[Hashable, Any]]" = OrderedDict()
+        self._keys_by_order: Dict[int, set] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, order_id: int, kind: str, locale: str, stamp: Hashable) -> Any:
+        key = (order_id, kind, locale)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != stamp:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, order_id: int, kind: str, locale: str, stamp: Hashable, value: Any) -> Any:
+        key = (order_id, kind, locale)
+        self._entries[key] = (stamp, value)
+        self._entries.move_to_end(key)
+        self._keys_by_order.setdefault(order_id, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            old_key, _ = self._entries.popitem(last=False)
+            self._forget_key(old_key)
+        return value
+
+    def invalidate(self, order_id: int) -> None:
+        for key in self._keys_by_order.pop(order_id, ()):
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_order.clear()
+
+    def _forget_key(self, key: Tuple[int, str, str]) -> None:
+        keys = self._keys_by_order.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_order[key[0]]
+
+
+# Общий кэш процесса
+order_fragments = FragmentCache(maxsize=settings.template_cache_size)
+
+
+def _invalidate_order(order_id: int, _old_status: Any, _new_status: Any) -> None:
+    order_fragments.invalidate(order_id)
+
+
+register_status_listener(_invalidate_order)
+
+
+@register_collector
+def _collect_cache_metrics():
+    yield ("cache_hits_total", "counter", "Попадания в кэши", [({"cache": "order_fragments"}, order_fragments.hits)])
+    yield ("cache_misses_total", "counter", "Промахи кэшей", [({"cache": "order_fragments"}, order_fragments.misses)])
+
+
+def _stamp(order: Order) -> Hashable:
+    # updated_at меняется при любом UPDATE заказа; статус и цена - на случай
+    # изменений, еще не сброшенных в БД, и UPDATE в обход ORM без onupdate
+    return (order.updated_at, order.status, order.price)
+
+
+def _build_fields(order: Order, locale: str) -> Dict[str, str]:
+    formats = FORMATS.get(locale, FORMATS[DEFAULT_LOCALE])
+    price = f"{order.price}" if order.price else ""
+    fields = {
+        "id": str(order.id),
+        "work_type": escape(order.work_type),
+        "work_type_title": escape((order.work_type or "").replace("_", " ").title()),
+        "subject": escape(order.subject),
+        "topic": escape(order.topic),
+        "topic_50": escape(truncate(order.topic, 50)),
+        "topic_30": escape(truncate(order.topic, 30)),
+        "volume": escape(order.volume),
+        "deadline": escape(order.deadline),
+        "requirements_200": escape(truncate(order.requirements, 200)),
+        "price": price,
+        "price_amount": f"{order.price:,.2f}" if order.price else "",
+        "status_emoji": get_status_emoji(order.status),
+        "status_text": get_status_text(order.status),
+        "created_date": order.created_at.strftime(formats["date"]) if order.created_at else "",
+        "created_datetime": order.created_at.strftime(formats["datetime"]) if order.created_at else "",
+    }
+    fields["requirements_line"] = (
+        template("requirements_line", locale).render(fields) if order.requirements else ""
+    )
+    fields["price_line"] = template("price_line", locale).render(fields) if price else ""
+    fields["list_price_line"] = template("list_price_line", locale).render(fields) if price else ""
+    return fields
+
+
+def order_fields(order: Order, locale: Optional[str] = None) -> Dict[str, str]:
+    """Экранированные и отформатированные поля заказа (из кэша, если заказ не менялся)"""
+    locale = resolve_locale(locale)
+    stamp = _stamp(order)
+    fields = order_fragments.get(order.id, "fields", locale, stamp)
+    if fields is None:
+        fields = order_fragments.put(order.id, "fields", locale, stamp, _build_fields(order, locale))
+    return fields
+
+
+def order_fragment(order: Order, name: str, locale: Optional[str] = None) -> str:
+    """Готовый фрагмент по заказу (шаблон name только с полями заказа)"""
+    locale = resolve_locale(locale)
+    stamp = _stamp(order)
+    text = order_fragments.get(order.id, name, locale, stamp)
+    if text is None:
+        text = order_fragments.put(
+            order.id, name, locale, stamp, template(name, locale).render(order_fields(order, locale))
+        )
+    return text
+
+
+def render_order_list(orders: Iterable[Order], page: int, total_pages: int,
+                      locale: Optional[str] = None) -> str:
+    """Страница списка заказов: заголовок и кэшированные строки, одна склейка"""
+    orders = list(orders)
+    if not orders:
+        return template("order_list_empty", locale).render()
+
+    parts = [template("order_list_header", locale).render(page=page, total_pages=total_pages)]
+    parts.extend(order_fragment(order, "order_list_item", locale) for order in orders)
+    return "".join(parts)
+
+
+def render(name: str, locale: Optional[str] = None, **fields: Any) -> str:
+    """Отрендерить шаблон каталога с уже подготовленными полями"""
+    return template(name, locale).render(**fields)
@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from app.database.models.user import User
 from typing import Optional, List
+from datetime import datetime
 
 
 class UserService:
@@ -77,6 +78,39 @@ class UserService:
             return True
         return False
     
+    def mark_unreachable(self, telegram_id: int, reason: str) -> bool:
+        """Отметить, что сообщения пользователю не доставляются (бот заблокирован, чат удален)"""
+        updated = self.db.query(User)\
+            .filter(User.telegram_id == telegram_id, User.unreachable_at.is_(None))\
+            .update({User.unreachable_at: datetime.utcnow(), User.unreachable_reason: reason[:255]},
+                    synchronize_session=False)
+        self.db.commit()
+        return updated > 0
+    
+    def clear_unreachable(self, telegram_id: Optional[int] = None) -> int:
+        """Снять отметку о недоступности (с одного пользователя или со всех)"""
+        query = self.db.query(User).filter(User.unreachable_at.isnot(None))
+        if telegram_id is not None:
+            query = query.filter(User.telegram_id == telegram_id)
+        cleared = query.update({User.unreachable_at: None, User.unreachable_reason: None},
+                               synchronize_session=False)
+        self.db.commit()
+        return cleared
+    
+    def get_unreachable_users(self, limit: Optional[int] = None) -> List[User]:
+        """Недоступные пользователи, недавние первыми"""
+        query = self.db.query(User)\
+            .filter(User.unreachable_at.isnot(None))\
+            .order_by(User.unreachable_at.desc())
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+    
+    def get_unreachable_ids(self) -> List[int]:
+        """Telegram ID недоступных пользователей"""
+        rows = self.db.query(User.telegram_id).filter(User.unreachable_at.isnot(None))
+        return [telegram_id for telegram_id, in rows]
+    
     def get_all_users(self, include_blocked: bool = False) -> List[User]:
         """Получить всех пользователей"""
         query = self.db.query(User)
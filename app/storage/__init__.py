@@ -0,0 +1 @@
+# File storage package
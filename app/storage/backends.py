@@ -0,0 +1,330 @@
+"""
+Бэкенды хранения файлов: локальный диск и S3-совместимое хранилище (MinIO и др.)
+
+Где лежит файл, определяет сам путь в БД (OrderFile.file_path,
+StoredBlob.storage_path):
+    /srv/uploads/blobs/ab/cd/<sha256>   - локальный диск
+    s3://bucket/blobs/ab/cd/<sha256>    - S3
+
+Новые файлы пишутся в бэкенд из settings.storage_backend, старые читаются
+оттуда, где лежат, поэтому переезд можно делать постепенно (app.storage.migrate).
+
+Операции синхронные (boto3 синхронный); из асинхронного кода их вызывают
+через asyncio.to_thread. boto3 - необязательная зависимость, нужна только
+для S3.
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from app.config import settings
+
+try:
+    import boto3
+    from botocore.client import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+S3_SCHEME = "s3://"
+
+
+class StorageError(Exception):
+    """Ошибка работы с хранилищем"""
+
+
+@dataclass
+class ObjectInfo:
+    """Файл в хранилище при обходе бэкенда"""
+    uri: str
+    key: str        # Путь относительно корня бэкенда: blobs/ab/cd/<sha256>, tmp/..., ...
+    size: int
+    mtime: float    # Время изменения, unix time
+
+
+class StorageBackend(ABC):
+    """Интерфейс хранилища. Файлы адресуются URI, который хранится в БД"""
+
+    name: str
+
+    @abstractmethod
+    def uri(self, key: str) -> str:
+        """URI файла по ключу вида blobs/ab/cd/<sha256>"""
+
+    @abstractmethod
+    def put_to(self, local_path: str, uri: str, move: bool = False) -> str:
+        """Поместить локальный файл по URI этого бэкенда, вернуть URI"""
+
+    def put_file(self, local_path: str, key: str, move: bool = False) -> str:
+        """Поместить локальный файл под ключом, вернуть URI"""
+        return self.put_to(local_path, self.uri(key), move)
+
+    @abstractmethod
+    def exists(self, uri: str) -> bool:
+        """Есть ли файл"""
+
+    @abstractmethod
+    def size(self, uri: str) -> Optional[int]:
+        """Размер файла или None, если файла нет"""
+
+    @abstractmethod
+    def delete(self, uri: str) -> None:
+        """Удалить файл (отсутствие файла не ошибка)"""
+
+    @abstractmethod
+    def open_read(self, uri: str) -> BinaryIO:
+        """Открыть файл на чтение (объект с read(size) и close())"""
+
+    @abstractmethod
+    def iter_objects(self) -> Iterator[ObjectInfo]:
+        """Обойти все файлы бэкенда"""
+
+    def download_to(self, uri: str, local_path: str) -> None:
+        """Скачать файл в локальный путь"""
+        with self.open_read(uri) as source, open(local_path, "wb") as target:
+            shutil.copyfileobj(source, target, settings.file_chunk_size)
+
+    def local_path(self, uri: str) -> Optional[str]:
+        """Путь на локальном диске, если файл доступен напрямую"""
+        return None
+
+    def presigned_url(self, uri: str, filename: Optional[str] = None,
+                      media_type: Optional[str] = None, inline: bool = False) -> Optional[str]:
+        """Временная прямая ссылка на скачивание (если бэкенд умеет)"""
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """Файлы на локальном диске под settings.upload_path"""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def uri(self, key: str) -> str:
+        return str(self.root / key)
+
+    def put_to(self, local_path: str, uri: str, move: bool = False) -> str:
+        target = Path(uri)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if move:
+            os.replace(local_path, target)
+            return str(target)
+
+        # Копия под временным именем в том же каталоге и атомарная замена:
+        # после сбоя посреди копирования под ключом содержимого не останется
+        # обрезанного файла, которому поверит дедупликация
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as dst, open(local_path, "rb") as src:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, target)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        return str(target)
+
+    def exists(self, uri: str) -> bool:
+        return os.path.isfile(uri)
+
+    def size(self, uri: str) -> Optional[int]:
+        try:
+            return os.path.getsize(uri)
+        except OSError:
+            return None
+
+    def delete(self, uri: str) -> None:
+        try:
+            os.remove(uri)
+        except FileNotFoundError:
+            pass
+
+    def open_read(self, uri: str) -> BinaryIO:
+        return open(uri, "rb")
+
+    def iter_objects(self) -> Iterator[ObjectInfo]:
+        stack = [str(self.root)]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield ObjectInfo(
+                        uri=entry.path,
+                        key=Path(os.path.relpath(entry.path, self.root)).as_posix(),
+                        size=stat.st_size,
+                        mtime=stat.st_mtime
+                    )
+
+    def local_path(self, uri: str) -> Optional[str]:
+        return uri
+
+
+class S3StorageBackend(StorageBackend):
+    """S3-совместимое хранилище (AWS S3, MinIO, Yandex Object Storage)"""
+
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = ""):
+        if boto3 is None:
+            raise StorageError("Для STORAGE_BACKEND=s3 нужен пакет boto3")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint_url,
+            region_name=settings.s3_region,
+            aws_access_key_id=settings.s3_access_key_id,
+            aws_secret_access_key=settings.s3_secret_access_key,
+            # MinIO и большинство S3-совместимых хранилищ работают с path-style
+            config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _split(self, uri: str) -> Tuple[str, str]:
+        bucket, key = parse_s3_uri(uri)
+        if bucket != self.bucket:
+            raise StorageError(f"Файл {uri} не из бакета {self.bucket}")
+        return bucket, key
+
+    def uri(self, key: str) -> str:
+        return f"{S3_SCHEME}{self.bucket}/{self._key(key)}"
+
+    def put_to(self, local_path: str, uri: str, move: bool = False) -> str:
+        bucket, key = self._split(uri)
+        # upload_file сам переходит на multipart-загрузку для больших файлов
+        self.client.upload_file(local_path, bucket, key)
+        if move:
+            os.remove(local_path)
+        return uri
+
+    def _head(self, uri: str) -> Optional[dict]:
+        bucket, key = self._split(uri)
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, uri: str) -> bool:
+        return self._head(uri) is not None
+
+    def size(self, uri: str) -> Optional[int]:
+        head = self._head(uri)
+        return head["ContentLength"] if head else None
+
+    def delete(self, uri: str) -> None:
+        bucket, key = self._split(uri)
+        self.client.delete_object(Bucket=bucket, Key=key)
+
+    def open_read(self, uri: str) -> BinaryIO:
+        bucket, key = self._split(uri)
+        return self.client.get_object(Bucket=bucket, Key=key)["Body"]
+
+    def iter_objects(self) -> Iterator[ObjectInfo]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield ObjectInfo(
+                    uri=f"{S3_SCHEME}{self.bucket}/{item['Key']}",
+                    key=item["Key"][len(prefix):],
+                    size=item["Size"],
+                    mtime=item["LastModified"].timestamp()
+                )
+
+    def presigned_url(self, uri: str, filename: Optional[str] = None,
+                      media_type: Optional[str] = None, inline: bool = False) -> Optional[str]:
+        bucket, key = self._split(uri)
+        params = {"Bucket": bucket, "Key": key}
+        if filename:
+            disposition = "inline" if inline else "attachment"
+            params["ResponseContentDisposition"] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+        if media_type:
+            params["ResponseContentType"] = media_type
+        return self.client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=settings.s3_presign_expires
+        )
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    """s3://bucket/key -> (bucket, key)"""
+    bucket, _, key = uri[len(S3_SCHEME):].partition("/")
+    return bucket, key
+
+
+def is_remote(uri: Optional[str]) -> bool:
+    """Лежит ли файл не на локальном диске"""
+    return bool(uri) and uri.startswith(S3_SCHEME)
+
+
+@lru_cache(maxsize=None)
+def _local_backend() -> LocalStorageBackend:
+    return LocalStorageBackend(settings.upload_path)
+
+
+@lru_cache(maxsize=None)
+def _s3_backend(bucket: str) -> S3StorageBackend:
+    prefix = settings.s3_prefix if bucket == settings.s3_bucket else ""
+    return S3StorageBackend(bucket, prefix)
+
+
+def get_backend(name: str) -> StorageBackend:
+    """Бэкенд по имени: local или s3"""
+    if name == "local":
+        return _local_backend()
+    if name == "s3":
+        if not settings.s3_bucket:
+            raise StorageError("Не задан S3_BUCKET")
+        return _s3_backend(settings.s3_bucket)
+    raise StorageError(f"Неизвестный бэкенд хранилища: {name}")
+
+
+def get_storage() -> StorageBackend:
+    """Бэкенд для записи новых файлов (settings.storage_backend)"""
+    return get_backend(settings.storage_backend)
+
+
+def backend_for(uri: str) -> StorageBackend:
+    """Бэкенд, в котором лежит файл с данным URI"""
+    if is_remote(uri):
+        bucket, _ = parse_s3_uri(uri)
+        return _s3_backend(bucket)
+    return _local_backend()
+
+
+# Короткие обертки для кода, которому неважно, где лежит файл
+
+def storage_exists(uri: Optional[str]) -> bool:
+    return bool(uri) and backend_for(uri).exists(uri)
+
+
+def storage_size(uri: Optional[str]) -> Optional[int]:
+    return backend_for(uri).size(uri) if uri else None
+
+
+def storage_delete(uri: Optional[str]) -> None:
+    if uri:
+        backend_for(uri).delete(uri)
+
+
+def storage_open(uri: str) -> BinaryIO:
+    return backend_for(uri).open_read(uri)
@@ -0,0 +1,155 @@
+"""
+Хранилище файлов с адресацией по содержимому
+
+Каждый файл лежит один раз под ключом blobs/<ab>/<cd>/<sha256>, где ab и cd -
+первые байты хэша. Имя однозначно определяется содержимым, поэтому
+конфликты имен невозможны, а повторная загрузка того же файла не занимает
+место. Отображаемое имя хранится в OrderFile.filename.
+
+Содержимое сначала пишется во временный файл на локальном диске (хэш
+известен только в конце), затем переносится в бэкенд хранилища
+(app.storage.backends): на локальный диск или в S3.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import aiofiles
+
+from app.config import settings
+from app.services.metrics import file_io_bytes
+from app.storage.backends import get_storage, storage_delete
+from app.storage.thumbnails import delete_thumbnail
+
+BLOBS_DIR = "blobs"
+TMP_DIR = "tmp"
+
+_stored_bytes = file_io_bytes.labels("store")
+
+
+@dataclass
+class StoredContent:
+    """Содержимое, записанное в хранилище"""
+    sha256: str
+    size: int
+    path: str
+    # Откуда получено содержимое в Telegram (если известно)
+    telegram_file_id: Optional[str] = None
+    telegram_file_unique_id: Optional[str] = None
+    telegram_file_type: Optional[str] = None
+
+
+def storage_root() -> Path:
+    """Корень хранилища файлов"""
+    return Path(settings.upload_path)
+
+
+def blob_key(sha256: str) -> str:
+    """Ключ содержимого в хранилище: blobs/ab/cd/<sha256>"""
+    return f"{BLOBS_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+async def _place_blob(local_path: str, sha256: str, move: bool) -> str:
+    """Перенести файл в бэкенд под ключом по хэшу (если такого содержимого еще нет)"""
+    storage = get_storage()
+    key = blob_key(sha256)
+    uri = storage.uri(key)
+
+    if await asyncio.to_thread(storage.exists, uri):
+        # Такое содержимое уже хранится - дубликат не нужен
+        if move:
+            os.remove(local_path)
+        return uri
+
+    return await asyncio.to_thread(storage.put_file, local_path, key, move)
+
+
+class BlobWriter:
+    """
+    Потоковая запись содержимого в хранилище с подсчетом SHA-256
+
+    Данные пишутся во временный файл; commit() переносит его в хранилище
+    под ключом по хэшу или удаляет, если такое содержимое уже есть.
+
+        async with BlobWriter() as writer:
+            async for chunk in stream:
+                await writer.write(chunk)
+            content = await writer.commit()
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._tmp_path: Optional[Path] = None
+        self._file = None
+        self._committed = False
+
+    async def __aenter__(self) -> "BlobWriter":
+        tmp_dir = storage_root() / TMP_DIR
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+        self._file = await aiofiles.open(self._tmp_path, "wb")
+        return self
+
+    async def write(self, chunk: bytes) -> None:
+        """Записать очередной блок"""
+        self._hasher.update(chunk)
+        self.size += len(chunk)
+        await self._file.write(chunk)
+        _stored_bytes.inc(len(chunk))
+
+    async def commit(self) -> StoredContent:
+        """Завершить запись и поместить содержимое в хранилище"""
+        await self._file.close()
+        sha256 = self._hasher.hexdigest()
+        uri = await _place_blob(str(self._tmp_path), sha256, move=True)
+
+        self._committed = True
+        return StoredContent(sha256=sha256, size=self.size, path=uri)
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self._committed:
+            return
+        await self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+async def store_stream(chunks: AsyncIterator[bytes]) -> StoredContent:
+    """Записать асинхронный поток блоков в хранилище"""
+    async with BlobWriter() as writer:
+        async for chunk in chunks:
+            await writer.write(chunk)
+        return await writer.commit()
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 файла на диске (блокирующий вызов)"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+async def store_local_file(path: str, move: bool = False) -> StoredContent:
+    """
+    Поместить существующий файл в хранилище
+
+    Args:
+        path: Путь к файлу
+        move: Переместить файл вместо копирования
+    """
+    sha256 = await asyncio.to_thread(hash_file, path)
+    size = os.path.getsize(path)
+    uri = await _place_blob(path, sha256, move)
+    return StoredContent(sha256=sha256, size=size, path=uri)
+
+
+def delete_blob(storage_path: str) -> None:
+    """Удалить содержимое из хранилища (вместе с превью)"""
+    storage_delete(storage_path)
+    delete_thumbnail(storage_path)
@@ -0,0 +1,167 @@
+"""
+Сборщик мусора хранилища
+
+Периодически обходит хранилище (app.storage.indexer), сверяет его с БД и:
+    - удаляет сирот - файлы, на которые БД не ссылается дольше
+      settings.storage_gc_grace (запас нужен, чтобы не удалить содержимое,
+      которое только что записано, а запись в БД еще не зафиксирована);
+    - удаляет брошенные временные файлы незавершенных загрузок;
+    - исправляет StoredBlob.ref_count и удаляет записи StoredBlob без ссылок.
+Записи OrderFile без файла только попадают в отчет - решает админ.
+
+Запуск вручную:
+    python -m app.storage.gc [--dry-run]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.connection import get_db_session
+from app.database.models.blob import StoredBlob
+from app.database.models.file import OrderFile
+from app.storage.backends import backend_for
+from app.storage.indexer import StorageIndexer, StorageReport, indexed_backends, normalize_uri
+
+logger = logging.getLogger(__name__)
+
+_gc_task: Optional[asyncio.Task] = None
+
+
+class StorageGC:
+    """Один проход сборщика мусора"""
+
+    def __init__(self, db: Session, grace_seconds: Optional[int] = None, dry_run: bool = False):
+        self.db = db
+        self.grace = timedelta(seconds=settings.storage_gc_grace if grace_seconds is None else grace_seconds)
+        self.dry_run = dry_run
+        self.deleted = 0
+        self.freed_bytes = 0
+
+    def run(self) -> StorageReport:
+        indexer = StorageIndexer(self.db)
+        for backend in indexed_backends():
+            indexer.scan(backend)
+
+        report = indexer.reconcile(int(self.grace.total_seconds()))
+        if not self.dry_run:
+            self._fix_refcounts(report)
+            self._delete_orphans(report)
+
+        logger.info(f"Сборка мусора: сирот {len(report.orphans)} ({report.orphan_bytes} байт), "
+                    f"удалено {self.deleted} ({self.freed_bytes} байт), "
+                    f"записей без файла {len(report.missing_files)}")
+        return report
+
+    def _fix_refcounts(self, report: StorageReport) -> None:
+        """Привести ref_count к числу OrderFile; записи без ссылок удалить"""
+        cutoff = datetime.utcnow() - self.grace
+
+        for blob_id, stored, actual in report.refcount_mismatches:
+            blob = self.db.get(StoredBlob, blob_id)
+            if blob is None:
+                continue
+            logger.warning(f"StoredBlob #{blob_id}: ref_count {stored}, ссылок {actual}")
+
+            if actual == 0:
+                # Свежие записи не трогаем: ссылку может создавать параллельная транзакция
+                if blob.created_at and blob.created_at < cutoff:
+                    # Файл станет сиротой и удалится на следующих проходах
+                    self.db.delete(blob)
+            else:
+                blob.ref_count = actual
+
+        self.db.commit()
+
+    def _delete_orphans(self, report: StorageReport) -> None:
+        """Удалить файлы, которые остаются сиротами дольше grace"""
+        cutoff = datetime.utcnow() - self.grace
+        cutoff_ts = cutoff.timestamp()
+
+        for obj in report.orphans:
+            if obj.orphan_since > cutoff or obj.mtime > cutoff_ts:
+                continue
+            if obj.kind in ("blob", "legacy") and self._is_referenced(obj.uri):
+                continue
+
+            try:
+                backend_for(obj.uri).delete(obj.uri)
+            except Exception as e:
+                logger.error(f"Не удалось удалить {obj.uri}: {e}")
+                continue
+
+            self.deleted += 1
+            self.freed_bytes += obj.size
+            self.db.delete(obj)
+
+        self.db.commit()
+
+    def _is_referenced(self, uri: str) -> bool:
+        """
+        Повторная проверка прямо перед удалением
+
+        Пути в БД сравниваются так же, как при сверке (normalize_uri):
+        запрос отбирает кандидатов по имени файла, сравнение - после нормализации.
+        """
+        target = normalize_uri(uri)
+        name = target.rsplit("/", 1)[-1].rsplit(os.sep, 1)[-1]
+        candidates = self.db.query(StoredBlob.storage_path)\
+            .filter(StoredBlob.storage_path.endswith(name, autoescape=True))\
+            .union_all(
+                self.db.query(OrderFile.file_path)
+                .filter(OrderFile.file_path.endswith(name, autoescape=True))
+            )
+        return any(path and normalize_uri(path) == target for (path,) in candidates)
+
+
+def collect_garbage(dry_run: bool = False) -> StorageReport:
+    """Проход сборщика мусора в отдельной сессии (блокирующий вызов)"""
+    db = get_db_session()
+    try:
+        return StorageGC(db, dry_run=dry_run).run()
+    finally:
+        db.close()
+
+
+async def _gc_loop() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(collect_garbage)
+        except Exception as e:
+            logger.error(f"Ошибка сборки мусора хранилища: {e}")
+        await asyncio.sleep(settings.storage_gc_interval)
+
+
+def start_storage_gc() -> None:
+    """Запустить периодическую сборку мусора (в процессе бота)"""
+    global _gc_task
+    if settings.storage_gc_enabled and _gc_task is None:
+        _gc_task = asyncio.create_task(_gc_loop())
+
+
+def stop_storage_gc() -> None:
+    """Остановить периодическую сборку мусора"""
+    global _gc_task
+    if _gc_task is not None:
+        _gc_task.cancel()
+        _gc_task = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сборка мусора хранилища файлов")
+    parser.add_argument("--dry-run", action="store_true", help="Только отчет, ничего не удалять")
+    args = parser.parse_args()
+
+    report = collect_garbage(dry_run=args.dry_run)
+    print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
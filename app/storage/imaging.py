@@ -0,0 +1,46 @@
+"""
+Обработка изображений для превью
+
+Модуль выполняется в дочерних процессах пула, поэтому не импортирует
+настройки и БД: только Pillow и стандартная библиотека.
+"""
+import os
+
+
+def render_thumbnail(source_path: str, target_path: str, size: int, quality: int) -> int:
+    """
+    Сделать превью изображения в формате WebP
+
+    Большие JPEG декодируются сразу в уменьшенном виде (draft), поэтому
+    скриншот в несколько мегапикселей обрабатывается за миллисекунды.
+    Превью пишется во временный файл и атомарно переносится на место.
+
+    Args:
+        source_path: Исходное изображение
+        target_path: Куда сохранить превью
+        size: Максимальная сторона превью, px
+        quality: Качество WebP (0-100)
+
+    Returns:
+        int: Размер превью в байтах
+    """
+    from PIL import Image, ImageOps
+
+    tmp_path = f"{target_path}.{os.getpid()}.part"
+
+    with Image.open(source_path) as image:
+        image.draft("RGB", (size * 2, size * 2))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.LANCZOS)
+
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        try:
+            image.save(tmp_path, format="WEBP", quality=quality, method=4)
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    return os.path.getsize(target_path)
@@ -0,0 +1,302 @@
+"""
+Индекс файлов хранилища и сверка его с БД
+
+Обход инкрементальный: файл хэшируется заново, только если изменились его
+размер или mtime, поэтому повторные обходы почти не читают содержимое.
+По индексу (таблица storage_objects) находятся:
+    - сироты: файлы, на которые не ссылаются ни StoredBlob, ни OrderFile
+      (например, содержимое, записанное перед ошибкой сохранения заказа);
+    - висячие записи: OrderFile и StoredBlob без файла в хранилище;
+    - поврежденное содержимое: хэш не совпадает с именем файла;
+    - расхождения StoredBlob.ref_count с числом ссылающихся OrderFile.
+
+Все операции синхронные, из асинхронного кода вызываются через asyncio.to_thread.
+"""
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.models.blob import StoredBlob
+from app.database.models.file import OrderFile
+from app.database.models.storage_object import StorageObject
+from app.storage.backends import ObjectInfo, StorageBackend, StorageError, backend_for, get_backend, is_remote
+from app.storage.blob_store import BLOBS_DIR, TMP_DIR, hash_file
+from app.storage.thumbnails import THUMBNAIL_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# Файлы этих видов хэшируются при обходе
+HASHED_KINDS = {"blob", "legacy"}
+
+
+def classify(key: str) -> str:
+    """Вид файла по ключу: blob, thumbnail, tmp или legacy (сохранен до хранилища по хэшу)"""
+    if key.startswith(f"{TMP_DIR}/"):
+        return "tmp"
+    if key.endswith(THUMBNAIL_SUFFIX):
+        return "thumbnail"
+    if key.startswith(f"{BLOBS_DIR}/"):
+        return "blob"
+    return "legacy"
+
+
+def normalize_uri(uri: str) -> str:
+    """URI для сравнения: локальные пути в БД бывают относительными и с обратными слешами"""
+    return uri if is_remote(uri) else os.path.abspath(uri.replace("\\", "/"))
+
+
+def indexed_backends() -> List[StorageBackend]:
+    """Бэкенды для обхода: локальный диск всегда, S3 - если настроен"""
+    backends = [get_backend("local")]
+    if settings.s3_bucket:
+        try:
+            backends.append(get_backend("s3"))
+        except StorageError as e:
+            logger.warning(f"S3 не проиндексирован: {e}")
+    return backends
+
+
+@dataclass
+class ScanStats:
+    """Итоги обхода одного бэкенда"""
+    backend: str
+    seen: int = 0
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    hashed_bytes: int = 0
+
+
+@dataclass
+class StorageReport:
+    """Результат сверки индекса с БД"""
+    objects: int = 0
+    total_bytes: int = 0
+    bytes_by_kind: Dict[str, int] = field(default_factory=dict)
+    orphans: List[StorageObject] = field(default_factory=list)
+    missing_files: List[int] = field(default_factory=list)   # OrderFile.id без файла
+    missing_blobs: List[int] = field(default_factory=list)   # StoredBlob.id без файла
+    corrupted: List[str] = field(default_factory=list)
+    refcount_mismatches: List[Tuple[int, int, int]] = field(default_factory=list)  # (blob_id, ref_count, фактически)
+
+    @property
+    def orphan_bytes(self) -> int:
+        return sum(obj.size for obj in self.orphans)
+
+    def to_dict(self, limit: int = 50) -> dict:
+        return {
+            "objects": self.objects,
+            "total_bytes": self.total_bytes,
+            "bytes_by_kind": self.bytes_by_kind,
+            "orphans": len(self.orphans),
+            "orphan_bytes": self.orphan_bytes,
+            "orphan_samples": [obj.uri for obj in self.orphans[:limit]],
+            "missing_files": self.missing_files[:limit],
+            "missing_blobs": self.missing_blobs[:limit],
+            "corrupted": self.corrupted[:limit],
+            "refcount_mismatches": [
+                {"blob_id": blob_id, "ref_count": stored, "actual": actual}
+                for blob_id, stored, actual in self.refcount_mismatches[:limit]
+            ],
+        }
+
+
+class StorageIndexer:
+    """Обход хранилища и сверка индекса с БД"""
+
+    def __init__(self, db: Session, batch_size: int = 500):
+        self.db = db
+        self.batch_size = batch_size
+        self.scanned_backends: Set[StorageBackend] = set()
+
+    def scan(self, backend: StorageBackend) -> ScanStats:
+        """
+        Обойти бэкенд и обновить индекс
+
+        Новые и измененные файлы хэшируются (только локальные: для S3 хэш
+        содержимого берется из ключа), исчезнувшие удаляются из индекса.
+        """
+        stats = ScanStats(backend=backend.name)
+        now = datetime.utcnow()
+
+        known: Dict[str, Tuple[int, int, float]] = {
+            uri: (object_id, size, mtime)
+            for object_id, uri, size, mtime in self.db.query(
+                StorageObject.id, StorageObject.uri, StorageObject.size, StorageObject.mtime
+            ).filter(StorageObject.backend == backend.name)
+        }
+
+        pending = 0
+        for info in backend.iter_objects():
+            stats.seen += 1
+            previous = known.pop(info.uri, None)
+            if previous and previous[1] == info.size and previous[2] == info.mtime:
+                continue
+
+            kind = classify(info.key)
+            sha256 = self._content_hash(backend, info, kind, stats)
+
+            if previous:
+                self.db.query(StorageObject)\
+                    .filter(StorageObject.id == previous[0])\
+                    .update({
+                        StorageObject.kind: kind,
+                        StorageObject.size: info.size,
+                        StorageObject.mtime: info.mtime,
+                        StorageObject.sha256: sha256,
+                        StorageObject.hashed_at: now if sha256 else None,
+                        StorageObject.orphan_since: None,
+                    }, synchronize_session=False)
+                stats.changed += 1
+            else:
+                self.db.add(StorageObject(
+                    backend=backend.name,
+                    uri=info.uri,
+                    kind=kind,
+                    size=info.size,
+                    mtime=info.mtime,
+                    sha256=sha256,
+                    hashed_at=now if sha256 else None,
+                    first_seen_at=now,
+                    last_seen_at=now
+                ))
+                stats.added += 1
+
+            pending += 1
+            if pending >= self.batch_size:
+                self.db.commit()
+                pending = 0
+
+        # Чего не нашли при обходе, того больше нет
+        removed_ids = [object_id for object_id, _, _ in known.values()]
+        for start in range(0, len(removed_ids), self.batch_size):
+            self.db.query(StorageObject)\
+                .filter(StorageObject.id.in_(removed_ids[start:start + self.batch_size]))\
+                .delete(synchronize_session=False)
+        stats.removed = len(removed_ids)
+
+        self.db.query(StorageObject)\
+            .filter(StorageObject.backend == backend.name)\
+            .update({StorageObject.last_seen_at: now}, synchronize_session=False)
+        self.db.commit()
+
+        self.scanned_backends.add(backend)
+        logger.info(f"Хранилище {backend.name}: файлов {stats.seen}, новых {stats.added}, "
+                    f"измененных {stats.changed}, удаленных {stats.removed}")
+        return stats
+
+    def _content_hash(self, backend: StorageBackend, info: ObjectInfo,
+                      kind: str, stats: ScanStats) -> Optional[str]:
+        if kind not in HASHED_KINDS:
+            return None
+
+        local_path = backend.local_path(info.uri)
+        if local_path is None:
+            # Читать объекты S3 ради хэша дорого; ключ содержимого и есть хэш
+            return info.key.rsplit("/", 1)[-1] if kind == "blob" else None
+
+        try:
+            sha256 = hash_file(local_path)
+        except OSError:
+            # Файл удалили во время обхода
+            return None
+        stats.hashed_bytes += info.size
+        return sha256
+
+    def reconcile(self, grace_seconds: int) -> StorageReport:
+        """
+        Сверить индекс с БД
+
+        Отмечает сирот (orphan_since) и снимает отметку с файлов, на которые
+        снова ссылается БД. Незавершенные загрузки (tmp) моложе grace_seconds
+        сиротами не считаются.
+        """
+        report = StorageReport()
+        now = datetime.utcnow()
+        fresh_after = (now - timedelta(seconds=grace_seconds)).timestamp()
+
+        referenced = {normalize_uri(path) for (path,) in self.db.query(StoredBlob.storage_path)}
+        referenced.update(
+            normalize_uri(path) for (path,) in self.db.query(OrderFile.file_path) if path
+        )
+
+        indexed: Set[str] = set()
+        for obj in self.db.query(StorageObject).all():
+            uri = normalize_uri(obj.uri)
+            indexed.add(uri)
+            report.objects += 1
+            report.total_bytes += obj.size
+            report.bytes_by_kind[obj.kind] = report.bytes_by_kind.get(obj.kind, 0) + obj.size
+
+            if obj.kind == "thumbnail":
+                in_use = uri[:-len(THUMBNAIL_SUFFIX)] in referenced
+            elif obj.kind == "tmp":
+                in_use = obj.mtime > fresh_after
+            else:
+                in_use = uri in referenced
+
+            if in_use:
+                obj.orphan_since = None
+            else:
+                obj.orphan_since = obj.orphan_since or now
+                report.orphans.append(obj)
+
+            if obj.is_corrupted:
+                report.corrupted.append(obj.uri)
+
+        for file_id, path in self.db.query(OrderFile.id, OrderFile.file_path):
+            if self._is_missing(path, indexed):
+                report.missing_files.append(file_id)
+
+        for blob_id, path in self.db.query(StoredBlob.id, StoredBlob.storage_path):
+            if self._is_missing(path, indexed):
+                report.missing_blobs.append(blob_id)
+
+        actual_refs = func.count(OrderFile.id)
+        rows = self.db.query(StoredBlob.id, StoredBlob.ref_count, actual_refs)\
+            .outerjoin(OrderFile, OrderFile.blob_id == StoredBlob.id)\
+            .group_by(StoredBlob.id, StoredBlob.ref_count)\
+            .having(StoredBlob.ref_count != actual_refs)\
+            .all()
+        report.refcount_mismatches = [tuple(row) for row in rows]
+
+        self.db.commit()
+        return report
+
+    def _is_missing(self, path: Optional[str], indexed: Set[str]) -> bool:
+        """Файла нет в проиндексированном бэкенде (непроиндексированные бэкенды не проверяем)"""
+        if not path:
+            return True
+        if backend_for(path) not in self.scanned_backends:
+            return False
+        return normalize_uri(path) not in indexed
+
+    def summary(self) -> dict:
+        """Сводка по индексу без обхода (для админ-панели)"""
+        rows = self.db.query(
+            StorageObject.kind,
+            func.count(StorageObject.id),
+            func.coalesce(func.sum(StorageObject.size), 0)
+        ).group_by(StorageObject.kind).all()
+
+        orphans, orphan_bytes = self.db.query(
+            func.count(StorageObject.id),
+            func.coalesce(func.sum(StorageObject.size), 0)
+        ).filter(StorageObject.orphan_since.isnot(None)).one()
+
+        last_scan = self.db.query(func.max(StorageObject.last_seen_at)).scalar()
+
+        return {
+            "objects": sum(count for _, count, _ in rows),
+            "total_bytes": sum(size for _, _, size in rows),
+            "by_kind": {kind: {"objects": count, "bytes": size} for kind, count, size in rows},
+            "orphans": orphans,
+            "orphan_bytes": orphan_bytes,
+            "last_scan": last_scan.isoformat() if last_scan else None,
+        }
@@ -0,0 +1,195 @@
+"""
+Перенос файлов между бэкендами хранилища
+
+    python -m app.storage.migrate --to s3 [--dry-run] [--delete-source] [--batch 50]
+
+Копирует содержимое StoredBlob (и превью) и старые файлы без StoredBlob
+в целевой бэкенд и обновляет пути в БД: StoredBlob.storage_path
+и OrderFile.file_path. Изменения фиксируются пачками, поэтому прерванный
+перенос можно запустить повторно - уже перенесенные файлы пропускаются.
+Исходные файлы удаляются только с --delete-source и только после коммита.
+"""
+import argparse
+import logging
+import os
+import tempfile
+from typing import List, Optional
+
+from app.database.connection import get_db_session
+from app.database.models.blob import StoredBlob
+from app.database.models.file import OrderFile
+from app.storage.backends import StorageBackend, backend_for, get_backend
+from app.storage.blob_store import blob_key
+from app.storage.thumbnails import thumbnail_path
+
+logger = logging.getLogger(__name__)
+
+
+def _belongs_to(uri: str, target: StorageBackend) -> bool:
+    """Лежит ли файл уже в целевом бэкенде"""
+    return backend_for(uri) is target
+
+
+def copy_object(source_uri: str, target: StorageBackend, target_uri: str) -> bool:
+    """
+    Скопировать файл из его бэкенда в целевой
+
+    Returns:
+        bool: False, если исходного файла нет
+    """
+    source = backend_for(source_uri)
+    if not source.exists(source_uri):
+        return False
+
+    local_path = source.local_path(source_uri)
+    if local_path:
+        target.put_to(local_path, target_uri)
+        return True
+
+    with tempfile.TemporaryDirectory(prefix="migrate_") as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, "object")
+        source.download_to(source_uri, tmp_path)
+        target.put_to(tmp_path, target_uri, move=True)
+    return True
+
+
+def legacy_key(order_file: OrderFile) -> str:
+    """Ключ для файла, сохраненного до появления хранилища по хэшу"""
+    name = os.path.basename(order_file.file_path.replace("\\", "/"))
+    if not name.startswith(f"{order_file.id}_"):
+        name = f"{order_file.id}_{name}"
+    return f"files/{order_file.order_id}/{name}"
+
+
+class StorageMigration:
+    """Перенос файлов в целевой бэкенд"""
+
+    def __init__(self, target: StorageBackend, dry_run: bool = False,
+                 delete_source: bool = False, batch_size: int = 50):
+        self.target = target
+        self.dry_run = dry_run
+        self.delete_source = delete_source
+        self.batch_size = batch_size
+        self.moved = 0
+        self.missing = 0
+        self._to_delete: List[str] = []
+
+    def run(self) -> None:
+        db = get_db_session()
+        try:
+            self._migrate_blobs(db)
+            self._migrate_legacy_files(db)
+        finally:
+            db.close()
+
+        action = "будет перенесено" if self.dry_run else "перенесено"
+        print(f"✅ Файлов {action}: {self.moved}, не найдено: {self.missing}")
+
+    def _migrate_blobs(self, db) -> None:
+        last_id = 0
+        while True:
+            blobs = db.query(StoredBlob)\
+                .filter(StoredBlob.id > last_id)\
+                .order_by(StoredBlob.id)\
+                .limit(self.batch_size)\
+                .all()
+            if not blobs:
+                return
+
+            for blob in blobs:
+                last_id = blob.id
+                if _belongs_to(blob.storage_path, self.target):
+                    continue
+                new_uri = self._copy(blob.storage_path, self.target.uri(blob_key(blob.sha256)))
+                if new_uri is None:
+                    continue
+
+                self._copy_thumbnail(blob.storage_path, new_uri)
+                if not self.dry_run:
+                    db.query(OrderFile)\
+                        .filter(OrderFile.blob_id == blob.id)\
+                        .update({OrderFile.file_path: new_uri}, synchronize_session=False)
+                    blob.storage_path = new_uri
+
+            self._commit(db)
+
+    def _migrate_legacy_files(self, db) -> None:
+        last_id = 0
+        while True:
+            files = db.query(OrderFile)\
+                .filter(OrderFile.id > last_id, OrderFile.blob_id.is_(None))\
+                .order_by(OrderFile.id)\
+                .limit(self.batch_size)\
+                .all()
+            if not files:
+                return
+
+            for order_file in files:
+                last_id = order_file.id
+                if not order_file.file_path or _belongs_to(order_file.file_path, self.target):
+                    continue
+                new_uri = self._copy(order_file.file_path, self.target.uri(legacy_key(order_file)))
+                if new_uri is None:
+                    continue
+
+                self._copy_thumbnail(order_file.file_path, new_uri)
+                if not self.dry_run:
+                    order_file.file_path = new_uri
+
+            self._commit(db)
+
+    def _copy(self, source_uri: str, target_uri: str) -> Optional[str]:
+        if self.dry_run:
+            print(f"   {source_uri} -> {target_uri}")
+            self.moved += 1
+            return target_uri
+
+        if not copy_object(source_uri, self.target, target_uri):
+            logger.warning(f"Файл не найден, пропускаем: {source_uri}")
+            self.missing += 1
+            return None
+
+        self.moved += 1
+        self._to_delete.append(source_uri)
+        return target_uri
+
+    def _copy_thumbnail(self, source_uri: str, target_uri: str) -> None:
+        if self.dry_run:
+            return
+        source_thumb = thumbnail_path(source_uri)
+        if copy_object(source_thumb, self.target, thumbnail_path(target_uri)):
+            self._to_delete.append(source_thumb)
+
+    def _commit(self, db) -> None:
+        if self.dry_run:
+            return
+
+        db.commit()
+        print(f"   ... перенесено {self.moved}")
+
+        # Исходные файлы удаляем только после того, как БД ссылается на новые
+        if self.delete_source:
+            for uri in self._to_delete:
+                backend_for(uri).delete(uri)
+        self._to_delete.clear()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Перенос файлов между бэкендами хранилища")
+    parser.add_argument("--to", required=True, choices=["local", "s3"], help="Целевой бэкенд")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет перенесено")
+    parser.add_argument("--delete-source", action="store_true", help="Удалить исходные файлы после переноса")
+    parser.add_argument("--batch", type=int, default=50, help="Файлов в одной транзакции")
+    args = parser.parse_args(argv)
+
+    StorageMigration(
+        target=get_backend(args.to),
+        dry_run=args.dry_run,
+        delete_source=args.delete_source,
+        batch_size=args.batch
+    ).run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
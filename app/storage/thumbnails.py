@@ -0,0 +1,135 @@
+"""
+Превью изображений (скриншоты оплаты, фотографии)
+
+Превью в WebP строятся в пуле процессов (Pillow держит GIL на декодировании)
+и кэшируются рядом с оригиналом: <путь к файлу>.thumb.webp, в том же бэкенде
+хранилища. Для содержимого из хранилища превью одно на все копии файла.
+
+Pillow - необязательная зависимость: без него превью не строятся,
+а админ-панель показывает оригиналы.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Set
+
+from app.config import settings
+from app.storage.backends import backend_for, storage_delete
+from app.storage.imaging import render_thumbnail
+
+try:
+    import PIL  # noqa: F401
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SUFFIX = ".thumb.webp"
+THUMBNAIL_MEDIA_TYPE = "image/webp"
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif", "bmp", "tif", "tiff"}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_in_flight: Dict[str, asyncio.Future] = {}
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def is_image(filename: Optional[str]) -> bool:
+    """Похоже ли имя файла на изображение"""
+    if not filename or "." not in filename:
+        return False
+    return filename.rsplit(".", 1)[-1].lower() in IMAGE_EXTENSIONS
+
+
+def thumbnail_path(source_path: str) -> str:
+    """Путь к превью рядом с оригиналом"""
+    return source_path + THUMBNAIL_SUFFIX
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: дочерние процессы не наследуют потоки и сокеты цикла событий
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, settings.thumbnail_workers),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown_thumbnail_pool() -> None:
+    """Остановить пул процессов (при остановке приложения)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _render(source_path: str, target: str) -> None:
+    """Построить превью в пуле процессов; удаленные файлы обрабатываются через временный каталог"""
+    loop = asyncio.get_running_loop()
+    backend = backend_for(source_path)
+    local_source = backend.local_path(source_path)
+    args = (settings.thumbnail_size, settings.thumbnail_quality)
+
+    if local_source:
+        await loop.run_in_executor(_get_executor(), render_thumbnail, local_source, target, *args)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="thumb_") as tmp_dir:
+        local_source = os.path.join(tmp_dir, "source")
+        local_target = os.path.join(tmp_dir, "thumb.webp")
+        await asyncio.to_thread(backend.download_to, source_path, local_source)
+        await loop.run_in_executor(_get_executor(), render_thumbnail, local_source, local_target, *args)
+        await asyncio.to_thread(backend.put_to, local_target, target, True)
+
+
+async def ensure_thumbnail(source_path: str) -> Optional[str]:
+    """
+    Получить превью, построив его при необходимости
+
+    Одновременные запросы превью одного файла ждут одну задачу.
+
+    Returns:
+        Optional[str]: Путь (URI) превью или None, если построить нельзя
+    """
+    target = thumbnail_path(source_path)
+    backend = backend_for(source_path)
+
+    if await asyncio.to_thread(backend.exists, target):
+        return target
+
+    if not PIL_AVAILABLE or not await asyncio.to_thread(backend.exists, source_path):
+        return None
+
+    future = _in_flight.get(target)
+    if future is None:
+        future = asyncio.ensure_future(_render(source_path, target))
+        _in_flight[target] = future
+        future.add_done_callback(lambda _: _in_flight.pop(target, None))
+
+    try:
+        await asyncio.shield(future)
+    except Exception as e:
+        logger.warning(f"Не удалось построить превью {source_path}: {e}")
+        return None
+
+    return target
+
+
+def schedule_thumbnail(source_path: str, filename: Optional[str]) -> None:
+    """Построить превью изображения в фоне (при приеме файла)"""
+    if not PIL_AVAILABLE or not is_image(filename):
+        return
+
+    task = asyncio.create_task(ensure_thumbnail(source_path))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def delete_thumbnail(source_path: str) -> None:
+    """Удалить превью вместе с оригиналом"""
+    storage_delete(thumbnail_path(source_path))
@@ -0,0 +1,115 @@
+"""
+Замер разбора callback_data и выбора обработчика
+
+    - parse: старый разбор callback.data.split(":") с int()/OrderStatus()
+      против CallbackData.unpack (новый двоичный и старый текстовый формат);
+    - invalid: отказ на испорченных данных (CallbackDataError);
+    - dispatch: роутер с фильтрами F.data.startswith(...), перебираемыми
+      по очереди, против роутера с use_prefix_dispatch; событие - кнопка
+      последнего зарегистрированного обработчика (худший случай перебора).
+
+Запуск (нужны переменные окружения приложения, как для бота):
+    python -m benchmarks.bench_callbacks [--number 5000]
+"""
+import argparse
+import asyncio
+import time
+import timeit
+
+from aiogram import F, Router
+from aiogram.types import CallbackQuery, User
+
+from app.bot.keyboards import callbacks
+from app.bot.utils.callback_data import CallbackDataError, use_prefix_dispatch
+from app.database.models import OrderStatus
+
+# Схемы обработчиков в порядке регистрации (как в bot/handlers)
+SCHEMAS = [
+    callbacks.AdminOrders, callbacks.SetPrice, callbacks.ChangeStatus, callbacks.SetStatus,
+    callbacks.BulkPick, callbacks.BulkTo, callbacks.BulkApply, callbacks.SendFile,
+    callbacks.AdminStats, callbacks.AdminBroadcast, callbacks.BroadcastWorkTypes,
+    callbacks.BroadcastSegment, callbacks.BroadcastCancel, callbacks.AcceptPrice,
+    callbacks.DeclinePrice, callbacks.ViewOrder, callbacks.OrdersPage, callbacks.OrderDetails,
+    callbacks.BackToOrders, callbacks.CurrentPage,
+]
+
+
+def per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def legacy_status(data: str):
+    _, order_id, status = data.split(":")
+    return int(order_id), OrderStatus(status)
+
+
+def rejects(parse, data: str) -> bool:
+    try:
+        parse(data)
+    except (CallbackDataError, ValueError):
+        return True
+    return False
+
+
+async def handle(callback: CallbackQuery, **kwargs) -> bool:
+    return True
+
+
+def linear_router() -> Router:
+    router = Router()
+    for schema in SCHEMAS:
+        router.callback_query(F.data.startswith(f"{schema.legacy_prefix}:"))(handle)
+    return router
+
+
+def prefix_router() -> Router:
+    router = use_prefix_dispatch(Router())
+    for schema in SCHEMAS:
+        router.callback_query(schema.filter())(handle)
+    return router
+
+
+async def per_event_us(router: Router, event: CallbackQuery, number: int) -> float:
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(number):
+            await router.propagate_event("callback_query", event)
+        best = min(best, time.perf_counter() - started)
+    return best / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Разбор callback_data и выбор обработчика")
+    parser.add_argument("--number", type=int, default=5000, help="Повторов на замер")
+    args = parser.parse_args()
+
+    button = callbacks.SetStatus(123456, OrderStatus.READY)
+    packed, legacy = button.pack(), "status:123456:ready"
+    print(f"{legacy!r} -> {packed!r}\n")
+
+    rows = [
+        ("parse split (старый)", lambda: legacy_status(legacy)),
+        ("unpack двоичный", lambda: callbacks.SetStatus.unpack(packed)),
+        ("unpack текстовый", lambda: callbacks.SetStatus.unpack(legacy)),
+        ("pack", button.pack),
+        ("invalid split", lambda: rejects(legacy_status, "status:12:bogus")),
+        ("invalid unpack", lambda: rejects(callbacks.SetStatus.unpack, "st:AQwZ")),
+    ]
+    for name, func in rows:
+        print(f"{name:28} {per_call_us(func, args.number):8.2f} мкс")
+
+    user = User(id=1, is_bot=False, first_name="bench")
+    last = SCHEMAS[-1]
+    print(f"\ndispatch ({len(SCHEMAS)} обработчиков, кнопка {last.__name__}):")
+    for name, router, data in (
+        ("перебор F.data", linear_router(), f"{last.legacy_prefix}:"),
+        ("по префиксу", prefix_router(), last().pack()),
+    ):
+        event = CallbackQuery(id="1", from_user=user, chat_instance="1", data=data)
+        us = asyncio.run(per_event_us(router, event, args.number // 5))
+        print(f"{name:28} {us:8.2f} мкс")
+
+
+if __name__ == "__main__":
+    main()
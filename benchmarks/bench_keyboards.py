@@ -0,0 +1,79 @@
+"""
+Замер стоимости подготовки ответа обработчика с клавиатурой
+
+Для каждой клавиатуры сравнивается:
+    - build: построение заново (исходная функция без кэша);
+    - cached: вызов через реестр (static_keyboard / cached_keyboard);
+    - resp.old / resp.new: вся работа над ответом до HTTP-запроса -
+      клавиатура, SendMessage и тело запроса (build_form_data): раньше
+      (построение заново, AiohttpSession) и сейчас (реестр, KeyboardSession).
+
+Запуск (нужны переменные окружения приложения, как для бота):
+    python -m benchmarks.bench_keyboards [--number 5000]
+"""
+import argparse
+import timeit
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import SendMessage
+
+from app.bot.keyboards import client, inline
+from app.bot.keyboards.registry import KeyboardSession
+from app.database.models import OrderStatus
+
+CASES = [
+    ("get_main_menu", client.get_main_menu, ()),
+    ("get_work_types", client.get_work_types, ()),
+    ("get_cancel_keyboard", client.get_cancel_keyboard, ()),
+    ("get_files_keyboard", client.get_files_keyboard, ()),
+    ("get_admin_main_keyboard", inline.get_admin_main_keyboard, ()),
+    ("get_price_response_keyboard", client.get_price_response_keyboard, (42,)),
+    ("get_order_details_keyboard", inline.get_order_details_keyboard, (42, True)),
+    ("get_orders_pagination_keyboard", inline.get_orders_pagination_keyboard, (3, 10, None)),
+    ("get_status_change_keyboard", inline.get_status_change_keyboard, (42,)),
+    ("get_bulk_status_keyboard", inline.get_bulk_status_keyboard, (OrderStatus.READY,)),
+]
+
+
+def per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Стоимость клавиатур в ответах обработчиков")
+    parser.add_argument("--number", type=int, default=5000, help="Вызовов на замер")
+    args = parser.parse_args()
+
+    plain, cached = AiohttpSession(), KeyboardSession()
+    bot = Bot(token="123456:benchmark", session=plain)
+    text = "✅ Заказ #42 принят. Мы свяжемся с вами в ближайшее время."
+
+    def response(session, keyboard, call_args):
+        method = SendMessage(chat_id=42, text=text, reply_markup=keyboard(*call_args))
+        return session.build_form_data(bot, method)
+
+    header = f"{'клавиатура':32} {'build':>8} {'cached':>8} {'resp.old':>9} {'resp.new':>9}  мкс"
+    print(header)
+    print("-" * len(header))
+
+    total_old = total_new = 0.0
+    for name, keyboard, call_args in CASES:
+        build = keyboard.__wrapped__
+        response(cached, keyboard, call_args)  # Первая отправка запоминает JSON
+
+        build_us = per_call_us(lambda: build(*call_args), args.number)
+        cached_us = per_call_us(lambda: keyboard(*call_args), args.number)
+        resp_old = per_call_us(lambda: response(plain, build, call_args), args.number)
+        resp_new = per_call_us(lambda: response(cached, keyboard, call_args), args.number)
+
+        total_old += resp_old
+        total_new += resp_new
+        print(f"{name:32} {build_us:8.2f} {cached_us:8.2f} {resp_old:9.2f} {resp_new:9.2f}")
+
+    print("-" * len(header))
+    print(f"{'всего':32} {'':8} {'':8} {total_old:9.2f} {total_new:9.2f}  (x{total_old / total_new:.1f})")
+
+
+if __name__ == "__main__":
+    main()
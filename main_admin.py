@@ -8,6 +8,7 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from app.config import settings
+from app.config.logging_setup import setup_logging
 from app.database.connection import create_tables
 from app.admin.main import app as admin_app
 
@@ -19,13 +20,7 @@ async def startup_event():
 
 
 def create_app() -> FastAPI:
-    """Создание FastAPI приложения"""
-    # Настройка логирования
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
+    """Создание FastAPI приложения (логирование настраивается при импорте app.admin.main)"""
     # Добавление обработчика запуска
     admin_app.add_event_handler("startup", startup_event)
     
@@ -34,12 +29,18 @@ def create_app() -> FastAPI:
 
 if __name__ == '__main__':
     try:
+        # Логи uvicorn идут через общую очередь (log_config=None).
+        # При reload=True сервер работает в дочернем процессе - там логирование
+        # настраивает импорт app.admin.main
+        setup_logging()
+        
         # Запуск сервера с импортом в виде строки
         uvicorn.run(
             "app.admin.main:app",
             host=settings.admin_host,
             port=settings.admin_port,
             reload=settings.debug,
+            log_config=None,
             log_level="info" if not settings.debug else "debug"
         )
     except KeyboardInterrupt:
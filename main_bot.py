@@ -8,18 +8,26 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from app.config import settings
+from app.config.logging_setup import setup_logging
 from app.database.connection import create_tables
 from app.bot.bot import create_bot
 from app.bot.handlers import register_handlers
+from app.bot.keyboards.registry import KeyboardSession
+from app.bot.utils.dispatch_profiler import dispatch_profiler
+from app.services.notification_service import admin_digest, close_bot, user_notifier
+from app.services.delivery_tracker import delivery_tracker
+from app.services.metrics import start_metrics_server, stop_metrics_server
+from app.services.profiling import loop_watchdog
+from app.services.broadcast_service import resume_broadcasts, stop_broadcasts
+from app.services.sla_service import start_sla_scheduler, stop_sla_scheduler
+from app.storage.gc import start_storage_gc, stop_storage_gc
+from app.storage.thumbnails import shutdown_thumbnail_pool
 
 
 async def main():
     """Главная функция для запуска бота"""
-    # Настройка логирования
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    # Настройка логирования (запись в отдельном потоке)
+    setup_logging(log_file=settings.bot_log_file)
     logger = logging.getLogger(__name__)
     
     try:
@@ -27,9 +35,13 @@ async def main():
         create_tables()
         logger.info("База данных инициализирована")
         
+        # Чаты, заблокировавшие бота (до возобновления рассылок)
+        logger.info(f"Недоступных чатов: {delivery_tracker.load()}")
+        
         # Создание бота и диспетчера
         bot = Bot(
             token=settings.bot_token,
+            session=KeyboardSession(),
             default=DefaultBotProperties(parse_mode=ParseMode.HTML)
         )
         
@@ -39,6 +51,22 @@ async def main():
         register_handlers(dp)
         logger.info("Обработчики зарегистрированы")
         
+        # /metrics на отдельном порту
+        if settings.metrics_enabled and settings.bot_metrics_port:
+            await start_metrics_server(settings.bot_metrics_host, settings.bot_metrics_port)
+        
+        # Стек синхронного кода, занявшего цикл событий дольше порога
+        loop_watchdog.start()
+        
+        # Периодическая сборка мусора хранилища
+        start_storage_gc()
+        
+        # Напоминания о сроках заказов
+        start_sla_scheduler()
+        
+        # Рассылки, прерванные прошлой остановкой
+        resume_broadcasts()
+        
         # Запуск бота
         logger.info("Запуск бота...")
         await dp.start_polling(bot)
@@ -47,6 +75,19 @@ async def main():
         logger.error(f"Ошибка при запуске бота: {e}")
         raise
     finally:
+        # Прогресс рассылок сохраняется, после запуска они продолжатся
+        await stop_broadcasts()
+        # Досылаем накопленные уведомления админу
+        await admin_digest.flush_all()
+        await user_notifier.drain()
+        loop_watchdog.stop()
+        stop_storage_gc()
+        stop_sla_scheduler()
+        await close_bot()
+        await stop_metrics_server()
+        shutdown_thumbnail_pool()
+        if dispatch_profiler.installed:
+            logger.info(f"Профиль диспетчеризации:\n{dispatch_profiler.report()}")
         logger.info("Бот остановлен")
 
 
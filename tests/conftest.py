@@ -0,0 +1,57 @@
+"""
+Общие фикстуры тестов
+
+Настройки читаются из окружения при импорте app.config, поэтому
+обязательные переменные задаются здесь, до импорта модулей приложения.
+"""
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("ADMIN_USER_ID", "1")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("UPLOAD_PATH", f"{_tmp}/uploads")
+os.environ.setdefault("STORAGE_BACKEND", "local")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database.models import Base, Order, OrderStatus, User
+
+
+@pytest.fixture
+def db():
+    """Сессия чистой БД в памяти"""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def make_order(db):
+    """Создать заказ в заданном статусе"""
+    def make(status: OrderStatus = OrderStatus.NEW, price=None, telegram_id: int = 1000) -> Order:
+        user = db.query(User).filter(User.telegram_id == telegram_id).first()
+        if user is None:
+            user = User(telegram_id=telegram_id, first_name="Тест")
+            db.add(user)
+            db.flush()
+        order = Order(
+            user_id=user.id, work_type="essay", subject="История", topic="Тема",
+            volume="10 страниц", deadline="через неделю", status=status, price=price
+        )
+        db.add(order)
+        db.commit()
+        return order
+    return make
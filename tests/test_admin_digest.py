@@ -0,0 +1,68 @@
+"""
+Тесты дайджеста уведомлений администратору
+"""
+import asyncio
+from types import SimpleNamespace
+
+from app.bot.handlers.user_messages import notify_admin_about_user_message
+from app.services import notification_service
+from app.services.notification_service import AdminDigest
+
+
+def collect(monkeypatch, digest: AdminDigest):
+    sent = []
+
+    async def send(self, text):
+        sent.append(text)
+
+    monkeypatch.setattr(AdminDigest, "_send", send)
+    monkeypatch.setattr(notification_service, "admin_digest", digest)
+    return sent
+
+
+def test_single_event_sent_as_is(monkeypatch):
+    digest = AdminDigest(window=60)
+    sent = collect(monkeypatch, digest)
+
+    async def run():
+        await digest.notify("полный текст", key="order:1", summary="кратко")
+        await digest.flush_all()
+
+    asyncio.run(run())
+    assert sent == ["полный текст"]
+
+
+def test_events_coalesced(monkeypatch):
+    digest = AdminDigest(window=60)
+    sent = collect(monkeypatch, digest)
+
+    async def run():
+        for i in range(3):
+            await digest.notify(f"текст {i}", key="order:1", summary=f"событие {i}", title="Заказ #1")
+        await digest.notify("срочно", key="order:1", urgent=True)
+        await digest.flush_all()
+
+    asyncio.run(run())
+    assert sent[0] == "срочно"
+    assert sent[1].startswith("📬 <b>Заказ #1</b>: 3 событий")
+    assert "• событие 2" in sent[1]
+
+
+def test_user_text_is_escaped(monkeypatch):
+    import app.bot.handlers.user_messages as user_messages
+
+    digest = AdminDigest(window=60)
+    sent = collect(monkeypatch, digest)
+    monkeypatch.setattr(user_messages, "admin_digest", digest)
+    order = SimpleNamespace(id=7, work_type="essay", short_topic="A <b> & C")
+    user = SimpleNamespace(full_name="<Иван>", username=None, telegram_id=5)
+
+    async def run():
+        await notify_admin_about_user_message(order, user, "цена < 100?")
+        await notify_admin_about_user_message(order, user, "еще <i>")
+        await digest.flush_all()
+
+    asyncio.run(run())
+    [text] = sent
+    assert "&lt;Иван&gt;: <i>цена &lt; 100?</i>" in text
+    assert "<i>еще &lt;i&gt;</i>" in text
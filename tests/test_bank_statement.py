@@ -0,0 +1,122 @@
+"""
+Тесты разбора банковских выписок и сверки
+"""
+import io
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.database.models import OrderPayment, OrderStatus
+from app.services.bank_statement import (
+    BankTransaction, InvalidRow, StatementError, iter_statement, parse_amount, parse_datetime,
+    parse_ofx_datetime,
+)
+from app.services.reconciliation_service import ReconciliationService, extract_order_numbers
+
+
+def rows(text: str, encoding: str = "utf-8"):
+    return list(iter_statement(io.BytesIO(text.encode(encoding))))
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1 234,56", Decimal("1234.56")),
+    ("-1234.56", Decimal("-1234.56")),
+    ("1 234,56 ₽", Decimal("1234.56")),
+    ("1,234.56", Decimal("1234.56")),
+    ("1.234,56", Decimal("1234.56")),
+    ("−500", Decimal("-500")),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+def test_parse_amount_invalid():
+    with pytest.raises(StatementError):
+        parse_amount("сумма")
+
+
+def test_parse_datetime_converts_to_utc():
+    assert parse_datetime("31.01.2024 15:30") == (datetime(2024, 1, 31, 12, 30), True)
+    assert parse_datetime("2024-01-31") == (datetime(2024, 1, 31), False)
+
+
+def test_parse_datetime_invalid():
+    with pytest.raises(StatementError):
+        parse_datetime("вчера")
+
+
+def test_parse_ofx_datetime_offset():
+    assert parse_ofx_datetime("20240131153000.000[+5:YEKT]") == (datetime(2024, 1, 31, 10, 30), True)
+    assert parse_ofx_datetime("20240131") == (datetime(2024, 1, 31), False)
+
+
+def test_csv_semicolon_cp1251():
+    text = (
+        "Дата операции;Сумма операции;Описание;ID операции\n"
+        "31.01.2024 15:30:00;1 500,00;Оплата заказа #12;T1\n"
+    )
+    [transaction] = rows(text, "cp1251")
+
+    assert transaction.amount == Decimal("1500.00")
+    assert transaction.description == "Оплата заказа #12"
+    assert transaction.transaction_id == "T1"
+    assert transaction.line == 2
+
+
+def test_csv_bad_rows_are_reported_and_skipped():
+    text = (
+        "date,amount,description\n"
+        "2024-01-31,100,ok\n"
+        "2024-13-45,200,bad date\n"
+        "2024-01-31,abc,bad amount\n"
+        "2024-02-01,300,ok\n"
+    )
+    result = rows(text)
+
+    assert [r.amount for r in result if isinstance(r, BankTransaction)] == [Decimal("100"), Decimal("300")]
+    assert [r.line for r in result if isinstance(r, InvalidRow)] == [3, 4]
+
+
+def test_csv_missing_columns_is_fatal():
+    with pytest.raises(StatementError, match="amount"):
+        rows("date,description\n2024-01-31,x\n")
+
+
+def test_ofx():
+    text = (
+        "OFXHEADER:100\n<OFX><BANKTRANLIST>\n"
+        "<STMTTRN>\n<DTPOSTED>20240131153000\n<TRNAMT>250.50\n<FITID>F1\n<MEMO>заказ 7\n</STMTTRN>\n"
+        "<STMTTRN>\n<TRNAMT>10\n<FITID>F2\n</STMTTRN>\n"
+        "</BANKTRANLIST></OFX>\n"
+    )
+    transaction, invalid = rows(text)
+
+    assert (transaction.amount, transaction.transaction_id, transaction.description) == (
+        Decimal("250.50"), "F1", "заказ 7"
+    )
+    assert isinstance(invalid, InvalidRow)
+
+
+def test_extract_order_numbers():
+    assert extract_order_numbers("Оплата заказа #12, заказ №15") == {12, 15}
+    assert extract_order_numbers("перевод") == set()
+
+
+def test_reconcile_lists_invalid_rows(db, make_order):
+    order = make_order(OrderStatus.WAITING_PAYMENT, price=Decimal("1500"))
+    payment = OrderPayment(order_id=order.id, amount=Decimal("1500"),
+                           created_at=datetime.utcnow() - timedelta(hours=2))
+    db.add(payment)
+    db.commit()
+
+    statement = [
+        InvalidRow(line=2, error="Неверная сумма: 'x'"),
+        BankTransaction(posted_at=datetime.utcnow() - timedelta(hours=1), amount=Decimal("1500"),
+                        description=f"Оплата заказа #{order.id}", transaction_id="T1", line=3),
+    ]
+    report = ReconciliationService(db).reconcile(statement, admin_user_id=1, auto_verify=False)
+
+    assert report.transactions == 1
+    assert [m.candidates[0].payment_id for m in report.confident] == [payment.id]
+    assert report.to_dict()["invalid_rows"] == [{"line": 2, "error": "Неверная сумма: 'x'"}]
@@ -0,0 +1,91 @@
+"""
+Тесты упаковки и разбора callback_data
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import pytest
+
+from app.bot.keyboards.callbacks import (
+    AdminOrders, BroadcastSegment, OrdersPage, SetStatus,
+)
+from app.bot.utils.callback_data import (
+    MAX_CALLBACK_DATA, CallbackData, CallbackDataError, parse_callback,
+)
+from app.database.models import OrderStatus
+
+
+@dataclass(frozen=True)
+class Batch(CallbackData, prefix="tbatch"):
+    ids: Tuple[int, ...]
+    note: Optional[str] = None
+
+
+@pytest.mark.parametrize("value", [
+    SetStatus(12, OrderStatus.READY),
+    SetStatus(2**40, OrderStatus.REVISION),
+    OrdersPage(0),
+    OrdersPage(-3, user_id=5),
+    AdminOrders(),
+    BroadcastSegment("work_type", "эссе"),
+    Batch((1, 300, 70000), note="x:y"),
+])
+def test_roundtrip(value):
+    data = value.pack()
+
+    assert data.startswith(value.prefix + ":")
+    assert len(data) <= MAX_CALLBACK_DATA
+    assert type(value).unpack(data) == value
+    assert parse_callback(data) == value
+
+
+def test_pack_is_compact():
+    assert SetStatus(12, OrderStatus.READY).pack() == "st:ARgC"
+
+
+@pytest.mark.parametrize("data, expected", [
+    ("status:12:ready", SetStatus(12, OrderStatus.READY)),
+    ("orders_page:2", OrdersPage(2)),
+    ("orders_page:2:77", OrdersPage(2, user_id=77)),
+    ("admin_orders:all", AdminOrders()),
+    ("admin_orders:new", AdminOrders(OrderStatus.NEW)),
+    ("bc_seg:topic:a:b", BroadcastSegment("topic", "a:b")),
+])
+def test_legacy_format(data, expected):
+    assert parse_callback(data) == expected
+
+
+@pytest.mark.parametrize("data", [
+    "st:!!!",            # не base64
+    "st:AhgC",           # другая версия схемы
+    "st:ARg",            # обрезано
+    "st:ARgCAA",         # лишние данные
+    "st:ARh_",           # неизвестный статус
+    "status:12:unknown",
+    "status:x:ready",
+])
+def test_invalid(data):
+    with pytest.raises(CallbackDataError):
+        parse_callback(data)
+
+
+def test_unknown_prefix():
+    assert parse_callback("zz:AQ") is None
+    assert parse_callback(None) is None
+
+
+def test_wrong_schema():
+    with pytest.raises(CallbackDataError):
+        OrdersPage.unpack(SetStatus(1, OrderStatus.NEW).pack())
+
+
+def test_limit_checked_on_pack():
+    with pytest.raises(CallbackDataError):
+        Batch(tuple(range(1000, 1100))).pack()
+
+
+def test_duplicate_prefix_rejected():
+    with pytest.raises(ValueError):
+        @dataclass(frozen=True)
+        class Duplicate(CallbackData, prefix="st"):
+            order_id: int
@@ -0,0 +1,62 @@
+"""
+Тесты разбора срока заказа
+"""
+from datetime import datetime
+
+import pytest
+
+from app.config import settings
+from app.services.deadline_parser import parse_deadline, to_local
+
+# Среда, 14.05.2025 12:00 МСК
+NOW = datetime(2025, 5, 14, 9, 0)
+
+
+@pytest.fixture(autouse=True)
+def moscow(monkeypatch):
+    monkeypatch.setattr(settings, "deadline_utc_offset", 3.0)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("15.05.2025", datetime(2025, 5, 15, 20, 59)),
+    ("до 15 мая", datetime(2025, 5, 15, 20, 59)),
+    ("2025-05-20", datetime(2025, 5, 20, 20, 59)),
+    ("10 мая", datetime(2026, 5, 10, 20, 59)),
+    ("завтра в 18:00", datetime(2025, 5, 15, 15, 0)),
+    ("Завтра в 3 дня", datetime(2025, 5, 15, 12, 0)),
+    ("послезавтра", datetime(2025, 5, 16, 20, 59)),
+    ("срочно", datetime(2025, 5, 14, 20, 59)),
+    ("через неделю", datetime(2025, 5, 21, 20, 59)),
+    ("через 2 дня", datetime(2025, 5, 16, 20, 59)),
+    ("через три часа", datetime(2025, 5, 14, 12, 0)),
+    ("через месяц", datetime(2025, 6, 14, 20, 59)),
+    ("15.05 днем", datetime(2025, 5, 15, 20, 59)),
+    ("к концу месяца", datetime(2025, 5, 31, 20, 59)),
+    ("к понедельнику", datetime(2025, 5, 19, 20, 59)),
+    ("в пятницу", datetime(2025, 5, 16, 20, 59)),
+    ("в следующую пятницу", datetime(2025, 5, 23, 20, 59)),
+])
+def test_parse_deadline(text, expected):
+    assert parse_deadline(text, now=NOW) == expected
+
+
+# Дробное количество перед единицей - срок, а не дата "д.м"
+@pytest.mark.parametrize("text, expected", [
+    ("1.5 недели", datetime(2025, 5, 24, 20, 59)),
+    ("через 2.5 часа", datetime(2025, 5, 14, 11, 30)),
+    ("через 1,5 месяца", datetime(2025, 6, 29, 20, 59)),
+    ("за 3.5 дня", datetime(2025, 5, 17, 20, 59)),
+])
+def test_fractional_duration(text, expected):
+    assert parse_deadline(text, now=NOW) == expected
+
+
+@pytest.mark.parametrize("text", [
+    None, "", "когда сможете", "31.02", "до 10 утра", "не срочно", "не сегодня",
+])
+def test_unrecognized(text):
+    assert parse_deadline(text, now=NOW) is None
+
+
+def test_to_local():
+    assert to_local(NOW) == datetime(2025, 5, 14, 12, 0)
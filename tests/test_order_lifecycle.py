@@ -0,0 +1,174 @@
+"""
+Тесты жизненного цикла заказа (ORDER_TRANSITIONS, охранные условия, обработчики)
+"""
+from decimal import Decimal
+
+import pytest
+
+from app.database.models import OrderPayment, OrderStatus, StatusHistory
+from app.database.models.enums import ORDER_TRANSITIONS
+from app.services.order_lifecycle import (
+    ACTOR_ADMIN, ACTOR_USER, TRANSITION_TABLE, OrderLifecycle, TransitionError,
+    register_status_listener, transition_counts,
+)
+from app.services.order_service import OrderService
+from app.services.payment_service import PaymentService
+
+
+def pending_payments(db, order):
+    return db.query(OrderPayment).filter(
+        OrderPayment.order_id == order.id,
+        OrderPayment.is_verified == False,
+        OrderPayment.is_rejected == False
+    ).all()
+
+
+def test_table_matches_transitions():
+    expected = {(source, target) for source, targets in ORDER_TRANSITIONS.items() for target in targets}
+    assert set(TRANSITION_TABLE) == expected
+
+
+def test_every_status_has_transitions():
+    assert set(ORDER_TRANSITIONS) == set(OrderStatus)
+
+
+@pytest.mark.parametrize("status", [
+    OrderStatus.IN_PROGRESS, OrderStatus.READY, OrderStatus.WAITING_PAYMENT,
+])
+def test_price_decline_returns_to_new(db, make_order, status):
+    order = make_order(status, price=Decimal("1000"))
+    lifecycle = OrderLifecycle(db)
+
+    assert lifecycle.check(order, OrderStatus.NEW) is None
+    assert lifecycle.transition(order, OrderStatus.NEW, "Цена отклонена клиентом", actor=ACTOR_USER)
+    lifecycle.commit()
+
+    assert order.status == OrderStatus.NEW
+
+
+def test_invalid_transition_raises(db, make_order):
+    order = make_order(OrderStatus.SENT)
+    lifecycle = OrderLifecycle(db)
+
+    assert lifecycle.check(order, OrderStatus.NEW) is not None
+    with pytest.raises(TransitionError):
+        lifecycle.transition(order, OrderStatus.NEW)
+    assert order.status == OrderStatus.SENT
+
+
+def test_same_status_is_noop(db, make_order):
+    order = make_order(OrderStatus.IN_PROGRESS)
+    lifecycle = OrderLifecycle(db)
+
+    assert lifecycle.transition(order, OrderStatus.IN_PROGRESS) is False
+    assert lifecycle.effects.changes == []
+
+
+def test_waiting_payment_requires_price(db, make_order):
+    order = make_order(OrderStatus.NEW)
+
+    with pytest.raises(TransitionError, match="цена"):
+        OrderLifecycle(db).transition(order, OrderStatus.WAITING_PAYMENT)
+
+
+def test_history_and_notification(db, make_order):
+    order = make_order(OrderStatus.NEW)
+    lifecycle = OrderLifecycle(db)
+
+    lifecycle.transition(order, OrderStatus.IN_PROGRESS, "Взят в работу", actor=ACTOR_ADMIN)
+    effects = lifecycle.commit()
+
+    history = db.query(StatusHistory).filter(StatusHistory.order_id == order.id).one()
+    assert (history.old_status, history.new_status, history.note) == (
+        OrderStatus.NEW, OrderStatus.IN_PROGRESS, "Взят в работу"
+    )
+    assert [n.chat_id for n in effects.notifications] == [1000]
+
+
+def test_user_actor_is_not_notified(db, make_order):
+    order = make_order(OrderStatus.WAITING_PAYMENT, price=Decimal("500"))
+    lifecycle = OrderLifecycle(db)
+
+    lifecycle.transition(order, OrderStatus.NEW, actor=ACTOR_USER)
+    assert lifecycle.commit().notifications == []
+
+
+def test_waiting_payment_creates_single_pending_payment(db, make_order):
+    order = make_order(OrderStatus.NEW, price=Decimal("1500"))
+    lifecycle = OrderLifecycle(db)
+
+    for status in (OrderStatus.WAITING_PAYMENT, OrderStatus.IN_PROGRESS, OrderStatus.WAITING_PAYMENT):
+        lifecycle.transition(order, status)
+        lifecycle.commit()
+
+    payments = pending_payments(db, order)
+    assert len(payments) == 1
+    assert payments[0].amount == Decimal("1500")
+
+
+def test_price_change_closes_stale_payment(db, make_order):
+    order = make_order(OrderStatus.NEW, price=Decimal("1500"))
+    lifecycle = OrderLifecycle(db)
+    lifecycle.transition(order, OrderStatus.WAITING_PAYMENT)
+    lifecycle.commit()
+
+    lifecycle.transition(order, OrderStatus.IN_PROGRESS)
+    order.price = Decimal("2000")
+    lifecycle.transition(order, OrderStatus.WAITING_PAYMENT)
+    lifecycle.commit()
+
+    assert [p.amount for p in pending_payments(db, order)] == [Decimal("2000")]
+
+
+@pytest.mark.parametrize("status", [OrderStatus.NEW, OrderStatus.CANCELLED])
+def test_leaving_payment_closes_pending(db, make_order, status):
+    order = make_order(OrderStatus.NEW, price=Decimal("700"))
+    lifecycle = OrderLifecycle(db)
+    lifecycle.transition(order, OrderStatus.WAITING_PAYMENT)
+    lifecycle.commit()
+
+    lifecycle.transition(order, status)
+    lifecycle.commit()
+
+    assert pending_payments(db, order) == []
+
+
+def test_listeners_and_counters_after_commit(db, make_order):
+    order = make_order(OrderStatus.NEW)
+    calls = []
+    register_status_listener(lambda *args: calls.append(args))
+    before = transition_counts[(OrderStatus.NEW, OrderStatus.CANCELLED)]
+    lifecycle = OrderLifecycle(db)
+
+    lifecycle.transition(order, OrderStatus.CANCELLED)
+    assert calls == []
+    lifecycle.commit()
+
+    assert (order.id, OrderStatus.NEW, OrderStatus.CANCELLED) in calls
+    assert transition_counts[(OrderStatus.NEW, OrderStatus.CANCELLED)] == before + 1
+
+
+def test_create_order_commits_once(db, make_order, monkeypatch):
+    user_id = make_order().user_id
+    commits = []
+    real_commit = db.commit
+    monkeypatch.setattr(db, "commit", lambda: commits.append(1) or real_commit())
+
+    order = OrderService(db).create_order(user_id, "essay", "История", "Тема", "5 страниц", "завтра")
+
+    assert len(commits) == 1
+    [history] = db.query(StatusHistory).filter(StatusHistory.order_id == order.id).all()
+    assert history.new_status == OrderStatus.NEW
+
+
+def test_payment_confirmation_escapes_topic(db, make_order):
+    order = make_order(OrderStatus.WAITING_PAYMENT, price=Decimal("100"))
+    order.topic = "Сравнение a < b & c"
+    payment = OrderPayment(order_id=order.id, amount=Decimal("100"))
+    db.add(payment)
+    db.commit()
+
+    result = PaymentService(db).review_payments([payment.id], [], None, admin_user_id=1)
+
+    assert result.verified == [payment.id]
+    assert "📋 Сравнение a &lt; b &amp; c\n" in result.notifications[0].text
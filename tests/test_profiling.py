@@ -0,0 +1,40 @@
+"""
+Тесты сторожа цикла событий
+"""
+import asyncio
+import time
+
+from app.services.profiling import LoopWatchdog
+
+
+def test_stall_detected_and_stop_joins_thread():
+    watchdog = LoopWatchdog(threshold=0.05)
+
+    async def run():
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)  # блокируем цикл
+        assert watchdog._stall_started is not None
+        thread = watchdog._thread
+        watchdog.stop()
+        return thread
+
+    thread = asyncio.run(run())
+
+    assert not thread.is_alive()
+    assert watchdog._thread is None
+    assert watchdog._stall_started is None
+
+
+def test_restart_after_stop():
+    watchdog = LoopWatchdog(threshold=0.05)
+
+    async def run():
+        watchdog.start()
+        watchdog.stop()
+        watchdog.start()
+        assert watchdog._thread.is_alive()
+        watchdog.stop()
+
+    asyncio.run(run())
+    assert watchdog._task is None
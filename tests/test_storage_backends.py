@@ -0,0 +1,47 @@
+"""
+Тесты локального бэкенда хранилища
+"""
+import shutil
+
+import pytest
+
+from app.storage.backends import LocalStorageBackend
+
+
+def test_put_to_copies(tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"content")
+    backend = LocalStorageBackend(str(tmp_path / "store"))
+
+    uri = backend.put_to(str(source), backend.uri("ab/abcdef"))
+
+    assert backend.size(uri) == len(b"content")
+    assert source.exists()
+    assert sorted(p.name for p in (tmp_path / "store" / "ab").iterdir()) == ["abcdef"]
+
+
+def test_put_to_move(tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"content")
+    backend = LocalStorageBackend(str(tmp_path / "store"))
+
+    uri = backend.put_to(str(source), backend.uri("ab/abcdef"), move=True)
+
+    assert backend.exists(uri)
+    assert not source.exists()
+
+
+def test_failed_copy_leaves_no_object(tmp_path, monkeypatch):
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"x" * 1024)
+    backend = LocalStorageBackend(str(tmp_path / "store"))
+
+    def broken_copy(src, dst, *args):
+        dst.write(src.read(100))
+        raise OSError("диск заполнен")
+
+    monkeypatch.setattr(shutil, "copyfileobj", broken_copy)
+    with pytest.raises(OSError):
+        backend.put_to(str(source), backend.uri("ab/abcdef"))
+
+    assert list((tmp_path / "store" / "ab").iterdir()) == []
@@ -0,0 +1,80 @@
+"""
+Тесты сборщика мусора хранилища
+"""
+import os
+
+import pytest
+
+from app.database.models import OrderFile, StoredBlob
+from app.storage import gc as gc_module
+from app.storage.backends import LocalStorageBackend
+from app.storage.gc import StorageGC
+from app.storage.indexer import normalize_uri
+
+OLD = 1_000_000_000  # mtime задолго до запуска
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Локальное хранилище в tmp_path/store, рабочий каталог - tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    backend = LocalStorageBackend(str(tmp_path / "store"))
+    monkeypatch.setattr(gc_module, "indexed_backends", lambda: [backend])
+
+    def put(key: str) -> str:
+        path = tmp_path / "store" / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"data")
+        os.utime(path, (OLD, OLD))
+        return str(path)
+    return put
+
+
+def test_normalize_uri():
+    assert normalize_uri("store\\orders\\1\\a.pdf") == os.path.abspath("store/orders/1/a.pdf")
+    assert normalize_uri("s3://bucket/key") == "s3://bucket/key"
+
+
+def test_deletes_orphan_only(db, make_order, store):
+    order = make_order()
+    orphan = store("blobs/aa/" + "a" * 64)
+    blob_path = store("blobs/bb/" + "b" * 64)
+    legacy_path = store("orders/1/a.pdf")
+
+    # Пути в БД записаны по-разному: абсолютный, относительный, с обратными слешами
+    db.add(StoredBlob(sha256="b" * 64, size=4, storage_path=os.path.relpath(blob_path), ref_count=0))
+    db.add(OrderFile(order_id=order.id, filename="a.pdf", file_path="store\\orders\\1\\a.pdf"))
+    db.commit()
+
+    gc = StorageGC(db, grace_seconds=0)
+    gc.run()
+
+    assert not os.path.exists(orphan)
+    assert os.path.exists(blob_path)
+    assert os.path.exists(legacy_path)
+    assert gc.deleted == 1
+
+
+def test_dry_run_deletes_nothing(db, store):
+    orphan = store("blobs/aa/" + "a" * 64)
+
+    report = StorageGC(db, grace_seconds=0, dry_run=True).run()
+
+    assert os.path.exists(orphan)
+    assert len(report.orphans) == 1
+
+
+def test_refcount_fixed(db, make_order, store):
+    order = make_order()
+    path = store("blobs/cc/" + "c" * 64)
+    blob = StoredBlob(sha256="c" * 64, size=4, storage_path=path, ref_count=5)
+    db.add(blob)
+    db.flush()
+    db.add(OrderFile(order_id=order.id, filename="c", file_path=path, blob_id=blob.id))
+    db.commit()
+
+    StorageGC(db, grace_seconds=0).run()
+
+    db.refresh(blob)
+    assert blob.ref_count == 1
+    assert os.path.exists(path)
@@ -0,0 +1,120 @@
+"""
+Тесты учета содержимого файлов (дедупликация, счетчики ссылок)
+"""
+from decimal import Decimal
+
+import pytest
+
+from app.database.models import OrderFile, OrderPayment, OrderStatus, StoredBlob
+from app.services import storage_service as storage_module
+from app.services.payment_service import PaymentService
+from app.services.storage_service import StorageService
+from app.storage.blob_store import StoredContent
+
+SHA = "a" * 64
+
+
+def content(sha256: str = SHA) -> StoredContent:
+    return StoredContent(sha256=sha256, size=10, path=f"blobs/{sha256[:2]}/{sha256}")
+
+
+def add_file(db, order, blob=None, file_path="blobs/x") -> OrderFile:
+    order_file = OrderFile(order_id=order.id, filename="check.jpg", file_path=file_path,
+                           blob_id=blob.id if blob else None)
+    db.add(order_file)
+    db.flush()
+    return order_file
+
+
+@pytest.fixture
+def deleted(monkeypatch):
+    """Пути, удаленные из хранилища (вместо настоящего удаления)"""
+    paths = []
+    monkeypatch.setattr(storage_module, "delete_blob", paths.append)
+    return paths
+
+
+def test_acquire_same_content_shares_blob(db):
+    service = StorageService(db)
+
+    first = service.acquire_blob(content())
+    second = service.acquire_blob(content())
+    db.commit()
+
+    assert first.id == second.id
+    assert db.query(StoredBlob).one().ref_count == 2
+
+
+def test_acquire_conflict_keeps_caller_changes(db, make_order, monkeypatch):
+    order = make_order()
+    db.add(StoredBlob(sha256=SHA, size=10, storage_path="blobs/existing", ref_count=1))
+    db.commit()
+    pending_file = add_file(db, order)
+
+    # Запись о содержимом создана параллельно, пока мы ее искали
+    service = StorageService(db)
+    lookups = iter([None])
+    real_lookup = service.get_blob_by_hash
+    monkeypatch.setattr(service, "get_blob_by_hash", lambda sha: next(lookups, None) or real_lookup(sha))
+
+    blob = service.acquire_blob(content())
+    db.commit()
+
+    assert blob.storage_path == "blobs/existing"
+    assert blob.ref_count == 2
+    assert db.query(OrderFile).filter(OrderFile.id == pending_file.id).count() == 1
+
+
+def test_release_deletes_after_commit(db, make_order, deleted):
+    order = make_order()
+    service = StorageService(db)
+    blob = service.acquire_blob(content())
+    db.commit()
+    order_file = add_file(db, order, blob)
+    db.commit()
+
+    service.release_file(order_file)
+    db.delete(order_file)
+    assert deleted == []
+
+    service.commit()
+    assert deleted == [content().path]
+    assert db.query(StoredBlob).count() == 0
+
+
+def test_release_shared_blob_keeps_content(db, make_order, deleted):
+    order = make_order()
+    service = StorageService(db)
+    blob = service.acquire_blob(content())
+    service.acquire_blob(content())
+    db.commit()
+
+    service.delete_order_file(add_file(db, order, blob))
+
+    assert deleted == []
+    assert db.query(StoredBlob).one().ref_count == 1
+
+
+def test_release_legacy_file(db, make_order, deleted):
+    order = make_order()
+
+    StorageService(db).delete_order_file(add_file(db, order, file_path="uploads/old.pdf"))
+
+    assert deleted == ["uploads/old.pdf"]
+
+
+def test_rejected_screenshot_can_be_resent(db, make_order):
+    order = make_order(OrderStatus.WAITING_PAYMENT, price=Decimal("100"))
+    blob = StorageService(db).acquire_blob(content())
+    db.commit()
+    screenshot = add_file(db, order, blob)
+    payment = OrderPayment(order_id=order.id, amount=Decimal("100"), screenshot_file_id=screenshot.id)
+    db.add(payment)
+    db.commit()
+    payments = PaymentService(db)
+
+    assert payments.find_payment_by_screenshot(order.id, SHA).id == payment.id
+
+    payment.is_rejected = True
+    db.commit()
+    assert payments.find_payment_by_screenshot(order.id, SHA) is None